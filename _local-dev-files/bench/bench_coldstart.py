@@ -0,0 +1,176 @@
+##################################
+# コールドスタート（モジュール読み込み時間）計測
+#
+# 各Lambdaの lambda_function を `python -X importtime` で別プロセスとして読み込み、
+# 読み込み時間と読み込みに時間のかかっているモジュールを出力する
+#
+# 基準値ファイル（coldstart_baseline.json）と比較し、
+# 基準値 × (1 + 許容率) + 許容時間 を超えたLambda、または基準値のあるLambdaが
+# 読み込みエラーとなった場合は終了コード1で終了する
+# 基準値のないLambdaの読み込みエラー（ローカルで不足する依存パッケージ等）はスキップとして出力する
+# 読み込み時のAWS通信も検出するため、接続先（endpoint_url）には接続できないアドレスを指定する
+# 基準値は計測環境に依存するため、計測環境を変えた場合は --update-baseline で作成し直す
+#
+# 実行方法:
+#   pip install -r _local-dev-files/bench/requirements.txt
+#   python _local-dev-files/bench/bench_coldstart.py [Lambda名 ...] [-r 繰り返し回数]
+#   基準値の更新: python _local-dev-files/bench/bench_coldstart.py --update-baseline
+##################################
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+LAYER_DIR = os.path.join(ROOT, "_local-dev-files", "layer", "common_functions_layer", "python")
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "coldstart_baseline.json")
+
+# 読み込み時の通信を失敗させる接続先
+UNREACHABLE_ENDPOINT = "http://127.0.0.1:9"
+# 1Lambdaあたりの読み込みタイムアウト（秒）
+IMPORT_TIMEOUT = 60
+
+IMPORTTIME_PATTERN = re.compile(r"^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)$")
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+# Lambda一覧（contents/lambda_function.py を持つディレクトリ）
+def find_lambdas():
+    return sorted(
+        name
+        for name in os.listdir(ROOT)
+        if os.path.isfile(os.path.join(ROOT, name, "contents", "lambda_function.py"))
+    )
+
+
+# docker-compose.yml のLambda環境変数
+def load_lambda_environment(lambda_name):
+    path = os.path.join(ROOT, lambda_name, "docker-compose.yml")
+    if not os.path.isfile(path):
+        return {}
+    app = _read(path).split("  localstack:")[0]
+    return dict(re.findall(r"^\s*-\s*(\w+)=(.*)$", app, re.M))
+
+
+##################################
+# 読み込み時間計測
+# 戻り値 : (読み込み時間(ms), [(モジュール名, 自身の読み込み時間(ms)), ...]) 失敗時は例外を送出
+##################################
+def measure(lambda_name):
+    env = dict(os.environ)
+    env.update(load_lambda_environment(lambda_name))
+    env.update(
+        {
+            "AWS_DEFAULT_REGION": "ap-northeast-1",
+            "AWS_ACCESS_KEY_ID": "dummy",
+            "AWS_SECRET_ACCESS_KEY": "dummy",
+            "AWS_SESSION_TOKEN": "dummy",
+            "AWS_EC2_METADATA_DISABLED": "true",
+            "AWS_XRAY_SDK_ENABLED": "false",
+            "AWS_MAX_ATTEMPTS": "1",
+            "endpoint_url": UNREACHABLE_ENDPOINT,
+            # レイヤーは同梱のboto3より実行環境のものを優先するため末尾に追加
+            "PYTHONPATH": os.pathsep.join([os.path.join(ROOT, lambda_name, "contents"), LAYER_DIR]),
+            "PYTHONDONTWRITEBYTECODE": "1",
+        }
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import lambda_function"],
+        cwd=os.path.join(ROOT, lambda_name, "contents"),
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=IMPORT_TIMEOUT,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "")
+
+    total = None
+    modules = []
+    for line in result.stderr.splitlines():
+        m = IMPORTTIME_PATTERN.match(line)
+        if not m:
+            continue
+        self_us, cumulative_us, indent, name = m.groups()
+        modules.append((name, int(self_us) / 1000))
+        if name == "lambda_function" and len(indent) == 1:
+            total = int(cumulative_us) / 1000
+    if total is None:
+        raise RuntimeError("lambda_function の読み込み時間が取得できません")
+    modules.sort(key=lambda item: item[1], reverse=True)
+    return total, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lambdaコールドスタート（読み込み時間）計測")
+    parser.add_argument("lambdas", nargs="*", help="Lambda名（未指定時は全Lambda）")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="繰り返し回数（最小値を採用）")
+    parser.add_argument("--top", type=int, default=5, help="表示するモジュール数")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="基準値からの許容率")
+    parser.add_argument("--slack-ms", type=float, default=50.0, help="基準値からの許容時間(ms)")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true", help="計測結果で基準値を更新")
+    args = parser.parse_args()
+
+    lambda_names = args.lambdas or find_lambdas()
+    baseline = {}
+    if os.path.isfile(args.baseline):
+        baseline = json.loads(_read(args.baseline)).get("lambdas", {})
+
+    results = {}
+    failures = []
+    skipped = []
+    for lambda_name in lambda_names:
+        try:
+            runs = [measure(lambda_name) for _ in range(args.repeat)]
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            if lambda_name in baseline:
+                print(f"{lambda_name:36s} 読み込みエラー: {e}")
+                failures.append(lambda_name)
+            else:
+                print(f"{lambda_name:36s} スキップ（基準値なし・読み込みエラー）: {e}")
+                skipped.append(lambda_name)
+            continue
+        total, modules = min(runs, key=lambda run: run[0])
+        results[lambda_name] = round(total, 1)
+
+        status = ""
+        base = baseline.get(lambda_name)
+        if base is not None:
+            limit = base * (1 + args.tolerance) + args.slack_ms
+            status = f"基準値={base:8.1f}ms"
+            if total > limit and not args.update_baseline:
+                status += f"  ※超過（上限={limit:.1f}ms）"
+                failures.append(lambda_name)
+        top = ", ".join(f"{name}={elapsed:.0f}" for name, elapsed in modules[: args.top])
+        print(f"{lambda_name:36s} {total:8.1f}ms  {status}")
+        print(f"{'':36s} 上位: {top}")
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(
+                {"python": sys.version.split()[0], "lambdas": dict(sorted(baseline.items()))},
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+            f.write("\n")
+        print(f"基準値を更新しました: {args.baseline}")
+
+    if skipped:
+        print(f"SKIP: {', '.join(skipped)}")
+    if failures:
+        print(f"NG: {', '.join(failures)}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+##################################
+# 登録用データ変換マイクロベンチマーク
+#
+# 旧実装(json.loads(json.dumps(item), parse_float=Decimal) / 型判定を順に行う to_dynamo_format)と
+# convert.to_dynamo_item / convert.to_dynamo_format の変換時間を比較する
+#
+# 実行方法:
+#   python _local-dev-files/bench/bench_convert.py [-n 繰り返し回数]
+##################################
+import argparse
+import json
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(__file__), "..", "layer", "common_functions_layer", "python"
+    )
+)
+import convert  # noqa: E402
+
+
+def decimal_to_num(obj):
+    if isinstance(obj, Decimal):
+        return int(obj) if float(obj).is_integer() else float(obj)
+
+
+def legacy_item(item):
+    return json.loads(json.dumps(item, default=decimal_to_num), parse_float=Decimal)
+
+
+def legacy_to_dynamo_format(v):
+    if type(v) is str:
+        return {"S": v}
+    if type(v) is int:
+        return {"N": str(v)}
+    if type(v) is Decimal:
+        return {"N": str(v)}
+    if type(v) is bool:
+        return {"BOOL": v}
+    if type(v) is list:
+        return {"L": [legacy_to_dynamo_format(a) for a in v]}
+    if type(v) is dict:
+        return {"M": {k: legacy_to_dynamo_format(a) for k, a in v.items()}}
+    if v is None:
+        return {"NULL": True}
+
+
+# 受信履歴（receivedata-2 の recv_data 相当）
+def recv_data_item():
+    return {
+        "simid": "898110000000000001",
+        "event_datetime": 1700000000000,
+        "recv_datetime": 1700000000123,
+        "device_id": "bench-device-00001",
+        "device_type": "PJ2",
+        "msg_type": 1,
+        "battery_voltage": 3.6,
+        "rssi": -80,
+        "sinr": 12.5,
+        "ai1": 12.34,
+        "ai2": -3.21,
+        "di_state": [1, 0, 1, 0, 0, 0, 0, 0],
+        "do_state": [0, 1],
+        "device_state": {"battery_near": False, "device_abnormality": True, "signal": "good"},
+        "note": None,
+    }
+
+
+# 履歴一覧（hist_list 相当）
+def hist_list_item():
+    return {
+        "device_id": "bench-device-00001",
+        "hist_id": "5a0f2b8e-9d3c-4c8e-8f5e-123456789abc",
+        "event_datetime": 1700000000000,
+        "recv_datetime": 1700000000123,
+        "expire_datetime": 1731536000,
+        "hist_data": {
+            "device_name": "倉庫A 入口",
+            "imei": "350000000000001",
+            "event_type": "di_change_state",
+            "terminal_no": 3,
+            "terminal_name": "扉センサー",
+            "terminal_state_name": "開",
+            "group_list": [{"group_id": f"g{i}", "group_name": f"グループ{i}"} for i in range(3)],
+            "notification_hist_id": "",
+            "threshold": Decimal("12.5"),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=50000)
+    args = parser.parse_args()
+
+    for name, factory in (("recv_data", recv_data_item), ("hist_list", hist_list_item)):
+        item = factory()
+        # 変換結果の一致確認（入力を変更しないことも確認）
+        assert convert.to_dynamo_item(item) == legacy_item(item), name
+        assert item == factory(), name
+        legacy = timeit.timeit(lambda: legacy_item(item), number=args.n)
+        new = timeit.timeit(lambda: convert.to_dynamo_item(item), number=args.n)
+        print(
+            f"to_dynamo_item    {name:10s} json={legacy / args.n * 1e6:.2f}us "
+            f"dispatch={new / args.n * 1e6:.2f}us speedup={legacy / new:.1f}x"
+        )
+
+    item = legacy_item(hist_list_item())
+    assert convert.dict_dynamo_format(item) == legacy_to_dynamo_format(item)["M"]
+    assert convert.from_dynamo_format({"M": convert.dict_dynamo_format(item)}) == item
+    legacy = timeit.timeit(lambda: legacy_to_dynamo_format(item), number=args.n)
+    new = timeit.timeit(lambda: convert.to_dynamo_format(item), number=args.n)
+    print(
+        f"to_dynamo_format  hist_list  legacy={legacy / args.n * 1e6:.2f}us "
+        f"dispatch={new / args.n * 1e6:.2f}us speedup={legacy / new:.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
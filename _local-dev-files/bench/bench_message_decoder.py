@@ -0,0 +1,133 @@
+##################################
+# 電文解析マイクロベンチマーク
+#
+# 旧実装(getByteArray + int.from_bytes + signed_hex2int)と
+# message_decoder(struct.Struct + memoryview)の解析時間を比較する
+#
+# 実行方法:
+#   python _local-dev-files/bench/bench_message_decoder.py [-n 繰り返し回数]
+##################################
+import argparse
+import os
+import struct
+import sys
+import timeit
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "..", "receivedata-2", "contents")
+)
+import message_decoder  # noqa: E402
+
+
+def getByteArray(Payload, index, len):
+    start = index[0]
+    end = index[0] + len
+    index[0] += len
+    return Payload[start:end]
+
+
+def signed_hex2int(signed_hex, digit):
+    signed = 0x01 << (digit - 1)
+    mask = 0x00
+    for num in range(digit):
+        mask = mask | (0x01 << num)
+    signed_int = (
+        (int(signed_hex ^ mask) * -1) - 1 if (signed_hex & signed) else int(signed_hex)
+    )
+    return signed_int
+
+
+# 旧実装（validate + commandParser で共通部を2回解析）
+def legacy_decode(Payload):
+    index = [0]
+    int.from_bytes(getByteArray(Payload, index, 2), "big")
+    int.from_bytes(getByteArray(Payload, index, 2), "big")
+    int.from_bytes(getByteArray(Payload, index, 2), "big")
+    nMsgType = int.from_bytes(getByteArray(Payload, index, 2), "big")
+    if nMsgType == 0x8002:
+        getByteArray(Payload, index, 4).hex()
+    int.from_bytes(getByteArray(Payload, index, 8), "big")
+
+    index = [0]
+    nlen = int.from_bytes(getByteArray(Payload, index, 2), "big")
+    nDeviceType = int.from_bytes(getByteArray(Payload, index, 2), "big")
+    nVer = int.from_bytes(getByteArray(Payload, index, 2), "big")
+    nMsgType = int.from_bytes(getByteArray(Payload, index, 2), "big")
+    szReqNo = getByteArray(Payload, index, 4).hex() if nMsgType == 0x8002 else None
+    nEventTime = int.from_bytes(getByteArray(Payload, index, 8), "big")
+    nState = int.from_bytes(getByteArray(Payload, index, 1), "big")
+    nStatetrg = None
+    if nMsgType == 0x0001:
+        nStatetrg = int.from_bytes(getByteArray(Payload, index, 1), "big")
+    nVolt = int.from_bytes(getByteArray(Payload, index, 1), "big")
+    nRssi = signed_hex2int(int.from_bytes(getByteArray(Payload, index, 1), "big"), 8)
+    nSinr = signed_hex2int(int.from_bytes(getByteArray(Payload, index, 1), "big"), 8)
+    values = [None] * 8
+    if nMsgType == 0x0001:
+        values = [
+            int.from_bytes(getByteArray(Payload, index, 1), "big"),
+            int.from_bytes(getByteArray(Payload, index, 1), "big"),
+            int.from_bytes(getByteArray(Payload, index, 1), "big"),
+            int.from_bytes(getByteArray(Payload, index, 1), "big"),
+            signed_hex2int(int.from_bytes(getByteArray(Payload, index, 2), "big"), 16),
+            signed_hex2int(int.from_bytes(getByteArray(Payload, index, 2), "big"), 16),
+            int.from_bytes(getByteArray(Payload, index, 1), "big"),
+            None,
+        ]
+    elif nMsgType in [0x0011, 0x0012]:
+        nDIState = int.from_bytes(getByteArray(Payload, index, 1), "big")
+        nDOState = int.from_bytes(getByteArray(Payload, index, 1), "big")
+        nAI1 = signed_hex2int(int.from_bytes(getByteArray(Payload, index, 2), "big"), 16)
+        nAI2 = signed_hex2int(int.from_bytes(getByteArray(Payload, index, 2), "big"), 16)
+        values = [nDIState, None, nDOState, None, nAI1, nAI2, None, None]
+    elif nMsgType == 0x8002:
+        nControlResult = int.from_bytes(getByteArray(Payload, index, 1), "big")
+        nDOState = int.from_bytes(getByteArray(Payload, index, 1), "big")
+        values = [None, None, nDOState, None, None, None, None, nControlResult]
+    return message_decoder.DeviceMessage(
+        nlen, nDeviceType, nVer, nMsgType, szReqNo, nEventTime, nState, nStatetrg,
+        nVolt, nRssi, nSinr, *values,
+    )
+
+
+def new_decode(Payload):
+    header = message_decoder.decodeHeader(Payload)
+    return message_decoder.decode(Payload, header)
+
+
+def build_payload(msg_type, device_type=2):
+    body = struct.pack(">HHH", device_type, 1, msg_type)
+    if msg_type == 0x8002:
+        body += bytes.fromhex("0000002a")
+    body += struct.pack(">QB", 1700000000000, 0b10000101)
+    if msg_type == 0x0001:
+        body += bytes([1])
+    body += struct.pack(">Bbb", 36, -80, 12)
+    if msg_type == 0x0001:
+        body += struct.pack(">BBBBhhB", 0b00000101, 3, 0b10, 2, 1234, -321, 0)
+    elif msg_type in (0x0011, 0x0012):
+        body += struct.pack(">BBhh", 0b00000101, 0b10, 1234, -321)
+    else:
+        body += struct.pack(">BB", 0, 0b10)
+    return struct.pack(">H", len(body) + 2) + body
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=100000)
+    args = parser.parse_args()
+
+    for msg_type in (0x0001, 0x0011, 0x0012, 0x8002):
+        payload = build_payload(msg_type)
+        # 解析結果の一致確認
+        assert legacy_decode(payload) == new_decode(payload), hex(msg_type)
+        legacy = timeit.timeit(lambda: legacy_decode(payload), number=args.n)
+        new = timeit.timeit(lambda: new_decode(payload), number=args.n)
+        print(
+            f"msg_type={msg_type:04x} legacy={legacy / args.n * 1e6:.2f}us "
+            f"struct={new / args.n * 1e6:.2f}us speedup={legacy / new:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
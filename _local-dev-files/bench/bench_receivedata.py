@@ -0,0 +1,503 @@
+##################################
+# receivedata-2 取り込み性能計測（リプレイ＆ベンチマーク）
+#
+# PJ1/PJ2/PJ3の電文（状態変化通知・現状態通知・電源ON・接点出力制御応答）を生成し、
+# receivedata-2 の lambda_handler（または batch_handler）へ順に投入して
+# 処理件数/秒、電文1件あたりのAWS API呼び出し回数、レイテンシ分布を出力する
+#
+# DynamoDB/SSM/SQSは以下のいずれかを使用する
+#   ・インメモリ（既定）: moto で terraform(DDB/SSM/SQS) 定義と同じテーブル・パラメータ・キューを作成
+#   ・ローカル環境    : --endpoint-url で localstack 等を指定（テーブル等は init.sh で構築済みのもの）
+#
+# 実行方法:
+#   pip install -r _local-dev-files/bench/requirements.txt
+#   python _local-dev-files/bench/bench_receivedata.py [-d デバイス数] [-n 電文数] [--batch-size 件数]
+##################################
+import argparse
+import base64
+import collections
+import json
+import os
+import random
+import re
+import struct
+import sys
+import time
+import types
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+LAMBDA_DIR = os.path.join(ROOT, "receivedata-2")
+LAYER_DIR = os.path.join(ROOT, "_local-dev-files", "layer", "common_functions_layer", "python")
+TERRAFORM_DIR = os.path.join(ROOT, "_local-dev-files", "localstack", "terraform")
+
+# デバイス種別 → (デバイス種別コード, 接点入力数, 接点出力数)
+DEVICE_TYPES = {"PJ1": (0x0001, 1, 0), "PJ2": (0x0002, 8, 2), "PJ3": (0x0003, 8, 2)}
+
+# 電文種別の出現比率（接点出力制御応答はPJ2/PJ3のみ）
+MESSAGE_WEIGHTS = {0x0001: 60, 0x0012: 20, 0x0011: 5, 0x8002: 15}
+
+# デバイス状態のビット（バッテリーニアエンド、機器異常）
+BATTERY_NEAR_BIT = 0b00000001
+DEVICE_ABNORMALITY_BIT = 0b00000100
+
+
+##################################
+# terraform定義の読み込み
+##################################
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def _tfvars(path):
+    return dict(re.findall(r'^\s*(\w+)\s*=\s*"([^"]*)"', _read(path), re.M))
+
+
+def _substitute(value, tfvars):
+    return re.sub(r"\$\{var\.(\w+)\}", lambda m: tfvars[m.group(1)], value)
+
+
+def _blocks(text, header):
+    # header に続く { ... } の中身を順に返す
+    for m in re.finditer(header, text):
+        start = text.index("{", m.end() - 1)
+        depth = 0
+        for i in range(start, len(text)):
+            if text[i] == "{":
+                depth += 1
+            elif text[i] == "}":
+                depth -= 1
+                if depth == 0:
+                    yield m, text[start + 1 : i]
+                    break
+
+
+def _attr(body, name):
+    m = re.search(rf'^\s*{name}\s*=\s*"([^"]*)"', body, re.M)
+    return m.group(1) if m else None
+
+
+# DDB/db.tf → create_table引数リスト
+def load_table_definitions():
+    tfvars = _tfvars(os.path.join(TERRAFORM_DIR, "DDB", "db.tfvars"))
+    text = _read(os.path.join(TERRAFORM_DIR, "DDB", "db.tf"))
+    definitions = []
+    for _, body in _blocks(text, r'resource\s+"aws_dynamodb_table"\s+"\w+"\s*\{'):
+        # 入れ子ブロックを除いたテーブル直下の定義
+        top = re.sub(r"\w+\s*\{[^{}]*\}", "", body)
+        hash_key = _attr(top, "hash_key")
+        range_key = _attr(top, "range_key")
+        key_schema = [{"AttributeName": hash_key, "KeyType": "HASH"}]
+        if range_key:
+            key_schema.append({"AttributeName": range_key, "KeyType": "RANGE"})
+        definition = {
+            "TableName": _substitute(_attr(top, "name"), tfvars),
+            "KeySchema": key_schema,
+            "AttributeDefinitions": [
+                {"AttributeName": _attr(b, "name"), "AttributeType": _attr(b, "type")}
+                for _, b in _blocks(body, r"\battribute\s*\{")
+            ],
+            "BillingMode": "PAY_PER_REQUEST",
+        }
+        for block, index_type in (
+            ("global_secondary_index", "GlobalSecondaryIndexes"),
+            ("local_secondary_index", "LocalSecondaryIndexes"),
+        ):
+            indexes = []
+            for _, b in _blocks(body, rf"\b{block}\s*\{{"):
+                index_key_schema = [
+                    {"AttributeName": _attr(b, "hash_key") or hash_key, "KeyType": "HASH"}
+                ]
+                if _attr(b, "range_key"):
+                    index_key_schema.append(
+                        {"AttributeName": _attr(b, "range_key"), "KeyType": "RANGE"}
+                    )
+                indexes.append(
+                    {
+                        "IndexName": _attr(b, "name"),
+                        "KeySchema": index_key_schema,
+                        "Projection": {"ProjectionType": _attr(b, "projection_type") or "ALL"},
+                    }
+                )
+            if indexes:
+                definition[index_type] = indexes
+        definitions.append(definition)
+    return definitions
+
+
+# SSM/ssm.tf → テーブル名パラメータ（パラメータ名, 値）
+def load_table_names_parameter():
+    tfvars = _tfvars(os.path.join(TERRAFORM_DIR, "SSM", "ssm.tfvars"))
+    text = _read(os.path.join(TERRAFORM_DIR, "SSM", "ssm.tf"))
+    for m, body in _blocks(text, r'resource\s+"aws_ssm_parameter"\s+"dynamodb_table_name"\s*\{'):
+        name = _substitute(_attr(body, "name"), tfvars)
+        table_names = {
+            key: _substitute(value, tfvars)
+            for key, value in re.findall(r'^\s*(\w+)\s*=\s*"(\$\{var\.\w+\})"', body, re.M)
+        }
+        return name, json.dumps(table_names)
+    raise ValueError("dynamodb_table_name が見つかりません")
+
+
+# receivedata-2/docker-compose.yml → 環境変数
+def load_lambda_environment():
+    text = _read(os.path.join(LAMBDA_DIR, "docker-compose.yml"))
+    app = text.split("  localstack:")[0]
+    return dict(re.findall(r"^\s*-\s*(\w+)=(.*)$", app, re.M))
+
+
+##################################
+# 試験データ
+##################################
+class Device:
+    def __init__(self, no, device_type):
+        self.no = no
+        self.device_type = device_type
+        self.type_code, self.di_count, self.do_count = DEVICE_TYPES[device_type]
+        self.device_id = f"bench-device-{no:05d}"
+        self.iccid = f"8981100000{no:09d}"
+        self.imei = f"35000000{no:07d}"
+        self.di_state = 0
+        self.do_state = 0
+        self.device_state = 0
+        self.req_no = 0
+
+    def device_item(self):
+        di_list = [
+            {
+                "di_no": i,
+                "di_name": f"接点入力{i}",
+                "di_on_name": "閉",
+                "di_on_icon": "on",
+                "di_off_name": "開",
+                "di_off_icon": "off",
+            }
+            for i in range(1, self.di_count + 1)
+        ]
+        do_list = [
+            {
+                "do_no": i,
+                "do_name": f"接点出力{i}",
+                "do_control": "open",
+                "do_specified_time": 3,
+                "do_di_return": 0,
+                "do_timer_list": [],
+            }
+            for i in range(1, self.do_count + 1)
+        ]
+        return {
+            "device_id": self.device_id,
+            "identification_id": self.imei,
+            "device_type": self.device_type,
+            "imei": self.imei,
+            "contract_state": 1,
+            "contract_id": "bench-contract",
+            "device_data": {
+                "param": {
+                    "contract_id": "bench-contract",
+                    "iccid": self.iccid,
+                    "device_code": "MS-C0130",
+                },
+                "config": {
+                    "device_name": f"ベンチ{self.no:05d}",
+                    "device_healthy_period": 3,
+                    "terminal_settings": {"di_list": di_list, "do_list": do_list},
+                    "notification_settings": [
+                        {"event_trigger": "di_change", "terminal_no": 1, "change_detail": 1},
+                        {"event_trigger": "battery_near", "event_type": "battery_near"},
+                    ],
+                    "notification_target_list": ["bench-user"],
+                },
+            },
+        }
+
+
+def seed(dynamodb, table_names, devices):
+    tables = {key: dynamodb.Table(name) for key, name in table_names.items()}
+    with tables["GROUP_TABLE"].batch_writer() as batch:
+        for i in range(3):
+            batch.put_item(
+                Item={
+                    "group_id": f"bench-group-{i}",
+                    "contract_id": "bench-contract",
+                    "group_data": {"config": {"group_name": f"グループ{i}"}},
+                }
+            )
+    with tables["DEVICE_TABLE"].batch_writer() as device_batch, tables[
+        "ICCID_TABLE"
+    ].batch_writer() as iccid_batch, tables["DEVICE_RELATION_TABLE"].batch_writer() as relation_batch:
+        for device in devices:
+            device_batch.put_item(Item=device.device_item())
+            iccid_batch.put_item(
+                Item={
+                    "iccid": device.iccid,
+                    "device_id": device.device_id,
+                    "contract_id": "bench-contract",
+                }
+            )
+            relation_batch.put_item(
+                Item={"key1": f"g-bench-group-{device.no % 3}", "key2": f"d-{device.device_id}"}
+            )
+
+
+# 接点出力制御要求（接点出力制御応答の照合先）
+def put_remote_control(remote_control_table, device, req_datetime):
+    device.req_no += 1
+    req_no = format(device.req_no, "08x")
+    remote_control_table.put_item(
+        Item={
+            "device_req_no": f"{device.iccid}-{req_no}",
+            "req_datetime": req_datetime,
+            "device_id": device.device_id,
+            "contract_id": "bench-contract",
+            "control": "open",
+            "control_trigger": "manual_control",
+            "do_no": random.randint(1, device.do_count),
+            "link_di_no": 0,
+            "iccid": device.iccid,
+            "control_exec_user_name": "ベンチ",
+            "control_exec_user_email_address": "bench@example.com",
+        }
+    )
+    return bytes.fromhex(req_no)
+
+
+def build_payload(device, msg_type, event_datetime, req_no=None):
+    body = struct.pack(">HHH", device.type_code, 1, msg_type)
+    if msg_type == 0x8002:
+        body += req_no
+    body += struct.pack(">QB", event_datetime, device.device_state)
+    if msg_type == 0x0001:
+        body += bytes([0])
+    body += struct.pack(">Bbb", 36, random.randint(-100, -55), random.randint(0, 30))
+    if msg_type == 0x0001:
+        di_trigger = random.randint(1, device.di_count)
+        device.di_state ^= 1 << (di_trigger - 1)
+        body += struct.pack(
+            ">BBBBhhB", device.di_state, di_trigger, device.do_state, 0, 1234, -321, 0
+        )
+    elif msg_type in (0x0011, 0x0012):
+        body += struct.pack(">BBhh", device.di_state, device.do_state, 1234, -321)
+    else:
+        device.do_state ^= 1
+        body += struct.pack(">BB", 0, device.do_state)
+    return struct.pack(">H", len(body) + 2) + body
+
+
+# 電文列生成 [(device, payload)]
+def generate_messages(devices, count, remote_control_table):
+    now = int(time.time() * 1000)
+    event_datetime = now - count * 1000
+    messages = []
+    for _ in range(count):
+        device = random.choice(devices)
+        msg_types = [t for t in MESSAGE_WEIGHTS if t != 0x8002 or device.do_count]
+        msg_type = random.choices(msg_types, [MESSAGE_WEIGHTS[t] for t in msg_types])[0]
+        event_datetime += 1000
+        # バッテリーニアエンド・機器異常の発生/復旧
+        if random.random() < 0.05:
+            device.device_state ^= random.choice([BATTERY_NEAR_BIT, DEVICE_ABNORMALITY_BIT])
+        req_no = None
+        if msg_type == 0x8002:
+            req_no = put_remote_control(remote_control_table, device, event_datetime - 500)
+        messages.append((device, build_payload(device, msg_type, event_datetime, req_no)))
+    return messages
+
+
+##################################
+# AWS API呼び出し回数計測
+##################################
+class CallCounter:
+    def __init__(self):
+        self.calls = collections.Counter()
+
+    def __call__(self, event_name, **kwargs):
+        # event_name : before-call.<サービス>.<操作>
+        _, service, operation = event_name.split(".", 2)
+        self.calls[(service, operation)] += 1
+
+    def reset(self):
+        self.calls.clear()
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    f = int(k)
+    c = min(f + 1, len(values) - 1)
+    return values[f] + (values[c] - values[f]) * (k - f)
+
+
+def report(label, latencies, elapsed, message_count, counter, results):
+    print(f"== {label} ==")
+    print(f"電文数          : {message_count}")
+    print(f"処理時間        : {elapsed:.2f}s")
+    print(f"処理件数/秒     : {message_count / elapsed:.1f}")
+    ms = [v * 1000 for v in latencies]
+    print(
+        "レイテンシ(ms)  : "
+        f"p50={percentile(ms, 50):.2f} p90={percentile(ms, 90):.2f} "
+        f"p99={percentile(ms, 99):.2f} max={max(ms, default=0):.2f}"
+    )
+    total = sum(n for (service, _), n in counter.calls.items() if service == "dynamodb")
+    print(f"DynamoDB呼出/件 : {total / message_count:.2f}")
+    for (service, operation), n in sorted(counter.calls.items()):
+        print(f"  {service + '.' + operation:<32} {n:>7} ({n / message_count:.2f}/件)")
+    print(f"応答            : {dict(results)}")
+
+
+##################################
+# 計測環境構築
+#
+# Lambda環境変数の設定、テーブル等の作成（moto使用時）、呼び出し回数計測の登録を行い、
+# receivedata-2 の lambda_function を読み込む
+# Lambdaモジュールはプロセス内で1回だけ読み込まれるため、構築済みの場合は同じ環境を返す
+# 戻り値 : (lambda_function, dynamodb, テーブル名, CallCounter, mock)
+##################################
+_environment = None
+
+
+def setup(endpoint_url=None, log_level="WARNING"):
+    global _environment
+    if _environment is not None:
+        return _environment
+
+    # Lambda環境変数
+    env = load_lambda_environment()
+    env.update(
+        {
+            "AWS_DEFAULT_REGION": "ap-northeast-1",
+            "AWS_ACCESS_KEY_ID": "dummy",
+            "AWS_SECRET_ACCESS_KEY": "dummy",
+            "AWS_SESSION_TOKEN": "dummy",
+            "POWERTOOLS_LOG_LEVEL": log_level,
+            "AWS_XRAY_SDK_ENABLED": "false",
+        }
+    )
+    env.pop("endpoint_url", None)
+    if endpoint_url:
+        env["endpoint_url"] = endpoint_url
+    os.environ.update(env)
+
+    import boto3
+
+    mock = None
+    if not endpoint_url:
+        from moto import mock_aws
+
+        mock = mock_aws()
+        mock.start()
+
+    dynamodb = boto3.resource("dynamodb", endpoint_url=endpoint_url)
+    parameter_name, parameter_value = load_table_names_parameter()
+    table_names = json.loads(parameter_value)
+    if mock:
+        for definition in load_table_definitions():
+            dynamodb.create_table(**definition)
+        boto3.client("ssm").put_parameter(Name=parameter_name, Value=parameter_value, Type="String")
+        boto3.client("sqs").create_queue(QueueName=env["EVENT_NOTICE_SQS_QUEUE_NAME"])
+
+    # 呼び出し回数計測（Lambdaモジュール読み込み前に登録し、生成される全クライアントに反映）
+    counter = CallCounter()
+    boto3.setup_default_session()
+    boto3.DEFAULT_SESSION.events.register("before-call", counter)
+    if mock:
+        # 初期受信Lambdaは呼び出さない
+        boto3.DEFAULT_SESSION.events.register(
+            "before-call.lambda.Invoke",
+            lambda **kwargs: (types.SimpleNamespace(status_code=202), {"StatusCode": 202}),
+        )
+
+    # レイヤーは同梱のboto3より実行環境のものを優先するため末尾に追加
+    sys.path.insert(0, os.path.join(LAMBDA_DIR, "contents"))
+    sys.path.append(LAYER_DIR)
+    import lambda_function
+
+    _environment = (lambda_function, dynamodb, table_names, counter, mock)
+    return _environment
+
+
+##################################
+# 電文投入
+#
+# batch_size : 0: lambda_handler, 1以上: batch_handler
+# 戻り値 : (レイテンシリスト, 処理時間, 応答件数)
+##################################
+def replay(lambda_function, message_list, batch_size=0):
+    latencies = []
+    results = collections.Counter()
+    start = time.perf_counter()
+    if batch_size:
+        for i in range(0, len(message_list), batch_size):
+            chunk = message_list[i : i + batch_size]
+            records = [
+                {
+                    "messageId": str(i + j),
+                    "attributes": {"SentTimestamp": str(int(time.time() * 1000))},
+                    "body": json.dumps(
+                        {
+                            "simId": device.iccid,
+                            "payload": base64.standard_b64encode(payload).decode(),
+                        }
+                    ),
+                }
+                for j, (device, payload) in enumerate(chunk)
+            ]
+            t = time.perf_counter()
+            res = lambda_function.batch_handler({"Records": records}, None)
+            latencies.append(time.perf_counter() - t)
+            results["failure"] += len(res["batchItemFailures"])
+            results["success"] += len(chunk) - len(res["batchItemFailures"])
+    else:
+        for device, payload in message_list:
+            event = {"payload": base64.standard_b64encode(payload).decode()}
+            context = types.SimpleNamespace(
+                client_context=types.SimpleNamespace(custom={"simId": device.iccid})
+            )
+            t = time.perf_counter()
+            res = lambda_function.lambda_handler(event, context)
+            latencies.append(time.perf_counter() - t)
+            results[res[0]] += 1
+    return latencies, time.perf_counter() - start, results
+
+
+##################################
+# 実行
+##################################
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--devices", type=int, default=50)
+    parser.add_argument("-n", "--messages", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=0, help="0: lambda_handler, 1以上: batch_handler")
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--endpoint-url", default=None, help="localstack等（未指定時はmotoのインメモリ環境）")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    lambda_function, dynamodb, table_names, counter, mock = setup(args.endpoint_url, args.log_level)
+
+    devices = [
+        Device(i, list(DEVICE_TYPES)[i % len(DEVICE_TYPES)]) for i in range(args.devices)
+    ]
+    seed(dynamodb, table_names, devices)
+    remote_control_table = dynamodb.Table(table_names["REMOTE_CONTROL_TABLE"])
+    warmup = generate_messages(devices, args.warmup, remote_control_table)
+    messages = generate_messages(devices, args.messages, remote_control_table)
+
+    if warmup:
+        replay(lambda_function, warmup, args.batch_size)
+    counter.reset()
+    latencies, elapsed, results = replay(lambda_function, messages, args.batch_size)
+    label = f"batch_handler(batch_size={args.batch_size})" if args.batch_size else "lambda_handler"
+    report(label, latencies, elapsed, len(messages), counter, results)
+
+    if mock:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
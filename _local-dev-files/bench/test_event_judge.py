@@ -0,0 +1,168 @@
+##################################
+# receivedata-2 イベント判定の確認
+#
+# ルールテーブル（DEVICE_STATE_RULES / STATE_UPDATE_RULES）によるイベント判定に電文・現状態を与え、
+# 作成される履歴一覧と現状態を確認する
+#
+# 実行方法:
+#   pip install -r _local-dev-files/bench/requirements.txt
+#   python -m unittest _local-dev-files/bench/test_event_judge.py
+##################################
+import copy
+import itertools
+import os
+import random
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import bench_receivedata as bench  # noqa: E402
+
+# 試験毎のデバイス番号
+DEVICE_NO = itertools.count(3000)
+
+
+def setUpModule():
+    global dynamodb, table_names, event_judge, message_decoder, parsePayload
+    random.seed(1)
+    _, dynamodb, table_names, _, _ = bench.setup()
+    import event_judge
+    import message_decoder
+    from command_parser import parsePayload
+
+
+class TestEventJudge(unittest.TestCase):
+    def setUp(self):
+        self.remote_control_table = dynamodb.Table(table_names["REMOTE_CONTROL_TABLE"])
+        self.device = bench.Device(next(DEVICE_NO), "PJ2")
+        bench.seed(dynamodb, table_names, [self.device])
+        self.device_info = self.device.device_item()
+
+    def _recv_data(self, msg_type, event_datetime=None, req_no=None):
+        event_datetime = event_datetime or int(time.time() * 1000) - 1000
+        payload = bench.build_payload(self.device, msg_type, event_datetime, req_no)
+        recv_data, _ = parsePayload(
+            self.device.iccid, int(time.time() * 1000), message_decoder.decode(payload)
+        )
+        return recv_data
+
+    def _judge(self, recv_data, device_current_state):
+        return event_judge.eventJudge(
+            copy.deepcopy(recv_data),
+            copy.deepcopy(device_current_state),
+            self.device_info,
+            dynamodb.Table(table_names["DEVICE_RELATION_TABLE"]),
+            dynamodb.Table(table_names["GROUP_TABLE"]),
+            self.remote_control_table,
+        )
+
+    def _current_state(self, **values):
+        state = {"device_id": self.device.device_id, "signal_state": "high"}
+        state.update({key: 0 for key in event_judge.INIT_STATE if key != "signal_state"})
+        state.update({key: 0 for key in event_judge.DI_STATE_KEYS + event_judge.DO_STATE_KEYS})
+        state.update(values)
+        return state
+
+    @staticmethod
+    def _event_types(hist_list):
+        return [hist["hist_data"]["event_type"] for hist in hist_list]
+
+    # デバイス状態ビット毎の発生・復旧と現状態の更新
+    def test_device_state_rules(self):
+        for check_bit, event_type, state_key in event_judge.DEVICE_STATE_RULES:
+            for occurrence in (0, 1):
+                with self.subTest(event_type=event_type, occurrence=occurrence):
+                    self.device.device_state = check_bit if occurrence else 0
+                    recv_data = self._recv_data(0x0012)
+                    hist_list, current_state_info = self._judge(
+                        recv_data, self._current_state(**{state_key: 1 - occurrence})
+                    )
+                    hist = [h for h in hist_list if h["hist_data"]["event_type"] == event_type]
+                    self.assertEqual(len(hist), 1)
+                    self.assertEqual(hist[0]["hist_data"]["occurrence_flag"], occurrence)
+                    update_key, change_key, _ = event_judge.STATE_UPDATE_RULES[event_type]
+                    self.assertEqual(current_state_info[update_key], occurrence)
+                    self.assertEqual(current_state_info[change_key], recv_data["event_datetime"])
+
+                    # 現状態と同じ場合は履歴を作成しない
+                    hist_list, _ = self._judge(recv_data, self._current_state(**{state_key: occurrence}))
+                    self.assertNotIn(event_type, self._event_types(hist_list))
+
+    # 初回受信時は発生のみ履歴を作成し、全端子の現状態を登録する
+    def test_initial_receive(self):
+        self.device.device_state = bench.BATTERY_NEAR_BIT
+        self.device.di_state = 0b00000101
+        hist_list, current_state_info = self._judge(self._recv_data(0x0012), None)
+        self.assertEqual(self._event_types(hist_list), ["battery_near"])
+        self.assertEqual(
+            [current_state_info[key] for key in event_judge.DI_STATE_KEYS],
+            [1, 0, 1, 0, 0, 0, 0, 0],
+        )
+        self.assertEqual(current_state_info["battery_near_state"], 1)
+
+    # 状態変化通知はトリガー端子のみ履歴を作成し、変化した端子は全て現状態に反映する
+    def test_di_change(self):
+        self.device.di_state = 0b00010000
+        recv_data = self._recv_data(0x0001)
+        di_trigger = recv_data["di_trigger"]
+        hist_list, current_state_info = self._judge(recv_data, self._current_state())
+        hist = [h for h in hist_list if h["hist_data"]["event_type"] == "di_change"]
+        self.assertEqual([h["hist_data"]["terminal_no"] for h in hist], [di_trigger])
+        di_state = int(recv_data["di_state"], 2)
+        expected_name = "閉" if (di_state >> (di_trigger - 1)) & 1 == 0 else "開"
+        self.assertEqual(hist[0]["hist_data"]["terminal_state_name"], expected_name)
+        self.assertEqual(
+            [current_state_info[key] for key in event_judge.DI_STATE_KEYS],
+            [(di_state >> i) & 1 for i in range(8)],
+        )
+
+    # 電源ON
+    def test_power_on(self):
+        hist_list, _ = self._judge(self._recv_data(0x0011), self._current_state())
+        self.assertIn("power_on", self._event_types(hist_list))
+
+    # 履歴IDは電文とイベントから決まり、再判定しても同じ値となる
+    def test_hist_id_is_deterministic(self):
+        self.device.device_state = bench.DEVICE_ABNORMALITY_BIT
+        recv_data = self._recv_data(0x0001)
+        first, _ = self._judge(recv_data, self._current_state())
+        second, _ = self._judge(recv_data, self._current_state())
+        self.assertTrue(first)
+        self.assertEqual([h["hist_id"] for h in first], [h["hist_id"] for h in second])
+        self.assertEqual(len({h["hist_id"] for h in first}), len(first))
+
+    # 接点出力制御応答（制御結果未記録・タイムアウト記録済み・同じ応答の記録済み）
+    def test_control_response(self):
+        event_datetime = int(time.time() * 1000) - 1000
+        req_no = bench.put_remote_control(self.remote_control_table, self.device, event_datetime - 500)
+        recv_data = self._recv_data(0x8002, event_datetime, req_no)
+        hist_list, _ = self._judge(recv_data, self._current_state())
+        self.assertEqual(self._event_types(hist_list), ["manual_control"])
+        self.assertEqual(hist_list[0]["hist_data"]["control_result"], "success")
+
+        key = {"device_req_no": recv_data["device_req_no"], "req_datetime": event_datetime - 500}
+        # 再送（同じ応答の制御結果を記録済み）
+        self.remote_control_table.update_item(
+            Key=key,
+            UpdateExpression="SET control_result = :control_result, event_datetime = :event_datetime",
+            ExpressionAttributeValues={
+                ":control_result": recv_data["control_result"],
+                ":event_datetime": event_datetime,
+            },
+        )
+        retry_hist_list, _ = self._judge(recv_data, self._current_state())
+        self.assertEqual([h["hist_id"] for h in retry_hist_list], [h["hist_id"] for h in hist_list])
+
+        # タイムアウト記録済み
+        self.remote_control_table.update_item(
+            Key=key,
+            UpdateExpression="SET control_result = :control_result REMOVE event_datetime",
+            ExpressionAttributeValues={":control_result": "9999"},
+        )
+        hist_list, _ = self._judge(recv_data, self._current_state())
+        self.assertEqual(hist_list, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
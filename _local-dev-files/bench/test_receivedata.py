@@ -0,0 +1,271 @@
+##################################
+# receivedata-2 電文1件あたりのDynamoDB呼び出し回数・再送時の冪等性の確認
+#
+# bench_receivedata.py と同じ moto 環境で電文を投入し、呼び出し回数が増えていないこと、
+# 受信済み電文・登録失敗後の再送が重複なく処理されることを確認する
+#
+# 実行方法:
+#   pip install -r _local-dev-files/bench/requirements.txt
+#   python -m unittest _local-dev-files/bench/test_receivedata.py
+##################################
+import collections
+import os
+import random
+import sys
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import bench_receivedata as bench  # noqa: E402
+
+# 電文1件あたりのDynamoDB呼び出し回数の上限（リプレイ全体の平均）
+MAX_CALLS_PER_MESSAGE = 5.0
+MAX_CALLS_PER_MESSAGE_BATCH = 3.0
+
+
+# テーブル単位の呼び出し回数計測
+class TableCallCounter:
+    def __init__(self):
+        self.calls = collections.Counter()
+
+    def __call__(self, event_name, params, **kwargs):
+        # event_name : before-parameter-build.dynamodb.<操作>
+        operation = event_name.split(".", 2)[2]
+        self.calls[(params.get("TableName"), operation)] += 1
+
+    def reset(self):
+        self.calls.clear()
+
+
+def setUpModule():
+    global lambda_function, dynamodb, table_names, counter, table_counter
+    random.seed(1)
+    lambda_function, dynamodb, table_names, counter, _ = bench.setup()
+    import boto3
+
+    table_counter = TableCallCounter()
+    boto3.DEFAULT_SESSION.events.register("before-parameter-build.dynamodb", table_counter)
+
+
+class TestDynamoDBCallsPerMessage(unittest.TestCase):
+    def setUp(self):
+        self.remote_control_table = dynamodb.Table(table_names["REMOTE_CONTROL_TABLE"])
+        self.hist_list_table = dynamodb.Table(table_names["HIST_LIST_TABLE"])
+
+    def _devices(self, start, count):
+        devices = [
+            bench.Device(start + i, list(bench.DEVICE_TYPES)[i % len(bench.DEVICE_TYPES)])
+            for i in range(count)
+        ]
+        bench.seed(dynamodb, table_names, devices)
+        return devices
+
+    def _replay(self, messages, batch_size=0):
+        counter.reset()
+        table_counter.reset()
+        _, _, results = bench.replay(lambda_function, messages, batch_size)
+        return results
+
+    def _dynamodb_calls(self):
+        return sum(n for (service, _), n in counter.calls.items() if service == "dynamodb")
+
+    # 複数イベントを含む電文でもグループ一覧の取得は電文毎に1回
+    def test_group_list_once_per_message(self):
+        device = bench.Device(1000, "PJ2")
+        bench.seed(dynamodb, table_names, [device])
+        event_datetime = int(time.time() * 1000)
+        # 初回受信（デバイス情報キャッシュ）
+        self._replay([(device, bench.build_payload(device, 0x0012, event_datetime))])
+
+        # 接点入力変化・バッテリーニアエンド・機器異常の3イベント
+        # （コンテナ間で共有するグループ一覧キャッシュは破棄し、電文内の再利用のみを確認する）
+        device.device_state ^= bench.BATTERY_NEAR_BIT | bench.DEVICE_ABNORMALITY_BIT
+        sys.modules["ddb"].group_cache.clear()
+        results = self._replay([(device, bench.build_payload(device, 0x0001, event_datetime + 1000))])
+        self.assertEqual(results, {1: 1})
+
+        relation_table = table_names["DEVICE_RELATION_TABLE"]
+        group_table = table_names["GROUP_TABLE"]
+        self.assertEqual(table_counter.calls[(relation_table, "Query")], 1)
+        self.assertEqual(table_counter.calls[(group_table, "GetItem")], 1)
+        hist_list = self.hist_list_table.scan()["Items"]
+        event_types = {
+            item["hist_data"]["event_type"]
+            for item in hist_list
+            if item["device_id"] == device.device_id and item["event_datetime"] == event_datetime + 1000
+        }
+        self.assertEqual(event_types, {"di_change", "battery_near", "device_abnormality"})
+
+    # 端子設定未登録の接点入力も既定の名称で履歴を作成する
+    def test_missing_di_setting(self):
+        device = bench.Device(1100, "PJ2")
+        item = device.device_item()
+        item["device_data"]["config"]["terminal_settings"]["di_list"] = []
+        bench.seed(dynamodb, table_names, [device])
+        dynamodb.Table(table_names["DEVICE_TABLE"]).put_item(Item=item)
+        event_datetime = int(time.time() * 1000)
+        self._replay([(device, bench.build_payload(device, 0x0012, event_datetime))])
+
+        results = self._replay([(device, bench.build_payload(device, 0x0001, event_datetime + 1000))])
+        self.assertEqual(results, {1: 1})
+        hist_list = [
+            item
+            for item in self.hist_list_table.scan()["Items"]
+            if item["device_id"] == device.device_id and item["hist_data"]["event_type"] == "di_change"
+        ]
+        self.assertEqual(len(hist_list), 1)
+        terminal_no = hist_list[0]["hist_data"]["terminal_no"]
+        self.assertEqual(hist_list[0]["hist_data"]["terminal_name"], f"接点入力{terminal_no}")
+
+    # リプレイ全体の電文1件あたりの呼び出し回数
+    def test_calls_per_message(self):
+        for batch_size, max_calls in (
+            (0, MAX_CALLS_PER_MESSAGE),
+            (10, MAX_CALLS_PER_MESSAGE_BATCH),
+        ):
+            with self.subTest(batch_size=batch_size):
+                devices = self._devices(2000 + batch_size * 100, 10)
+                self._replay(bench.generate_messages(devices, 20, self.remote_control_table), batch_size)
+                messages = bench.generate_messages(devices, 60, self.remote_control_table)
+                results = self._replay(messages, batch_size)
+                if batch_size:
+                    self.assertEqual(results["failure"], 0)
+                else:
+                    self.assertEqual(results, {1: len(messages)})
+                self.assertLessEqual(self._dynamodb_calls() / len(messages), max_calls)
+
+
+# 1回目の呼び出しのみ例外とする（登録失敗後の再送の確認用）
+def fail_once(func):
+    calls = []
+
+    def wrapper(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise RuntimeError("injected")
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+class TestIdempotency(unittest.TestCase):
+    def setUp(self):
+        self.remote_control_table = dynamodb.Table(table_names["REMOTE_CONTROL_TABLE"])
+        self.hist_list_table = dynamodb.Table(table_names["HIST_LIST_TABLE"])
+        self.idempotency_table = dynamodb.Table(table_names["RECV_IDEMPOTENCY_TABLE"])
+        self.ddb = sys.modules["ddb"]
+        self.command_parser = sys.modules["command_parser"]
+
+    def _device(self, no):
+        device = bench.Device(no, "PJ2")
+        bench.seed(dynamodb, table_names, [device])
+        # 初回受信（現状態登録）
+        bench.replay(lambda_function, [(device, bench.build_payload(device, 0x0012, self._now(-10000)))])
+        return device
+
+    @staticmethod
+    def _now(offset=0):
+        return int(time.time() * 1000) + offset
+
+    def _hist_list(self, device):
+        return [item for item in self.hist_list_table.scan()["Items"] if item["device_id"] == device.device_id]
+
+    # 受信済み電文は単発・一括受信とも再処理しない
+    def test_duplicate_message(self):
+        for batch_size, no in ((0, 4000), (10, 4001)):
+            with self.subTest(batch_size=batch_size):
+                device = self._device(no)
+                device.device_state ^= bench.BATTERY_NEAR_BIT
+                messages = [(device, bench.build_payload(device, 0x0001, self._now(-5000)))]
+                bench.replay(lambda_function, messages, batch_size)
+                hist_list = self._hist_list(device)
+                self.ddb.recent_message_cache.clear()
+                bench.replay(lambda_function, messages, batch_size)
+                self.assertEqual(len(self._hist_list(device)), len(hist_list))
+
+    # 同じイベント発生日時の状態変化通知と接点出力制御応答は別の電文として処理する
+    def test_state_and_control_response_same_datetime(self):
+        device = self._device(4100)
+        event_datetime = self._now(-5000)
+        req_no = bench.put_remote_control(self.remote_control_table, device, event_datetime - 500)
+        messages = [
+            (device, bench.build_payload(device, 0x0001, event_datetime)),
+            (device, bench.build_payload(device, 0x8002, event_datetime, req_no)),
+        ]
+        _, _, results = bench.replay(lambda_function, messages)
+        self.assertEqual(results, {1: 2})
+        event_types = {item["hist_data"]["event_type"] for item in self._hist_list(device)}
+        self.assertIn("di_change", event_types)
+        self.assertIn("manual_control", event_types)
+        claimed = self.idempotency_table.query(
+            KeyConditionExpression="simid = :simid",
+            ExpressionAttributeValues={":simid": device.iccid},
+        )["Items"]
+        self.assertEqual(len([item for item in claimed if item["event_datetime"] == event_datetime]), 2)
+
+    # 現状態の登録失敗後の再送で、イベント通知処理が記録した通知進捗を上書きしない
+    def test_retry_keeps_notice_state(self):
+        for batch_size, no in ((0, 4200), (10, 4201)):
+            with self.subTest(batch_size=batch_size):
+                device = self._device(no)
+                device.device_state ^= bench.DEVICE_ABNORMALITY_BIT
+                messages = [(device, bench.build_payload(device, 0x0001, self._now(-5000)))]
+                with mock.patch.object(self.ddb, "update_current_state", fail_once(self.ddb.update_current_state)):
+                    _, _, results = bench.replay(lambda_function, messages, batch_size)
+                if batch_size:
+                    self.assertEqual(results["failure"], 1)
+                else:
+                    self.assertNotIn(1, results)
+                hist_list = self._hist_list(device)
+                self.assertTrue(hist_list)
+                for item in hist_list:
+                    self.hist_list_table.update_item(
+                        Key={"device_id": item["device_id"], "hist_id": item["hist_id"]},
+                        UpdateExpression="SET notice_state = :notice_state",
+                        ExpressionAttributeValues={":notice_state": "automation"},
+                    )
+
+                _, _, results = bench.replay(lambda_function, messages, batch_size)
+                if batch_size:
+                    self.assertEqual(results["failure"], 0)
+                else:
+                    self.assertEqual(results, {1: 1})
+                retry_hist_list = self._hist_list(device)
+                self.assertEqual(len(retry_hist_list), len(hist_list))
+                self.assertTrue(all(item.get("notice_state") == "automation" for item in retry_hist_list))
+
+    # イベント通知の登録失敗後に再送された接点出力制御応答も履歴一覧・イベント通知を作成する
+    def test_control_response_retry(self):
+        device = self._device(4300)
+        event_datetime = self._now(-5000)
+        req_no = bench.put_remote_control(self.remote_control_table, device, event_datetime - 500)
+        messages = [(device, bench.build_payload(device, 0x8002, event_datetime, req_no))]
+        event_notice = self.command_parser.eventNotice
+        with mock.patch.object(self.command_parser, "eventNotice", fail_once(event_notice)):
+            bench.replay(lambda_function, messages)
+        with mock.patch.object(self.command_parser, "eventNotice") as retry_notice:
+            _, _, results = bench.replay(lambda_function, messages)
+        self.assertEqual(results, {1: 1})
+        self.assertEqual(retry_notice.call_count, 1)
+        event_types = [item["hist_data"]["event_type"] for item in self._hist_list(device)]
+        self.assertEqual(event_types.count("manual_control"), 1)
+
+    # デバイス情報未登録のデバイスの電文は一括受信でも登録しない
+    def test_batch_unknown_device_not_claimed(self):
+        device = bench.Device(4400, "PJ2")
+        bench.seed(dynamodb, table_names, [device])
+        with mock.patch.object(self.ddb, "get_device_info_cached", return_value=None):
+            _, _, results = bench.replay(
+                lambda_function, [(device, bench.build_payload(device, 0x0012, self._now(-5000)))], 10
+            )
+        self.assertEqual(results["failure"], 0)
+        claimed = self.idempotency_table.query(
+            KeyConditionExpression="simid = :simid",
+            ExpressionAttributeValues={":simid": device.iccid},
+        )["Items"]
+        self.assertEqual(claimed, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
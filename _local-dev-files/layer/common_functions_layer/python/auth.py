@@ -1,16 +1,13 @@
 import json
-import os
 
-import boto3
 from aws_lambda_powertools import Logger
-from jose import JWTError, jwt
 from boto3.dynamodb.conditions import Key
 
+import clients
 import db
-import ssm
+import ddb_metrics
 
 logger = Logger()
-dynamodb = boto3.resource("dynamodb", endpoint_url=os.environ.get("endpoint_url"))
 
 
 class AuthError(Exception):
@@ -26,6 +23,7 @@ def is_alphanumeric(contract_id):
 
 def verify_login_user(verify_password_exp=True):
     def _verify_login_user(func):
+        @ddb_metrics.per_request
         def wrapper(event, *args, **kwargs):
             try:
                 login_user = _get_login_user(event, verify_password_exp)
@@ -49,6 +47,7 @@ def verify_login_user(verify_password_exp=True):
 
 def verify_login_user_list(verify_password_exp=True):
     def _verify_login_user_list(func):
+        @ddb_metrics.per_request
         def wrapper(event, *args, **kwargs):
             try:
                 login_user_list = _get_login_user_list(event, verify_password_exp)
@@ -70,12 +69,24 @@ def verify_login_user_list(verify_password_exp=True):
     return _verify_login_user_list
 
 
+# IDトークンのクレーム取得
+# joseは読み込みに時間がかかるため初回呼び出し時にインポートする
+# トークン形式不正の場合はValueErrorを送出する
+def _get_unverified_claims(id_token):
+    from jose import JWTError, jwt
+
+    try:
+        return jwt.get_unverified_claims(id_token)
+    except JWTError as e:
+        raise ValueError(str(e)) from e
+
+
 def _get_login_user(event, verify_password_exp=True):
     try:
         event["headers"] = __convert_to_lower_case(event["headers"])
 
         id_token = event["headers"]["authorization"]
-        claims = jwt.get_unverified_claims(id_token)
+        claims = _get_unverified_claims(id_token)
 
         auth_id = claims["custom:auth_id"]
 
@@ -96,24 +107,16 @@ def _get_login_user(event, verify_password_exp=True):
         if not isinstance(password_exp, int):
             password_exp = int(password_exp)
 
-    except (JWTError, KeyError, ValueError, TypeError) as e:
+    except (KeyError, ValueError, TypeError) as e:
         raise AuthError(401, "認証情報が不正です。") from e
 
-    account_table = dynamodb.Table(ssm.table_names["ACCOUNT_TABLE"])
+    account_table = clients.get_table("ACCOUNT_TABLE")
     account = db.get_account_info(auth_id, account_table)
     if not account:
         raise AuthError(401, "認証情報が不正です。")
 
-    user_table = dynamodb.Table(ssm.table_names["USER_TABLE"])
-    res = user_table.query(
-        IndexName="account_id_index",
-        KeyConditionExpression=Key("account_id").eq(account["account_id"]) & Key("contract_id").eq(contract_id),
-    ).get("Items", [])
-    user_list = [
-        item
-        for item in res
-        if item.get("user_data", {}).get("config", {}).get("del_datetime") is None
-    ]
+    user_table = clients.get_table("USER_TABLE")
+    user_list = db.get_user_info(account["account_id"], contract_id, user_table)
     login_user = user_list[0] if user_list else None
 
     if not login_user:
@@ -129,7 +132,7 @@ def _get_login_user_list(event, verify_password_exp=True):
         event["headers"] = __convert_to_lower_case(event["headers"])
 
         id_token = event["headers"]["authorization"]
-        claims = jwt.get_unverified_claims(id_token)
+        claims = _get_unverified_claims(id_token)
 
         auth_id = claims["custom:auth_id"]
 
@@ -143,19 +146,20 @@ def _get_login_user_list(event, verify_password_exp=True):
         if not isinstance(password_exp, int):
             password_exp = int(password_exp)
 
-    except (JWTError, KeyError, ValueError, TypeError) as e:
+    except (KeyError, ValueError, TypeError) as e:
         raise AuthError(401, "認証情報が不正です。") from e
 
-    account_table = dynamodb.Table(ssm.table_names["ACCOUNT_TABLE"])
+    account_table = clients.get_table("ACCOUNT_TABLE")
     account = db.get_account_info(auth_id, account_table)
     if not account:
         raise AuthError(401, "認証情報が不正です。")
 
-    user_table = dynamodb.Table(ssm.table_names["USER_TABLE"])
-    res = user_table.query(
+    user_table = clients.get_table("USER_TABLE")
+    res = db.iter_query(
+        user_table,
         IndexName="account_id_index",
         KeyConditionExpression=Key("account_id").eq(account["account_id"]),
-    ).get("Items", [])
+    )
     user_list = [
         item
         for item in res
@@ -2,33 +2,37 @@ import os
 import decimal
 import re
 import uuid
-import json
 import time
 from datetime import datetime
 from zoneinfo import ZoneInfo
 import textwrap
-from dateutil import relativedelta
+import traceback
 
-import boto3
 from boto3.dynamodb.conditions import Attr, Key
 from botocore.exceptions import ClientError
 from aws_lambda_powertools import Logger
 
+import automation_rules
+import clients
+import control_timeout
 import db
-import ssm
 import convert
 import mail
+import parallel
+import req_no as req_no_counter
 
 logger = Logger()
 
 AWS_DEFAULT_REGION = os.environ["AWS_DEFAULT_REGION"]
-LAMBDA_TIMEOUT_CHECK = os.environ["LAMBDA_TIMEOUT_CHECK"]
 HIST_LIST_TTL = int(os.environ["HIST_LIST_TTL"])
 REMOTE_CONTROLS_TTL = int(os.environ["REMOTE_CONTROLS_TTL"])
 
-aws_lambda = boto3.client("lambda", region_name=AWS_DEFAULT_REGION)
-iot = boto3.client("iot-data", region_name=AWS_DEFAULT_REGION)
-dynamodb = boto3.resource("dynamodb", endpoint_url=os.environ.get("endpoint_url"))
+
+# 年単位の期間（dateutilは利用時にインポートする）
+def _relativedelta(**kwargs):
+    from dateutil import relativedelta
+
+    return relativedelta.relativedelta(**kwargs)
 
 
 def decimal_to_num(obj):
@@ -60,18 +64,18 @@ def automation_control(device_id, event_type, terminal_no, di_state, occurrence_
 
     # テーブル取得
     try:
-        account_table = dynamodb.Table(ssm.table_names["ACCOUNT_TABLE"])
-        user_table = dynamodb.Table(ssm.table_names["USER_TABLE"])
-        device_relation_table = dynamodb.Table(ssm.table_names["DEVICE_RELATION_TABLE"])
-        device_table = dynamodb.Table(ssm.table_names["DEVICE_TABLE"])
-        device_state_table = dynamodb.Table(ssm.table_names["STATE_TABLE"])
-        req_no_counter_table = dynamodb.Table(ssm.table_names["REQ_NO_COUNTER_TABLE"])
-        remote_controls_table = dynamodb.Table(ssm.table_names["REMOTE_CONTROL_TABLE"])
-        hist_list_table = dynamodb.Table(ssm.table_names["HIST_LIST_TABLE"])
-        group_table = dynamodb.Table(ssm.table_names["GROUP_TABLE"])
-        notification_hist_table = dynamodb.Table(ssm.table_names["NOTIFICATION_HIST_TABLE"])
-        automation_table = dynamodb.Table(ssm.table_names["AUTOMATION_TABLE"])
-        control_status_table = dynamodb.Table(ssm.table_names["CONTROL_STATUS_TABLE"])
+        account_table = clients.get_table("ACCOUNT_TABLE")
+        user_table = clients.get_table("USER_TABLE")
+        device_relation_table = clients.get_table("DEVICE_RELATION_TABLE")
+        device_table = clients.get_table("DEVICE_TABLE")
+        device_state_table = clients.get_table("STATE_TABLE")
+        req_no_counter_table = clients.get_table("REQ_NO_COUNTER_TABLE")
+        remote_controls_table = clients.get_table("REMOTE_CONTROL_TABLE")
+        hist_list_table = clients.get_table("HIST_LIST_TABLE")
+        group_table = clients.get_table("GROUP_TABLE")
+        notification_hist_table = clients.get_table("NOTIFICATION_HIST_TABLE")
+        automation_table = clients.get_table("AUTOMATION_TABLE")
+        control_status_table = clients.get_table("CONTROL_STATUS_TABLE")
     except KeyError as e:
         return {"result": False, "message": e}
 
@@ -87,116 +91,139 @@ def automation_control(device_id, event_type, terminal_no, di_state, occurrence_
     # トリガーデバイス情報取得
     trigger_device = db.get_device_info_other_than_unavailable(device_id, device_table)
 
-    result = True
+    # 連動制御設定毎の実行
+    # 同じ制御対象（デバイス・接点出力）の設定は、制御状況の排他で互いに実行不可とならないよう
+    # 同じスレッドで順に実行し、異なる制御対象はスレッドプールで並列実行する
+    tables = {
+        "account_table": account_table,
+        "user_table": user_table,
+        "device_relation_table": device_relation_table,
+        "device_table": device_table,
+        "device_state_table": device_state_table,
+        "req_no_counter_table": req_no_counter_table,
+        "remote_controls_table": remote_controls_table,
+        "hist_list_table": hist_list_table,
+        "group_table": group_table,
+        "notification_hist_table": notification_hist_table,
+        "control_status_table": control_status_table,
+    }
+    target_automation_list = {}
     for automation in automation_list:
-        control_trigger = ""
-        logger.info(f"automation: {automation}")
-        # 制御対象デバイス情報取得
-        control_device = db.get_device_info_other_than_unavailable(
-            automation["control_device_id"], device_table
-        )
-
-        # デバイス情報存在チェック
-        if not trigger_device or not control_device:
-            logger.info("device_info not found")
-            result = False
-            continue
+        target_automation_list.setdefault(
+            (automation["control_device_id"], automation["control_do_no"]), []
+        ).append(automation)
+    summary = []
+    for target_summary in parallel.map_parallel(
+        lambda automations: [
+            _exec_automation_target(automation, trigger_device, tables)
+            for automation in automations
+        ],
+        target_automation_list.values(),
+    ):
+        summary.extend(target_summary)
+    logger.info({"automation_summary": summary})
+
+    # 実行中の例外は全ての制御対象の実行後に送出する
+    for target in summary:
+        if target["status"] == "error":
+            raise target.pop("error")
+
+    result = all(target["status"] == "executed" for target in summary)
+    return {"result": result, "message": "連動制御を実行しました。", "summary": summary}
+
+
+##################################
+# 制御対象毎の連動制御実行
+# 戻り値 : {"automation_id", "control_device_id", "control_do_no", "status", "elapsed_ms"}
+# status :
+#   executed : 制御実行
+#   device_not_found : トリガー・制御対象デバイスなし
+#   state_not_found : 制御対象デバイスの現状態なし
+#   link_di_state : 紐づき接点入力状態が変更済みのため制御不要
+#   control_status / under_control : 他の制御中のため実行せず
+#   error : 例外発生（"error"に例外を格納）
+##################################
+def _exec_automation_target(automation, trigger_device, tables):
+    start = time.perf_counter()
+    target = {
+        "automation_id": automation.get("automation_id"),
+        "control_device_id": automation.get("control_device_id"),
+        "control_do_no": automation.get("control_do_no"),
+    }
+    try:
+        target["status"] = _exec_automation(automation, trigger_device, **tables)
+    except Exception as e:
+        logger.error(f"連動制御実行エラー automation_id={target['automation_id']}, e={e}")
+        logger.error(traceback.format_exc())
+        target["status"] = "error"
+        target["error"] = e
+    target["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return target
 
-        # 制御対象デバイスの接点出力設定取得
-        control_device_do_list = (
-            control_device.get("device_data", {})
-            .get("config", {})
-            .get("terminal_settings", {})
-            .get("do_list", [])
-        )
-        control_do = [
-            do for do in control_device_do_list if do["do_no"] == automation["control_do_no"]
-        ][0]
 
-        event_datetime = datetime.now()
+def _exec_automation(
+    automation,
+    trigger_device,
+    account_table,
+    user_table,
+    device_relation_table,
+    device_table,
+    device_state_table,
+    req_no_counter_table,
+    remote_controls_table,
+    hist_list_table,
+    group_table,
+    notification_hist_table,
+    control_status_table,
+):
+    control_trigger = ""
+    logger.info(f"automation: {automation}")
+    # 制御対象デバイス情報取得
+    control_device = db.get_device_info_other_than_unavailable(
+        automation["control_device_id"], device_table
+    )
 
-        group_id_list = db.get_device_relation_group_id_list(
-            control_device["device_id"], device_relation_table
-        )
-        group_list = []
-        for group_id in group_id_list:
-            group_info = db.get_group_info(group_id, group_table)
-            if group_info:
-                group_list.append(
-                    {
-                        "group_id": group_info["group_id"],
-                        "group_name": group_info["group_data"]["config"]["group_name"],
-                    }
-                )
-        if group_list:
-            group_list = sorted(group_list, key=lambda x: x["group_name"])
-
-        # 制御対象デバイスの紐づけ接点入力が指定されている場合、接点入力状態をチェック
-        if control_do.get("do_di_return") and automation["control_di_state"] in [0, 1]:
-            device_state = db.get_device_state(automation["control_device_id"], device_state_table)
-            if not device_state:
-                logger.info("制御対象デバイスの現状態情報が存在しません。")
-                result = False
-                continue
-
-            col_name = "di" + str(control_do.get("do_di_return")) + "_state"
-            if device_state[col_name] == automation["control_di_state"]:
-                # 紐づき接点入力状態がすでに変更済みのため、制御不要
-                # メール通知
-                notification_hist_id = _send_not_exec_mail(
-                    event_datetime,
-                    trigger_device,
-                    control_device,
-                    group_list,
-                    automation,
-                    control_do,
-                    account_table,
-                    user_table,
-                    notification_hist_table,
-                    "link_di_state",
-                    control_trigger,
-                )
+    # デバイス情報存在チェック
+    if not trigger_device or not control_device:
+        logger.info("device_info not found")
+        return "device_not_found"
 
-                # 履歴一覧登録
-                _put_hist_list(
-                    event_datetime,
-                    trigger_device,
-                    control_device,
-                    group_list,
-                    automation,
-                    control_do,
-                    notification_hist_id,
-                    "not_excuted",
-                    control_trigger,
-                    hist_list_table,
-                )
+    # 制御対象デバイスの接点出力設定取得
+    control_device_do_list = (
+        control_device.get("device_data", {})
+        .get("config", {})
+        .get("terminal_settings", {})
+        .get("do_list", [])
+    )
+    control_do = [
+        do for do in control_device_do_list if do["do_no"] == automation["control_do_no"]
+    ][0]
 
-                logger.info("制御対象デバイスの接点入力状態がすでに変更済みです。")
-                result = False
-                continue
+    event_datetime = datetime.now()
 
-        # 制御中判定
-        # 最新制御情報を確認
-        remote_control_latest = _get_remote_control_latest(
-            control_device.get("device_id"), control_do.get("do_no"), remote_controls_table
-        )
-        if remote_control_latest:
-            control_trigger = remote_control_latest[0].get("control_trigger")
-        else:
-            control_trigger = ""
-        # 制御状況を追加（同時処理の排他制御）
-        if control_do.get("do_di_return"):
-            # 紐づけありの場合は、30秒後に制御状況を自動削除
-            delete_second = 30
-        else:
-            # 紐づけなしの場合は、10秒後に制御状況を自動削除
-            delete_second = 10
-        if not _check_control_status(
-            control_device.get("device_id"),
-            control_do.get("do_no"),
-            delete_second,
-            control_status_table,
-        ):
+    group_id_list = db.get_device_relation_group_id_list(
+        control_device["device_id"], device_relation_table
+    )
+    group_list = [
+        {
+            "group_id": group_info["group_id"],
+            "group_name": group_info["group_data"]["config"]["group_name"],
+        }
+        for group_info in db.get_group_info_many(group_id_list, group_table, db.GROUP_NAME_FIELDS)
+    ]
+    if group_list:
+        group_list = sorted(group_list, key=lambda x: x["group_name"])
+
+    # 制御対象デバイスの紐づけ接点入力が指定されている場合、接点入力状態をチェック
+    if control_do.get("do_di_return") and automation["control_di_state"] in [0, 1]:
+        device_state = db.get_device_state(automation["control_device_id"], device_state_table)
+        if not device_state:
+            logger.info("制御対象デバイスの現状態情報が存在しません。")
+            return "state_not_found"
+
+        col_name = "di" + str(control_do.get("do_di_return")) + "_state"
+        if device_state[col_name] == automation["control_di_state"]:
+            # 紐づき接点入力状態がすでに変更済みのため、制御不要
             # メール通知
             notification_hist_id = _send_not_exec_mail(
                 event_datetime,
@@ -208,7 +235,7 @@ def automation_control(device_id, event_type, terminal_no, di_state, occurrence_
                 account_table,
                 user_table,
                 notification_hist_table,
-                "control_status",
+                "link_di_state",
                 control_trigger,
             )
 
@@ -221,101 +248,147 @@ def automation_control(device_id, event_type, terminal_no, di_state, occurrence_
                 automation,
                 control_do,
                 notification_hist_id,
-                "not_excuted_done",
+                "not_excuted",
                 control_trigger,
                 hist_list_table,
             )
 
-            logger.info("他のユーザー操作、タイマーまたは連動により制御中です。")
-            result = False
-            continue
-
-        if len(remote_control_latest) > 0:
-            remote_control_latest = remote_control_latest[0]
-            link_di_no = remote_control_latest.get("link_di_no")
-            logger.info(f"remote_control_latest: {remote_control_latest}")
-
-            # 制御中判定
-            if not remote_control_latest.get("control_result") or (
-                link_di_no
-                and remote_control_latest.get("control_result") != "9999"
-                and not remote_control_latest.get("link_di_result")
-            ):
-                logger.info("Not processed because it was judged that it was already under control")
-                # メール通知
-                notification_hist_id = _send_not_exec_mail(
-                    event_datetime,
-                    trigger_device,
-                    control_device,
-                    group_list,
-                    automation,
-                    control_do,
-                    account_table,
-                    user_table,
-                    notification_hist_table,
-                    "control_status",
-                    control_trigger,
-                )
-
-                # 履歴一覧登録
-                _put_hist_list(
-                    event_datetime,
-                    trigger_device,
-                    control_device,
-                    group_list,
-                    automation,
-                    control_do,
-                    notification_hist_id,
-                    "not_excuted_done",
-                    control_trigger,
-                    hist_list_table,
-                )
-
-                # 制御状況を削除
-                control_status_table.delete_item(
-                    Key={
-                        "device_id": control_device.get("device_id"),
-                        "do_no": control_do.get("do_no"),
-                    },
-                )
-
-                logger.info("他のユーザー操作、タイマーまたは連動により制御中です。")
-                result = False
-                continue
+            logger.info("制御対象デバイスの接点入力状態がすでに変更済みです。")
+            return "link_di_state"
 
-        # 要求番号生成
-        icc_id = control_device["device_data"]["param"]["iccid"]
-        req_no = _get_req_no(icc_id, req_no_counter_table)
-
-        # 制御実行（MQTT）
-        _cmd_exec(icc_id, req_no, control_do)
-
-        # 要求データ登録
-        device_req_no = icc_id + "-" + req_no
-        _put_remote_controls(
+    # 制御中判定
+    # 最新制御情報を確認
+    remote_control_latest = _get_remote_control_latest(
+        control_device.get("device_id"), control_do.get("do_no"), remote_controls_table
+    )
+    if remote_control_latest:
+        control_trigger = remote_control_latest[0].get("control_trigger")
+    else:
+        control_trigger = ""
+    # 制御状況を追加（同時処理の排他制御）
+    if control_do.get("do_di_return"):
+        # 紐づけありの場合は、30秒後に制御状況を自動削除
+        delete_second = 30
+    else:
+        # 紐づけなしの場合は、10秒後に制御状況を自動削除
+        delete_second = 10
+    if not _check_control_status(
+        control_device.get("device_id"),
+        control_do.get("do_no"),
+        delete_second,
+        control_status_table,
+    ):
+        # メール通知
+        notification_hist_id = _send_not_exec_mail(
+            event_datetime,
             trigger_device,
             control_device,
+            group_list,
             automation,
-            device_req_no,
             control_do,
-            remote_controls_table,
+            account_table,
+            user_table,
+            notification_hist_table,
+            "control_status",
+            control_trigger,
         )
 
-        # タイムアウト判定Lambda呼び出し
-        payload = {"body": json.dumps({"device_req_no": device_req_no})}
-        lambda_invoke_result = aws_lambda.invoke(
-            FunctionName=LAMBDA_TIMEOUT_CHECK,
-            InvocationType="Event",
-            Payload=json.dumps(payload, ensure_ascii=False),
+        # 履歴一覧登録
+        _put_hist_list(
+            event_datetime,
+            trigger_device,
+            control_device,
+            group_list,
+            automation,
+            control_do,
+            notification_hist_id,
+            "not_excuted_done",
+            control_trigger,
+            hist_list_table,
         )
-        logger.info(f"lambda_invoke_result: {lambda_invoke_result}")
 
-        # 制御状況を削除
-        control_status_table.delete_item(
-            Key={"device_id": control_device.get("device_id"), "do_no": control_do.get("do_no")},
-        )
+        logger.info("他のユーザー操作、タイマーまたは連動により制御中です。")
+        return "control_status"
 
-    return {"result": result, "message": "連動制御を実行しました。"}
+    if len(remote_control_latest) > 0:
+        remote_control_latest = remote_control_latest[0]
+        link_di_no = remote_control_latest.get("link_di_no")
+        logger.info(f"remote_control_latest: {remote_control_latest}")
+
+        # 制御中判定
+        if not remote_control_latest.get("control_result") or (
+            link_di_no
+            and remote_control_latest.get("control_result") != "9999"
+            and not remote_control_latest.get("link_di_result")
+        ):
+            logger.info("Not processed because it was judged that it was already under control")
+            # メール通知
+            notification_hist_id = _send_not_exec_mail(
+                event_datetime,
+                trigger_device,
+                control_device,
+                group_list,
+                automation,
+                control_do,
+                account_table,
+                user_table,
+                notification_hist_table,
+                "control_status",
+                control_trigger,
+            )
+
+            # 履歴一覧登録
+            _put_hist_list(
+                event_datetime,
+                trigger_device,
+                control_device,
+                group_list,
+                automation,
+                control_do,
+                notification_hist_id,
+                "not_excuted_done",
+                control_trigger,
+                hist_list_table,
+            )
+
+            # 制御状況を削除
+            control_status_table.delete_item(
+                Key={
+                    "device_id": control_device.get("device_id"),
+                    "do_no": control_do.get("do_no"),
+                },
+            )
+
+            logger.info("他のユーザー操作、タイマーまたは連動により制御中です。")
+            return "under_control"
+
+    # 要求番号生成
+    icc_id = control_device["device_data"]["param"]["iccid"]
+    req_no = _get_req_no(icc_id, req_no_counter_table)
+
+    # 制御実行（MQTT）
+    _cmd_exec(icc_id, req_no, control_do)
+
+    # 要求データ登録
+    device_req_no = icc_id + "-" + req_no
+    _put_remote_controls(
+        trigger_device,
+        control_device,
+        automation,
+        device_req_no,
+        control_do,
+        remote_controls_table,
+    )
+
+    # タイムアウト判定予約
+    control_timeout.request_check(device_req_no, "automation_control")
+
+    # 制御状況を削除
+    control_status_table.delete_item(
+        Key={"device_id": control_device.get("device_id"), "do_no": control_do.get("do_no")},
+    )
+
+    return "executed"
 
 
 def _put_remote_controls(
@@ -330,7 +403,7 @@ def _put_remote_controls(
     expire_datetime = int(
         (
             datetime.fromtimestamp(now_unixtime / 1000)
-            + relativedelta.relativedelta(years=REMOTE_CONTROLS_TTL)
+            + _relativedelta(years=REMOTE_CONTROLS_TTL)
         ).timestamp()
     )
     control_trigger = ""
@@ -392,9 +465,7 @@ def _check_control_status(device_id, do_no, delete_second, table):
             "do_no": do_no,
             "del_datetime": int(time.time() + delete_second),
         }
-        put_item_fmt = json.loads(
-            json.dumps(put_item, default=decimal_to_num), parse_float=decimal.Decimal
-        )
+        put_item_fmt = convert.to_dynamo_item(put_item)
         table.put_item(
             Item=put_item_fmt,
             ConditionExpression="attribute_not_exists(device_id)",
@@ -409,14 +480,14 @@ def _check_control_status(device_id, do_no, delete_second, table):
 
 
 def _get_remote_control_latest(device_id, do_no, table):
-    response = table.query(
+    remote_control_latest = db.query_first(
+        table,
         IndexName="device_id_req_datetime_index",
         KeyConditionExpression=Key("device_id").eq(device_id),
         FilterExpression=Attr("do_no").eq(do_no),
         ScanIndexForward=False,  # 降順
-        Limit=1,
-    ).get("Items", [])
-    return response
+    )
+    return [remote_control_latest] if remote_control_latest else []
 
 
 def _put_hist_list(
@@ -435,7 +506,7 @@ def _put_hist_list(
         event_datetime.microsecond / 1000
     )
     expire_datetime = int(
-        (event_datetime + relativedelta.relativedelta(years=HIST_LIST_TTL)).timestamp()
+        (event_datetime + _relativedelta(years=HIST_LIST_TTL)).timestamp()
     )
 
     di_name = None
@@ -763,7 +834,7 @@ def _put_notification_hist(
         + int(notification_datetime.microsecond / 1000),
         "notification_user_list": notification_user_list,
     }
-    item = json.loads(json.dumps(notice_hist_item), parse_float=decimal.Decimal)
+    item = convert.to_dynamo_item(notice_hist_item)
     notification_hist_table.put_item(Item=item)
     return notification_hist_id
 
@@ -799,65 +870,21 @@ def _cmd_exec(icc_id, req_no, control_do):
     logger.info(f"Iot Core Message(hexadecimal): {pubhex}")
 
     topic = "cmd/" + icc_id
+    iot = clients.get_client("iot-data", region_name=AWS_DEFAULT_REGION)
     iot_result = iot.publish(topic=topic, qos=0, retain=False, payload=bytes.fromhex(pubhex))
     logger.info(f"iot_result: {iot_result}")
 
 
+# 要求番号生成（1回のUpdateItemで採番）
 def _get_req_no(sim_id, req_no_counter_table):
-    req_no_count_info = req_no_counter_table.get_item(Key={"simid": sim_id}).get("Item", {})
-    if req_no_count_info:
-        # 要求番号生成（アトミックカウンタをインクリメントし、要求番号を取得）
-        response = req_no_counter_table.update_item(
-            Key={"simid": sim_id},
-            UpdateExpression="ADD #key :increment",
-            ExpressionAttributeNames={"#key": "num"},
-            ExpressionAttributeValues={":increment": decimal.Decimal(1)},
-            ReturnValues="UPDATED_NEW",
-        )
-        num = response.get("Attributes").get("num")
-        count = int(convert.decimal_default_proc(num))
-
-    else:
-        count = 0
-        write_items = [
-            {
-                "Put": {
-                    "TableName": req_no_counter_table.name,
-                    "Item": {"simid": {"S": sim_id}, "num": {"N": str(count)}},
-                }
-            }
-        ]
-        db.execute_transact_write_item(write_items)
-
-    return re.sub("^0x", "", format(count % 65535, "#010x"))
+    return req_no_counter.next_req_no(sim_id, req_no_counter_table)
 
 
+# 連動制御設定取得（ウォームコンテナ内の索引キャッシュを使用）
 def _get_automation(
     automation_table, device_id, event_type, terminal_no, di_state, occurrence_flag
 ):
-    automation_list = automation_table.query(
-        IndexName="trigger_device_id_index",
-        KeyConditionExpression=Key("trigger_device_id").eq(device_id),
-    ).get("Items")
-    automation_list = [
-        item
-        for item in automation_list
-        if item.get("trigger_event_type") == event_type
-        and (
-            (
-                event_type == "di_change_state"
-                and item.get("trigger_terminal_no") == terminal_no
-                and item.get("trigger_event_detail_state") == di_state
-            )
-            or (
-                event_type == "di_unhealthy"
-                and item.get("trigger_terminal_no") == terminal_no
-                and item.get("trigger_event_detail_flag") == occurrence_flag
-            )
-            or (
-                event_type not in ["di_change_state", "di_unhealthy"]
-                and item.get("trigger_event_detail_flag") == occurrence_flag
-            )
-        )
-    ]
+    automation_list = automation_rules.get_rules(
+        automation_table, device_id, event_type, terminal_no, di_state, occurrence_flag
+    )
     return automation_list if automation_list else None
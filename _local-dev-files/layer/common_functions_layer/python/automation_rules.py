@@ -0,0 +1,130 @@
+import os
+import time
+import threading
+import uuid
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from aws_lambda_powertools import Logger
+
+import cache
+import clients
+import db
+
+logger = Logger()
+
+# 連動制御設定キャッシュの有効期間（秒）
+# バージョン確認に失敗した場合でも、この期間で再読込される
+AUTOMATION_RULE_CACHE_TTL = int(os.environ.get("AUTOMATION_RULE_CACHE_TTL", 300))
+# 設定バージョンの確認間隔（秒）
+# 連動制御設定の変更が他のコンテナのキャッシュに反映されるまでの最大時間
+AUTOMATION_RULE_VERSION_CHECK_INTERVAL = int(
+    os.environ.get("AUTOMATION_RULE_VERSION_CHECK_INTERVAL", 10)
+)
+# 設定バージョンを保持する項目のキー（要求番号カウンタテーブル）
+# 連動制御設定管理テーブルの検索結果に含めないよう、キー指定でのみ読み書きするカウンタテーブルに保持する
+# （要求番号カウンタはICCID毎の項目のため、"#"で始まるキーと重複しない）
+AUTOMATION_RULE_VERSION_KEY = "#automation_rule_version"
+
+# トリガーデバイスID毎の連動制御設定索引 {トリガーデバイスID: {索引キー: [連動制御設定, ...]}}
+# 設定が存在しないデバイスは空の索引を保持し、DynamoDBへの問い合わせを省略する
+_index_cache = cache.TTLCache(maxsize=4096, ttl=AUTOMATION_RULE_CACHE_TTL)
+# 確認済みの設定バージョン
+_version = {"value": None, "checked": 0.0}
+_version_lock = threading.Lock()
+
+
+##################################
+# 索引キー
+# 接点入力変化 : (イベント項目, 接点端子, 接点入力状態)
+# 接点入力異常 : (イベント項目, 接点端子, 発生フラグ)
+# その他 : (イベント項目, None, 発生フラグ)
+##################################
+def rule_key(event_type, terminal_no, di_state, occurrence_flag):
+    if event_type == "di_change_state":
+        return (event_type, terminal_no, di_state)
+    if event_type == "di_unhealthy":
+        return (event_type, terminal_no, occurrence_flag)
+    return (event_type, None, occurrence_flag)
+
+
+def _item_rule_key(item):
+    return rule_key(
+        item.get("trigger_event_type"),
+        item.get("trigger_terminal_no"),
+        item.get("trigger_event_detail_state"),
+        item.get("trigger_event_detail_flag"),
+    )
+
+
+# トリガーデバイスの連動制御設定を1回のクエリで取得し、索引を作成する
+def load_index(device_id, automation_table):
+    index = {}
+    for item in db.iter_query(
+        automation_table,
+        IndexName="trigger_device_id_index",
+        KeyConditionExpression=Key("trigger_device_id").eq(device_id),
+    ):
+        index.setdefault(_item_rule_key(item), []).append(item)
+    return index
+
+
+# 設定バージョンを保持するテーブル
+def _version_table():
+    return clients.get_table("REQ_NO_COUNTER_TABLE")
+
+
+# 設定バージョンの確認（確認間隔毎）
+# 他のコンテナで設定が変更されていた場合はキャッシュを破棄する
+def _check_version():
+    now = time.monotonic()
+    if now - _version["checked"] < AUTOMATION_RULE_VERSION_CHECK_INTERVAL:
+        return
+    with _version_lock:
+        if now - _version["checked"] < AUTOMATION_RULE_VERSION_CHECK_INTERVAL:
+            return
+        try:
+            item = _version_table().get_item(
+                Key={"simid": AUTOMATION_RULE_VERSION_KEY},
+                ProjectionExpression="rule_version",
+            ).get("Item", {})
+        except ClientError as e:
+            logger.warning(f"連動制御設定のバージョン確認エラー e={e}")
+            return
+        version = item.get("rule_version", "")
+        if _version["value"] is not None and _version["value"] != version:
+            logger.info("連動制御設定の変更を検知したためキャッシュを破棄")
+            _index_cache.clear()
+        _version["value"] = version
+        _version["checked"] = time.monotonic()
+
+
+##################################
+# 連動制御設定取得
+# イベントに一致する連動制御設定の一覧（存在しない場合は空の一覧）
+##################################
+def get_rules(automation_table, device_id, event_type, terminal_no, di_state, occurrence_flag):
+    _check_version()
+    index = _index_cache.get(device_id)
+    if index is None:
+        index = load_index(device_id, automation_table)
+        _index_cache.put(device_id, index)
+    return list(index.get(rule_key(event_type, terminal_no, di_state, occurrence_flag), []))
+
+
+##################################
+# 連動制御設定キャッシュの無効化
+# 連動制御設定の登録・更新・削除後に呼び出す
+# 書き込み自体は完了しているため、更新失敗時はログ出力のみ（キャッシュ有効期間で再読込される）
+##################################
+def invalidate():
+    _index_cache.clear()
+    try:
+        _version_table().update_item(
+            Key={"simid": AUTOMATION_RULE_VERSION_KEY},
+            UpdateExpression="SET #rule_version = :rule_version",
+            ExpressionAttributeNames={"#rule_version": "rule_version"},
+            ExpressionAttributeValues={":rule_version": str(uuid.uuid4())},
+        )
+    except ClientError as e:
+        logger.error(f"連動制御設定のバージョン更新エラー e={e}")
@@ -0,0 +1,74 @@
+import time
+import threading
+from collections import OrderedDict
+
+# 未登録を表す値（Noneをキャッシュ値として扱うため）
+_MISSING = object()
+
+
+##################################
+# TTL付きLRUキャッシュ
+# ウォームコンテナ内でのみ有効なインプロセスキャッシュ
+# maxsize : 最大保持件数（超過時は最終参照が古いものから破棄）
+# ttl : 有効期間（秒）
+##################################
+class TTLCache:
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    # キャッシュ取得（未登録・期限切れの場合はdefault）
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expire = entry
+            if expire < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    # キャッシュ登録
+    # ttl(任意) : このキーのみの有効期間（秒）、未指定時はキャッシュの有効期間
+    def put(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    # キャッシュ破棄
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    # 全件破棄
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    # 統計情報
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+
+import boto3
+from botocore.config import Config
+
+import ddb_metrics
+
+# ローカル環境の接続先（DynamoDB・SSM・SES・SQS等）
+ENDPOINT_URL = os.environ.get("endpoint_url")
+
+# コネクションプールの上限（並列処理のスレッド数より多くする）
+CLIENT_MAX_POOL_CONNECTIONS = int(os.environ.get("CLIENT_MAX_POOL_CONNECTIONS", 32))
+# リトライ回数（初回の呼び出しを除く）
+CLIENT_MAX_ATTEMPTS = int(os.environ.get("CLIENT_MAX_ATTEMPTS", 5))
+
+# 共通の接続設定
+# - tcp_keepalive : ウォームコンテナ間の待機中に接続が切断されにくくする
+# - retries(adaptive) : スロットリング発生時はクライアント側で送信レートを抑制する
+CLIENT_CONFIG = Config(
+    tcp_keepalive=True,
+    max_pool_connections=CLIENT_MAX_POOL_CONNECTIONS,
+    retries={"max_attempts": CLIENT_MAX_ATTEMPTS, "mode": "adaptive"},
+)
+
+# DynamoDB呼び出し集計（有効時のみ）
+# 各Lambdaで直接生成するクライアント・リソースも対象とするため、デフォルトセッションにも登録する
+# （読み込み前に生成したクライアントは対象外のため、モジュールレベルのクライアント生成より先に読み込む）
+if ddb_metrics.DDB_METRICS_ENABLED:
+    if boto3.DEFAULT_SESSION is None:
+        boto3.setup_default_session()
+    ddb_metrics.install(boto3.DEFAULT_SESSION.events)
+
+# 生成済みオブジェクト（ウォームコンテナ内で再利用）
+_clients = {}
+_resources = {}
+_tables = {}
+# 生成処理の排他（boto3のデフォルトセッションはスレッドセーフではない）
+_lock = threading.RLock()
+# 生成に要した時間（ミリ秒） {"client:ses": 12.3, "table:DEVICE_TABLE": 0.1, ...}
+_init_times = {}
+
+
+def _cache_key(service_name, kwargs):
+    return (service_name, tuple(sorted(kwargs.items(), key=lambda item: item[0])))
+
+
+def _create(cache, key, label, factory):
+    obj = cache.get(key)
+    if obj is not None:
+        return obj
+    with _lock:
+        obj = cache.get(key)
+        if obj is None:
+            start = time.perf_counter()
+            obj = factory()
+            _init_times[label] = round((time.perf_counter() - start) * 1000, 1)
+            cache[key] = obj
+    return obj
+
+
+# DynamoDB呼び出し集計の登録（デフォルトセッションの生成順によらず集計対象とする）
+def _install_metrics(service_name, client):
+    if ddb_metrics.DDB_METRICS_ENABLED and service_name == "dynamodb":
+        ddb_metrics.install(client.meta.events)
+
+
+def _config(kwargs):
+    config = kwargs.pop("config", None)
+    return CLIENT_CONFIG.merge(config) if config else CLIENT_CONFIG
+
+
+##################################
+# クライアント取得
+# service_name : サービス名（"lambda", "ses" 等）
+# **kwargs : boto3.clientの引数（region_name, endpoint_url, config 等）
+# 同じ引数での2回目以降は生成済みのクライアントを返す
+##################################
+def get_client(service_name, **kwargs):
+    def factory():
+        client_kwargs = dict(kwargs)
+        client = boto3.client(service_name, config=_config(client_kwargs), **client_kwargs)
+        _install_metrics(service_name, client)
+        return client
+
+    return _create(_clients, _cache_key(service_name, kwargs), f"client:{service_name}", factory)
+
+
+##################################
+# リソース取得
+# service_name : サービス名（"dynamodb", "sqs" 等）
+# **kwargs : boto3.resourceの引数
+##################################
+def get_resource(service_name, **kwargs):
+    def factory():
+        resource_kwargs = dict(kwargs)
+        resource = boto3.resource(service_name, config=_config(resource_kwargs), **resource_kwargs)
+        _install_metrics(service_name, resource.meta.client)
+        return resource
+
+    return _create(
+        _resources, _cache_key(service_name, kwargs), f"resource:{service_name}", factory
+    )
+
+
+# DynamoDBリソース
+def dynamodb():
+    return get_resource("dynamodb", endpoint_url=ENDPOINT_URL)
+
+
+##################################
+# テーブル取得
+# table_key : SSMのテーブル名一覧（ssm.table_names）のキー（"DEVICE_TABLE" 等）
+# 存在しないキーの場合はKeyErrorを送出する
+##################################
+def get_table(table_key):
+    table = _tables.get(table_key)
+    if table is not None:
+        return table
+
+    import ssm
+
+    table_name = ssm.table_names[table_key]
+    return _create(
+        _tables, table_key, f"table:{table_key}", lambda: dynamodb().Table(table_name)
+    )
+
+
+# 複数テーブル取得 {テーブルキー: テーブル}
+def get_tables(*table_keys):
+    return {table_key: get_table(table_key) for table_key in table_keys}
+
+
+# 生成に要した時間（ミリ秒）
+def init_timings():
+    with _lock:
+        return dict(_init_times)
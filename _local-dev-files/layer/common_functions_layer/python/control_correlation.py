@@ -0,0 +1,151 @@
+import os
+import time
+
+from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeDeserializer
+from aws_lambda_powertools import Logger
+
+import clients
+import control_timeout
+import db
+
+logger = Logger()
+
+##################################
+# 接点出力制御の応答突合
+#
+# 接点出力制御応答テーブル（REMOTE_CONTROL_TABLE）のストリーム（NEW_AND_OLD_IMAGES）を
+# remote-control-correlation で受信し、制御結果・紐づけ接点入力結果の登録を検知する
+# - 制御応答の受信時に、紐づけ接点入力の判定を期限（応答受信日時 + 20秒 / 40秒）で予約する
+#   （タイムアウト判定は応答判定から紐づけ接点入力の判定へ引き継がない）
+# - 要求の確定（制御結果・紐づけ接点入力結果の登録）を要求からの所要時間とともにログ出力する
+# - 応答（タイムアウト以外）を登録した結果項目を確定管理テーブル（REMOTE_CONTROL_SETTLED_TABLE）に記録する
+#   タイムアウト判定（remote-control-timeout）は記録済みの段階の判定を、接点出力制御応答を取得せずに取り消す
+#   （タイムアウトの登録は記録しない。通知に失敗して再配信された判定が通知をやり直せるようにする）
+#
+# 画面向けの応答待ち（wait_result）はストリームを使用せず、従来どおりテーブルを一定間隔で確認する
+# （確認するのは結果項目のみ）
+##################################
+CONTROL_CORRELATION_ENABLED = (
+    os.environ.get("CONTROL_CORRELATION_ENABLED", "false").lower() == "true"
+)
+
+# 結果項目
+RESULT_CONTROL = "control_result"
+RESULT_LINK_DI = "link_di_result"
+# タイムアウト時の結果
+RESULT_TIMEOUT = "9999"
+# 判定段階毎の結果項目
+PHASE_RESULTS = {
+    control_timeout.PHASE_RESPONSE: RESULT_CONTROL,
+    control_timeout.PHASE_LINK_DI: RESULT_LINK_DI,
+}
+# 確定管理テーブル
+SETTLED_TABLE_KEY = "REMOTE_CONTROL_SETTLED_TABLE"
+# 確定記録の保持期間（秒）（判定の再予約・再配信を含む判定期間より十分長くする）
+SETTLED_TTL_SECONDS = 86400
+# 応答待ちの確認間隔（秒）
+WAIT_INTERVAL_SECONDS = float(os.environ.get("CONTROL_RESULT_WAIT_INTERVAL", 1))
+
+_deserializer = TypeDeserializer()
+
+
+# 応答突合による紐づけ接点入力判定予約の有効・無効（判定予約がSQSの場合のみ）
+def enabled():
+    return CONTROL_CORRELATION_ENABLED and control_timeout.enabled()
+
+
+def _deserialize(image):
+    return {key: _deserializer.deserialize(value) for key, value in (image or {}).items()}
+
+
+##################################
+# ストリームレコードの変更前後の項目
+# 戻り値 : (変更前, 変更後)（存在しない場合は空の辞書）
+##################################
+def images(record):
+    dynamodb = record.get("dynamodb", {})
+    return _deserialize(dynamodb.get("OldImage")), _deserialize(dynamodb.get("NewImage"))
+
+
+##################################
+# 結果の登録
+# 戻り値 : 変更で新たに登録された結果項目の一覧（RESULT_CONTROL / RESULT_LINK_DI）
+##################################
+def resolved(old, new):
+    return [
+        result_key
+        for result_key in (RESULT_CONTROL, RESULT_LINK_DI)
+        if old.get(result_key) is None and new.get(result_key) is not None
+    ]
+
+
+# 要求の確定有無（紐づけ接点入力なしは制御結果、ありは紐づけ接点入力結果の登録で確定）
+def is_settled(remote_control):
+    if remote_control.get(RESULT_CONTROL) is None:
+        return False
+    if remote_control.get("link_di_no", 0) > 0:
+        return remote_control.get(RESULT_LINK_DI) is not None
+    return True
+
+
+##################################
+# 応答の確定記録
+# result_keys : 応答（タイムアウト以外）を登録した結果項目の一覧
+##################################
+def settle(device_req_no, result_keys):
+    clients.get_table(SETTLED_TABLE_KEY).update_item(
+        Key={"device_req_no": device_req_no},
+        UpdateExpression="ADD #results :result_keys SET expire_datetime = :expire_datetime",
+        ExpressionAttributeNames={"#results": "results"},
+        ExpressionAttributeValues={
+            ":result_keys": set(result_keys),
+            ":expire_datetime": int(time.time()) + SETTLED_TTL_SECONDS,
+        },
+    )
+
+
+##################################
+# 確定記録の一括取得
+# device_req_no_list : 端末要求番号の一覧
+# 戻り値 : {端末要求番号: 応答を登録した結果項目のセット}（記録なしの端末要求番号は含まない）
+##################################
+def settled_results(device_req_no_list):
+    return {
+        item["device_req_no"]: item.get("results", set())
+        for item in db.batch_get_items(
+            "device_req_no", device_req_no_list, clients.get_table(SETTLED_TABLE_KEY)
+        )
+    }
+
+
+# 判定段階の結果が応答で確定済みか
+def is_phase_settled(settled, device_req_no, phase):
+    return PHASE_RESULTS.get(phase) in settled.get(device_req_no, set())
+
+
+##################################
+# 結果の待機
+# device_req_no : 端末要求番号
+# result_key : 待機する結果項目（RESULT_CONTROL / RESULT_LINK_DI）
+# limit_datetime : 待機期限（UNIX時間（ミリ秒））
+# 戻り値 : 結果（期限までに登録されない場合はNone）
+# 結果が登録されるまで WAIT_INTERVAL_SECONDS 間隔でテーブルを確認する（ポーリング）
+# 接点出力制御応答の全項目は取得せず、結果項目のみを確認する
+##################################
+def wait_result(device_req_no, result_key, limit_datetime, remote_control_table):
+    while True:
+        items = remote_control_table.query(
+            KeyConditionExpression=Key("device_req_no").eq(device_req_no),
+            ProjectionExpression="#result",
+            ExpressionAttributeNames={"#result": result_key},
+            ScanIndexForward=False,
+            Limit=1,
+        ).get("Items", [])
+        result = items[0].get(result_key) if items else None
+        if result is not None:
+            return result
+        remaining = control_timeout.remaining_seconds(limit_datetime)
+        if remaining <= 0:
+            return None
+        time.sleep(min(WAIT_INTERVAL_SECONDS, remaining))
@@ -0,0 +1,116 @@
+import os
+import json
+import math
+import time
+
+from aws_lambda_powertools import Logger
+
+import clients
+
+logger = Logger()
+
+##################################
+# 接点出力制御のタイムアウト判定予約
+#
+# 制御要求の登録後に request_check を呼び出し、タイムアウト判定（remote-control-timeout）を予約する
+# REMOTE_CONTROL_TIMEOUT_SQS_QUEUE_NAME が設定されている場合は、判定期限まで遅延させたSQSメッセージで予約する
+# （判定処理は期限までLambda内で待機しない。複数の判定をSQSのバッチでまとめて処理する）
+# 未設定の場合は従来どおり判定Lambdaを非同期呼び出しする（判定Lambda内で期限まで待機する）
+#
+# 判定段階（phase）:
+# - response : 制御応答の期限（要求日時 + 10秒（マニュアル）/ 20秒（スケジュール・オートメーション））
+# - link_di : 紐づけ接点入力変化の期限（応答受信日時 + 20秒（マニュアル）/ 40秒（スケジュール・オートメーション））
+##################################
+REMOTE_CONTROL_TIMEOUT_SQS_QUEUE_NAME = os.environ.get("REMOTE_CONTROL_TIMEOUT_SQS_QUEUE_NAME")
+LAMBDA_TIMEOUT_CHECK = os.environ.get("LAMBDA_TIMEOUT_CHECK")
+AWS_DEFAULT_REGION = os.environ.get("AWS_DEFAULT_REGION", "ap-northeast-1")
+
+PHASE_RESPONSE = "response"
+PHASE_LINK_DI = "link_di"
+
+# 判定期限（ミリ秒） {段階: (マニュアル, スケジュール・オートメーション)}
+TIMEOUT_MILLISECONDS = {
+    PHASE_RESPONSE: (10000, 20000),
+    PHASE_LINK_DI: (20000, 40000),
+}
+# SQSの遅延配信の上限（秒）
+SQS_MAX_DELAY_SECONDS = 900
+
+# キュー取得結果（ウォームコンテナ内で再利用）
+_queue = None
+
+
+def _get_queue():
+    global _queue
+    if _queue is None:
+        sqs = clients.get_resource("sqs", endpoint_url=clients.ENDPOINT_URL)
+        _queue = sqs.get_queue_by_name(QueueName=REMOTE_CONTROL_TIMEOUT_SQS_QUEUE_NAME)
+    return _queue
+
+
+# SQSによる予約の有効・無効
+def enabled():
+    return bool(REMOTE_CONTROL_TIMEOUT_SQS_QUEUE_NAME)
+
+
+def _timeout_milliseconds(phase, control_trigger):
+    manual, others = TIMEOUT_MILLISECONDS[phase]
+    return manual if control_trigger == "manual_control" else others
+
+
+##################################
+# 判定期限（UNIX時間（ミリ秒））
+# remote_control : 接点出力制御応答
+##################################
+def limit_datetime(remote_control, phase):
+    base_datetime = (
+        remote_control["req_datetime"]
+        if phase == PHASE_RESPONSE
+        else remote_control["recv_datetime"]
+    )
+    return base_datetime + _timeout_milliseconds(phase, remote_control.get("control_trigger"))
+
+
+##################################
+# 判定予約（SQS）
+# delay_seconds : 判定までの秒数（SQSの上限を超える場合は上限で予約し、判定側で再予約する）
+##################################
+def schedule(device_req_no, phase, delay_seconds):
+    delay_seconds = min(max(math.ceil(delay_seconds), 0), SQS_MAX_DELAY_SECONDS)
+    _get_queue().send_message(
+        MessageBody=json.dumps({"device_req_no": device_req_no, "phase": phase}),
+        DelaySeconds=delay_seconds,
+    )
+    logger.debug(f"タイムアウト判定予約 device_req_no={device_req_no}, phase={phase}, delay={delay_seconds}")
+
+
+##################################
+# 制御要求後のタイムアウト判定予約
+# control_trigger : 制御契機（"manual_control", "timer_control", "automation_control" 等）
+# headers(任意) : 判定Lambdaへ引き継ぐヘッダー（非同期呼び出し時のみ）
+##################################
+def request_check(device_req_no, control_trigger, headers=None):
+    if enabled():
+        # 制御要求の登録直後のため、要求日時からの期限を現在時刻からの秒数とする
+        schedule(
+            device_req_no,
+            PHASE_RESPONSE,
+            _timeout_milliseconds(PHASE_RESPONSE, control_trigger) / 1000,
+        )
+        return
+
+    payload = {"body": json.dumps({"device_req_no": device_req_no})}
+    if headers is not None:
+        payload["headers"] = headers
+    aws_lambda = clients.get_client("lambda", region_name=AWS_DEFAULT_REGION)
+    lambda_invoke_result = aws_lambda.invoke(
+        FunctionName=LAMBDA_TIMEOUT_CHECK,
+        InvocationType="Event",
+        Payload=json.dumps(payload, ensure_ascii=False),
+    )
+    logger.info(f"lambda_invoke_result: {lambda_invoke_result}")
+
+
+# 判定期限までの秒数（期限を過ぎている場合は0以下）
+def remaining_seconds(limit):
+    return float(limit) / 1000 - time.time()
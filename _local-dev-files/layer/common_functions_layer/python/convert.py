@@ -1,9 +1,11 @@
 from decimal import Decimal
-from jose import jwt
 
 
 # idトークンデコード
+# joseは読み込みに時間がかかるため初回呼び出し時にインポートする
 def decode_idtoken(event):
+    from jose import jwt
+
     headers = event.get("headers", {})
     if not headers or "authorization" not in headers:
         return False
@@ -12,42 +14,174 @@ def decode_idtoken(event):
     return decoded_idtoken
 
 
+##################################
+# DynamoDB形式への変換
+#
+# 型毎の変換関数を辞書で引く（未登録の型は初回に判定して登録する）
+# 変換不要の型はNoneを登録し、要素毎の関数呼び出しを省略する
+# いずれも1回の走査で新しいオブジェクトを生成し、引数は変更しない
+##################################
+def _type_dispatch(resolve, converters):
+    def unknown(v):
+        convert = converters[type(v)] = resolve(type(v))
+        return v if convert is None else convert(v)
+
+    return converters.get, unknown
+
+
+# 低レベルAPI（client）の属性値形式 {"S": ...} 等（最も多い文字列は辞書を引かずに変換する）
+def _attribute_value_dict(v):
+    return {
+        k: {"S": a} if type(a) is str else _attribute_value_get(type(a), _attribute_value_unknown)(a)
+        for k, a in v.items()
+    }
+
+
+def _attribute_value_list(v):
+    return [
+        {"S": a} if type(a) is str else _attribute_value_get(type(a), _attribute_value_unknown)(a)
+        for a in v
+    ]
+
+
+def _resolve_attribute_value(value_type):
+    if issubclass(value_type, bool):
+        return lambda v: {"BOOL": v}
+    if issubclass(value_type, str):
+        return lambda v: {"S": v}
+    if issubclass(value_type, (int, Decimal)):
+        return lambda v: {"N": str(v)}
+    if issubclass(value_type, float):
+        return lambda v: {"N": repr(v)}
+    if issubclass(value_type, (list, tuple)):
+        return lambda v: {"L": _attribute_value_list(v)}
+    if issubclass(value_type, dict):
+        return lambda v: {"M": _attribute_value_dict(v)}
+    if value_type is type(None):
+        return lambda v: {"NULL": True}
+    return lambda v: None
+
+
+_attribute_value_get, _attribute_value_unknown = _type_dispatch(_resolve_attribute_value, {})
+
+
 # dict型をDynamoDBで使える形式に変換
 def dict_dynamo_format(dict):
-    ret_dict = {}
-    for k, v in dict.items():
-        ret_dict[k] = to_dynamo_format(v)
-    return ret_dict
+    return _attribute_value_dict(dict)
 
 
 def to_dynamo_format(v):
-    if type(v) is str:
-        return {"S": v}
-    if type(v) is int:
-        return {"N": str(v)}
-    if type(v) is Decimal:
-        return {"N": str(v)}
-    if type(v) is bool:
-        return {"BOOL": v}
-    if type(v) is list:
-        return {"L": [to_dynamo_format(a) for a in v]}
-    if type(v) is dict:
-        return {"M": dict_dynamo_format(v)}
-    if v is None:
-        return {"NULL": True}
-
-
-# dict型のDecimalを数値に変換
+    return _attribute_value_get(type(v), _attribute_value_unknown)(v)
+
+
+# 低レベルAPI（client）の属性値形式から変換（数値はDecimal）
+def from_dynamo_format(v):
+    ((data_type, value),) = v.items()
+    if data_type == "S" or data_type == "BOOL":
+        return value
+    if data_type == "N":
+        return Decimal(value)
+    if data_type == "M":
+        return {k: from_dynamo_format(a) for k, a in value.items()}
+    if data_type == "L":
+        return [from_dynamo_format(a) for a in value]
+    if data_type == "NULL":
+        return None
+    return value
+
+
+# 高レベルAPI（resource）の登録値（floatをDecimalに変換）
+def _item_dict(v):
+    return {
+        k: a if (convert := _item_get(type(a), _item_unknown)) is None else convert(a)
+        for k, a in v.items()
+    }
+
+
+def _item_list(v):
+    return [
+        a if (convert := _item_get(type(a), _item_unknown)) is None else convert(a)
+        for a in v
+    ]
+
+
+def _resolve_item_value(value_type):
+    if issubclass(value_type, bool):
+        return None
+    if issubclass(value_type, float):
+        # json.dumpsと同じ文字列表現から変換する
+        return lambda v: Decimal(repr(v))
+    if issubclass(value_type, dict):
+        return _item_dict
+    if issubclass(value_type, (list, tuple)):
+        return _item_list
+    return None
+
+
+_item_get, _item_unknown = _type_dispatch(
+    _resolve_item_value, {str: None, int: None, bool: None, Decimal: None, type(None): None}
+)
+
+
+##################################
+# 登録用データ変換
+# json.loads(json.dumps(item), parse_float=Decimal) と同じく、floatをDecimalに変換した複製を返す
+# 文字列化・再解析を行わない
+##################################
+def to_dynamo_item(item):
+    convert = _item_get(type(item), _item_unknown)
+    return item if convert is None else convert(item)
+
+
+# 取得データ変換（Decimalを整数または浮動小数点数に変換した複製を返す）
+def _native_dict(v):
+    return {
+        k: a if (convert := _native_get(type(a), _native_unknown)) is None else convert(a)
+        for k, a in v.items()
+    }
+
+
+def _native_list(v):
+    return [
+        a if (convert := _native_get(type(a), _native_unknown)) is None else convert(a)
+        for a in v
+    ]
+
+
+def _resolve_native_value(value_type):
+    if issubclass(value_type, Decimal):
+        return lambda v: int(v) if v == v.to_integral_value() else float(v)
+    if issubclass(value_type, dict):
+        return _native_dict
+    if issubclass(value_type, (list, tuple)):
+        return _native_list
+    return None
+
+
+_native_get, _native_unknown = _type_dispatch(
+    _resolve_native_value, {str: None, int: None, bool: None, float: None, type(None): None}
+)
+
+
+def to_native(item):
+    convert = _native_get(type(item), _native_unknown)
+    return item if convert is None else convert(item)
+
+
+# dict型のfloatをDecimalに変換（引数を直接変更する）
 def float_to_decimal(param):
     if isinstance(param, dict):
         for key, value in param.items():
             if isinstance(value, float):
                 param[key] = Decimal(str(value))
-            else:
+            elif isinstance(value, (dict, list)):
                 float_to_decimal(value)
     elif isinstance(param, list):
-        for item in param:
-            float_to_decimal(item)
+        for i, item in enumerate(param):
+            if isinstance(item, float):
+                param[i] = Decimal(str(item))
+            elif isinstance(item, (dict, list)):
+                float_to_decimal(item)
     return param
 
 
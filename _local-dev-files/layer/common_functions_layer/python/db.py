@@ -1,20 +1,165 @@
 import json
-import os
+import random
+import time
 import traceback
 from operator import itemgetter
 
-import boto3
 from boto3.dynamodb.conditions import Attr, Key
 from aws_lambda_powertools import Logger
 
+import clients
+import parallel
+
 logger = Logger()
 
-dynamodb = boto3.resource("dynamodb")
-client = boto3.client(
-    "dynamodb",
-    region_name="ap-northeast-1",
-    endpoint_url=os.environ.get("endpoint_url"),
-)
+# query_first の1ページの件数（既定値）
+# 条件に合う先頭の1件を返すクエリで、1MB分のページを読まずに先頭付近の数件で打ち切る
+QUERY_FIRST_PAGE_LIMIT = 10
+
+
+###################################
+# クエリ・スキャン（ページング）
+#
+# LastEvaluatedKeyを辿り、1MB上限で打ち切られた後続ページも取得する
+# 次ページは呼び出し元が読み進めた時点で取得する（途中で打ち切った場合は以降のページを取得しない）
+#
+# **kwargs : table.query / table.scan の引数
+#   (KeyConditionExpression, FilterExpression, ProjectionExpression, IndexName, Limit(1ページの件数) 等)
+# capacity(任意) : 消費キャパシティの集計先（dict）
+#   {"CapacityUnits": 合計, "pages": ページ数} を加算する
+###################################
+def _iter_pages(operation, capacity, kwargs):
+    if capacity is not None:
+        kwargs["ReturnConsumedCapacity"] = "TOTAL"
+    while True:
+        response = operation(**kwargs)
+        if capacity is not None:
+            capacity["CapacityUnits"] = capacity.get("CapacityUnits", 0) + response.get(
+                "ConsumedCapacity", {}
+            ).get("CapacityUnits", 0)
+            capacity["pages"] = capacity.get("pages", 0) + 1
+        yield response.get("Items", [])
+        if "LastEvaluatedKey" not in response:
+            return
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def _iter_items(pages, max_items):
+    count = 0
+    for items in pages:
+        for item in items:
+            if max_items is not None and count >= max_items:
+                return
+            yield item
+            count += 1
+
+
+# クエリ（ページ単位）
+def iter_query_pages(table, capacity=None, **kwargs):
+    return _iter_pages(table.query, capacity, kwargs)
+
+
+# スキャン（ページ単位）
+# 並列スキャンの1セグメント分を取得する場合は Segment, TotalSegments を指定する
+def iter_scan_pages(table, capacity=None, **kwargs):
+    return _iter_pages(table.scan, capacity, kwargs)
+
+
+# クエリ（項目単位）
+# max_items : 取得件数上限（到達した時点で以降のページは取得しない）
+def iter_query(table, max_items=None, capacity=None, **kwargs):
+    return _iter_items(iter_query_pages(table, capacity, **kwargs), max_items)
+
+
+# スキャン（項目単位）
+def iter_scan(table, max_items=None, capacity=None, **kwargs):
+    return _iter_items(iter_scan_pages(table, capacity, **kwargs), max_items)
+
+
+# クエリ（全件）
+def query_all(table, capacity=None, **kwargs):
+    return list(iter_query(table, capacity=capacity, **kwargs))
+
+
+# クエリ（先頭1件、該当なしの場合はNone）
+# Limit未指定の場合は QUERY_FIRST_PAGE_LIMIT 件ずつ読み、1MB分のページを読まないようにする
+# （該当なしのページは後続ページを取得して読み進める）
+# FilterExpression指定時はLimitがフィルタ前の件数に掛かり、該当まで小さいページを繰り返し取得するため既定値を設定しない
+def query_first(table, capacity=None, **kwargs):
+    if "FilterExpression" not in kwargs:
+        kwargs.setdefault("Limit", QUERY_FIRST_PAGE_LIMIT)
+    return next(iter_query(table, max_items=1, capacity=capacity, **kwargs), None)
+
+
+# スキャン（全件）
+# segments : 並列スキャンのセグメント数（2以上の場合はセグメント毎に並列で取得）
+def scan_all(table, segments=1, capacity=None, **kwargs):
+    if segments <= 1:
+        return list(iter_scan(table, capacity=capacity, **kwargs))
+
+    def scan_segment(segment):
+        segment_capacity = {} if capacity is not None else None
+        items = list(
+            iter_scan(
+                table,
+                capacity=segment_capacity,
+                Segment=segment,
+                TotalSegments=segments,
+                **kwargs,
+            )
+        )
+        return items, segment_capacity
+
+    items = []
+    for segment_items, segment_capacity in parallel.map_parallel(scan_segment, range(segments)):
+        items.extend(segment_items)
+        if segment_capacity:
+            for key, value in segment_capacity.items():
+                capacity[key] = capacity.get(key, 0) + value
+    return items
+
+
+###################################
+# 射影式（ProjectionExpression）生成
+#
+# fields : 取得する属性のパス一覧
+#   ドット区切りで入れ子の属性、[n]でリストの要素を指定する
+#   例) ["device_id", "device_data.config.device_name", "device_data.config.terminal_settings"]
+# 戻り値 : table.query / table.get_item 等に渡す引数
+#   {"ProjectionExpression": ..., "ExpressionAttributeNames": ...}
+#
+# 属性名は予約語を考慮しプレースホルダ（#p0, #p1, ...）に置き換える
+# （条件式のプレースホルダ（#n0, ...）はboto3が別途追加する）
+# 引数の辞書はboto3の処理で更新されるため、呼び出し毎に生成すること
+###################################
+def projection_args(fields):
+    names = {}
+    placeholders = {}
+    paths = []
+    for field in dict.fromkeys(fields):
+        path = []
+        for part in field.split("."):
+            name, bracket, index = part.partition("[")
+            if name not in placeholders:
+                placeholders[name] = f"#p{len(placeholders)}"
+                names[placeholders[name]] = name
+            path.append(placeholders[name] + bracket + index)
+        paths.append(".".join(path))
+    return {"ProjectionExpression": ", ".join(paths), "ExpressionAttributeNames": names}
+
+
+# 射影指定時の引数（キー等の必須属性を追加する、未指定時は全属性を取得）
+def _projection_kwargs(fields, *required):
+    if fields is None:
+        return {}
+    return projection_args(list(required) + list(fields))
+
+
+# デバイス情報の必須属性（insert_id_key_in_device_infoで参照）
+DEVICE_KEY_FIELDS = ("device_id", "identification_id", "device_type")
+
+# グループ名のみ取得する場合の属性（一覧画面用）
+GROUP_NAME_FIELDS = ("group_data.config.group_name",)
 
 
 ###################################
@@ -34,27 +179,29 @@ def get_device_relation(pk, table, **kwargs):
     if "gsi_name" in kwargs:
         # GSI PK & SK(識別子の前方一致検索)
         if "sk_prefix" in kwargs:
-            response = table.query(
+            response = query_all(
+                table,
                 IndexName=kwargs["gsi_name"],
                 KeyConditionExpression=Key("key2").eq(pk)
                 & Key("key1").begins_with(kwargs["sk_prefix"]),
-            ).get("Items", [])
+            )
         # GSI PK検索
         else:
-            response = table.query(
-                IndexName=kwargs["gsi_name"], KeyConditionExpression=Key("key2").eq(pk)
-            ).get("Items", [])
+            response = query_all(
+                table, IndexName=kwargs["gsi_name"], KeyConditionExpression=Key("key2").eq(pk)
+            )
     else:
         # PK & SK(識別子の前方一致検索)
         if "sk_prefix" in kwargs:
-            response = table.query(
+            response = query_all(
+                table,
                 KeyConditionExpression=Key("key1").eq(pk)
-                & Key("key2").begins_with(kwargs["sk_prefix"])
-            ).get("Items", [])
+                & Key("key2").begins_with(kwargs["sk_prefix"]),
+            )
 
         # PK検索
         else:
-            response = table.query(KeyConditionExpression=Key("key1").eq(pk)).get("Items", [])
+            response = query_all(table, KeyConditionExpression=Key("key1").eq(pk))
 
     return response
 
@@ -101,24 +248,15 @@ def get_user_relation_group_id_list(user_id, device_relation_table):
 
 
 # ユーザーに紐づくデバイスID一覧を取得
+# 契約情報を取得済みの場合はrelation.get_relation_graph（契約単位のキャッシュ）を使用すること
 def get_user_relation_device_id_list(user_id, device_relation_table, include_group_relation=True):
-    device_relation_list = get_device_relation(f"u-{user_id}", device_relation_table)
-    device_id_list = []
-    for relation in device_relation_list:
-        relation_id = relation["key2"]
-        if relation_id.startswith("d-"):
-            device_id_list.append(relation_id[2:])
-        elif relation_id.startswith("g-"):
-            if include_group_relation:
-                device_id_list.extend(
-                    [
-                        relation_device_id["key2"][2:]
-                        for relation_device_id in get_device_relation(
-                            relation_id, device_relation_table, sk_prefix="d-"
-                        )
-                    ]
-                )
-    return list(set(device_id_list))
+    return list(
+        set(
+            get_user_relation_duplication_device_id_list(
+                user_id, device_relation_table, include_group_relation
+            )
+        )
+    )
 
 
 # ユーザーに紐づく重複を含むデバイスID一覧を取得
@@ -186,6 +324,9 @@ def get_group_relation_user_id_list(group_id, device_relation_table):
 # トランザクション(書き込み)
 def execute_transact_write_item(transact_items):
     try:
+        client = clients.get_client(
+            "dynamodb", region_name="ap-northeast-1", endpoint_url=clients.ENDPOINT_URL
+        )
         client.transact_write_items(TransactItems=transact_items)
         return True
     except Exception as e:
@@ -196,10 +337,11 @@ def execute_transact_write_item(transact_items):
 
 # モノセコムユーザ情報取得
 def get_user_info(pk, sk, table):
-    user_info = table.query(
+    user_info = iter_query(
+        table,
         IndexName="account_id_index",
         KeyConditionExpression=Key("account_id").eq(pk) & Key("contract_id").eq(sk),
-    ).get("Items", [])
+    )
     # del_datetimeの項目が存在しないか、値がNullの情報（削除済み以外のユーザー情報）のみを取得
     response = [
         item
@@ -218,11 +360,12 @@ def get_user_info_by_user_id(user_id, table):
 
 
 def get_admin_user_id_list(contract_id, table):
-    user_info_list = table.query(
+    user_info_list = iter_query(
+        table,
         IndexName="contract_id_index",
         KeyConditionExpression=Key("contract_id").eq(contract_id),
         FilterExpression=Attr("user_type").contains("admin"),
-    ).get("Items", [])
+    )
     user_id_list = [
         user_info["user_id"]
         for user_info in user_info_list
@@ -233,30 +376,35 @@ def get_admin_user_id_list(contract_id, table):
 
 # アカウント情報取得
 def get_account_info(pk, table):
-    account_info = table.query(
-        IndexName="auth_id_index", KeyConditionExpression=Key("auth_id").eq(pk)
-    ).get("Items", [])
+    account_info = iter_query(
+        table, IndexName="auth_id_index", KeyConditionExpression=Key("auth_id").eq(pk)
+    )
     # del_datetimeの項目が存在しないか、値がNullの情報（削除済み以外のアカウント情報）のみを取得
-    response = [
-        item
-        for item in account_info
-        if item.get("user_data", {}).get("config", {}).get("del_datetime") is None
-    ]
-    return response[0] if response else None
+    return next(
+        (
+            item
+            for item in account_info
+            if item.get("user_data", {}).get("config", {}).get("del_datetime") is None
+        ),
+        None,
+    )
 
 
 def get_account_info_by_email_address(email_address, table):
-    account_info = table.query(
+    account_info = iter_query(
+        table,
         IndexName="email_address_index",
         KeyConditionExpression=Key("email_address").eq(email_address),
-    ).get("Items", [])
+    )
     # del_datetimeの項目が存在しないか、値がNullの情報（削除済み以外のアカウント情報）のみを取得
-    response = [
-        item
-        for item in account_info
-        if item.get("user_data", {}).get("config", {}).get("del_datetime") is None
-    ]
-    return response[0] if response else None
+    return next(
+        (
+            item
+            for item in account_info
+            if item.get("user_data", {}).get("config", {}).get("del_datetime") is None
+        ),
+        None,
+    )
 
 
 def get_account_info_by_account_id(account_id, table):
@@ -274,22 +422,27 @@ def get_contract_info(contract_id, contract_table):
 
 
 # デバイス情報取得
-def get_device_info(device_id, device_table, consistent_read=False):
-    device_list = device_table.query(
+# fields(任意) : 取得する属性のパス一覧（projection_args参照）
+def get_device_info(device_id, device_table, consistent_read=False, fields=None):
+    device_info = query_first(
+        device_table,
         KeyConditionExpression=Key("device_id").eq(device_id),
         FilterExpression=Attr("contract_state").eq(1),
         ConsistentRead=consistent_read,
-    ).get("Items", [])
-    return insert_id_key_in_device_info(device_list[0]) if device_list else None
+        **_projection_kwargs(fields, *DEVICE_KEY_FIELDS),
+    )
+    return insert_id_key_in_device_info(device_info) if device_info else None
 
 
 # デバイス情報取得(契約状態:使用不可以外)
-def get_device_info_other_than_unavailable(device_id, table):
-    device_list = table.query(
+def get_device_info_other_than_unavailable(device_id, table, fields=None):
+    device_info = query_first(
+        table,
         KeyConditionExpression=Key("device_id").eq(device_id),
         FilterExpression=Attr("contract_state").ne(2),
-    ).get("Items", [])
-    return insert_id_key_in_device_info(device_list[0]) if device_list else None
+        **_projection_kwargs(fields, *DEVICE_KEY_FIELDS),
+    )
+    return insert_id_key_in_device_info(device_info) if device_info else None
 
 
 # 現状態取得
@@ -305,10 +458,11 @@ def get_device_state(device_id, device_state_table, consistent_read=False):
 def get_pre_reg_device_info(contract_id_list, pre_register_table):
     pre_reg_device_list = []
     for item in contract_id_list:
-        pre_register_table_res = pre_register_table.query(
+        pre_register_table_res = query_all(
+            pre_register_table,
             IndexName="contract_id_index",
             KeyConditionExpression=Key("contract_id").eq(item),
-        ).get("Items", [])
+        )
         pre_register_table_res = insert_id_key_in_device_info_list(pre_register_table_res)
         for items in pre_register_table_res:
             # レスポンス生成(未登録デバイス)
@@ -350,12 +504,32 @@ def update_device_order(device_order, user_id, user_table):
     return ""
 
 
+###################################
+# デバイス設定バージョン更新
+# 受信処理（receivedata）のデバイス情報キャッシュを無効化するため、
+# 現状態テーブルのconfig_versionを加算する
+# 現状態未作成のデバイスは対象外（キャッシュ有効期間で反映）
+###################################
+def update_device_config_version(device_id, device_state_table):
+    try:
+        device_state_table.update_item(
+            Key={"device_id": device_id},
+            UpdateExpression="ADD #config_version :inc",
+            ConditionExpression="attribute_exists(device_id)",
+            ExpressionAttributeNames={"#config_version": "config_version"},
+            ExpressionAttributeValues={":inc": 1},
+        )
+    except device_state_table.meta.client.exceptions.ConditionalCheckFailedException:
+        logger.debug(f"現状態未作成のためconfig_version更新対象外 device_id={device_id}")
+
+
 def get_remote_control(device_req_no, remote_control_table):
-    remote_control_list = remote_control_table.query(
+    return query_first(
+        remote_control_table,
         KeyConditionExpression=Key("device_req_no").eq(device_req_no),
         ScanIndexForward=False,
-    ).get("Items", [])
-    return remote_control_list[0] if remote_control_list else None
+        Limit=1,
+    )
 
 def get_group_relation_pre_register_device_id_list(group_id, device_relation_table):
     group_relation_device_list = get_device_relation(
@@ -366,11 +540,12 @@ def get_group_relation_pre_register_device_id_list(group_id, device_relation_tab
 
 
 def get_device_info_by_imei(pre_register_device_id, pre_register_table):
-    device_list = pre_register_table.query(
+    device_info = query_first(
+        pre_register_table,
         KeyConditionExpression=Key("identification_id").eq(pre_register_device_id),
         FilterExpression=Attr("contract_state").ne(2),
-    ).get("Items", [])
-    return insert_id_key_in_device_info(device_list[0]) if device_list else None
+    )
+    return insert_id_key_in_device_info(device_info) if device_info else None
 
 def insert_id_key_in_device_info(info):
     if info.get("device_type") and info.get("device_type") != "":
@@ -409,4 +584,99 @@ def insert_id_key_in_device_info_list(info_list):
                 item["imei"] = item.get("identification_id")
 
         device_info_list.append(item)
-    return device_info_list
\ No newline at end of file
+    return device_info_list
+
+
+###################################
+# 一括取得（BatchGetItem）
+#
+# キー100件毎に分割してBatchGetItemを実行し、未処理キー（UnprocessedKeys）は
+# 指数バックオフで再実行する
+# 戻り値は入力順（重複キーは1件、未登録・削除済みは除外）
+###################################
+BATCH_GET_MAX_KEYS = 100
+BATCH_GET_MAX_RETRY = 8
+BATCH_GET_BACKOFF_BASE = 0.05
+
+
+def batch_get_items(key_name, key_list, table, consistent_read=False, fields=None):
+    key_list = list(dict.fromkeys(key for key in key_list if key))
+    client = table.meta.client
+    items = {}
+    for i in range(0, len(key_list), BATCH_GET_MAX_KEYS):
+        request_items = {
+            table.name: {
+                "Keys": [{key_name: key} for key in key_list[i : i + BATCH_GET_MAX_KEYS]],
+                "ConsistentRead": consistent_read,
+                **_projection_kwargs(fields, key_name),
+            }
+        }
+        retry = 0
+        while request_items:
+            response = client.batch_get_item(RequestItems=request_items)
+            for item in response.get("Responses", {}).get(table.name, []):
+                items[item[key_name]] = item
+            request_items = response.get("UnprocessedKeys") or {}
+            if request_items:
+                if retry >= BATCH_GET_MAX_RETRY:
+                    raise Exception(f"batch_get_items未処理キー残存 table={table.name}")
+                time.sleep(BATCH_GET_BACKOFF_BASE * (2**retry) * random.uniform(0.5, 1.0))
+                retry += 1
+    return [items[key] for key in key_list if key in items]
+
+
+# グループ情報一括取得
+def get_group_info_many(group_id_list, group_table, fields=None):
+    return batch_get_items("group_id", group_id_list, group_table, fields=fields)
+
+
+# 現状態一括取得
+def get_device_state_many(device_id_list, device_state_table, consistent_read=False, fields=None):
+    return batch_get_items(
+        "device_id", device_id_list, device_state_table, consistent_read, fields
+    )
+
+
+# 射影指定時は削除済み判定の属性を追加する
+def _with_del_datetime(fields):
+    return None if fields is None else list(fields) + ["user_data.config.del_datetime"]
+
+
+# モノセコムユーザ情報一括取得（削除済み以外）
+def get_users_many(user_id_list, user_table, fields=None):
+    return [
+        user
+        for user in batch_get_items(
+            "user_id",
+            user_id_list,
+            user_table,
+            fields=_with_del_datetime(fields),
+        )
+        if user.get("user_data", {}).get("config", {}).get("del_datetime") is None
+    ]
+
+
+# アカウント情報一括取得（削除済み以外）
+def get_accounts_many(account_id_list, account_table, fields=None):
+    return [
+        account
+        for account in batch_get_items(
+            "account_id",
+            account_id_list,
+            account_table,
+            fields=_with_del_datetime(fields),
+        )
+        if account.get("user_data", {}).get("config", {}).get("del_datetime") is None
+    ]
+
+
+# デバイス情報一括取得（契約状態:使用可能）
+# デバイステーブルはソートキー（identification_id）が必要なためBatchGetItemは使用できず、
+# デバイス毎のクエリを並列実行する
+def get_devices_many(device_id_list, device_table, consistent_read=False, fields=None):
+    device_id_list = list(dict.fromkeys(device_id for device_id in device_id_list if device_id))
+    device_info_list = parallel.map_parallel(
+        lambda device_id: get_device_info(device_id, device_table, consistent_read, fields),
+        device_id_list,
+    )
+    return [device_info for device_info in device_info_list if device_info]
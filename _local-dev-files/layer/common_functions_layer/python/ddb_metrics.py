@@ -0,0 +1,178 @@
+import functools
+import os
+import threading
+import time
+
+from aws_lambda_powertools import Logger
+
+logger = Logger()
+
+##################################
+# DynamoDB呼び出し集計（リクエスト単位）
+#
+# 環境変数 DDB_METRICS_ENABLED=true の場合のみ有効
+# botocoreのイベントハンドラを登録したDynamoDBクライアント・リソースの呼び出しを テーブル × 操作 毎に集計する
+# - clients.get_client / get_resource / get_table で取得したもの（生成時に登録）
+# - boto3.client / boto3.resource で直接生成したもの
+#   clients の読み込み時にboto3のデフォルトセッションへ登録するため、clients の読み込み後に生成したもののみ対象
+#   （クライアントは生成時にセッションのイベントハンドラを複製するため、読み込み前に生成したものは集計されない）
+# - 呼び出し回数・エラー回数
+# - 消費キャパシティ（ReturnConsumedCapacity未指定の呼び出しには TOTAL を付与する）
+# - 所要時間（パラメータ生成からレスポンス解析まで、リトライを含む）
+#
+# per_request で囲んだハンドラの終了時に、集計結果を1行の構造化ログとして出力する
+# {"ddb_metrics": {"calls": 合計, "capacity": 合計, "latency_ms": 合計,
+#                  "operations": [{"table", "operation", "calls", ...}, ...]（呼び出し回数の多い順）}}
+##################################
+DDB_METRICS_ENABLED = os.environ.get("DDB_METRICS_ENABLED", "false").lower() == "true"
+
+_CONTEXT_KEY = "ddb_metrics"
+
+# {(テーブル名, 操作名): {"calls", "errors", "capacity", "latency", "max_latency"}}
+_stats = {}
+_lock = threading.Lock()
+_installed_events = []
+
+
+# 呼び出し対象のテーブル名（複数テーブルの場合はカンマ区切り）
+def _table_name(params):
+    if "TableName" in params:
+        return params["TableName"]
+    if "RequestItems" in params:
+        return ",".join(sorted(params["RequestItems"]))
+    if "TransactItems" in params:
+        table_names = {
+            operation.get("TableName")
+            for item in params["TransactItems"]
+            for operation in item.values()
+        }
+        return ",".join(sorted(name for name in table_names if name))
+    return "-"
+
+
+def _capacity_units(consumed_capacity):
+    if not consumed_capacity:
+        return 0
+    if isinstance(consumed_capacity, dict):
+        consumed_capacity = [consumed_capacity]
+    return sum(capacity.get("CapacityUnits", 0) for capacity in consumed_capacity)
+
+
+def _record(table_name, operation, elapsed, capacity_units, error):
+    key = (table_name, operation)
+    with _lock:
+        stat = _stats.get(key)
+        if stat is None:
+            stat = _stats[key] = {
+                "calls": 0,
+                "errors": 0,
+                "capacity": 0,
+                "latency": 0,
+                "max_latency": 0,
+            }
+        stat["calls"] += 1
+        stat["errors"] += 1 if error else 0
+        stat["capacity"] += capacity_units
+        stat["latency"] += elapsed
+        stat["max_latency"] = max(stat["max_latency"], elapsed)
+
+
+def _before_parameter_build(params, model, context, **kwargs):
+    input_shape = model.input_shape
+    if (
+        input_shape is not None
+        and "ReturnConsumedCapacity" in input_shape.members
+        and "ReturnConsumedCapacity" not in params
+    ):
+        params["ReturnConsumedCapacity"] = "TOTAL"
+    context[_CONTEXT_KEY] = (_table_name(params), time.perf_counter())
+
+
+def _after_call(http_response, parsed, model, context, **kwargs):
+    started = context.pop(_CONTEXT_KEY, None)
+    if started is None:
+        return
+    table_name, start = started
+    _record(
+        table_name,
+        model.name,
+        time.perf_counter() - start,
+        _capacity_units(parsed.get("ConsumedCapacity")),
+        http_response.status_code >= 300,
+    )
+
+
+def _after_call_error(model, context, **kwargs):
+    started = context.pop(_CONTEXT_KEY, None)
+    if started is None:
+        return
+    table_name, start = started
+    _record(table_name, model.name, time.perf_counter() - start, 0, True)
+
+
+##################################
+# イベントハンドラの登録
+# events : boto3.Session.events（登録後に生成したクライアントから集計対象となる）
+##################################
+def install(events):
+    if events in _installed_events:
+        return
+    events.register(
+        "before-parameter-build.dynamodb", _before_parameter_build, unique_id="ddb-metrics-before"
+    )
+    events.register("after-call.dynamodb", _after_call, unique_id="ddb-metrics-after")
+    events.register(
+        "after-call-error.dynamodb", _after_call_error, unique_id="ddb-metrics-after-error"
+    )
+    _installed_events.append(events)
+
+
+# 集計結果の破棄
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+# 集計結果
+def summary():
+    with _lock:
+        stats = {key: dict(stat) for key, stat in _stats.items()}
+    operations = [
+        {
+            "table": table_name,
+            "operation": operation,
+            "calls": stat["calls"],
+            "errors": stat["errors"],
+            "capacity": round(stat["capacity"], 1),
+            "latency_ms": round(stat["latency"] * 1000, 1),
+            "max_latency_ms": round(stat["max_latency"] * 1000, 1),
+        }
+        for (table_name, operation), stat in stats.items()
+    ]
+    operations.sort(key=lambda operation: (-operation["calls"], -operation["latency_ms"]))
+    return {
+        "calls": sum(operation["calls"] for operation in operations),
+        "capacity": round(sum(stat["capacity"] for stat in stats.values()), 1),
+        "latency_ms": round(sum(stat["latency"] for stat in stats.values()) * 1000, 1),
+        "operations": operations,
+    }
+
+
+##################################
+# ハンドラ単位の集計
+# 開始時に集計結果を破棄し、終了時（例外発生時を含む）に集計結果をログ出力する
+# 無効時は何もしない
+##################################
+def per_request(func):
+    if not DDB_METRICS_ENABLED:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        reset()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            logger.info({"ddb_metrics": summary()})
+
+    return wrapper
@@ -1,8 +1,9 @@
 import os
-import boto3
 import textwrap
 from aws_lambda_powertools import Logger
 
+import clients
+
 logger = Logger()
 
 region_name = os.environ.get("AWS_REGION")
@@ -11,7 +12,7 @@ endpoint_url = os.environ.get("endpoint_url")
 monosc_web_url = os.environ.get("MONOSC_WEB_URL")
 
 def send_email(to_address_list, subject, body):
-    client = boto3.client("ses", region_name=region_name, endpoint_url=endpoint_url)
+    client = clients.get_client("ses", region_name=region_name, endpoint_url=endpoint_url)
 
     text_body = textwrap.dedent(f"""
         モノセコムをご利用いただきありがとうございます。
@@ -0,0 +1,133 @@
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# スレッドプールの最大スレッド数
+PARALLEL_MAX_WORKERS = int(os.environ.get("PARALLEL_MAX_WORKERS", 8))
+
+# ウォームコンテナ内で共有するスレッドプール（初回利用時に生成）
+_executor = None
+_executor_lock = threading.Lock()
+_THREAD_NAME_PREFIX = "parallel"
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=PARALLEL_MAX_WORKERS, thread_name_prefix=_THREAD_NAME_PREFIX
+                )
+    return _executor
+
+
+# X-Rayのトレース情報をワーカースレッドへ引き継ぐ
+# X-Ray SDKが読み込まれていない（トレースしていない）場合は引き継ぎ不要のためインポートしない
+def _wrap(func):
+    xray_core = sys.modules.get("aws_xray_sdk.core")
+    if xray_core is None:
+        return func
+    xray_recorder = xray_core.xray_recorder
+    try:
+        entity = xray_recorder.get_trace_entity()
+    except Exception:
+        return func
+
+    def wrapper(*args, **kwargs):
+        xray_recorder.set_trace_entity(entity)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            xray_recorder.clear_trace_entities()
+
+    return wrapper
+
+
+##################################
+# 独立した処理の並列実行
+# tasks : {名前: (関数, 引数, ...)}
+# 戻り値 : {名前: 戻り値}
+# 先頭の処理は呼び出し元スレッドで実行し、残りをスレッドプールで実行する
+# 全ての処理の終了を待ってから、最初に発生した例外を送出する
+# ワーカースレッド内から呼ばれた場合はスレッド枯渇を避けるため直列実行
+##################################
+def run_parallel(tasks):
+    if len(tasks) <= 1 or threading.current_thread().name.startswith(_THREAD_NAME_PREFIX):
+        return {name: task[0](*task[1:]) for name, task in tasks.items()}
+
+    executor = _get_executor()
+    names = list(tasks)
+    futures = {
+        name: executor.submit(_wrap(tasks[name][0]), *tasks[name][1:]) for name in names[1:]
+    }
+    results = {}
+    error = None
+    try:
+        results[names[0]] = tasks[names[0]][0](*tasks[names[0]][1:])
+    except Exception as e:
+        error = e
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            if error is None:
+                error = e
+    if error is not None:
+        raise error
+    return {name: results[name] for name in names}
+
+
+##################################
+# 同一処理の並列実行
+# 戻り値は入力順
+##################################
+def map_parallel(func, items):
+    items = list(items)
+    results = run_parallel({i: (func, item) for i, item in enumerate(items)})
+    return [results[i] for i in range(len(items))]
+
+
+##################################
+# 処理段階毎の所要時間計測
+#
+# timer = parallel.StageTimer()
+# with timer.stage("read"):
+#     ...
+# logger.info(f"stage_timings={timer.summary()}")
+##################################
+class StageTimer:
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def add(self, name, elapsed):
+        with self._lock:
+            self._stages[name] = self._stages.get(name, 0) + elapsed
+
+    # 段階毎の所要時間（ミリ秒）
+    def summary(self):
+        with self._lock:
+            result = {name: round(elapsed * 1000, 1) for name, elapsed in self._stages.items()}
+        result["total"] = round((time.perf_counter() - self._start) * 1000, 1)
+        return result
+
+
+class _Stage:
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.timer.add(self.name, time.perf_counter() - self._start)
+        return False
@@ -0,0 +1,176 @@
+import os
+import uuid
+
+from botocore.exceptions import ClientError
+from boto3.dynamodb.conditions import Key
+from aws_lambda_powertools import Logger
+
+import cache
+import db
+import parallel
+
+logger = Logger()
+
+# 関係グラフキャッシュの有効期間（秒）
+# バージョン更新が行われなかった場合（書き込み後の異常終了等）でも、この期間で再読込される
+RELATION_GRAPH_CACHE_TTL = int(os.environ.get("RELATION_GRAPH_CACHE_TTL", 300))
+
+# 契約ID毎の関係グラフキャッシュ {契約ID: (バージョン, 関係グラフ)}
+_graph_cache = cache.TTLCache(maxsize=256, ttl=RELATION_GRAPH_CACHE_TTL)
+
+
+##################################
+# デバイス関係グラフ
+#
+# 契約単位のデバイス関係テーブル（key1, key2）を隣接リストとして保持する
+# 関係の種類:
+# - ユーザ → グループ :'u-' → 'g-'
+# - ユーザ → デバイス :'u-' → 'd-'
+# - グループ → デバイス :'g-' → 'd-'
+# - グループ → 登録前デバイス :'g-' → 'pd-'
+##################################
+class RelationGraph:
+    def __init__(self, relation_list):
+        self.user_groups = {}
+        self.user_devices = {}
+        self.group_users = {}
+        self.group_devices = {}
+        self.group_pre_devices = {}
+        self.device_users = {}
+        self.device_groups = {}
+        for relation in relation_list:
+            key1_prefix, _, key1_id = relation["key1"].partition("-")
+            key2_prefix, _, key2_id = relation["key2"].partition("-")
+            if key1_prefix == "u" and key2_prefix == "g":
+                self.user_groups.setdefault(key1_id, []).append(key2_id)
+                self.group_users.setdefault(key2_id, []).append(key1_id)
+            elif key1_prefix == "u" and key2_prefix == "d":
+                self.user_devices.setdefault(key1_id, []).append(key2_id)
+                self.device_users.setdefault(key2_id, []).append(key1_id)
+            elif key1_prefix == "g" and key2_prefix == "d":
+                self.group_devices.setdefault(key1_id, []).append(key2_id)
+                self.device_groups.setdefault(key2_id, []).append(key1_id)
+            elif key1_prefix == "g" and key2_prefix == "pd":
+                self.group_pre_devices.setdefault(key1_id, []).append(key2_id)
+        # グループ展開済みの結果（初回参照時に生成）
+        self._user_device_set = {}
+        self._device_user_set = {}
+
+    # ユーザーに紐づくグループID一覧
+    def user_group_id_list(self, user_id):
+        return list(self.user_groups.get(user_id, []))
+
+    # グループに紐づくデバイスID一覧
+    def group_device_id_list(self, group_id):
+        return list(self.group_devices.get(group_id, []))
+
+    # グループに紐づく登録前デバイスID一覧
+    def group_pre_device_id_list(self, group_id):
+        return list(self.group_pre_devices.get(group_id, []))
+
+    # グループに紐づくユーザーID一覧
+    def group_user_id_list(self, group_id):
+        return list(self.group_users.get(group_id, []))
+
+    # デバイスに紐づくグループID一覧
+    def device_group_id_list(self, device_id):
+        return list(self.device_groups.get(device_id, []))
+
+    # ユーザーに紐づく重複を含むデバイスID一覧（直接紐づくデバイス、グループ経由のデバイスの順）
+    def user_duplication_device_id_list(self, user_id, include_group_relation=True):
+        device_id_list = list(self.user_devices.get(user_id, []))
+        if include_group_relation:
+            for group_id in self.user_groups.get(user_id, []):
+                device_id_list.extend(self.group_devices.get(group_id, []))
+        return device_id_list
+
+    # ユーザーに紐づくデバイスID一覧
+    def user_device_id_list(self, user_id, include_group_relation=True):
+        if not include_group_relation:
+            return list(set(self.user_devices.get(user_id, [])))
+        if user_id not in self._user_device_set:
+            self._user_device_set[user_id] = frozenset(
+                self.user_duplication_device_id_list(user_id)
+            )
+        return list(self._user_device_set[user_id])
+
+    # ユーザーがデバイスを参照可能か
+    def user_has_device(self, user_id, device_id):
+        if user_id not in self._user_device_set:
+            self.user_device_id_list(user_id)
+        return device_id in self._user_device_set[user_id]
+
+    # デバイスに紐づくユーザーID一覧
+    def device_user_id_list(self, device_id, include_group_relation=True):
+        user_id_list = list(self.device_users.get(device_id, []))
+        if not include_group_relation:
+            return list(set(user_id_list))
+        if device_id not in self._device_user_set:
+            for group_id in self.device_groups.get(device_id, []):
+                user_id_list.extend(self.group_users.get(group_id, []))
+            self._device_user_set[device_id] = frozenset(user_id_list)
+        return list(self._device_user_set[device_id])
+
+
+# パーティション（key1）単位の関係一覧取得
+def _query_relation(pk, device_relation_table):
+    return db.query_all(
+        device_relation_table,
+        KeyConditionExpression=Key("key1").eq(pk),
+        ProjectionExpression="key1, key2",
+    )
+
+
+##################################
+# 関係グラフ読込
+# 契約に属するユーザ・グループのパーティションを並列に取得する
+##################################
+def load_relation_graph(contract_info, device_relation_table):
+    contract_data = contract_info.get("contract_data", {})
+    pk_list = [f"u-{user_id}" for user_id in contract_data.get("user_list", [])] + [
+        f"g-{group_id}" for group_id in contract_data.get("group_list", [])
+    ]
+    relation_list = []
+    for partition in parallel.map_parallel(
+        lambda pk: _query_relation(pk, device_relation_table), pk_list
+    ):
+        relation_list.extend(partition)
+    logger.debug(
+        f"関係グラフ読込 contract_id={contract_info.get('contract_id')}, パーティション数={len(pk_list)}, 件数={len(relation_list)}"
+    )
+    return RelationGraph(relation_list)
+
+
+##################################
+# 関係グラフ取得
+# contract_info : 契約情報（db.get_contract_infoの戻り値）
+# 契約情報のバージョン（relation_version）がキャッシュ登録時と一致する場合はキャッシュを返す
+##################################
+def get_relation_graph(contract_info, device_relation_table):
+    contract_id = contract_info["contract_id"]
+    version = contract_info.get("relation_version", "")
+    cached = _graph_cache.get(contract_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    graph = load_relation_graph(contract_info, device_relation_table)
+    _graph_cache.put(contract_id, (version, graph))
+    return graph
+
+
+##################################
+# 関係グラフのバージョン更新
+# デバイス関係テーブル・契約情報（ユーザ・グループ一覧）の書き込み後に呼び出す
+# 書き込み自体は完了しているため、更新失敗時はログ出力のみ（キャッシュ有効期間で再読込される）
+##################################
+def update_relation_version(contract_id, contract_table):
+    _graph_cache.invalidate(contract_id)
+    try:
+        contract_table.update_item(
+            Key={"contract_id": contract_id},
+            UpdateExpression="SET #relation_version = :relation_version",
+            ConditionExpression="attribute_exists(contract_id)",
+            ExpressionAttributeNames={"#relation_version": "relation_version"},
+            ExpressionAttributeValues={":relation_version": str(uuid.uuid4())},
+        )
+    except ClientError as e:
+        logger.error(f"関係グラフのバージョン更新エラー contract_id={contract_id}, e={e}")
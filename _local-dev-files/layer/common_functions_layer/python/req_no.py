@@ -0,0 +1,66 @@
+import os
+import re
+import threading
+
+from aws_lambda_powertools import Logger
+
+logger = Logger()
+
+# 一括確保する要求番号の件数（1の場合は呼び出し毎に確保）
+# 2以上の場合はウォームコンテナ内でSIM毎に連番を確保し、使い切るまでDynamoDBに問い合わせない
+# コンテナ間で番号が前後するため、端末側で要求番号の順序を判定しない場合のみ有効化すること
+# コンテナ終了時に未使用の番号は欠番となる
+REQ_NO_BLOCK_SIZE = max(int(os.environ.get("REQ_NO_BLOCK_SIZE", 1)), 1)
+# 要求番号の周期
+REQ_NO_MODULO = 65535
+
+# 確保済みの番号 {SIMID: [次の番号, 確保した最後の番号]}
+_leases = {}
+_lock = threading.Lock()
+
+
+# 要求番号カウンタを増やし、増加後の値を返す
+# レコードが存在しない場合は -1 から加算する（最初の番号は0）
+def _increment(sim_id, table, count):
+    response = table.update_item(
+        Key={"simid": sim_id},
+        UpdateExpression="SET #num = if_not_exists(#num, :start) + :count",
+        ExpressionAttributeNames={"#num": "num"},
+        ExpressionAttributeValues={":start": -1, ":count": count},
+        ReturnValues="UPDATED_NEW",
+    )
+    return int(response["Attributes"]["num"])
+
+
+##################################
+# 要求番号カウンタ採番
+# sim_id : SIMID（ICCID）
+# table : 要求番号カウンタテーブル
+# 戻り値 : カウンタ値（int）
+# 1回のUpdateItemで採番する（レコードがない場合の作成を含む）
+##################################
+def next_count(sim_id, table):
+    if REQ_NO_BLOCK_SIZE == 1:
+        return _increment(sim_id, table, 1)
+
+    with _lock:
+        lease = _leases.get(sim_id)
+        if lease and lease[0] <= lease[1]:
+            count = lease[0]
+            lease[0] += 1
+            return count
+    last = _increment(sim_id, table, REQ_NO_BLOCK_SIZE)
+    logger.debug(f"要求番号確保 sim_id={sim_id}, {last - REQ_NO_BLOCK_SIZE + 1}～{last}")
+    with _lock:
+        _leases[sim_id] = [last - REQ_NO_BLOCK_SIZE + 2, last]
+    return last - REQ_NO_BLOCK_SIZE + 1
+
+
+# 端末要求番号（カウンタ値を16進8桁に変換）
+def to_req_no(count):
+    return re.sub("^0x", "", format(count % REQ_NO_MODULO, "#010x"))
+
+
+# 端末要求番号採番
+def next_req_no(sim_id, table):
+    return to_req_no(next_count(sim_id, table))
@@ -1,36 +1,181 @@
 import os
 import json
+import time
+import threading
 
-import boto3
+from botocore.exceptions import ClientError
+from aws_lambda_powertools import Logger
 
-ssm = boto3.client(
-    "ssm", region_name="ap-northeast-1", endpoint_url=os.environ.get("endpoint_url")
-)
+import cache
+import clients
 
+logger = Logger()
 
-##################################
-# パラメータストアから値を取得
-##################################
-def get_ssm_params(key):
+# パラメータキャッシュの既定の有効期間（秒）
+SSM_CACHE_TTL = int(os.environ.get("SSM_CACHE_TTL", 300))
+# キャッシュの保存先（/tmp配下、未設定時は保存しない）
+# 復号済みの値を保存するため、SecureStringを扱う関数では有効化の要否を確認すること
+SSM_CACHE_FILE = os.environ.get("SSM_CACHE_FILE")
+# GetParametersの最大件数
+GET_PARAMETERS_MAX_NAMES = 10
+# 取得失敗時に期限切れの値で代替するエラー
+STALE_FALLBACK_ERROR_CODES = ("ThrottlingException", "TooManyRequestsException")
+
+# パラメータ名 → 値
+_cache = cache.TTLCache(maxsize=256, ttl=SSM_CACHE_TTL)
+# 最後に取得した値と有効期限（UNIX時間） {パラメータ名: (値, 有効期限)}
+# 保存先への書き込みと、取得失敗時の代替に使用する
+_stored = {}
+_stored_loaded = False
+_lock = threading.Lock()
+
+
+def _client():
+    return clients.get_client(
+        "ssm", region_name="ap-northeast-1", endpoint_url=clients.ENDPOINT_URL
+    )
+
+
+# 保存済みキャッシュの読み込み（初回のみ）
+def _load_stored():
+    global _stored_loaded
+    if _stored_loaded:
+        return
+    _stored_loaded = True
+    if not SSM_CACHE_FILE or not os.path.isfile(SSM_CACHE_FILE):
+        return
+    try:
+        with open(SSM_CACHE_FILE, encoding="utf-8") as f:
+            stored = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"SSMキャッシュ読み込みエラー file={SSM_CACHE_FILE}, e={e}")
+        return
+    now = time.time()
+    for name, (value, expire) in stored.items():
+        _stored[name] = (value, expire)
+        if expire > now:
+            _cache.put(name, value, expire - now)
+
+
+# キャッシュの保存（一時ファイルに書き込んでから置き換える）
+def _save_stored():
+    if not SSM_CACHE_FILE:
+        return
+    tmp_file = f"{SSM_CACHE_FILE}.{os.getpid()}.tmp"
+    try:
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(_stored, f, ensure_ascii=False)
+        os.replace(tmp_file, SSM_CACHE_FILE)
+    except OSError as e:
+        logger.warning(f"SSMキャッシュ保存エラー file={SSM_CACHE_FILE}, e={e}")
+
+
+# SSMから取得（1件はGetParameter、複数件は10件毎にGetParameters）
+def _fetch(names):
+    ssm = _client()
+    if len(names) == 1:
+        response = ssm.get_parameter(Name=names[0], WithDecryption=True)
+        return {names[0]: response["Parameter"]["Value"]}
     result = {}
-    if isinstance(key, tuple) and len(key) > 1:
+    for i in range(0, len(names), GET_PARAMETERS_MAX_NAMES):
         response = ssm.get_parameters(
-            Names=key,
+            Names=names[i : i + GET_PARAMETERS_MAX_NAMES],
             WithDecryption=True,
         )
-
         for p in response["Parameters"]:
             result[p["Name"]] = p["Value"]
-    elif isinstance(key, str):
-        response = ssm.get_parameter(Name=key, WithDecryption=True)
-        result = response["Parameter"]["Value"]
     return result
 
 
 ##################################
-# 初期処理
-# SSMからテーブル名を取得して、モジュールとしてインポート可能にする
+# パラメータ一括取得（キャッシュ付き）
+# names : パラメータ名の一覧
+# ttl(任意) : 取得した値の有効期間（秒）、未指定時はSSM_CACHE_TTL
+# refresh(任意) : Trueの場合はキャッシュを使用せずに取得する
+# 戻り値 : {パラメータ名: 値}（存在しないパラメータは含まない）
+# スロットリング等で取得できない場合、期限切れの値があればその値を返す
+##################################
+def get_parameters(names, ttl=None, refresh=False):
+    names = list(dict.fromkeys(names))
+    with _lock:
+        _load_stored()
+    result = {}
+    if not refresh:
+        for name in names:
+            value = _cache.get(name)
+            if value is not None:
+                result[name] = value
+    missing = [name for name in names if name not in result]
+    if not missing:
+        return result
+
+    try:
+        fetched = _fetch(missing)
+    except ClientError as e:
+        stale = {name: _stored[name][0] for name in missing if name in _stored}
+        if e.response["Error"]["Code"] not in STALE_FALLBACK_ERROR_CODES:
+            raise
+        if len(stale) < len(missing):
+            raise
+        logger.warning(f"SSM取得エラーのため期限切れの値を使用 names={missing}, e={e}")
+        result.update(stale)
+        return result
+
+    ttl = SSM_CACHE_TTL if ttl is None else ttl
+    expire = time.time() + ttl
+    with _lock:
+        for name, value in fetched.items():
+            _cache.put(name, value, ttl)
+            _stored[name] = (value, expire)
+        _save_stored()
+    result.update(fetched)
+    return result
+
+
+# パラメータ取得（キャッシュ付き、存在しない場合はClientError(ParameterNotFound)）
+def get_parameter(name, ttl=None, refresh=False):
+    return get_parameters([name], ttl, refresh)[name]
+
+
+##################################
+# キャッシュ破棄
+# names(任意) : 破棄するパラメータ名の一覧、未指定時は全件
+# 次回の取得時にSSMから再取得する
 ##################################
+def refresh(names=None):
+    with _lock:
+        _load_stored()
+        if names is None:
+            _cache.clear()
+            _stored.clear()
+        else:
+            for name in names:
+                _cache.invalidate(name)
+                _stored.pop(name, None)
+        _save_stored()
+
+
+##################################
+# パラメータストアから値を取得
+# key : パラメータ名（str）の場合は値、パラメータ名のtupleの場合は{パラメータ名: 値}
+##################################
+def get_ssm_params(key):
+    if isinstance(key, tuple):
+        return get_parameters(key)
+    elif isinstance(key, str):
+        return get_parameter(key)
+    return {}
+
+
+##################################
+# テーブル名一覧（ssm.table_names）
+# 初回参照時にSSMからテーブル名を取得する（インポート時には通信しない）
+# 取得後はモジュール属性として保持し、以降の参照では__getattr__を経由しない
+##################################
+_init_lock = threading.Lock()
+
+
 def _init():
     ssm_key_table_name = os.environ.get("SSM_KEY_TABLE_NAME")
     if ssm_key_table_name:
@@ -39,4 +184,11 @@ def _init():
         table_names = json.loads(response)
 
 
-_init()
+def __getattr__(name):
+    if name == "table_names":
+        with _init_lock:
+            if "table_names" not in globals():
+                _init()
+        if "table_names" in globals():
+            return globals()["table_names"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
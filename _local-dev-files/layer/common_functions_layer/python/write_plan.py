@@ -0,0 +1,346 @@
+import json
+import os
+import random
+import time
+
+from botocore.exceptions import ClientError
+from aws_lambda_powertools import Logger
+
+import clients
+import parallel
+
+logger = Logger()
+
+# BatchWriteItemの最大件数
+BATCH_WRITE_MAX_ITEMS = 25
+# TransactWriteItemsの最大件数
+TRANSACT_WRITE_MAX_ITEMS = 100
+# 未処理項目・競合時の再実行回数
+WRITE_PLAN_MAX_RETRY = int(os.environ.get("WRITE_PLAN_MAX_RETRY", 8))
+WRITE_PLAN_BACKOFF_BASE = 0.05
+# 再実行するトランザクションのキャンセル理由（"None"は他の項目の失敗による巻き添え）
+RETRYABLE_CANCELLATION_CODES = ("TransactionConflict", "ThrottlingError", "None")
+
+
+def _client():
+    return clients.get_client(
+        "dynamodb", region_name="ap-northeast-1", endpoint_url=clients.ENDPOINT_URL
+    )
+
+
+def _backoff(retry):
+    time.sleep(WRITE_PLAN_BACKOFF_BASE * (2**retry) * random.uniform(0.5, 1.0))
+
+
+def _operation(item):
+    if len(item) != 1:
+        raise ValueError(f"書き込み項目の形式が不正です item={item}")
+    return next(iter(item))
+
+
+# 条件付きの書き込み（BatchWriteItemは条件を指定できないため1件毎に実行する）
+def _conditional(item):
+    return "ConditionExpression" in item[_operation(item)]
+
+
+# BatchWriteItemで実行する書き込み（条件なしの Put/Delete）
+def _batch_writable(item):
+    return _operation(item) != "Update" and not _conditional(item)
+
+
+# BatchWriteItemの重複判定キー（同一バッチ内の同一キーはValidationExceptionとなるため）
+# key_names : {テーブル名: キー属性名のタプル}
+def _batch_key(item, key_names):
+    operation = _operation(item)
+    params = item[operation]
+    if operation == "Delete":
+        key = params["Key"]
+    else:
+        key = {name: params["Item"][name] for name in key_names[params["TableName"]]}
+    return params["TableName"], json.dumps(key, sort_keys=True)
+
+
+##################################
+# 書き込み計画
+#
+# トランザクション形式の書き込み項目（{"Put": {...}} / {"Delete": {...}} / {"Update": {...}}、
+# 値は convert.dict_dynamo_format 済み）を、実行方法毎に振り分けて実行する
+# - add : 独立した書き込み
+#   Put/Delete は25件毎の BatchWriteItem、Update は UpdateItem で実行する
+#   条件付きの Put/Delete（ConditionExpression指定）は PutItem/DeleteItem で実行する
+# - add_atomic : まとめて成功・失敗させる書き込み（1グループ100件まで）
+#   グループ毎に TransactWriteItems で実行する
+# - then : 以降に追加した書き込みは、それまでの書き込みが全て成功してから実行する
+#   （関係データを先に削除し、本体の削除日時設定を最後に行う 等）
+#
+# 同じ段階の書き込みは parallel で並列実行し、BatchWriteItemの未処理項目・トランザクション競合は
+# 指数バックオフで再実行する
+# いずれかの段階が失敗した場合は以降の段階を実行せず、実行済みの書き込みの補償（compensate）を
+# 実行とは逆の順に1件ずつ実行する
+# 補償できなかった書き込み・未実行の書き込みは補償レコードとしてエラーログに出力する
+#
+# key_names : 条件なしの Put（補償を含む）を行うテーブルのキー属性名 {テーブル名: (パーティションキー, ソートキー)}
+#   同一バッチ内の同一キーの判定に使用する
+#
+# plan = write_plan.WritePlan(key_names={device_relation_table_name: ("key1", "key2")})
+# plan.add(delete_relation, compensate=put_relation)
+# plan.then()
+# plan.add_atomic([update_contract, update_user])
+# result = plan.execute()
+# if not result.ok: ...
+##################################
+class WritePlan:
+    def __init__(self, key_names=None):
+        self._stages = [[]]
+        self._key_names = dict(key_names or {})
+
+    # 条件なしの Put はテーブルのキー属性名が必要
+    def _check_key_names(self, item):
+        if _operation(item) == "Put" and _batch_writable(item):
+            table_name = item["Put"]["TableName"]
+            if table_name not in self._key_names:
+                raise ValueError(f"キー属性名が指定されていないテーブルです table={table_name}")
+
+    # 独立した書き込み
+    # compensate(任意) : 以降の段階が失敗した場合に実行する書き込み項目
+    def add(self, item, compensate=None):
+        if _operation(item) not in ("Put", "Delete", "Update"):
+            raise ValueError(f"独立した書き込みには使用できない項目です item={item}")
+        self._check_key_names(item)
+        if compensate:
+            self._check_key_names(compensate)
+        self._stages[-1].append(_Unit("single", [item], [compensate] if compensate else []))
+        return self
+
+    # まとめて成功・失敗させる書き込み
+    # compensate(任意) : 以降の段階が失敗した場合に実行する書き込み項目の一覧
+    def add_atomic(self, items, compensate=None):
+        items = list(items)
+        if not items:
+            return self
+        if len(items) > TRANSACT_WRITE_MAX_ITEMS:
+            raise ValueError(
+                f"1トランザクションの書き込み項目は{TRANSACT_WRITE_MAX_ITEMS}件までです count={len(items)}"
+            )
+        for item in items:
+            _operation(item)
+        for item in compensate or []:
+            self._check_key_names(item)
+        self._stages[-1].append(_Unit("atomic", items, list(compensate or [])))
+        return self
+
+    # 段階の区切り
+    def then(self):
+        if self._stages[-1]:
+            self._stages.append([])
+        return self
+
+    def __len__(self):
+        return sum(len(unit.items) for stage in self._stages for unit in stage)
+
+    ##################################
+    # 実行
+    # 戻り値 : WriteResult
+    ##################################
+    def execute(self):
+        result = WriteResult()
+        stages = [stage for stage in self._stages if stage]
+        for index, stage in enumerate(stages):
+            applied, failed = _execute_stage(stage, self._key_names)
+            result.applied.extend(applied)
+            if failed:
+                result.failed.extend(failed)
+                for skipped_stage in stages[index + 1 :]:
+                    for unit in skipped_stage:
+                        result.skipped.extend(unit.items)
+                _compensate(result, self._key_names)
+                logger.error({"write_plan_compensation": result.compensation_records()})
+                break
+        logger.info({"write_plan": result.summary()})
+        return result
+
+
+##################################
+# 実行結果
+# ok : 全ての書き込みが成功した場合True
+# applied : 実行済みの書き込み単位（_Unit）
+# failed : [{"items": 書き込み項目一覧, "error": エラー内容}, ...]
+# skipped : 前の段階の失敗により実行しなかった書き込み項目
+# uncompensated : 補償に失敗した書き込み項目
+##################################
+class WriteResult:
+    def __init__(self):
+        self.applied = []
+        self.failed = []
+        self.skipped = []
+        self.compensated = 0
+        self.uncompensated = []
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    # 手動での復旧・再実行に必要な情報
+    def compensation_records(self):
+        return {
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "applied_without_compensation": [
+                item for unit in self.applied if not unit.compensate for item in unit.items
+            ],
+            "uncompensated": self.uncompensated,
+        }
+
+    def summary(self):
+        return {
+            "ok": self.ok,
+            "applied": sum(len(unit.items) for unit in self.applied),
+            "failed": sum(len(failure["items"]) for failure in self.failed),
+            "skipped": len(self.skipped),
+            "compensated": self.compensated,
+            "uncompensated": len(self.uncompensated),
+        }
+
+
+class _Unit:
+    def __init__(self, kind, items, compensate):
+        self.kind = kind
+        self.items = items
+        self.compensate = compensate
+
+
+# 段階内の書き込みを実行方法毎にまとめる
+def _dispatch_units(stage, key_names):
+    tasks = []
+    batch = {}
+    for unit in stage:
+        if unit.kind == "atomic":
+            tasks.append((_transact_write, [unit]))
+        elif not _batch_writable(unit.items[0]):
+            tasks.append((_write_item, [unit]))
+        else:
+            # 同一キーは後から追加したものを優先
+            # 補償は先に追加したものを後に実行し、計画実行前の状態に戻す
+            key = _batch_key(unit.items[0], key_names)
+            previous = batch.pop(key, None)
+            if previous is not None:
+                unit = _Unit(unit.kind, unit.items, unit.compensate + previous.compensate)
+            batch[key] = unit
+    batch_units = list(batch.values())
+    for i in range(0, len(batch_units), BATCH_WRITE_MAX_ITEMS):
+        tasks.append((_batch_write, batch_units[i : i + BATCH_WRITE_MAX_ITEMS]))
+    return tasks
+
+
+##################################
+# 段階の実行
+# 戻り値 : (実行済みの書き込み単位一覧, 失敗一覧)
+##################################
+def _execute_stage(stage, key_names):
+    results = parallel.map_parallel(lambda task: task[0](task[1]), _dispatch_units(stage, key_names))
+    applied = []
+    failed = []
+    for task_applied, task_failed in results:
+        applied.extend(task_applied)
+        failed.extend(task_failed)
+    return applied, failed
+
+
+def _failure(units, e):
+    return {"items": [item for unit in units for item in unit.items], "error": str(e)}
+
+
+def _transact_write(units):
+    unit = units[0]
+    retry = 0
+    while True:
+        try:
+            _client().transact_write_items(TransactItems=unit.items)
+            return [unit], []
+        except ClientError as e:
+            reasons = [
+                reason.get("Code") for reason in e.response.get("CancellationReasons", [])
+            ]
+            retryable = (
+                e.response["Error"]["Code"] == "TransactionCanceledException"
+                and reasons
+                and all(code in RETRYABLE_CANCELLATION_CODES for code in reasons)
+            )
+            if not retryable or retry >= WRITE_PLAN_MAX_RETRY:
+                logger.error(f"トランザクション書き込みエラー reasons={reasons}, e={e}")
+                return [], [_failure(units, e)]
+            _backoff(retry)
+            retry += 1
+        except Exception as e:
+            logger.error(f"トランザクション書き込みエラー e={e}")
+            return [], [_failure(units, e)]
+
+
+def _write_item(units):
+    item = units[0].items[0]
+    operation = _operation(item)
+    write = {
+        "Put": _client().put_item,
+        "Delete": _client().delete_item,
+        "Update": _client().update_item,
+    }[operation]
+    try:
+        write(**item[operation])
+        return units, []
+    except Exception as e:
+        logger.error(f"書き込みエラー operation={operation}, e={e}")
+        return [], [_failure(units, e)]
+
+
+def _write_request(item):
+    if _operation(item) == "Put":
+        return {"PutRequest": {"Item": item["Put"]["Item"]}}
+    return {"DeleteRequest": {"Key": item["Delete"]["Key"]}}
+
+
+def _batch_write(units):
+    pending = [
+        (unit.items[0][_operation(unit.items[0])]["TableName"], _write_request(unit.items[0]), unit)
+        for unit in units
+    ]
+    retry = 0
+    try:
+        while pending:
+            request_items = {}
+            for table_name, request, _ in pending:
+                request_items.setdefault(table_name, []).append(request)
+            response = _client().batch_write_item(RequestItems=request_items)
+            unprocessed = {
+                (table_name, json.dumps(request, sort_keys=True))
+                for table_name, requests in (response.get("UnprocessedItems") or {}).items()
+                for request in requests
+            }
+            pending = [
+                (table_name, request, unit)
+                for table_name, request, unit in pending
+                if (table_name, json.dumps(request, sort_keys=True)) in unprocessed
+            ]
+            if pending:
+                if retry >= WRITE_PLAN_MAX_RETRY:
+                    raise Exception(f"BatchWriteItem未処理項目残存 count={len(pending)}")
+                _backoff(retry)
+                retry += 1
+    except Exception as e:
+        logger.error(f"一括書き込みエラー e={e}")
+        failed_units = [unit for _, _, unit in pending]
+        return [unit for unit in units if unit not in failed_units], [_failure(failed_units, e)]
+    return units, []
+
+
+##################################
+# 補償の実行
+# 実行済みの書き込みの補償項目を、実行とは逆の順に1件ずつ独立した書き込みとして実行する
+# （同じ項目を複数回書き込んだ場合も、最初の書き込み前の状態に戻す）
+##################################
+def _compensate(result, key_names):
+    for unit in reversed(result.applied):
+        for item in unit.compensate:
+            applied, failed = _execute_stage([_Unit("single", [item], [])], key_names)
+            result.compensated += sum(len(applied_unit.items) for applied_unit in applied)
+            for failure in failed:
+                result.uncompensated.extend(failure["items"])
@@ -617,7 +617,8 @@ resource "aws_dynamodb_table" "remote_control" {
   name           = "${var.global_name}-ddb-t-monosec-remote-controls"
   hash_key       = "device_req_no"
   range_key      = "req_datetime"
-  stream_enabled = "false"
+  stream_enabled = "true"
+  stream_view_type = "NEW_AND_OLD_IMAGES"
   table_class    = "STANDARD"
  
   attribute {
@@ -694,6 +695,66 @@ resource "aws_dynamodb_table" "req_no_counter" {
  
 }
  
+#受信電文冪等性管理テーブル
+resource "aws_dynamodb_table" "recv_idempotency" {
+  name           = "${var.global_name}-ddb-t-monosec-recv-idempotency-${var.num}"
+  hash_key       = "simid"
+  range_key      = "message_key"
+  stream_enabled = "false"
+  table_class    = "STANDARD"
+ 
+  attribute {
+    name = "simid"
+    type = "S"
+  }
+ 
+  attribute {
+    name = "message_key"
+    type = "S"
+  }
+ 
+  billing_mode = "PAY_PER_REQUEST"
+ 
+  ttl {
+    attribute_name = "expire_datetime"
+    enabled        = true
+  }
+ 
+  server_side_encryption {
+    enabled = true
+  }
+ 
+  tags = var.tags
+ 
+}
+ 
+#接点出力制御確定管理テーブル
+resource "aws_dynamodb_table" "remote_control_settled" {
+  name           = "${var.global_name}-ddb-t-monosec-remote-control-settled"
+  hash_key       = "device_req_no"
+  stream_enabled = "false"
+  table_class    = "STANDARD"
+ 
+  attribute {
+    name = "device_req_no"
+    type = "S"
+  }
+ 
+  billing_mode = "PAY_PER_REQUEST"
+ 
+  ttl {
+    attribute_name = "expire_datetime"
+    enabled        = true
+  }
+ 
+  server_side_encryption {
+    enabled = true
+  }
+ 
+  tags = var.tags
+ 
+}
+ 
 #連動制御設定管理テーブル
 resource "aws_dynamodb_table" "automations" {
   name           = "${var.global_name}-ddb-t-monosec-automations"
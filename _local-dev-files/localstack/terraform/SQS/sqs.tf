@@ -85,4 +85,57 @@ resource "aws_sqs_queue_redrive_allow_policy" "custom_event_queue_redrive_allow_
     redrivePermission = "byQueue",
     sourceQueueArns   = [aws_sqs_queue.custom_event_queue.arn]
   })
-}
\ No newline at end of file
+}
+
+resource "aws_sqs_queue" "event_notice_queue" {
+  name = "${var.global_name}-sqs-q-monosec-event-notice"
+  message_retention_seconds = 60 * 60 * 24 * 4
+  visibility_timeout_seconds = 335
+  receive_wait_time_seconds = 5
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.event_notice_queue_deadletter.arn
+    maxReceiveCount     = 4
+  })
+  tags      = var.tags
+}
+
+resource "aws_sqs_queue" "event_notice_queue_deadletter" {
+  name = "${var.global_name}-sqs-q-monosec-event-notice-dlq"
+  tags      = var.tags
+}
+
+resource "aws_sqs_queue_redrive_allow_policy" "event_notice_queue_redrive_allow_policy" {
+  queue_url = aws_sqs_queue.event_notice_queue_deadletter.id
+
+  redrive_allow_policy = jsonencode({
+    redrivePermission = "byQueue",
+    sourceQueueArns   = [aws_sqs_queue.event_notice_queue.arn]
+  })
+}
+resource "aws_sqs_queue" "remote_control_timeout_queue" {
+  name = "${var.global_name}-sqs-q-monosec-remote-control-timeout"
+  message_retention_seconds = 60 * 60 * 24 * 4
+  visibility_timeout_seconds = 335
+  receive_wait_time_seconds = 5
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.remote_control_timeout_queue_deadletter.arn
+    maxReceiveCount     = 4
+  })
+  tags      = var.tags
+}
+
+resource "aws_sqs_queue" "remote_control_timeout_queue_deadletter" {
+  name = "${var.global_name}-sqs-q-monosec-remote-control-timeout-dlq"
+  tags      = var.tags
+}
+
+resource "aws_sqs_queue_redrive_allow_policy" "remote_control_timeout_queue_redrive_allow_policy" {
+  queue_url = aws_sqs_queue.remote_control_timeout_queue_deadletter.id
+
+  redrive_allow_policy = jsonencode({
+    redrivePermission = "byQueue",
+    sourceQueueArns   = [aws_sqs_queue.remote_control_timeout_queue.arn]
+  })
+}
@@ -19,6 +19,8 @@ resource "aws_ssm_parameter" "dynamodb_table_name"{
         REMOTE_CONTROL_TABLE = "${var.remote_control_name}"
         DEVICE_RELATION_TABLE = "${var.device_relation_name}"
         REQ_NO_COUNTER_TABLE = "${var.req_no_counter_table}"
+        RECV_IDEMPOTENCY_TABLE = "${var.recv_idempotency_table}"
+        REMOTE_CONTROL_SETTLED_TABLE = "${var.remote_control_settled_table}"
         AUTOMATION_TABLE = "${var.automation_table}"
         ANNOUNCEMENT_TABLE = "${var.announcements_table_name}"
         DEVICE_ANNOUNCEMENT_TABLE = "${var.device_announcements_table_name}"
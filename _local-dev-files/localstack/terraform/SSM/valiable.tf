@@ -19,6 +19,8 @@ variable control_status_name {}
 variable remote_control_name {}
 variable device_relation_name {}
 variable req_no_counter_table {}
+variable recv_idempotency_table {}
+variable remote_control_settled_table {}
 variable soracom_authkey {}
 variable soracom_secret {}
 variable automation_table {}
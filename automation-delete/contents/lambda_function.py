@@ -9,8 +9,10 @@ from aws_xray_sdk.core import patch_all
 
 # layer
 import auth
+import automation_rules
 import convert
 import db
+import relation
 import ssm
 import validate
 
@@ -100,9 +102,9 @@ def lambda_handler(event, context, user_info, trigger_device_id, request_body):
 
         ### 5. デバイス操作権限チェック(ユーザ権限が作業者の場合)
         if user_info["user_type"] == "worker":
-            user_devices = db.get_user_relation_device_id_list(
-                user_info["user_id"], device_relation_table
-            )
+            user_devices = relation.get_relation_graph(
+                contract_info, device_relation_table
+            ).user_device_id_list(user_info["user_id"])
             if (
                 trigger_device_id not in user_devices
                 or automation_info.get("control_device_id") not in user_devices
@@ -138,6 +140,9 @@ def lambda_handler(event, context, user_info, trigger_device_id, request_body):
                 "body": json.dumps(res_body, ensure_ascii=False),
             }
 
+        # 連動制御の設定キャッシュ無効化
+        automation_rules.invalidate()
+
         ### 7. メッセージ応答
         res_body = {"message": ""}
         return {
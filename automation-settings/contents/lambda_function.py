@@ -12,8 +12,10 @@ from botocore.exceptions import ClientError
 
 # layer
 import auth
+import automation_rules
 import convert
 import db
+import relation
 import ddb
 import ssm
 import validate
@@ -131,9 +133,9 @@ def lambda_handler(event, context, user_info, trigger_device_id, request_body):
 
         ### 4. デバイス操作権限チェック(ユーザ権限が作業者の場合)
         if user_info["user_type"] == "worker":
-            user_devices = db.get_user_relation_device_id_list(
-                user_info["user_id"], device_relation_table
-            )
+            user_devices = relation.get_relation_graph(
+                contract_info, device_relation_table
+            ).user_device_id_list(user_info["user_id"])
             if trigger_device_id not in user_devices or control_device_id not in user_devices:
                 res_body = {"message": "デバイス操作権限がありません。"}
                 return {
@@ -204,6 +206,9 @@ def lambda_handler(event, context, user_info, trigger_device_id, request_body):
                     "body": json.dumps(result, ensure_ascii=False),
                 }
 
+        # 連動制御の設定キャッシュ無効化
+        automation_rules.invalidate()
+
         ### 7. 連動制御設定情報取得
         automation_info = ddb.get_automation_info_device(trigger_device_id, automation_table)
         if user_info["user_type"] == "worker":
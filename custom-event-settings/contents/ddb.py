@@ -1,11 +1,9 @@
 from aws_lambda_powertools import Logger
-import boto3
 import db
 import convert
 from boto3.dynamodb.conditions import Key
 from boto3.dynamodb.conditions import Attr
 
-dynamodb = boto3.resource("dynamodb")
 logger = Logger()
 
 
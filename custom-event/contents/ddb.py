@@ -1,12 +1,10 @@
-import json
-import boto3
 import decimal
+import convert
 import db
 from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 from aws_lambda_powertools import Logger
 
-dynamodb = boto3.resource("dynamodb")
 logger = Logger()
 
 
@@ -38,7 +36,7 @@ def get_device_state(device_id, device_state_table):
 # 履歴一覧データ挿入
 def put_cnt_hist_list(db_items, hist_list_table):
     for db_item in db_items:
-        item = json.loads(json.dumps(db_item, default=decimal_to_num), parse_float=decimal.Decimal)
+        item = convert.to_dynamo_item(db_item)
         try:
             hist_list_table.put_item(Item=item)
         except ClientError as e:
@@ -47,7 +45,7 @@ def put_cnt_hist_list(db_items, hist_list_table):
 
 # 通知履歴挿入
 def put_notice_hist(db_item, notification_hist_table):
-    item = json.loads(json.dumps(db_item), parse_float=decimal.Decimal)
+    item = convert.to_dynamo_item(db_item)
     try:
         notification_hist_table.put_item(Item=item)
     except ClientError as e:
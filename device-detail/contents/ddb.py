@@ -1,10 +1,8 @@
 from aws_lambda_powertools import Logger
 import db
-import boto3
 from boto3.dynamodb.conditions import Key
 from boto3.dynamodb.conditions import Attr
 
-dynamodb = boto3.resource("dynamodb")
 logger = Logger()
 
 
@@ -11,6 +11,7 @@ from aws_xray_sdk.core import patch_all
 
 # layer
 import db
+import relation
 import ssm
 import convert
 import auth
@@ -104,9 +105,9 @@ def lambda_handler(event, context, user_info):
             # 4.5 ユーザー権限による絞り込み
             if user_info["user_type"] == "worker" or user_info["user_type"] == "referrer":
                 # ユーザに紐づくデバイスID取得
-                device_id_list = db.get_user_relation_device_id_list(
-                    user_info["user_id"], tables["device_relation_table"]
-                )
+                device_id_list = relation.get_relation_graph(
+                    validate_result["contract_info"], tables["device_relation_table"]
+                ).user_device_id_list(user_info["user_id"])
                 automation_info_list = [
                     automation_info
                     for automation_info in automation_info_list
@@ -8,6 +8,7 @@ from aws_lambda_powertools import Logger
 
 # layer
 import db
+import relation
 
 logger = Logger()
 
@@ -34,7 +35,7 @@ def validate(event, user_info, tables):
     if not operation_auth:
         return {"message": "不正なデバイスIDが指定されています"}
 
-    return {"user_info": user_info, "device_id": device_id}
+    return {"user_info": user_info, "device_id": device_id, "contract_info": contract_info}
 
 
 # 操作権限チェック
@@ -48,9 +49,9 @@ def operation_auth_check(user_info, contract_info, device_id, tables):
 
     if user_type == "worker" or user_type == "referrer":
         # 3.1 ユーザに紐づくデバイスID取得
-        device_id_list = db.get_user_relation_device_id_list(
-            user_id, tables["device_relation_table"]
-        )
+        device_id_list = relation.get_relation_graph(
+            contract_info, tables["device_relation_table"]
+        ).user_device_id_list(user_id)
         if device_id not in set(device_id_list):
             return False
     return True
@@ -1,11 +1,9 @@
 import json
-import boto3
 import decimal
 from boto3.dynamodb.conditions import Key, Attr
 from botocore.exceptions import ClientError
 from aws_lambda_powertools import Logger
 
-dynamodb = boto3.resource("dynamodb")
 logger = Logger()
 
 
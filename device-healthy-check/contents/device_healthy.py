@@ -1,5 +1,4 @@
 import os
-import boto3
 import uuid
 import time
 from aws_lambda_powertools import Logger
@@ -9,8 +8,6 @@ from dateutil import relativedelta
 
 patch_all()
 
-dynamodb = boto3.resource("dynamodb", endpoint_url=os.environ.get("endpoint_url"))
-
 HIST_LIST_TTL = int(os.environ["HIST_LIST_TTL"])
 
 logger = Logger()
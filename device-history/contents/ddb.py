@@ -3,7 +3,6 @@ import json
 from datetime import datetime
 
 from aws_lambda_powertools import Logger
-import boto3
 from boto3.dynamodb.conditions import Key, Attr
 from operator import itemgetter
 from decimal import Decimal
@@ -11,8 +10,6 @@ from dateutil.relativedelta import relativedelta
 
 
 logger = Logger()
-dynamodb = boto3.resource("dynamodb")
-client = boto3.client("dynamodb", region_name="ap-northeast-1")
 PRECISION_THRESHOLD_DISPLAYING_LOCATION_HISTORY = int(os.environ["PRECISION_THRESHOLD_DISPLAYING_LOCATION_HISTORY"])
 
 
@@ -7,6 +7,7 @@ from aws_lambda_powertools import Logger
 
 # layer
 import db
+import relation
 
 logger = Logger()
 
@@ -124,9 +125,9 @@ def validate(event, user, account_table, user_table, contract_table, device_rela
 
     # 権限チェック（作業者）
     if user["user_type"] != "admin" and user["user_type"] != "sub_admin":
-        user_device_list = db.get_user_relation_device_id_list(
-            user["user_id"], device_relation_table
-        )
+        user_device_list = relation.get_relation_graph(
+            contract, device_relation_table
+        ).user_device_id_list(user["user_id"])
         logger.debug(user_device_list)
         for device in params["device_list"]:
             if device["device_id"] not in user_device_list:
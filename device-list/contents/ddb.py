@@ -1,5 +1,3 @@
-import boto3
-import os
 import db
 from boto3.dynamodb.conditions import Key
 from boto3.dynamodb.conditions import Attr
@@ -7,10 +5,6 @@ from operator import itemgetter
 from aws_lambda_powertools import Logger
 
 logger = Logger()
-region_name = os.environ.get("AWS_REGION")
-
-dynamodb = boto3.resource("dynamodb")
-client = boto3.client("dynamodb", region_name=region_name)
 
 
 # デバイス情報取得(契約状態:使用不可以外)
@@ -25,9 +19,9 @@ def get_device_info(pk, table):
 # 登録前デバイス取得
 def get_pre_reg_device_info(pk, table):
     pre_reg_device_list = []
-    response = table.query(
-        IndexName="contract_id_index", KeyConditionExpression=Key("contract_id").eq(pk)
-    ).get("Items", [])
+    response = db.iter_query(
+        table, IndexName="contract_id_index", KeyConditionExpression=Key("contract_id").eq(pk)
+    )
     for items in response:
         # レスポンス生成(未登録デバイス)
         items = db.insert_id_key_in_device_info(items)
@@ -43,36 +37,13 @@ def get_pre_reg_device_info(pk, table):
     # return sorted(pre_reg_device_list, key=itemgetter('dev_reg_datetime'))
     return pre_reg_device_list
 
-def get_device_info_by_contract_id(pk,table):
-
-    dev_info_list = []
-    start_key = None
-    done = True
-    
-    while done:
-        
-        if start_key:
-            response = table.query(
-                IndexName = "contract_id_index",
-                KeyConditionExpression=Key("contract_id").eq(pk),
-                FilterExpression=Attr("contract_state").ne(2),
-                Limit = 220,
-                ExclusiveStartKey = start_key
-            )
-        else:
-            response = table.query(
-                IndexName = "contract_id_index",
-                KeyConditionExpression=Key("contract_id").eq(pk),
-                FilterExpression=Attr("contract_state").ne(2),
-                Limit = 220
-            )
-
-        #logger.info(f"レスポンス:{response["Items"]}")
-            
-        dev_info_list.extend(response["Items"])
-        start_key = response.get('LastEvaluatedKey', None)
-            
-        if start_key == None:
-             break
-        
-    return dev_info_list
+# fields(任意) : 取得する属性のパス一覧（db.projection_args参照）
+def get_device_info_by_contract_id(pk, table, fields=None):
+    projection = db.projection_args(list(db.DEVICE_KEY_FIELDS) + list(fields)) if fields else {}
+    return db.query_all(
+        table,
+        IndexName="contract_id_index",
+        KeyConditionExpression=Key("contract_id").eq(pk),
+        FilterExpression=Attr("contract_state").ne(2),
+        **projection,
+    )
@@ -13,6 +13,7 @@ from functools import reduce
 # layer
 import auth
 import db
+import relation
 import ssm
 import convert
 
@@ -24,6 +25,14 @@ region_name = os.environ.get("AWS_REGION")
 
 logger = Logger()
 
+# 一覧表示・キーワード検索に必要なデバイス情報の属性
+DEVICE_LIST_FIELDS = [
+    "device_code",
+    "device_data.config.device_name",
+    "device_data.config.terminal_settings",
+    "device_data.param.device_code",
+]
+
 
 @auth.verify_login_user()
 def lambda_handler(event, context, user_info):
@@ -72,19 +81,19 @@ def lambda_handler(event, context, user_info):
 
         logger.info(f"権限:{user_type}")
         device_id_list = []
+        contract_info = db.get_contract_info(contract_id, tables["contract_table"])
+        if not contract_info:
+            res_body = {"message": "契約情報が存在しません。"}
+            return {
+                "statusCode": 500,
+                "headers": res_headers,
+                "body": json.dumps(res_body, ensure_ascii=False),
+            }
         ##################
         # 3 デバイスID一覧取得(権限が管理者・副管理者の場合)
         ##################
         if user_type == "admin" or user_type == "sub_admin":
             # 3.1 デバイスID一覧取得
-            contract_info = db.get_contract_info(contract_id, tables["contract_table"])
-            if not contract_info:
-                res_body = {"message": "契約情報が存在しません。"}
-                return {
-                    "statusCode": 500,
-                    "headers": res_headers,
-                    "body": json.dumps(res_body, ensure_ascii=False),
-                }
             device_id_list = contract_info.get("contract_data", {}).get("device_list", [])
 
         ##################
@@ -92,9 +101,9 @@ def lambda_handler(event, context, user_info):
         ##################
         elif user_type == "worker" or user_type == "referrer":
             # 2.1 適用デバイスID、グループID一覧取得
-            device_id_list = db.get_user_relation_device_id_list(
-                user_id, tables["device_relation_table"]
-            )
+            device_id_list = relation.get_relation_graph(
+                contract_info, tables["device_relation_table"]
+            ).user_device_id_list(user_id)
         else:
             res_body = {"message": "不正なユーザです。"}
             return {
@@ -130,10 +139,9 @@ def lambda_handler(event, context, user_info):
             [],
             [],
         )  # デバイスID毎のグループID一覧、重複のないグループID一覧
+        relation_graph = relation.get_relation_graph(contract_info, tables["device_relation_table"])
         for device_id in device_id_list:
-            group_id_list = db.get_device_relation_group_id_list(
-                device_id, tables["device_relation_table"]
-            )
+            group_id_list = relation_graph.device_group_id_list(device_id)
             device_group_relation.append({"device_id": device_id, "group_list": group_id_list})
             all_groups += group_id_list
         all_groups = set(all_groups)
@@ -141,13 +149,11 @@ def lambda_handler(event, context, user_info):
         logger.info(f"重複のないグループID一覧:{all_groups}")
 
         # グループ情報取得
-        group_info_list = []
-        for item in all_groups:
-            group_info = db.get_group_info(item, tables["group_table"])
-            if group_info:
-                group_info_list.append(group_info)
-            else:
-                logger.info(f"group information does not exist:{item}")
+        group_info_list = db.get_group_info_many(
+            all_groups, tables["group_table"], db.GROUP_NAME_FIELDS
+        )
+        for item in all_groups - {group_info["group_id"] for group_info in group_info_list}:
+            logger.info(f"group information does not exist:{item}")
         logger.info(f"グループ情報:{group_info_list}")
         if group_info_list:
             group_info_list = sorted(
@@ -159,7 +165,9 @@ def lambda_handler(event, context, user_info):
         ##################
         order = 1
         device_list, device_info_list, device_info_list_order, pre_reg_device_list_sorted = [], [], [], []
-        device_info_list = ddb.get_device_info_by_contract_id(contract_id,tables["device_table"])
+        device_info_list = ddb.get_device_info_by_contract_id(
+            contract_id, tables["device_table"], DEVICE_LIST_FIELDS
+        )
         device_info_list = db.insert_id_key_in_device_info_list(device_info_list)
 
         for device_item in device_order:
@@ -224,8 +232,9 @@ def lambda_handler(event, context, user_info):
                 pre_register_device_group_relation.append({"device_id": pre_device_id, "group_list": pre_device_group_id_list})
                 
                 unregistered_device_group_name_list = []
-                for pre_device_group_id in pre_device_group_id_list:
-                    unregistered_device_group_info = db.get_group_info(pre_device_group_id, tables["group_table"])
+                for unregistered_device_group_info in db.get_group_info_many(
+                    pre_device_group_id_list, tables["group_table"], db.GROUP_NAME_FIELDS
+                ):
                     unregistered_device_group_name_list.append(unregistered_device_group_info.get("group_data").get("config").get("group_name"))
                 
                 pre_reg_device_info["group_name_list"] = unregistered_device_group_name_list
@@ -251,6 +260,13 @@ def lambda_handler(event, context, user_info):
                 device_number = len(device_info_list_order_filtered)
                 device_info_list_order_filtered = device_info_list_order_filtered[start_num - 1:device_get_number]
         
+        # デバイス現状態一括取得
+        device_state_list = db.get_device_state_many(
+            [device_info["device_id"] for device_info in device_info_list_order_filtered if device_info],
+            tables["device_state_table"],
+        )
+        device_state_dict = {device_state["device_id"]: device_state for device_state in device_state_list}
+
         for device_info in device_info_list_order_filtered:
             logger.info(f"device_info_list_order_filtered:{device_info_list_order_filtered}")
             group_name_list = []
@@ -290,7 +306,7 @@ def lambda_handler(event, context, user_info):
             logger.info(f"グループ名:{group_name_list}")
             # デバイス現状態取得
             logger.info(f"device_info_dev_id:{device_info["device_id"]}")
-            device_state = db.get_device_state(device_info["device_id"], tables["device_state_table"])
+            device_state = device_state_dict.get(device_info["device_id"], {})
             if not device_state:
                 logger.info(f"device current status information does not exist:{device_info["device_id"]}")
 
@@ -13,6 +13,7 @@ import auth
 import convert
 import db
 import ddb
+import relation
 import ssm
 import validate
 
@@ -319,6 +320,9 @@ def lambda_handler(event, context, user_info, request_body):
                 "body": json.dumps(res_body, ensure_ascii=False),
             }
 
+        # デバイス関係グラフのキャッシュ無効化
+        relation.update_relation_version(contract_id, contract_table)
+
         ### 6. メッセージ応答
         res_body = {"message": ""}
         return {
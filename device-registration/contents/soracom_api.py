@@ -1,3 +1,4 @@
+import os
 import json
 import urllib
 
@@ -11,14 +12,20 @@ logger = Logger()
 
 SORACOM_ENDPOINT = "https://api.soracom.io/v1"
 SORACOM_G_ENDPOINT = "https://g.api.soracom.io/v1"
+# 認証キーのキャッシュ有効期間（秒）
+SORACOM_KEY_CACHE_TTL = int(os.environ.get("SORACOM_KEY_CACHE_TTL", 900))
 
 
 def get_soracom_token(operator_table):
     # 1. ソラコム接続用のキー取得
     soracom_info = ddb.get_opid_info(operator_table)
+    # 認証キーID・認証キーは1回のGetParametersで取得（キャッシュ有効期間内は再取得しない）
+    params = ssm.get_parameters(
+        [soracom_info["auth_key"], soracom_info["secret"]], ttl=SORACOM_KEY_CACHE_TTL
+    )
     data = {
-        "authKeyId": ssm.get_ssm_params(soracom_info["auth_key"]),
-        "authKey": ssm.get_ssm_params(soracom_info["secret"]),
+        "authKeyId": params[soracom_info["auth_key"]],
+        "authKey": params[soracom_info["secret"]],
     }
     # 2. 認証処理
     req = urllib.request.Request(
@@ -13,6 +13,7 @@ import auth
 import convert
 import db
 import ddb
+import relation
 import ssm
 import validate
 
@@ -47,6 +48,7 @@ def lambda_handler(event, context, user_info, request_body):
         device_table = dynamodb.Table(ssm.table_names["DEVICE_TABLE"])
         device_announcement_table = dynamodb.Table(ssm.table_names["DEVICE_ANNOUNCEMENT_TABLE"])
         device_relation_table = dynamodb.Table(ssm.table_names["DEVICE_RELATION_TABLE"])
+        contract_table = dynamodb.Table(ssm.table_names["CONTRACT_TABLE"])
 
         ### 1. 入力情報チェック
         # ユーザー権限確認
@@ -326,6 +328,9 @@ def lambda_handler(event, context, user_info, request_body):
                 "body": json.dumps(res_body, ensure_ascii=False),
             }
 
+        # デバイス関係グラフのキャッシュ無効化
+        relation.update_relation_version(user_info["contract_id"], contract_table)
+
         ### 7. メッセージ応答
         res_body = {"message": ""}
         return {
@@ -2,14 +2,12 @@ from decimal import Decimal
 import db
 
 from aws_lambda_powertools import Logger
-import boto3
 from boto3.dynamodb.conditions import Key
 from boto3.dynamodb.conditions import Attr
 from botocore.exceptions import ClientError
 
 
 logger = Logger()
-dynamodb = boto3.resource("dynamodb")
 
 
 # デバイス情報取得(契約状態:使用不可以外)
@@ -69,6 +69,8 @@ def lambda_handler(event, context, user_info):
         identification_id = imei if imei else sigfox_id
         try:
             ddb.update_device_settings(device_id, identification_id, convert_param, tables["device_table"])
+            # 受信処理のデバイス情報キャッシュ無効化
+            db.update_device_config_version(device_id, tables["device_state_table"])
         except ClientError as e:
             logger.info(f"デバイス設定更新エラー e={e}")
             res_body = {"message": "デバイス設定の更新に失敗しました。"}
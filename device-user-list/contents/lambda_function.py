@@ -8,6 +8,7 @@ from functools import reduce
 
 import auth
 import db
+import relation
 import ssm
 
 patch_all()
@@ -80,7 +81,9 @@ def lambda_handler(event, context, user):
         user_list = []
         admin_user_id_list = db.get_admin_user_id_list(user.get("contract_id"), user_table)
         logger.debug(f"admin_user_id_list: {admin_user_id_list}")
-        worker_user_id_list = db.get_device_relation_user_id_list(device_id, device_relation_table)
+        worker_user_id_list = relation.get_relation_graph(
+            contract, device_relation_table
+        ).device_user_id_list(device_id)
         logger.debug(f"worker_user_id_list: {worker_user_id_list}")
         user_id_list = admin_user_id_list + worker_user_id_list
         logger.debug(f"user_id_list: {user_id_list}")
@@ -4,12 +4,10 @@ import db
 import time
 
 from aws_lambda_powertools import Logger
-import boto3
 from boto3.dynamodb.conditions import Key
 from boto3.dynamodb.conditions import Attr
 
 logger = Logger()
-dynamodb = boto3.resource("dynamodb")
 
 
 # デバイス情報取得(契約状態:使用不可以外)
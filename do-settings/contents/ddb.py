@@ -1,12 +1,11 @@
 from aws_lambda_powertools import Logger
-import boto3
 from boto3.dynamodb.conditions import Key
 from boto3.dynamodb.conditions import Attr
 
+import automation_rules
 import db
 
 logger = Logger()
-dynamodb = boto3.resource("dynamodb")
 
 
 # デバイス設定更新
@@ -57,6 +56,7 @@ def update_device_settings(device_id, params, device_table, automation_table):
     )
 
     if update_control_list:
+        automation_deleted = False
         for do_no in update_control_list:
             # コントロール設定が変更されている場合は対象のオートメーション設定クリア
             automation_list = automation_table.query(
@@ -68,5 +68,9 @@ def update_device_settings(device_id, params, device_table, automation_table):
                     automation_table.delete_item(
                         Key={"automation_id": automation.get("automation_id")}
                     )
+                    automation_deleted = True
+        # 連動制御の設定キャッシュ無効化
+        if automation_deleted:
+            automation_rules.invalidate()
 
     return
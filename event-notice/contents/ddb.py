@@ -0,0 +1,76 @@
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from aws_lambda_powertools import Logger
+
+import convert
+
+logger = Logger()
+
+
+# 通知履歴挿入
+def put_notice_hist(db_item, notification_hist_table):
+    item = convert.to_dynamo_item(db_item)
+    try:
+        notification_hist_table.put_item(Item=item)
+    except ClientError as e:
+        logger.debug(f"put_notice_histエラー e={e}")
+
+
+# 履歴一覧のイベント通知進捗取得
+# 再送されたイベント通知で処理済みの段階（メール通知・連動制御）を省略するため、履歴毎の進捗を返す
+# 戻り値 : {hist_id: notice_state}
+def get_hist_list_notice_state(hist_list, hist_list_table):
+    notice_state = {}
+    for hist in hist_list:
+        item = hist_list_table.get_item(
+            Key={"device_id": hist["device_id"], "hist_id": hist["hist_id"]},
+            ProjectionExpression="#notice_state",
+            ExpressionAttributeNames={"#notice_state": "notice_state"},
+            ConsistentRead=True,
+        ).get("Item")
+        if item and "notice_state" in item:
+            notice_state[hist["hist_id"]] = item["notice_state"]
+    return notice_state
+
+
+# 履歴一覧のイベント通知進捗更新
+# 受信処理で登録済みの履歴一覧に、処理済みの段階とメール通知後の通知履歴IDを追記する
+def update_hist_list_notice_state(hist, notice_state, hist_list_table):
+    update_expression = "SET #notice_state = :notice_state"
+    attribute_names = {"#notice_state": "notice_state", "#hist_id": "hist_id"}
+    attribute_values = {":notice_state": notice_state}
+    notification_hist_id = hist.get("hist_data", {}).get("notification_hist_id")
+    if notification_hist_id:
+        update_expression += ", #hist_data.#notification_hist_id = :notification_hist_id"
+        attribute_names["#hist_data"] = "hist_data"
+        attribute_names["#notification_hist_id"] = "notification_hist_id"
+        attribute_values[":notification_hist_id"] = notification_hist_id
+    try:
+        hist_list_table.update_item(
+            Key={"device_id": hist["device_id"], "hist_id": hist["hist_id"]},
+            UpdateExpression=update_expression,
+            ConditionExpression="attribute_exists(#hist_id)",
+            ExpressionAttributeNames=attribute_names,
+            ExpressionAttributeValues=attribute_values,
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            # TTL等で削除済みの履歴は更新しない
+            logger.info(f"履歴一覧未登録 hist_id={hist['hist_id']}")
+            return
+        raise
+
+
+def get_notice_mailaddress(user_id_list, user_table, account_table):
+    mailaddress_list = []
+    for item in user_id_list:
+        users_table_res = user_table.query(
+            KeyConditionExpression=Key("user_id").eq(item),
+        ).get("Items", [])
+        for items in users_table_res:
+            account_id = items["account_id"]
+            account_info = account_table.query(
+                KeyConditionExpression=Key("account_id").eq(account_id)
+            ).get("Items", [])
+            mailaddress_list.append(account_info[0]["email_address"])
+    return mailaddress_list
@@ -0,0 +1,95 @@
+import os
+import clients
+import ddb
+import json
+import traceback
+from mail_notice import mailNotice
+from automation_trigger import automationTrigger
+from aws_lambda_powertools import Logger
+from aws_xray_sdk.core import patch_all
+
+patch_all()
+
+SSM_KEY_TABLE_NAME = os.environ["SSM_KEY_TABLE_NAME"]
+
+# 履歴一覧のイベント通知進捗（メール通知済み → 連動制御済み）
+NOTICE_STATE_MAIL = "mail"
+NOTICE_STATE_AUTOMATION = "automation"
+
+logger = Logger()
+
+
+###################################
+# イベント通知処理（メール通知・連動制御）
+#
+# 受信処理で登録済みの履歴一覧を受け取り、メール通知・連動制御を行う
+# SQSメッセージ : {"event_trigger", "device_info", "hist_list"}
+# 履歴毎に処理済みの段階を履歴一覧へ記録し、再送時は未処理の段階のみ実行する
+###################################
+def lambda_handler(event, context):
+    logger.debug(f"lambda_handler開始 件数={len(event.get('Records', []))}")
+
+    try:
+        # DynamoDB操作オブジェクト生成
+        try:
+            hist_list_table = clients.get_table("HIST_LIST_TABLE")
+            notification_hist_table = clients.get_table("NOTIFICATION_HIST_TABLE")
+            user_table = clients.get_table("USER_TABLE")
+            account_table = clients.get_table("ACCOUNT_TABLE")
+        except KeyError as e:
+            logger.error("KeyError")
+            logger.error(traceback.format_exc())
+            raise
+
+        failure_message_id_list = []
+        for record in event["Records"]:
+            message_id = record["messageId"]
+            try:
+                payload = json.loads(record["body"])
+            except ValueError as e:
+                # 形式不正のレコードは再送しても処理できないため破棄
+                logger.error(f"イベント通知形式エラー message_id={message_id}, e={e}")
+                continue
+
+            event_trigger = payload.get("event_trigger")
+            device_info = payload.get("device_info", {})
+            hist_list = payload.get("hist_list", [])
+            logger.debug(
+                f"event_trigger={event_trigger}, device_id={device_info.get('device_id')}, 件数={len(hist_list)}"
+            )
+
+            try:
+                # 処理済みの段階
+                # 受信処理の再送で同じ履歴のイベント通知が新しいメッセージとして届く場合があるため、
+                # 配信回数によらず履歴一覧の通知進捗を確認する
+                notice_state = ddb.get_hist_list_notice_state(hist_list, hist_list_table)
+
+                for hist in hist_list:
+                    state = notice_state.get(hist["hist_id"])
+                    if state is None:
+                        # メール通知
+                        hist = mailNotice(
+                            [hist], device_info, user_table, account_table, notification_hist_table
+                        )[0]
+                        ddb.update_hist_list_notice_state(hist, NOTICE_STATE_MAIL, hist_list_table)
+                        state = NOTICE_STATE_MAIL
+                    if state == NOTICE_STATE_MAIL:
+                        # 連動制御呼び出し
+                        automationTrigger([hist], device_info)
+                        ddb.update_hist_list_notice_state(hist, NOTICE_STATE_AUTOMATION, hist_list_table)
+            except Exception as e:
+                logger.error(f"イベント通知処理エラー message_id={message_id}, e={e}")
+                logger.error(traceback.format_exc())
+                failure_message_id_list.append(message_id)
+
+        logger.debug(f"lambda_handler正常終了 failure={len(failure_message_id_list)}")
+        return {
+            "batchItemFailures": [
+                {"itemIdentifier": message_id} for message_id in failure_message_id_list
+            ]
+        }
+
+    except Exception as e:
+        logger.error(e)
+        logger.error(traceback.format_exc())
+        raise
@@ -1,16 +1,19 @@
 import time
 
 from aws_lambda_powertools import Logger
-import boto3
 from boto3.dynamodb.conditions import Key
 
 import db
+import parallel
+import relation
 import convert
+import write_plan
 
-dynamodb = boto3.resource("dynamodb")
-client = boto3.client("dynamodb", region_name="ap-northeast-1")
 logger = Logger()
 
+# 通知先の更新に必要なデバイス情報の属性
+NOTIFICATION_TARGET_FIELDS = ("device_data.config.notification_target_list",)
+
 
 def delete_group_info(
     group_id,
@@ -22,8 +25,11 @@ def delete_group_info(
     device_relation_table_name,
     device_table_name,
 ):
-    # トランザクション書き込み用オブジェクト
-    transact_items = []
+    # 書き込み計画
+    # 通知先・関係データを先に更新し、全て成功した場合のみ契約・グループの削除を行う
+    # （失敗した場合は削除済みの関係データ・通知先を元に戻す）
+    plan = write_plan.WritePlan(key_names={device_relation_table_name: ("key1", "key2")})
+    group_delete_items = []
     # テーブル更新用キー
     group_data_attr = "group_data"
     config_attr = "config"
@@ -55,23 +61,33 @@ def delete_group_info(
             "ExpressionAttributeNames": contract_expression_attribute_name,
         }
     }
-    transact_items.append(update_contract)
+    group_delete_items.append(update_contract)
 
     #################################################
     # デバイス管理テーブル（通知先設定）
     #################################################
-    relation_device_id_list = db.get_group_relation_device_id_list(group_id, device_relation_table)
-    relation_user_id_list = db.get_group_relation_user_id_list(group_id, device_relation_table)
-    for device_id in relation_device_id_list:
+    relation_graph = relation.get_relation_graph(contract, device_relation_table)
+    relation_device_id_list = relation_graph.group_device_id_list(group_id)
+    relation_user_id_list = relation_graph.group_user_id_list(group_id)
+    # デバイス情報は通知先のみ並列取得
+    device_info_list = parallel.map_parallel(
+        lambda device_id: db.get_device_info_other_than_unavailable(
+            device_id, device_table, fields=NOTIFICATION_TARGET_FIELDS
+        ),
+        relation_device_id_list,
+    )
+    for device_id, device_info in zip(relation_device_id_list, device_info_list):
+        if not device_info:
+            continue
         remove_user_id_list = []
-        device_info = db.get_device_info_other_than_unavailable(device_id, device_table)
         notification_target_list = device_info.get('device_data', {}).get('config', {}).get('notification_target_list', [])
         user_id_list = list(set(relation_user_id_list) & set(notification_target_list))
         for user_id in user_id_list:
-            device_id_list_old = db.get_user_relation_duplication_device_id_list(user_id, device_relation_table)
+            device_id_list_old = relation_graph.user_duplication_device_id_list(user_id)
             if device_id_list_old.count(device_id) <= 1:
                 remove_user_id_list.append(user_id)
         if remove_user_id_list:
+            notification_target_list_old = notification_target_list
             notification_target_list = list(set(notification_target_list) - set(remove_user_id_list))
             device_update_expression = f"SET #device_data.#config.#notification_target_list = :notification_target_list"
             device_expression_attribute_values = {
@@ -98,7 +114,15 @@ def delete_group_info(
                     "ExpressionAttributeNames": device_expression_attribute_name,
                 }
             }
-            transact_items.append(update_device)
+            restore_device = {
+                "Update": {
+                    **update_device["Update"],
+                    "ExpressionAttributeValues": convert.dict_dynamo_format(
+                        {":notification_target_list": notification_target_list_old}
+                    ),
+                }
+            }
+            plan.add(update_device, compensate=restore_device)
 
     #################################################
     # デバイス関係テーブル削除用オブジェクト作成
@@ -117,8 +141,8 @@ def delete_group_info(
                 },
             }
         }
-        transact_items.append(remove_relation)
-        
+        plan.add(remove_relation, compensate=_restore_relation(device_relation_table_name, device_relation))
+
     # グループから削除された登録前デバイス
     unregistered_device_list = db.get_device_relation(
         "g-" + group_id, device_relation_table, sk_prefix="pd-"
@@ -133,7 +157,10 @@ def delete_group_info(
                 },
             }
         }
-        transact_items.append(remove_unregistered_device)
+        plan.add(
+            remove_unregistered_device,
+            compensate=_restore_relation(device_relation_table_name, remove_unregistered_device_list),
+        )
 
     user_relation_list = db.get_device_relation(
         "g-" + group_id, device_relation_table, sk_prefix="u-", gsi_name="key2_index"
@@ -149,7 +176,7 @@ def delete_group_info(
                 },
             }
         }
-        transact_items.append(remove_relation)
+        plan.add(remove_relation, compensate=_restore_relation(device_relation_table_name, user_relation))
 
     #################################################
     # グループテーブル更新用オブジェクト作成
@@ -174,17 +201,21 @@ def delete_group_info(
             "ExpressionAttributeNames": group_expression_attribute_name,
         }
     }
-    transact_items.append(update_group)
+    group_delete_items.append(update_group)
 
     #################################################
     # DB書き込みトランザクション実行
     #################################################
-    if len(transact_items) > 100:
-        transact_items_list = [transact_items[i:i+100] for i in range(0, len(transact_items), 100)]
-    else:
-        transact_items_list = [transact_items]
+    plan.then()
+    plan.add_atomic(group_delete_items)
+    return plan.execute()
 
-    for transact_item in transact_items_list:
-        transact_result = db.execute_transact_write_item(transact_item)
 
-    return transact_result
+# 削除したデバイス関係の復元用オブジェクト
+def _restore_relation(device_relation_table_name, device_relation):
+    return {
+        "Put": {
+            "TableName": device_relation_table_name,
+            "Item": convert.dict_dynamo_format(device_relation),
+        }
+    }
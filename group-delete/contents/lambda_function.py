@@ -8,6 +8,7 @@ from aws_xray_sdk.core import patch_all
 
 import auth
 import ssm
+import relation
 import convert
 import validate
 import ddb
@@ -51,7 +52,7 @@ def lambda_handler(event, context, user_info):
             }
 
         # グループ削除
-        transact_result = ddb.delete_group_info(
+        write_result = ddb.delete_group_info(
             validate_result["request_params"]["group_id"],
             validate_result["contract_info"],
             device_relation_table,
@@ -62,7 +63,9 @@ def lambda_handler(event, context, user_info):
             ssm.table_names["DEVICE_TABLE"],
         )
 
-        if not transact_result:
+        if not write_result.ok:
+            # 一部の更新が実行済みの場合があるためキャッシュは無効化する
+            relation.update_relation_version(user_info["contract_id"], contract_table)
             res_body = {"message": "グループの削除に失敗しました。"}
             return {
                 "statusCode": 500,
@@ -72,6 +75,9 @@ def lambda_handler(event, context, user_info):
                 ),
             }
 
+        # デバイス関係グラフのキャッシュ無効化
+        relation.update_relation_version(user_info["contract_id"], contract_table)
+
         return {
             "statusCode": 204,
             "headers": res_headers,
@@ -95,8 +95,15 @@ def lambda_handler(event, context, user):
                 }
             logger.info(f"グループID:{group_id_list}")
 
+            # グループ情報一括取得
+            group_info_dict = {
+                group_info["group_id"]: group_info
+                for group_info in db.get_group_info_many(
+                    group_id_list, group_table, db.GROUP_NAME_FIELDS
+                )
+            }
             for group_id in group_id_list:
-                group_info = db.get_group_info(group_id, group_table)
+                group_info = group_info_dict.get(group_id, {})
                 unregistered_device_id_list = db.get_group_relation_pre_register_device_id_list(group_id, device_relation_table)
                 if len(unregistered_device_id_list) >= 1:
                     unregistered_device_flag = 1
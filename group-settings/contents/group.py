@@ -4,6 +4,7 @@ from aws_lambda_powertools import Logger
 
 import db
 import convert
+import relation
 
 
 logger = Logger()
@@ -125,6 +126,7 @@ def create_group_info(
 def update_group_info(
     group_info,
     group_id,
+    contract,
     device_relation_table,
     device_table,
     group_table_name,
@@ -252,14 +254,15 @@ def update_group_info(
     #################################################
     # デバイス管理テーブル（通知先設定）
     #################################################
+    relation_graph = relation.get_relation_graph(contract, device_relation_table)
+    relation_user_id_list = relation_graph.group_user_id_list(group_id)
     for remove_device_id in removed_devices:
         remove_user_id_list = []
-        relation_user_id_list = db.get_group_relation_user_id_list(group_id, device_relation_table)
         device_info = db.get_device_info_other_than_unavailable(remove_device_id, device_table)
         notification_target_list = device_info.get('device_data', {}).get('config', {}).get('notification_target_list', [])
         user_id_list = list(set(relation_user_id_list) & set(notification_target_list))
         for user_id in user_id_list:
-            device_id_list_old = db.get_user_relation_duplication_device_id_list(user_id, device_relation_table)
+            device_id_list_old = relation_graph.user_duplication_device_id_list(user_id)
             if device_id_list_old.count(remove_device_id) <= 1:
                 remove_user_id_list.append(user_id)
         if remove_user_id_list:
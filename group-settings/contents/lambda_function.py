@@ -11,6 +11,7 @@ from aws_xray_sdk.core import patch_all
 import auth
 import convert
 import db
+import relation
 import validate
 import group
 
@@ -36,6 +37,7 @@ def lambda_handler(event, context, user_info):
             contract_table = dynamodb.Table(ssm.table_names["CONTRACT_TABLE"])
             device_relation_table = dynamodb.Table(ssm.table_names["DEVICE_RELATION_TABLE"])
             pre_register_table = dynamodb.Table(ssm.table_names["PRE_REGISTER_DEVICE_TABLE"])
+            state_table = dynamodb.Table(ssm.table_names["STATE_TABLE"])
         except KeyError as e:
             body = {"message": e}
             return {
@@ -56,6 +58,9 @@ def lambda_handler(event, context, user_info):
 
         logger.info(event["httpMethod"])
 
+        # 更新前の所属デバイス（グループから外れたデバイスのキャッシュ無効化用）
+        pre_device_id_list = []
+
         # グループ新規登録
         if event["httpMethod"] == "POST":
             result = group.create_group_info(
@@ -68,9 +73,11 @@ def lambda_handler(event, context, user_info):
         # グループ更新
         elif event["httpMethod"] == "PUT":
             group_id = event["pathParameters"]["group_id"]
+            pre_device_id_list = db.get_group_relation_device_id_list(group_id, device_relation_table)
             result = group.update_group_info(
                 group_info,
                 group_id,
+                validate_result["contract_info"],
                 device_relation_table,
                 device_table,
                 ssm.table_names["GROUP_TABLE"],
@@ -88,10 +95,18 @@ def lambda_handler(event, context, user_info):
                 ),
             }
 
+        # デバイス関係グラフのキャッシュ無効化
+        relation.update_relation_version(user_info["contract_id"], contract_table)
+
         group_info = db.get_group_info(result[1], group_table)
         device_id_list = db.get_group_relation_device_id_list(result[1], device_relation_table)
         logger.info(result[1])
         logger.info(device_id_list)
+
+        # 受信処理のデバイス情報キャッシュ無効化（グループ名・所属の変更）
+        for device_id in set(pre_device_id_list) | set(device_id_list):
+            db.update_device_config_version(device_id, state_table)
+
         device_list = []
         for device_id in device_id_list:
             logger.info(device_id)
@@ -1,3 +1,4 @@
+import os
 import json
 import ssm
 import urllib.request
@@ -5,11 +6,18 @@ from aws_lambda_powertools import Logger
 
 logger = Logger()
 
+# 認証キーのキャッシュ有効期間（秒）
+SORACOM_KEY_CACHE_TTL = int(os.environ.get("SORACOM_KEY_CACHE_TTL", 900))
+
 
 def get_token(coverage_url, soracom_info):
+    # 認証キーID・認証キーは1回のGetParametersで取得（キャッシュ有効期間内は再取得しない）
+    params = ssm.get_parameters(
+        [soracom_info["auth_key"], soracom_info["secret"]], ttl=SORACOM_KEY_CACHE_TTL
+    )
     data = {
-        "authKeyId": ssm.get_ssm_params(soracom_info["auth_key"]),
-        "authKey": ssm.get_ssm_params(soracom_info["secret"]),
+        "authKeyId": params[soracom_info["auth_key"]],
+        "authKey": params[soracom_info["secret"]],
     }
     req = urllib.request.Request(
         url=f"{coverage_url}/auth",
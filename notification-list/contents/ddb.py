@@ -1,14 +1,8 @@
-import boto3
-import os
 from boto3.dynamodb.conditions import Key
 from boto3.dynamodb.conditions import Attr
 from aws_lambda_powertools import Logger
 
 logger = Logger()
-region_name = os.environ.get("AWS_REGION")
-
-dynamodb = boto3.resource("dynamodb")
-client = boto3.client("dynamodb", region_name=region_name)
 
 
 def get_device_info_by_contract_id(pk,table):
@@ -9,6 +9,7 @@ from functools import reduce
 
 import auth
 import db
+import relation
 import ddb
 import ssm
 import convert
@@ -59,10 +60,9 @@ def lambda_handler(event, context, user):
             [],
             [],
         )  # デバイスID毎のグループID一覧、重複のないグループID一覧
+        relation_graph = relation.get_relation_graph(contract, device_relation_table)
         for device_id in device_id_list:
-            group_id_list = db.get_device_relation_group_id_list(
-                device_id, device_relation_table
-            )
+            group_id_list = relation_graph.device_group_id_list(device_id)
             device_group_relation.append({"device_id": device_id, "group_list": group_id_list})
             all_groups += group_id_list
         all_groups = set(all_groups)
@@ -70,13 +70,9 @@ def lambda_handler(event, context, user):
         logger.info(f"重複のないグループID一覧:{all_groups}")
 
         # グループ情報取得
-        group_info_list = []
-        for item in all_groups:
-            group_info = db.get_group_info(item, group_table)
-            if group_info:
-                group_info_list.append(group_info)
-            else:
-                logger.info(f"group information does not exist:{item}")
+        group_info_list = db.get_group_info_many(all_groups, group_table, db.GROUP_NAME_FIELDS)
+        for item in all_groups - {group_info["group_id"] for group_info in group_info_list}:
+            logger.info(f"group information does not exist:{item}")
         logger.info(f"グループ情報:{group_info_list}")
         if group_info_list:
             group_info_list = sorted(
@@ -7,6 +7,7 @@ from aws_xray_sdk.core import patch_all
 
 import auth
 import db
+import relation
 import ssm
 import validate
 import ddb
@@ -34,6 +35,7 @@ def lambda_handler(event, context, user, body):
         user_table = dynamodb.Table(ssm.table_names["USER_TABLE"])
         device_relation_table = dynamodb.Table(ssm.table_names["DEVICE_RELATION_TABLE"])
         account_table = dynamodb.Table(ssm.table_names["ACCOUNT_TABLE"])
+        state_table = dynamodb.Table(ssm.table_names["STATE_TABLE"])
     except KeyError as e:
         body = {"message": e}
         return {
@@ -81,7 +83,9 @@ def lambda_handler(event, context, user, body):
             }
 
         notification_target_list = body["notification_target_list"]
-        worker_user_id_list = db.get_device_relation_user_id_list(device_id, device_relation_table)
+        worker_user_id_list = relation.get_relation_graph(
+            contract, device_relation_table
+        ).device_user_id_list(device_id)
         for user_id in notification_target_list:
             user_info = db.get_user_info_by_user_id(user_id, user_table)
             if not user_info or user_id not in contract["contract_data"]["user_list"]:
@@ -133,6 +137,8 @@ def lambda_handler(event, context, user, body):
 
         # デバイス管理テーブルの通知設定更新
         ddb.update_device_notification_settings(device_id, notificaton_settings, notification_target_list, device_table)
+        # 受信処理のデバイス情報キャッシュ無効化
+        db.update_device_config_version(device_id, state_table)
 
         # デバイス情報取得
         logger.debug(device_id)
@@ -11,6 +11,7 @@ from aws_lambda_powertools import Logger
 
 import ssm
 import db
+import relation
 
 import convert
 
@@ -157,6 +158,9 @@ def lambda_handler(event, context):
                 "body": json.dumps(res_body, ensure_ascii=False),
             }
 
+        # デバイス関係グラフのキャッシュ無効化
+        relation.update_relation_version(validate_result["contract_id"], contract_table)
+
         pre_device_info = ddb.get_pre_reg_device_info_by_imei(identification_id, validate_result["contract_id"], pre_register_table)
 
         res_body = {"data": pre_device_info}
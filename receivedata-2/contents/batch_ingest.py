@@ -0,0 +1,314 @@
+import ddb
+import parallel
+import validate
+from command_parser import parsePayload
+from event_judge import eventJudge
+from event_notice import eventNotice
+from aws_lambda_powertools import Logger
+
+logger = Logger()
+
+
+###################################
+# 複数電文一括取り込み
+#
+# message_list : [{"message_id", "simid", "recv_datetime", "payload"}, ...]
+# 戻り値 : (処理失敗メッセージIDリスト, 初期受信対象ICCIDリスト)
+###################################
+def batchIngest(
+    message_list,
+    idempotency_table,
+    iccid_table,
+    device_table,
+    hist_table,
+    hist_list_table,
+    state_table,
+    group_table,
+    device_relation_table,
+    remote_control_table,
+    timer,
+):
+    logger.debug(f"batchIngest開始 件数={len(message_list)}")
+
+    # 入力データチェック・重複除外
+    device_message_list = {}
+    candidate_message_list = {}
+    message_key_list = set()
+    for message in message_list:
+        vali_result, decoded_message = validate.validate(
+            message["payload"], message["simid"], message["recv_datetime"]
+        )
+        if vali_result != 0:
+            # 不正電文・受信済み電文は再送しても結果が変わらないため破棄
+            logger.debug(f"入力データエラー message_id={message['message_id']}, vali_result={vali_result}")
+            continue
+        try:
+            recv_data, hist_flg = parsePayload(
+                message["simid"], message["recv_datetime"], decoded_message
+            )
+        except Exception as e:
+            # 規定外の電文種別・デバイス種別の組み合わせは再送しても処理できないため破棄
+            logger.error(f"受信データ解析エラー message_id={message['message_id']}, e={e}")
+            continue
+        message_key = (message["simid"], ddb.recv_message_key(recv_data))
+        if message_key in message_key_list:
+            logger.debug(f"バッチ内重複電文 message_id={message['message_id']}")
+            continue
+        message_key_list.add(message_key)
+        message["recv_data"] = recv_data
+        message["hist_flg"] = hist_flg
+        candidate_message_list.setdefault(message["simid"], []).append(message)
+
+    # デバイス情報取得（デバイス毎に1回、デバイス間は独立しているため並列実行）
+    # 登録対象外のデバイスの電文は登録前に除外する（単発受信と同じく破棄）
+    failure_message_id_list = []
+    with timer.stage("read"):
+        device_result = parallel.run_parallel(
+            {
+                simid: (_tryGetDevice, simid, iccid_table, device_table, state_table)
+                for simid in candidate_message_list
+            }
+        )
+    device_list = {}
+    for simid, (device, error) in device_result.items():
+        if error is not None:
+            failure_message_id_list.extend(
+                [message["message_id"] for message in candidate_message_list[simid]]
+            )
+            continue
+        if device is None:
+            continue
+        device_list[simid] = device
+    claim_message_list = [
+        message for simid in device_list for message in candidate_message_list[simid]
+    ]
+
+    # 受信電文登録（冪等性キー・履歴情報テーブル）、受信済み電文は除外
+    with timer.stage("claim"):
+        claim_result = ddb.claim_messages(
+            [(message["recv_data"], message["hist_flg"]) for message in claim_message_list],
+            idempotency_table,
+            hist_table,
+        )
+    for message, claimed in zip(claim_message_list, claim_result):
+        if claimed is None:
+            failure_message_id_list.append(message["message_id"])
+            continue
+        if not claimed:
+            logger.debug(f"受信済み電文 message_id={message['message_id']}")
+            continue
+        device_message_list.setdefault(message["simid"], []).append(message)
+
+    initial_receive_list = []
+    hist_list_items = []
+    hist_list_simid_list = []
+    state_update_list = {}
+    notice_list = {}
+
+    # デバイス単位で処理（デバイス間は独立しているため並列実行）
+    for device_messages in device_message_list.values():
+        device_messages.sort(key=lambda x: x["recv_data"]["event_datetime"])
+    with timer.stage("judge"):
+        ingest_result = parallel.run_parallel(
+            {
+                simid: (
+                    _tryIngestDeviceMessages,
+                    simid,
+                    device_list[simid],
+                    device_messages,
+                    group_table,
+                    device_relation_table,
+                    remote_control_table,
+                )
+                for simid, device_messages in device_message_list.items()
+            }
+        )
+
+    def release(simid_list):
+        # 再送で処理できるよう登録を取り消す
+        for simid in simid_list:
+            device_messages = device_message_list[simid]
+            ddb.release_messages(
+                [(message["recv_data"], message["hist_flg"]) for message in device_messages],
+                idempotency_table,
+                hist_table,
+            )
+            failure_message_id_list.extend([message["message_id"] for message in device_messages])
+
+    failure_simid_list = []
+    for simid in device_message_list:
+        result, error = ingest_result[simid]
+        if error is not None:
+            failure_simid_list.append(simid)
+            continue
+
+        if result["hist_list_items"]:
+            hist_list_items.extend(result["hist_list_items"])
+            hist_list_simid_list.append(simid)
+        if result["state_update"]:
+            state_update_list[simid] = result["state_update"]
+        if result["notice_list"]:
+            notice_list[simid] = result["notice_list"]
+        if result["initial_receive"]:
+            initial_receive_list.append(simid)
+    release(failure_simid_list)
+
+    # 履歴一覧テーブル → イベント通知 → 現状態テーブル（デバイス毎に1回）の順に登録
+    # 再送時は登録済みの現状態との差分でイベント判定するため、現状態は最後に更新する
+    # 失敗したデバイスの電文は登録を取り消して再送させる
+    # （履歴IDは電文から決まり、再送時は登録済みの履歴一覧を上書きしないため、
+    #   イベント通知処理が記録した通知進捗は保持される）
+    write_failure_simid_list = []
+    with timer.stage("write"):
+        if hist_list_items:
+            logger.debug(f"履歴一覧 件数={len(hist_list_items)}")
+            _, error = _tryCall(ddb.put_cnt_hist_list_batch, hist_list_items, hist_list_table)
+            if error is not None:
+                logger.error(f"履歴一覧登録エラー e={error}", exc_info=error)
+                write_failure_simid_list.extend(hist_list_simid_list)
+
+    # メール通知・連動制御（イベント通知処理へ非同期で連携）
+    # 履歴一覧の登録完了後に連携する
+    with timer.stage("notice"):
+        for simid, device_notice_list in notice_list.items():
+            if simid in write_failure_simid_list:
+                continue
+            try:
+                eventNotice(device_notice_list)
+            except Exception as e:
+                logger.error(f"イベント通知登録エラー simid={simid}, e={e}", exc_info=True)
+                write_failure_simid_list.append(simid)
+
+    with timer.stage("state"):
+        state_result = parallel.run_parallel(
+            {
+                simid: (
+                    _tryCall,
+                    ddb.update_current_state,
+                    current_state_info,
+                    device_current_state,
+                    device_info,
+                    event_datetime,
+                    state_table,
+                )
+                for simid, (
+                    current_state_info,
+                    device_current_state,
+                    device_info,
+                    event_datetime,
+                ) in state_update_list.items()
+                if simid not in write_failure_simid_list
+            }
+        )
+        for simid, (_, error) in state_result.items():
+            if error is not None:
+                logger.error(f"現状態登録エラー simid={simid}, e={error}", exc_info=error)
+                write_failure_simid_list.append(simid)
+    release(write_failure_simid_list)
+
+    logger.debug(
+        f"batchIngest終了 failure={len(failure_message_id_list)}, initial_receive={initial_receive_list}"
+    )
+    return failure_message_id_list, initial_receive_list
+
+
+# デバイス情報取得（例外は呼び出し元でデバイス毎に失敗扱いとするため戻り値で返す）
+def _tryGetDevice(simid, *tables):
+    try:
+        return _getDevice(simid, *tables), None
+    except Exception as e:
+        logger.error(f"デバイス情報取得エラー simid={simid}, e={e}", exc_info=True)
+        return None, e
+
+
+# デバイス単位処理（例外は呼び出し元でデバイス毎に失敗扱いとするため戻り値で返す）
+def _tryIngestDeviceMessages(simid, *args):
+    try:
+        return _ingestDeviceMessages(*args), None
+    except Exception as e:
+        logger.error(f"デバイス単位処理エラー simid={simid}, e={e}", exc_info=True)
+        return None, e
+
+
+# 登録処理（例外は呼び出し元でデバイス毎に失敗扱いとするため戻り値で返す）
+def _tryCall(func, *args):
+    try:
+        return func(*args), None
+    except Exception as e:
+        return None, e
+
+
+# ICCID情報・現状態・デバイス情報取得
+# 戻り値 : {"stray_flag", "device_info", "device_current_state"}、デバイス情報未登録の場合はNone
+def _getDevice(simid, iccid_table, device_table, state_table):
+    device_id = ddb.get_device_id_by_iccid(simid, iccid_table)
+    if device_id is None:
+        logger.debug(f"未登録デバイス szSimid={simid}")
+        return {"stray_flag": True, "device_info": None, "device_current_state": None}
+
+    # 現状態取得（デバイス毎に1回、config_versionでデバイス情報キャッシュの有効性を判定）
+    device_current_state = ddb.get_device_state(device_id, state_table)
+    config_version = (device_current_state or {}).get("config_version", 0)
+    device_info = ddb.get_device_info_cached(device_id, device_table, config_version)
+    if device_info is None or len(device_info) == 0:
+        ddb.invalidate_device_cache(device_id, simid)
+        return None
+    return {"stray_flag": False, "device_info": device_info, "device_current_state": device_current_state}
+
+
+def _ingestDeviceMessages(
+    device,
+    device_messages,
+    group_table,
+    device_relation_table,
+    remote_control_table,
+):
+    stray_flag = device["stray_flag"]
+    device_info = device["device_info"]
+    device_current_state = device["device_current_state"]
+
+    result = {
+        "hist_list_items": [],
+        "state_update": None,
+        "notice_list": [],
+        "initial_receive": (not stray_flag) and (device_info.get("contract_state") == 0),
+    }
+
+    if not stray_flag:
+        latest_state = device_current_state
+    current_state_info = None
+
+    for message in device_messages:
+        recv_data = message["recv_data"]
+        hist_list = []
+
+        if not stray_flag:
+            # イベント判定 履歴一覧、現状態作成（直前の電文の判定結果を現状態とする）
+            hist_list, wk_current_state_info = eventJudge(
+                recv_data,
+                latest_state,
+                device_info,
+                device_relation_table,
+                group_table,
+                remote_control_table,
+            )
+
+        if message["hist_flg"]:
+            if not stray_flag:
+                current_state_info = wk_current_state_info
+                latest_state = wk_current_state_info
+                event_datetime = recv_data["event_datetime"]
+        else:
+            logger.debug(f"接点出力制御応答テーブル dbItem={recv_data}")
+            if not ddb.update_control_res(recv_data, remote_control_table):
+                # 制御結果記録済み（=タイムアウト時）は履歴を作成しない
+                hist_list = []
+
+        if not stray_flag and hist_list:
+            result["hist_list_items"].extend(hist_list)
+            result["notice_list"].append((hist_list, device_info))
+
+    if not stray_flag and current_state_info:
+        result["state_update"] = (current_state_info, device_current_state, device_info, event_datetime)
+
+    return result
@@ -1,54 +1,29 @@
 import os
 import ddb
 import uuid
+import message_decoder
 from datetime import datetime
 from dateutil import relativedelta
 from event_judge import eventJudge
-from mail_notice import mailNotice
-from automation_trigger import automationTrigger
+from event_notice import eventNotice
 from aws_lambda_powertools import Logger
 
 logger = Logger()
 
 CNT_HIST_TTL = int(os.environ["CNT_HIST_TTL"])
+# 履歴情報IDの名前空間
+CNT_HIST_ID_NAMESPACE = uuid.UUID("2b7e4c1a-9d3f-5e6a-b8c0-d1e2f3a4b5c6")
 
 
-def getByteArray(Payload, index, len):
-    start = index[0]
-    end = index[0] + len
-    index[0] += len
-    return Payload[start:end]
+# 履歴情報ID
+# 電文から一意に決まる値とし、再送時も履歴一覧（hist_data.cnt_hist_id）から参照できるようにする
+def _cntHistId(szSimid, nEventTime, nMsgType):
+    return str(uuid.uuid5(CNT_HIST_ID_NAMESPACE, f"{szSimid}|{ddb.message_key(nEventTime, format(nMsgType, '04x'))}"))
 
 
-def signed_hex2int(signed_hex, digit):
-    signed = 0x01 << (digit - 1)
-    mask = 0x00
-    for num in range(digit):
-        mask = mask | (0x01 << num)
-    signed_int = (
-        (int(signed_hex ^ mask) * -1) - 1 if (signed_hex & signed) else int(signed_hex)
-    )
-    return signed_int
-
-
-def commandParser(
-    szSimid,
-    szRecvDatetime,
-    Payload,
-    device_info,
-    stray_flag,
-    hist_table,
-    hist_list_table,
-    state_table,
-    group_table,
-    notification_hist_table,
-    device_relation_table,
-    user_table,
-    account_table,
-    remote_control_table,
-):
+def parsePayload(szSimid, szRecvDatetime, message):
     logger.debug(
-        f"commandParser開始 szSimid={szSimid}, szRecvDatetime={szRecvDatetime}, Payload={Payload}"
+        f"parsePayload開始 szSimid={szSimid}, szRecvDatetime={szRecvDatetime}, message={message}"
     )
 
     # TTL有効期限
@@ -60,47 +35,32 @@ def commandParser(
     )
 
     ### コマンド共通部 ###
-    index = [0]
-    # メッセージ長
-    nlen = int.from_bytes(getByteArray(Payload, index, 2), "big")
     # デバイス種別
-    nDeviceType = int.from_bytes(getByteArray(Payload, index, 2), "big")
-    if nDeviceType == 1:
-        szDeviceType = "PJ1"
-    elif nDeviceType == 2:
-        szDeviceType = "PJ2"
-    elif nDeviceType == 3:
-        szDeviceType = "PJ3"
+    szDeviceType = message_decoder.DEVICE_TYPE_NAME.get(message.device_type)
     # ファームウェアVersion
-    nVer = int.from_bytes(getByteArray(Payload, index, 2), "big")
+    nVer = message.fw_version
     # メッセージ種別
-    nMsgType = int.from_bytes(getByteArray(Payload, index, 2), "big")
+    nMsgType = message.message_type
 
     # 要求番号
-    if nMsgType == 0x8002:
-        szReqNo = getByteArray(Payload, index, 4).hex()
-        logger.debug(f"szReqNo={szReqNo}")
-    else:
-        szReqNo = None
+    szReqNo = message.req_no
+    logger.debug(f"szReqNo={szReqNo}")
 
     # イベント発生日時
-    nEventTime = int.from_bytes(getByteArray(Payload, index, 8), "big")
+    nEventTime = message.event_datetime
     logger.debug(f"nEventTime={nEventTime}")
 
     # デバイス状態
-    nState = int.from_bytes(getByteArray(Payload, index, 1), "big")
-    if nMsgType == 0x0001:
-        nStatetrg = int.from_bytes(getByteArray(Payload, index, 1), "big")
-        logger.debug(f"nStatetrg={nStatetrg}")
-    else:
-        nStatetrg = None
+    nState = message.device_state
+    nStatetrg = message.device_trigger
+    logger.debug(f"nStatetrg={nStatetrg}")
 
     # 供給電圧(1/10V)
-    nVolt = int.from_bytes(getByteArray(Payload, index, 1), "big")
+    nVolt = message.power_voltage
     # RSSI
-    nRssi = signed_hex2int(int.from_bytes(getByteArray(Payload, index, 1), "big"), 8)
+    nRssi = message.rssi
     # SINR
-    nSinr = signed_hex2int(int.from_bytes(getByteArray(Payload, index, 1), "big"), 8)
+    nSinr = message.sinr
     logger.debug(f"nState={nState}, nVolt={nVolt}, nRssi={nRssi}, nSinr={nSinr}")
 
     ### コマンドデータ部 ###
@@ -115,17 +75,13 @@ def commandParser(
 
     # 状態変化通知
     if nMsgType == 0x0001 and szDeviceType in ["PJ1", "PJ2", "PJ3"]:
-        nDIState = int.from_bytes(getByteArray(Payload, index, 1), "big")
-        nDItrg = int.from_bytes(getByteArray(Payload, index, 1), "big")
-        nDOState = int.from_bytes(getByteArray(Payload, index, 1), "big")
-        nDOtrg = int.from_bytes(getByteArray(Payload, index, 1), "big")
-        nAI1 = signed_hex2int(
-            int.from_bytes(getByteArray(Payload, index, 2), "big"), 16
-        )
-        nAI2 = signed_hex2int(
-            int.from_bytes(getByteArray(Payload, index, 2), "big"), 16
-        )
-        nAItrg = int.from_bytes(getByteArray(Payload, index, 1), "big")
+        nDIState = message.di_state
+        nDItrg = message.di_trigger
+        nDOState = message.do_state
+        nDOtrg = message.do_trigger
+        nAI1 = message.analogv1
+        nAI2 = message.analogv2
+        nAItrg = message.ad_trigger
         hist_flg = True
         logger.debug(
             f"状態変化通知 nDIState={nDIState}, nDItrg={nDItrg}, nDOState={nDOState}, nDOtrg={nDOtrg}"
@@ -133,7 +89,7 @@ def commandParser(
         logger.debug(f"nAI1={nAI1}, nAI2={nAI2}, nAItrg={nAItrg}, nAItrg={nAItrg}")
 
         recv_data = {
-            "cnt_hist_id": str(uuid.uuid4()),
+            "cnt_hist_id": _cntHistId(szSimid, nEventTime, nMsgType),
             "simid": szSimid,
             "event_datetime": nEventTime,
             "recv_datetime": szRecvDatetime,
@@ -157,21 +113,17 @@ def commandParser(
 
     # 現状態通知
     elif nMsgType in [0x0011, 0x0012] and szDeviceType in ["PJ1", "PJ2", "PJ3"]:
-        nDIState = int.from_bytes(getByteArray(Payload, index, 1), "big")
-        nDOState = int.from_bytes(getByteArray(Payload, index, 1), "big")
-        nAI1 = signed_hex2int(
-            int.from_bytes(getByteArray(Payload, index, 2), "big"), 16
-        )
-        nAI2 = signed_hex2int(
-            int.from_bytes(getByteArray(Payload, index, 2), "big"), 16
-        )
+        nDIState = message.di_state
+        nDOState = message.do_state
+        nAI1 = message.analogv1
+        nAI2 = message.analogv2
         hist_flg = True
         logger.debug(
             f"現状態通知 nDIState={nDIState}, nDOState={nDOState}, nAI1={nAI1}, nAI2={nAI2}"
         )
 
         recv_data = {
-            "cnt_hist_id": str(uuid.uuid4()),
+            "cnt_hist_id": _cntHistId(szSimid, nEventTime, nMsgType),
             "simid": szSimid,
             "event_datetime": nEventTime,
             "recv_datetime": szRecvDatetime,
@@ -191,8 +143,8 @@ def commandParser(
 
     # 接点出力制御応答
     elif nMsgType == 0x8002 and szDeviceType in ["PJ2", "PJ3"]:
-        nControlResult = int.from_bytes(getByteArray(Payload, index, 1), "big")
-        nDOState = int.from_bytes(getByteArray(Payload, index, 1), "big")
+        nControlResult = message.control_result
+        nDOState = message.do_state
         logger.debug(
             f"接点出力制御応答 control_result={nControlResult}, nDOState={nDOState}"
         )
@@ -214,70 +166,126 @@ def commandParser(
         }
     else:
         logger.error(
-            f"規定外メッセージ受信: szSimid={szSimid}, szRecvDatetime={szRecvDatetime}, Payload={Payload}"
+            f"規定外メッセージ受信: szSimid={szSimid}, szRecvDatetime={szRecvDatetime}, message={message}"
         )
         raise Exception("規定外メッセージ受信")
 
-    if not stray_flag:
-        # 現状態取得
-        device_id = device_info["device_id"]
-        device_current_state = ddb.get_device_state(device_id, state_table)
+    return recv_data, hist_flg
 
-        # イベント判定 履歴一覧、現状態作成
-        hist_list, current_state_info = eventJudge(
+
+def commandParser(
+    szSimid,
+    szRecvDatetime,
+    message,
+    device_info,
+    device_current_state,
+    stray_flag,
+    idempotency_table,
+    hist_table,
+    hist_list_table,
+    state_table,
+    group_table,
+    device_relation_table,
+    remote_control_table,
+    timer,
+):
+    logger.debug(
+        f"commandParser開始 szSimid={szSimid}, szRecvDatetime={szRecvDatetime}, message={message}"
+    )
+
+    # 受信データ解析
+    recv_data, hist_flg = parsePayload(szSimid, szRecvDatetime, message)
+
+    # 受信電文登録（冪等性キー・履歴情報テーブル）
+    # 再送電文が並行して受信された場合も後続処理は1回のみ実行する
+    logger.debug(f"履歴情報テーブル dbItem={recv_data}")
+    with timer.stage("claim"):
+        claimed = ddb.claim_messages([(recv_data, hist_flg)], idempotency_table, hist_table)[0]
+    if claimed is None:
+        raise Exception("受信電文登録エラー")
+    if not claimed:
+        logger.debug("受信済みデータ")
+        return bytes([1])
+
+    try:
+        _processMessage(
             recv_data,
-            device_current_state,
+            hist_flg,
             device_info,
-            device_relation_table,
+            device_current_state,
+            stray_flag,
+            hist_list_table,
+            state_table,
             group_table,
+            device_relation_table,
             remote_control_table,
+            timer,
         )
+    except Exception:
+        # 再送で処理できるよう登録を取り消す
+        ddb.release_messages([(recv_data, hist_flg)], idempotency_table, hist_table)
+        raise
 
-        # メール通知
-        hist_list = mailNotice(
-            hist_list, device_info, user_table, account_table, notification_hist_table
-        )
+    logger.debug("commandParser終了")
+    return bytes([1])
+
+
+def _processMessage(
+    recv_data,
+    hist_flg,
+    device_info,
+    device_current_state,
+    stray_flag,
+    hist_list_table,
+    state_table,
+    group_table,
+    device_relation_table,
+    remote_control_table,
+    timer,
+):
+    hist_list = []
+
+    if not stray_flag:
+        # イベント判定 履歴一覧、現状態作成
+        with timer.stage("judge"):
+            hist_list, current_state_info = eventJudge(
+                recv_data,
+                device_current_state,
+                device_info,
+                device_relation_table,
+                group_table,
+                remote_control_table,
+            )
 
     # DB登録データ編集
-    # 履歴情報テーブル
-    if hist_flg:
-        logger.debug(f"履歴情報テーブル dbItem={recv_data}")
-        ddb.put_cnt_hist(recv_data, hist_table)
-    else:
+    if not hist_flg:
         logger.debug(f"接点出力制御応答テーブル dbItem={recv_data}")
         if not ddb.update_control_res(recv_data, remote_control_table):
             # 制御結果記録済み（=タイムアウト時）は履歴を作成しない
             hist_list = []
 
     if not stray_flag:
+        # 履歴一覧テーブル → イベント通知 → 現状態テーブルの順に登録
+        # 失敗時は登録を取り消して再送させるため、再送時のイベント判定の基準となる現状態は最後に更新する
+        # （履歴IDは電文から決まり、再送時は登録済みの履歴一覧を上書きしないため、
+        #   イベント通知処理が記録した通知進捗は保持される）
         if hist_list:
-            # 履歴一覧テーブル
             logger.debug(f"履歴一覧 dbItem={hist_list}")
-            ddb.put_cnt_hist_list(hist_list, hist_list_table)
+            with timer.stage("write"):
+                ddb.put_cnt_hist_list(hist_list, hist_list_table)
+
+            # メール通知・連動制御（イベント通知処理へ非同期で連携）
+            # 履歴一覧の登録完了後に連携する
+            with timer.stage("notice"):
+                eventNotice([(hist_list, device_info)])
 
-        # 現状態テーブル
         if hist_flg:
-            # 現状態更新タイプ
-            update_digit = 0b0000
-            if (current_state_info and device_current_state):
-                # デバイスヘルシー
-                if "device_healthy_state" in current_state_info and "device_healthy_state" in device_current_state:
-                    if current_state_info.get("device_healthy_state", 0) != device_current_state.get("device_healthy_state", 0):
-                        update_digit |= 0b0001
-
-                # 接点入力未変化検出
-                di_range = 2 if szDeviceType == "PJ1" else 9
-                for i in range(1, di_range):
-                    di_healthy_state_key = f"di{i}_healthy_state"
-                    if di_healthy_state_key in current_state_info and di_healthy_state_key in device_current_state:
-                        if current_state_info.get(di_healthy_state_key, 0) != device_current_state.get(di_healthy_state_key, 0):
-                            update_digit |= 0b0010
             logger.debug(f"現状態テーブル dbItem={current_state_info}")
-            ddb.update_current_state(current_state_info, device_info, update_digit, state_table)
-
-        if hist_list:
-            # 連動制御呼び出し
-            automationTrigger(hist_list, device_info)
-
-    logger.debug("commandParser終了")
-    return bytes([1])
+            with timer.stage("state"):
+                ddb.update_current_state(
+                    current_state_info,
+                    device_current_state,
+                    device_info,
+                    recv_data["event_datetime"],
+                    state_table,
+                )
@@ -1,14 +1,62 @@
-import json
-import boto3
+import os
+import copy
+import time
 import decimal
+import convert
 import db
+import cache
+import parallel
 from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 from aws_lambda_powertools import Logger
 
-dynamodb = boto3.resource("dynamodb")
 logger = Logger()
 
+# デバイス情報キャッシュ（ウォームコンテナ内で保持）
+DEVICE_CACHE_TTL = int(os.environ.get("DEVICE_CACHE_TTL", 60))
+DEVICE_CACHE_MAXSIZE = int(os.environ.get("DEVICE_CACHE_MAXSIZE", 1024))
+# ICCID → デバイスID
+iccid_cache = cache.TTLCache(maxsize=DEVICE_CACHE_MAXSIZE, ttl=DEVICE_CACHE_TTL)
+# デバイスID → (config_version, デバイス情報)
+device_cache = cache.TTLCache(maxsize=DEVICE_CACHE_MAXSIZE, ttl=DEVICE_CACHE_TTL)
+# デバイスID → グループ一覧
+group_cache = cache.TTLCache(maxsize=DEVICE_CACHE_MAXSIZE, ttl=DEVICE_CACHE_TTL)
+
+# 受信済み電文キャッシュ（simid, 冪等性キー）
+RECENT_MESSAGE_CACHE_TTL = int(os.environ.get("RECENT_MESSAGE_CACHE_TTL", 600))
+RECENT_MESSAGE_CACHE_MAXSIZE = int(os.environ.get("RECENT_MESSAGE_CACHE_MAXSIZE", 8192))
+recent_message_cache = cache.TTLCache(
+    maxsize=RECENT_MESSAGE_CACHE_MAXSIZE, ttl=RECENT_MESSAGE_CACHE_TTL
+)
+# 冪等性キー有効期間（受信可能な過去電文の範囲と同じ）
+RECV_PAST_TIME = int(os.environ["RECV_PAST_TIME"])
+# 現状態更新の競合時の再試行回数
+UPDATE_CURRENT_STATE_RETRY = int(os.environ.get("UPDATE_CURRENT_STATE_RETRY", 3))
+
+
+# 現状態テーブル更新対象キー（デバイス種別毎）
+def _currentStateKeys(di_count, do_count):
+    state_list = ["signal", "battery_near", "device_abnormality", "parameter_abnormality", "fw_update_abnormality"]
+    terminal_list = [f"di{i}" for i in range(1, di_count + 1)] + [f"do{i}" for i in range(1, do_count + 1)]
+    return (
+        tuple(f"{name}_last_update_datetime" for name in state_list + terminal_list)
+        + ("signal_state", "battery_near_state", "device_abnormality", "parameter_abnormality", "fw_update_abnormality")
+        + tuple(f"{name}_state" for name in terminal_list)
+        + tuple(f"{name}_last_change_datetime" for name in state_list + terminal_list)
+    )
+
+
+CURRENT_STATE_KEYS = {
+    "PJ1": _currentStateKeys(1, 0),
+    "PJ2": _currentStateKeys(8, 2),
+    "PJ3": _currentStateKeys(8, 2),
+}
+HEALTHY_STATE_KEYS = {
+    "PJ1": ("di1_healthy_state", "device_healthy_state"),
+    "PJ2": tuple(f"di{i}_healthy_state" for i in range(1, 9)) + ("device_healthy_state",),
+    "PJ3": tuple(f"di{i}_healthy_state" for i in range(1, 9)) + ("device_healthy_state",),
+}
+
 
 def decimal_to_num(obj):
     if isinstance(obj, decimal.Decimal):
@@ -31,10 +79,57 @@ def get_device_info(device_id, device_table):
     return db.insert_id_key_in_device_info(device_list[0]) if device_list else None
 
 
+# ICCID管理情報取得（キャッシュ利用）
+def get_device_id_by_iccid(sim_id, iccid_table):
+    device_id = iccid_cache.get(sim_id)
+    if device_id is None:
+        iccid_info = get_iccid_info(sim_id, iccid_table)
+        if not iccid_info:
+            return None
+        device_id = iccid_info["device_id"]
+        iccid_cache.put(sim_id, device_id)
+    return device_id
+
+
+# デバイス情報取得（キャッシュ利用）
+# config_version : 現状態テーブルのconfig_version（設定変更時に加算される）
+def get_device_info_cached(device_id, device_table, config_version):
+    cached = device_cache.get(device_id)
+    if cached is not None and cached[0] == config_version:
+        return cached[1]
+    # 設定変更されたデバイスはグループ一覧も破棄
+    if cached is not None:
+        group_cache.invalidate(device_id)
+    device_info = get_device_info(device_id, device_table)
+    if device_info:
+        device_cache.put(device_id, (config_version, device_info))
+    else:
+        device_cache.invalidate(device_id)
+    return device_info
+
+
+# デバイス情報キャッシュ破棄
+def invalidate_device_cache(device_id, sim_id=None):
+    device_cache.invalidate(device_id)
+    group_cache.invalidate(device_id)
+    if sim_id is not None:
+        iccid_cache.invalidate(sim_id)
+
+
+# キャッシュ統計情報
+def get_cache_stats():
+    return {
+        "iccid": iccid_cache.stats(),
+        "device": device_cache.stats(),
+        "group": group_cache.stats(),
+    }
+
+
 # 現状態取得
-def get_device_state(device_id, device_state_table):
+def get_device_state(device_id, device_state_table, consistent_read=False):
     device_state = device_state_table.query(
-        KeyConditionExpression=Key("device_id").eq(device_id)
+        KeyConditionExpression=Key("device_id").eq(device_id),
+        ConsistentRead=consistent_read,
     ).get("Items")
     return device_state[0] if device_state else None
 
@@ -68,944 +163,144 @@ def get_remote_control_info_by_device_id(
     return None
 
 
-# 履歴データ挿入
-def put_cnt_hist(db_item, hist_table):
-    item = json.loads(json.dumps(db_item), parse_float=decimal.Decimal)
-    try:
-        hist_table.put_item(Item=item)
-    except ClientError as e:
-        logger.debug(f"put_cnt_histエラー e={e}")
-
-
-# 履歴一覧データ挿入
+# 履歴一覧データ挿入（1件毎のput_itemを並列実行）
 def put_cnt_hist_list(db_items, hist_list_table):
-    for db_item in db_items:
-        item = json.loads(
-            json.dumps(db_item, default=decimal_to_num), parse_float=decimal.Decimal
-        )
+    def put(db_item):
+        item = convert.to_dynamo_item(db_item)
         try:
-            hist_list_table.put_item(Item=item)
+            # 再送時は登録済みの履歴一覧（通知進捗を含む）を上書きしない
+            hist_list_table.put_item(
+                Item=item,
+                ConditionExpression="attribute_not_exists(hist_id)",
+            )
         except ClientError as e:
-            logger.debug(f"put_cnt_hist_listエラー e={e}")
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                logger.info(f"履歴一覧登録済み hist_id={db_item['hist_id']}")
+                return
+            # 呼び出し元で登録を取り消して再送させる
+            logger.error(f"put_cnt_hist_listエラー e={e}")
+            raise
+
+    parallel.map_parallel(put, db_items)
+
+
+# 登録済み履歴ID取得（BatchGetItem）
+HIST_LIST_BATCH_GET_MAX_KEYS = 100
+HIST_LIST_BATCH_GET_MAX_RETRY = 8
+HIST_LIST_BATCH_GET_BACKOFF_BASE = 0.05
+
+
+def _get_registered_hist_id_set(db_items, hist_list_table):
+    client = hist_list_table.meta.client
+    key_list = [{"device_id": db_item["device_id"], "hist_id": db_item["hist_id"]} for db_item in db_items]
+    hist_id_set = set()
+    for i in range(0, len(key_list), HIST_LIST_BATCH_GET_MAX_KEYS):
+        request_items = {
+            hist_list_table.name: {
+                "Keys": key_list[i : i + HIST_LIST_BATCH_GET_MAX_KEYS],
+                "ProjectionExpression": "#hist_id",
+                "ExpressionAttributeNames": {"#hist_id": "hist_id"},
+                "ConsistentRead": True,
+            }
+        }
+        retry = 0
+        while request_items:
+            response = client.batch_get_item(RequestItems=request_items)
+            for item in response.get("Responses", {}).get(hist_list_table.name, []):
+                hist_id_set.add(item["hist_id"])
+            request_items = response.get("UnprocessedKeys") or {}
+            if request_items:
+                # 呼び出し元で登録を取り消して再送させる
+                if retry >= HIST_LIST_BATCH_GET_MAX_RETRY:
+                    raise Exception("履歴一覧取得 未処理キー残存")
+                time.sleep(HIST_LIST_BATCH_GET_BACKOFF_BASE * (2**retry))
+                retry += 1
+    return hist_id_set
+
+
+# 履歴一覧データ一括挿入(BatchWriteItem)
+# BatchWriteItemは条件指定できないため、再送時に登録済みの履歴一覧（通知進捗を含む）は除外する
+# （電文は冪等性キーで1件のみ処理中のため、取得後に他で同じ履歴が登録されることはない）
+def put_cnt_hist_list_batch(db_items, hist_list_table):
+    registered_hist_id_set = _get_registered_hist_id_set(db_items, hist_list_table)
+    with hist_list_table.batch_writer() as batch:
+        for db_item in db_items:
+            if db_item["hist_id"] in registered_hist_id_set:
+                logger.info(f"履歴一覧登録済み hist_id={db_item['hist_id']}")
+                continue
+            item = convert.to_dynamo_item(db_item)
+            batch.put_item(Item=item)
+
+
+# 現状態の差分（更新する項目と値）
+def _currentStateDiff(current_state_info, device_current_state, device_type):
+    update_values = {}
+    if not device_current_state:
+        # 初回受信時は全項目を登録
+        for key in CURRENT_STATE_KEYS[device_type]:
+            update_values[key] = current_state_info.get(key)
+    else:
+        for key in CURRENT_STATE_KEYS[device_type]:
+            if current_state_info.get(key) != device_current_state.get(key):
+                update_values[key] = current_state_info.get(key)
+        # デバイスヘルシー・接点入力未変化検出は両方に存在する場合のみ
+        for key in HEALTHY_STATE_KEYS[device_type]:
+            if key in current_state_info and key in device_current_state:
+                if current_state_info.get(key, 0) != device_current_state.get(key, 0):
+                    update_values[key] = current_state_info.get(key, 0)
+    return update_values
 
 
 # 現状態データ更新
-def update_current_state(current_state_info, device_info, update_digit, state_table):
-    if device_info["device_type"] == "PJ1":
-        if (update_digit & 0b0011) == 0b0011:
-            option = {
-                "Key": {
-                    "device_id": current_state_info['device_id'],
-                },
-                "UpdateExpression": "set #signal_last_update_datetime = :signal_last_update_datetime, \
-                    #battery_near_last_update_datetime = :battery_near_last_update_datetime, \
-                    #device_abnormality_last_update_datetime = :device_abnormality_last_update_datetime, \
-                    #parameter_abnormality_last_update_datetime = :parameter_abnormality_last_update_datetime, \
-                    #fw_update_abnormality_last_update_datetime = :fw_update_abnormality_last_update_datetime, \
-                    #di1_last_update_datetime = :di1_last_update_datetime, \
-                    #signal_state = :signal_state, \
-                    #battery_near_state = :battery_near_state, \
-                    #device_abnormality = :device_abnormality, \
-                    #parameter_abnormality = :parameter_abnormality, \
-                    #fw_update_abnormality = :fw_update_abnormality, \
-                    #di1_state = :di1_state, \
-                    #signal_last_change_datetime = :signal_last_change_datetime, \
-                    #battery_near_last_change_datetime = :battery_near_last_change_datetime, \
-                    #device_abnormality_last_change_datetime = :device_abnormality_last_change_datetime, \
-                    #parameter_abnormality_last_change_datetime = :parameter_abnormality_last_change_datetime, \
-                    #fw_update_abnormality_last_change_datetime = :fw_update_abnormality_last_change_datetime, \
-                    #di1_last_change_datetime = :di1_last_change_datetime, \
-                    #di1_healthy_state = :di1_healthy_state, \
-                    #device_healthy_state = :device_healthy_state",
-                "ExpressionAttributeNames": {
-                    "#signal_last_update_datetime": "signal_last_update_datetime",
-                    "#battery_near_last_update_datetime": "battery_near_last_update_datetime",
-                    "#device_abnormality_last_update_datetime": "device_abnormality_last_update_datetime",
-                    "#parameter_abnormality_last_update_datetime": "parameter_abnormality_last_update_datetime",
-                    "#fw_update_abnormality_last_update_datetime": "fw_update_abnormality_last_update_datetime",
-                    "#di1_last_update_datetime": "di1_last_update_datetime",
-                    "#signal_state": "signal_state",
-                    "#battery_near_state": "battery_near_state",
-                    "#device_abnormality": "device_abnormality",
-                    "#parameter_abnormality": "parameter_abnormality",
-                    "#fw_update_abnormality": "fw_update_abnormality",
-                    "#di1_state": "di1_state",
-                    "#signal_last_change_datetime": "signal_last_change_datetime",
-                    "#battery_near_last_change_datetime": "battery_near_last_change_datetime",
-                    "#device_abnormality_last_change_datetime": "device_abnormality_last_change_datetime",
-                    "#parameter_abnormality_last_change_datetime": "parameter_abnormality_last_change_datetime",
-                    "#fw_update_abnormality_last_change_datetime": "fw_update_abnormality_last_change_datetime",
-                    "#di1_last_change_datetime": "di1_last_change_datetime",
-                    "#di1_healthy_state": "di1_healthy_state",
-                    "#device_healthy_state": "device_healthy_state",
-                },
-                "ExpressionAttributeValues": {
-                    ":signal_last_update_datetime": current_state_info.get("signal_last_update_datetime"),
-                    ":battery_near_last_update_datetime": current_state_info.get("battery_near_last_update_datetime"),
-                    ":device_abnormality_last_update_datetime": current_state_info.get("device_abnormality_last_update_datetime"),
-                    ":parameter_abnormality_last_update_datetime": current_state_info.get("parameter_abnormality_last_update_datetime"),
-                    ":fw_update_abnormality_last_update_datetime": current_state_info.get("fw_update_abnormality_last_update_datetime"),
-                    ":di1_last_update_datetime": current_state_info.get("di1_last_update_datetime"),
-                    ":signal_state": current_state_info.get("signal_state"),
-                    ":battery_near_state": current_state_info.get("battery_near_state"),
-                    ":device_abnormality": current_state_info.get("device_abnormality"),
-                    ":parameter_abnormality": current_state_info.get("parameter_abnormality"),
-                    ":fw_update_abnormality": current_state_info.get("fw_update_abnormality"),
-                    ":di1_state": current_state_info.get("di1_state"),
-                    ":signal_last_change_datetime": current_state_info.get("signal_last_change_datetime"),
-                    ":battery_near_last_change_datetime": current_state_info.get("battery_near_last_change_datetime"),
-                    ":device_abnormality_last_change_datetime": current_state_info.get("device_abnormality_last_change_datetime"),
-                    ":parameter_abnormality_last_change_datetime": current_state_info.get("parameter_abnormality_last_change_datetime"),
-                    ":fw_update_abnormality_last_change_datetime": current_state_info.get("fw_update_abnormality_last_change_datetime"),
-                    ":di1_last_change_datetime": current_state_info.get("di1_last_change_datetime"),
-                    ":di1_healthy_state": current_state_info.get("di1_healthy_state", 0),
-                    ":device_healthy_state": current_state_info.get("device_healthy_state", 0),
-                },
-            }
-        elif (update_digit & 0b0001) == 0b0001:
-            option = {
-                "Key": {
-                    "device_id": current_state_info['device_id'],
-                },
-                "UpdateExpression": "set #signal_last_update_datetime = :signal_last_update_datetime, \
-                    #battery_near_last_update_datetime = :battery_near_last_update_datetime, \
-                    #device_abnormality_last_update_datetime = :device_abnormality_last_update_datetime, \
-                    #parameter_abnormality_last_update_datetime = :parameter_abnormality_last_update_datetime, \
-                    #fw_update_abnormality_last_update_datetime = :fw_update_abnormality_last_update_datetime, \
-                    #di1_last_update_datetime = :di1_last_update_datetime, \
-                    #signal_state = :signal_state, \
-                    #battery_near_state = :battery_near_state, \
-                    #device_abnormality = :device_abnormality, \
-                    #parameter_abnormality = :parameter_abnormality, \
-                    #fw_update_abnormality = :fw_update_abnormality, \
-                    #di1_state = :di1_state, \
-                    #signal_last_change_datetime = :signal_last_change_datetime, \
-                    #battery_near_last_change_datetime = :battery_near_last_change_datetime, \
-                    #device_abnormality_last_change_datetime = :device_abnormality_last_change_datetime, \
-                    #parameter_abnormality_last_change_datetime = :parameter_abnormality_last_change_datetime, \
-                    #fw_update_abnormality_last_change_datetime = :fw_update_abnormality_last_change_datetime, \
-                    #di1_last_change_datetime = :di1_last_change_datetime, \
-                    #device_healthy_state = :device_healthy_state",
-                "ExpressionAttributeNames": {
-                    "#signal_last_update_datetime": "signal_last_update_datetime",
-                    "#battery_near_last_update_datetime": "battery_near_last_update_datetime",
-                    "#device_abnormality_last_update_datetime": "device_abnormality_last_update_datetime",
-                    "#parameter_abnormality_last_update_datetime": "parameter_abnormality_last_update_datetime",
-                    "#fw_update_abnormality_last_update_datetime": "fw_update_abnormality_last_update_datetime",
-                    "#di1_last_update_datetime": "di1_last_update_datetime",
-                    "#signal_state": "signal_state",
-                    "#battery_near_state": "battery_near_state",
-                    "#device_abnormality": "device_abnormality",
-                    "#parameter_abnormality": "parameter_abnormality",
-                    "#fw_update_abnormality": "fw_update_abnormality",
-                    "#di1_state": "di1_state",
-                    "#signal_last_change_datetime": "signal_last_change_datetime",
-                    "#battery_near_last_change_datetime": "battery_near_last_change_datetime",
-                    "#device_abnormality_last_change_datetime": "device_abnormality_last_change_datetime",
-                    "#parameter_abnormality_last_change_datetime": "parameter_abnormality_last_change_datetime",
-                    "#fw_update_abnormality_last_change_datetime": "fw_update_abnormality_last_change_datetime",
-                    "#di1_last_change_datetime": "di1_last_change_datetime",
-                    "#device_healthy_state": "device_healthy_state",
-                },
-                "ExpressionAttributeValues": {
-                    ":signal_last_update_datetime": current_state_info.get("signal_last_update_datetime"),
-                    ":battery_near_last_update_datetime": current_state_info.get("battery_near_last_update_datetime"),
-                    ":device_abnormality_last_update_datetime": current_state_info.get("device_abnormality_last_update_datetime"),
-                    ":parameter_abnormality_last_update_datetime": current_state_info.get("parameter_abnormality_last_update_datetime"),
-                    ":fw_update_abnormality_last_update_datetime": current_state_info.get("fw_update_abnormality_last_update_datetime"),
-                    ":di1_last_update_datetime": current_state_info.get("di1_last_update_datetime"),
-                    ":signal_state": current_state_info.get("signal_state"),
-                    ":battery_near_state": current_state_info.get("battery_near_state"),
-                    ":device_abnormality": current_state_info.get("device_abnormality"),
-                    ":parameter_abnormality": current_state_info.get("parameter_abnormality"),
-                    ":fw_update_abnormality": current_state_info.get("fw_update_abnormality"),
-                    ":di1_state": current_state_info.get("di1_state"),
-                    ":signal_last_change_datetime": current_state_info.get("signal_last_change_datetime"),
-                    ":battery_near_last_change_datetime": current_state_info.get("battery_near_last_change_datetime"),
-                    ":device_abnormality_last_change_datetime": current_state_info.get("device_abnormality_last_change_datetime"),
-                    ":parameter_abnormality_last_change_datetime": current_state_info.get("parameter_abnormality_last_change_datetime"),
-                    ":fw_update_abnormality_last_change_datetime": current_state_info.get("fw_update_abnormality_last_change_datetime"),
-                    ":di1_last_change_datetime": current_state_info.get("di1_last_change_datetime"),
-                    ":device_healthy_state": current_state_info.get("device_healthy_state", 0),
-                },
-            }
-        elif (update_digit & 0b0010) == 0b0010:
-            option = {
-                "Key": {
-                    "device_id": current_state_info['device_id'],
-                },
-                "UpdateExpression": "set #signal_last_update_datetime = :signal_last_update_datetime, \
-                    #battery_near_last_update_datetime = :battery_near_last_update_datetime, \
-                    #device_abnormality_last_update_datetime = :device_abnormality_last_update_datetime, \
-                    #parameter_abnormality_last_update_datetime = :parameter_abnormality_last_update_datetime, \
-                    #fw_update_abnormality_last_update_datetime = :fw_update_abnormality_last_update_datetime, \
-                    #di1_last_update_datetime = :di1_last_update_datetime, \
-                    #signal_state = :signal_state, \
-                    #battery_near_state = :battery_near_state, \
-                    #device_abnormality = :device_abnormality, \
-                    #parameter_abnormality = :parameter_abnormality, \
-                    #fw_update_abnormality = :fw_update_abnormality, \
-                    #di1_state = :di1_state, \
-                    #signal_last_change_datetime = :signal_last_change_datetime, \
-                    #battery_near_last_change_datetime = :battery_near_last_change_datetime, \
-                    #device_abnormality_last_change_datetime = :device_abnormality_last_change_datetime, \
-                    #parameter_abnormality_last_change_datetime = :parameter_abnormality_last_change_datetime, \
-                    #fw_update_abnormality_last_change_datetime = :fw_update_abnormality_last_change_datetime, \
-                    #di1_last_change_datetime = :di1_last_change_datetime, \
-                    #di1_healthy_state = :di1_healthy_state",
-                "ExpressionAttributeNames": {
-                    "#signal_last_update_datetime": "signal_last_update_datetime",
-                    "#battery_near_last_update_datetime": "battery_near_last_update_datetime",
-                    "#device_abnormality_last_update_datetime": "device_abnormality_last_update_datetime",
-                    "#parameter_abnormality_last_update_datetime": "parameter_abnormality_last_update_datetime",
-                    "#fw_update_abnormality_last_update_datetime": "fw_update_abnormality_last_update_datetime",
-                    "#di1_last_update_datetime": "di1_last_update_datetime",
-                    "#signal_state": "signal_state",
-                    "#battery_near_state": "battery_near_state",
-                    "#device_abnormality": "device_abnormality",
-                    "#parameter_abnormality": "parameter_abnormality",
-                    "#fw_update_abnormality": "fw_update_abnormality",
-                    "#di1_state": "di1_state",
-                    "#signal_last_change_datetime": "signal_last_change_datetime",
-                    "#battery_near_last_change_datetime": "battery_near_last_change_datetime",
-                    "#device_abnormality_last_change_datetime": "device_abnormality_last_change_datetime",
-                    "#parameter_abnormality_last_change_datetime": "parameter_abnormality_last_change_datetime",
-                    "#fw_update_abnormality_last_change_datetime": "fw_update_abnormality_last_change_datetime",
-                    "#di1_last_change_datetime": "di1_last_change_datetime",
-                    "#di1_healthy_state": "di1_healthy_state",
-                },
-                "ExpressionAttributeValues": {
-                    ":signal_last_update_datetime": current_state_info.get("signal_last_update_datetime"),
-                    ":battery_near_last_update_datetime": current_state_info.get("battery_near_last_update_datetime"),
-                    ":device_abnormality_last_update_datetime": current_state_info.get("device_abnormality_last_update_datetime"),
-                    ":parameter_abnormality_last_update_datetime": current_state_info.get("parameter_abnormality_last_update_datetime"),
-                    ":fw_update_abnormality_last_update_datetime": current_state_info.get("fw_update_abnormality_last_update_datetime"),
-                    ":di1_last_update_datetime": current_state_info.get("di1_last_update_datetime"),
-                    ":signal_state": current_state_info.get("signal_state"),
-                    ":battery_near_state": current_state_info.get("battery_near_state"),
-                    ":device_abnormality": current_state_info.get("device_abnormality"),
-                    ":parameter_abnormality": current_state_info.get("parameter_abnormality"),
-                    ":fw_update_abnormality": current_state_info.get("fw_update_abnormality"),
-                    ":di1_state": current_state_info.get("di1_state"),
-                    ":signal_last_change_datetime": current_state_info.get("signal_last_change_datetime"),
-                    ":battery_near_last_change_datetime": current_state_info.get("battery_near_last_change_datetime"),
-                    ":device_abnormality_last_change_datetime": current_state_info.get("device_abnormality_last_change_datetime"),
-                    ":parameter_abnormality_last_change_datetime": current_state_info.get("parameter_abnormality_last_change_datetime"),
-                    ":fw_update_abnormality_last_change_datetime": current_state_info.get("fw_update_abnormality_last_change_datetime"),
-                    ":di1_last_change_datetime": current_state_info.get("di1_last_change_datetime"),
-                    ":di1_healthy_state": current_state_info.get("di1_healthy_state", 0),
-                },
-            }
-        else:
-            option = {
-                "Key": {
-                    "device_id": current_state_info['device_id'],
-                },
-                "UpdateExpression": "set #signal_last_update_datetime = :signal_last_update_datetime, \
-                    #battery_near_last_update_datetime = :battery_near_last_update_datetime, \
-                    #device_abnormality_last_update_datetime = :device_abnormality_last_update_datetime, \
-                    #parameter_abnormality_last_update_datetime = :parameter_abnormality_last_update_datetime, \
-                    #fw_update_abnormality_last_update_datetime = :fw_update_abnormality_last_update_datetime, \
-                    #di1_last_update_datetime = :di1_last_update_datetime, \
-                    #signal_state = :signal_state, \
-                    #battery_near_state = :battery_near_state, \
-                    #device_abnormality = :device_abnormality, \
-                    #parameter_abnormality = :parameter_abnormality, \
-                    #fw_update_abnormality = :fw_update_abnormality, \
-                    #di1_state = :di1_state, \
-                    #signal_last_change_datetime = :signal_last_change_datetime, \
-                    #battery_near_last_change_datetime = :battery_near_last_change_datetime, \
-                    #device_abnormality_last_change_datetime = :device_abnormality_last_change_datetime, \
-                    #parameter_abnormality_last_change_datetime = :parameter_abnormality_last_change_datetime, \
-                    #fw_update_abnormality_last_change_datetime = :fw_update_abnormality_last_change_datetime, \
-                    #di1_last_change_datetime = :di1_last_change_datetime",
-                "ExpressionAttributeNames": {
-                    "#signal_last_update_datetime": "signal_last_update_datetime",
-                    "#battery_near_last_update_datetime": "battery_near_last_update_datetime",
-                    "#device_abnormality_last_update_datetime": "device_abnormality_last_update_datetime",
-                    "#parameter_abnormality_last_update_datetime": "parameter_abnormality_last_update_datetime",
-                    "#fw_update_abnormality_last_update_datetime": "fw_update_abnormality_last_update_datetime",
-                    "#di1_last_update_datetime": "di1_last_update_datetime",
-                    "#signal_state": "signal_state",
-                    "#battery_near_state": "battery_near_state",
-                    "#device_abnormality": "device_abnormality",
-                    "#parameter_abnormality": "parameter_abnormality",
-                    "#fw_update_abnormality": "fw_update_abnormality",
-                    "#di1_state": "di1_state",
-                    "#signal_last_change_datetime": "signal_last_change_datetime",
-                    "#battery_near_last_change_datetime": "battery_near_last_change_datetime",
-                    "#device_abnormality_last_change_datetime": "device_abnormality_last_change_datetime",
-                    "#parameter_abnormality_last_change_datetime": "parameter_abnormality_last_change_datetime",
-                    "#fw_update_abnormality_last_change_datetime": "fw_update_abnormality_last_change_datetime",
-                    "#di1_last_change_datetime": "di1_last_change_datetime",
-                },
-                "ExpressionAttributeValues": {
-                    ":signal_last_update_datetime": current_state_info.get("signal_last_update_datetime"),
-                    ":battery_near_last_update_datetime": current_state_info.get("battery_near_last_update_datetime"),
-                    ":device_abnormality_last_update_datetime": current_state_info.get("device_abnormality_last_update_datetime"),
-                    ":parameter_abnormality_last_update_datetime": current_state_info.get("parameter_abnormality_last_update_datetime"),
-                    ":fw_update_abnormality_last_update_datetime": current_state_info.get("fw_update_abnormality_last_update_datetime"),
-                    ":di1_last_update_datetime": current_state_info.get("di1_last_update_datetime"),
-                    ":signal_state": current_state_info.get("signal_state"),
-                    ":battery_near_state": current_state_info.get("battery_near_state"),
-                    ":device_abnormality": current_state_info.get("device_abnormality"),
-                    ":parameter_abnormality": current_state_info.get("parameter_abnormality"),
-                    ":fw_update_abnormality": current_state_info.get("fw_update_abnormality"),
-                    ":di1_state": current_state_info.get("di1_state"),
-                    ":signal_last_change_datetime": current_state_info.get("signal_last_change_datetime"),
-                    ":battery_near_last_change_datetime": current_state_info.get("battery_near_last_change_datetime"),
-                    ":device_abnormality_last_change_datetime": current_state_info.get("device_abnormality_last_change_datetime"),
-                    ":parameter_abnormality_last_change_datetime": current_state_info.get("parameter_abnormality_last_change_datetime"),
-                    ":fw_update_abnormality_last_change_datetime": current_state_info.get("fw_update_abnormality_last_change_datetime"),
-                    ":di1_last_change_datetime": current_state_info.get("di1_last_change_datetime"),
-                },
-            }
-    elif device_info["device_type"] == "PJ2":
-        if (update_digit & 0b0011) == 0b0011:
-            option = {
-                "Key": {
-                    "device_id": current_state_info['device_id'],
-                },
-                "UpdateExpression": "set #signal_last_update_datetime = :signal_last_update_datetime, \
-                    #battery_near_last_update_datetime = :battery_near_last_update_datetime, \
-                    #device_abnormality_last_update_datetime = :device_abnormality_last_update_datetime, \
-                    #parameter_abnormality_last_update_datetime = :parameter_abnormality_last_update_datetime, \
-                    #fw_update_abnormality_last_update_datetime = :fw_update_abnormality_last_update_datetime, \
-                    #di1_last_update_datetime = :di1_last_update_datetime, \
-                    #di2_last_update_datetime = :di2_last_update_datetime, \
-                    #di3_last_update_datetime = :di3_last_update_datetime, \
-                    #di4_last_update_datetime = :di4_last_update_datetime, \
-                    #di5_last_update_datetime = :di5_last_update_datetime, \
-                    #di6_last_update_datetime = :di6_last_update_datetime, \
-                    #di7_last_update_datetime = :di7_last_update_datetime, \
-                    #di8_last_update_datetime = :di8_last_update_datetime, \
-                    #do1_last_update_datetime = :do1_last_update_datetime, \
-                    #do2_last_update_datetime = :do2_last_update_datetime, \
-                    #signal_state = :signal_state, \
-                    #battery_near_state = :battery_near_state, \
-                    #device_abnormality = :device_abnormality, \
-                    #parameter_abnormality = :parameter_abnormality, \
-                    #fw_update_abnormality = :fw_update_abnormality, \
-                    #di1_state = :di1_state, \
-                    #di2_state = :di2_state, \
-                    #di3_state = :di3_state, \
-                    #di4_state = :di4_state, \
-                    #di5_state = :di5_state, \
-                    #di6_state = :di6_state, \
-                    #di7_state = :di7_state, \
-                    #di8_state = :di8_state, \
-                    #do1_state = :do1_state, \
-                    #do2_state = :do2_state, \
-                    #signal_last_change_datetime = :signal_last_change_datetime, \
-                    #battery_near_last_change_datetime = :battery_near_last_change_datetime, \
-                    #device_abnormality_last_change_datetime = :device_abnormality_last_change_datetime, \
-                    #parameter_abnormality_last_change_datetime = :parameter_abnormality_last_change_datetime, \
-                    #fw_update_abnormality_last_change_datetime = :fw_update_abnormality_last_change_datetime, \
-                    #di1_last_change_datetime = :di1_last_change_datetime, \
-                    #di2_last_change_datetime = :di2_last_change_datetime, \
-                    #di3_last_change_datetime = :di3_last_change_datetime, \
-                    #di4_last_change_datetime = :di4_last_change_datetime, \
-                    #di5_last_change_datetime = :di5_last_change_datetime, \
-                    #di6_last_change_datetime = :di6_last_change_datetime, \
-                    #di7_last_change_datetime = :di7_last_change_datetime, \
-                    #di8_last_change_datetime = :di8_last_change_datetime, \
-                    #do1_last_change_datetime = :do1_last_change_datetime, \
-                    #do2_last_change_datetime = :do2_last_change_datetime, \
-                    #di1_healthy_state = :di1_healthy_state, \
-                    #di2_healthy_state = :di2_healthy_state, \
-                    #di3_healthy_state = :di3_healthy_state, \
-                    #di4_healthy_state = :di4_healthy_state, \
-                    #di5_healthy_state = :di5_healthy_state, \
-                    #di6_healthy_state = :di6_healthy_state, \
-                    #di7_healthy_state = :di7_healthy_state, \
-                    #di8_healthy_state = :di8_healthy_state, \
-                    #device_healthy_state = :device_healthy_state",
-                "ExpressionAttributeNames": {
-                    "#signal_last_update_datetime": "signal_last_update_datetime",
-                    "#battery_near_last_update_datetime": "battery_near_last_update_datetime",
-                    "#device_abnormality_last_update_datetime": "device_abnormality_last_update_datetime",
-                    "#parameter_abnormality_last_update_datetime": "parameter_abnormality_last_update_datetime",
-                    "#fw_update_abnormality_last_update_datetime": "fw_update_abnormality_last_update_datetime",
-                    "#di1_last_update_datetime": "di1_last_update_datetime",
-                    "#di2_last_update_datetime": "di2_last_update_datetime",
-                    "#di3_last_update_datetime": "di3_last_update_datetime",
-                    "#di4_last_update_datetime": "di4_last_update_datetime",
-                    "#di5_last_update_datetime": "di5_last_update_datetime",
-                    "#di6_last_update_datetime": "di6_last_update_datetime",
-                    "#di7_last_update_datetime": "di7_last_update_datetime",
-                    "#di8_last_update_datetime": "di8_last_update_datetime",
-                    "#do1_last_update_datetime": "do1_last_update_datetime",
-                    "#do2_last_update_datetime": "do2_last_update_datetime",
-                    "#signal_state": "signal_state",
-                    "#battery_near_state": "battery_near_state",
-                    "#device_abnormality": "device_abnormality",
-                    "#parameter_abnormality": "parameter_abnormality",
-                    "#fw_update_abnormality": "fw_update_abnormality",
-                    "#di1_state": "di1_state",
-                    "#di2_state": "di2_state",
-                    "#di3_state": "di3_state",
-                    "#di4_state": "di4_state",
-                    "#di5_state": "di5_state",
-                    "#di6_state": "di6_state",
-                    "#di7_state": "di7_state",
-                    "#di8_state": "di8_state",
-                    "#do1_state": "do1_state",
-                    "#do2_state": "do2_state",
-                    "#signal_last_change_datetime": "signal_last_change_datetime",
-                    "#battery_near_last_change_datetime": "battery_near_last_change_datetime",
-                    "#device_abnormality_last_change_datetime": "device_abnormality_last_change_datetime",
-                    "#parameter_abnormality_last_change_datetime": "parameter_abnormality_last_change_datetime",
-                    "#fw_update_abnormality_last_change_datetime": "fw_update_abnormality_last_change_datetime",
-                    "#di1_last_change_datetime": "di1_last_change_datetime",
-                    "#di2_last_change_datetime": "di2_last_change_datetime",
-                    "#di3_last_change_datetime": "di3_last_change_datetime",
-                    "#di4_last_change_datetime": "di4_last_change_datetime",
-                    "#di5_last_change_datetime": "di5_last_change_datetime",
-                    "#di6_last_change_datetime": "di6_last_change_datetime",
-                    "#di7_last_change_datetime": "di7_last_change_datetime",
-                    "#di8_last_change_datetime": "di8_last_change_datetime",
-                    "#do1_last_change_datetime": "do1_last_change_datetime",
-                    "#do2_last_change_datetime": "do2_last_change_datetime",
-                    "#di1_healthy_state": "di1_healthy_state",
-                    "#di2_healthy_state": "di2_healthy_state",
-                    "#di3_healthy_state": "di3_healthy_state",
-                    "#di4_healthy_state": "di4_healthy_state",
-                    "#di5_healthy_state": "di5_healthy_state",
-                    "#di6_healthy_state": "di6_healthy_state",
-                    "#di7_healthy_state": "di7_healthy_state",
-                    "#di8_healthy_state": "di8_healthy_state",
-                    "#device_healthy_state": "device_healthy_state",
-                },
-                "ExpressionAttributeValues": {
-                    ":signal_last_update_datetime": current_state_info.get("signal_last_update_datetime"),
-                    ":battery_near_last_update_datetime": current_state_info.get("battery_near_last_update_datetime"),
-                    ":device_abnormality_last_update_datetime": current_state_info.get("device_abnormality_last_update_datetime"),
-                    ":parameter_abnormality_last_update_datetime": current_state_info.get("parameter_abnormality_last_update_datetime"),
-                    ":fw_update_abnormality_last_update_datetime": current_state_info.get("fw_update_abnormality_last_update_datetime"),
-                    ":di1_last_update_datetime": current_state_info.get("di1_last_update_datetime"),
-                    ":di2_last_update_datetime": current_state_info.get("di2_last_update_datetime"),
-                    ":di3_last_update_datetime": current_state_info.get("di3_last_update_datetime"),
-                    ":di4_last_update_datetime": current_state_info.get("di4_last_update_datetime"),
-                    ":di5_last_update_datetime": current_state_info.get("di5_last_update_datetime"),
-                    ":di6_last_update_datetime": current_state_info.get("di6_last_update_datetime"),
-                    ":di7_last_update_datetime": current_state_info.get("di7_last_update_datetime"),
-                    ":di8_last_update_datetime": current_state_info.get("di8_last_update_datetime"),
-                    ":do1_last_update_datetime": current_state_info.get("do1_last_update_datetime"),
-                    ":do2_last_update_datetime": current_state_info.get("do2_last_update_datetime"),
-                    ":signal_state": current_state_info.get("signal_state"),
-                    ":battery_near_state": current_state_info.get("battery_near_state"),
-                    ":device_abnormality": current_state_info.get("device_abnormality"),
-                    ":parameter_abnormality": current_state_info.get("parameter_abnormality"),
-                    ":fw_update_abnormality": current_state_info.get("fw_update_abnormality"),
-                    ":di1_state": current_state_info.get("di1_state"),
-                    ":di2_state": current_state_info.get("di2_state"),
-                    ":di3_state": current_state_info.get("di3_state"),
-                    ":di4_state": current_state_info.get("di4_state"),
-                    ":di5_state": current_state_info.get("di5_state"),
-                    ":di6_state": current_state_info.get("di6_state"),
-                    ":di7_state": current_state_info.get("di7_state"),
-                    ":di8_state": current_state_info.get("di8_state"),
-                    ":do1_state": current_state_info.get("do1_state"),
-                    ":do2_state": current_state_info.get("do2_state"),
-                    ":signal_last_change_datetime": current_state_info.get("signal_last_change_datetime"),
-                    ":battery_near_last_change_datetime": current_state_info.get("battery_near_last_change_datetime"),
-                    ":device_abnormality_last_change_datetime": current_state_info.get("device_abnormality_last_change_datetime"),
-                    ":parameter_abnormality_last_change_datetime": current_state_info.get("parameter_abnormality_last_change_datetime"),
-                    ":fw_update_abnormality_last_change_datetime": current_state_info.get("fw_update_abnormality_last_change_datetime"),
-                    ":di1_last_change_datetime": current_state_info.get("di1_last_change_datetime"),
-                    ":di2_last_change_datetime": current_state_info.get("di2_last_change_datetime"),
-                    ":di3_last_change_datetime": current_state_info.get("di3_last_change_datetime"),
-                    ":di4_last_change_datetime": current_state_info.get("di4_last_change_datetime"),
-                    ":di5_last_change_datetime": current_state_info.get("di5_last_change_datetime"),
-                    ":di6_last_change_datetime": current_state_info.get("di6_last_change_datetime"),
-                    ":di7_last_change_datetime": current_state_info.get("di7_last_change_datetime"),
-                    ":di8_last_change_datetime": current_state_info.get("di8_last_change_datetime"),
-                    ":do1_last_change_datetime": current_state_info.get("do1_last_change_datetime"),
-                    ":do2_last_change_datetime": current_state_info.get("do2_last_change_datetime"),
-                    ":di1_healthy_state": current_state_info.get("di1_healthy_state", 0),
-                    ":di2_healthy_state": current_state_info.get("di2_healthy_state", 0),
-                    ":di3_healthy_state": current_state_info.get("di3_healthy_state", 0),
-                    ":di4_healthy_state": current_state_info.get("di4_healthy_state", 0),
-                    ":di5_healthy_state": current_state_info.get("di5_healthy_state", 0),
-                    ":di6_healthy_state": current_state_info.get("di6_healthy_state", 0),
-                    ":di7_healthy_state": current_state_info.get("di7_healthy_state", 0),
-                    ":di8_healthy_state": current_state_info.get("di8_healthy_state", 0),
-                    ":device_healthy_state": current_state_info.get("device_healthy_state", 0),
-                },
-            }
-        elif (update_digit & 0b0001) == 0b0001:
-            option = {
-                "Key": {
-                    "device_id": current_state_info['device_id'],
-                },
-                "UpdateExpression": "set #signal_last_update_datetime = :signal_last_update_datetime, \
-                    #battery_near_last_update_datetime = :battery_near_last_update_datetime, \
-                    #device_abnormality_last_update_datetime = :device_abnormality_last_update_datetime, \
-                    #parameter_abnormality_last_update_datetime = :parameter_abnormality_last_update_datetime, \
-                    #fw_update_abnormality_last_update_datetime = :fw_update_abnormality_last_update_datetime, \
-                    #di1_last_update_datetime = :di1_last_update_datetime, \
-                    #di2_last_update_datetime = :di2_last_update_datetime, \
-                    #di3_last_update_datetime = :di3_last_update_datetime, \
-                    #di4_last_update_datetime = :di4_last_update_datetime, \
-                    #di5_last_update_datetime = :di5_last_update_datetime, \
-                    #di6_last_update_datetime = :di6_last_update_datetime, \
-                    #di7_last_update_datetime = :di7_last_update_datetime, \
-                    #di8_last_update_datetime = :di8_last_update_datetime, \
-                    #do1_last_update_datetime = :do1_last_update_datetime, \
-                    #do2_last_update_datetime = :do2_last_update_datetime, \
-                    #signal_state = :signal_state, \
-                    #battery_near_state = :battery_near_state, \
-                    #device_abnormality = :device_abnormality, \
-                    #parameter_abnormality = :parameter_abnormality, \
-                    #fw_update_abnormality = :fw_update_abnormality, \
-                    #di1_state = :di1_state, \
-                    #di2_state = :di2_state, \
-                    #di3_state = :di3_state, \
-                    #di4_state = :di4_state, \
-                    #di5_state = :di5_state, \
-                    #di6_state = :di6_state, \
-                    #di7_state = :di7_state, \
-                    #di8_state = :di8_state, \
-                    #do1_state = :do1_state, \
-                    #do2_state = :do2_state, \
-                    #signal_last_change_datetime = :signal_last_change_datetime, \
-                    #battery_near_last_change_datetime = :battery_near_last_change_datetime, \
-                    #device_abnormality_last_change_datetime = :device_abnormality_last_change_datetime, \
-                    #parameter_abnormality_last_change_datetime = :parameter_abnormality_last_change_datetime, \
-                    #fw_update_abnormality_last_change_datetime = :fw_update_abnormality_last_change_datetime, \
-                    #di1_last_change_datetime = :di1_last_change_datetime, \
-                    #di2_last_change_datetime = :di2_last_change_datetime, \
-                    #di3_last_change_datetime = :di3_last_change_datetime, \
-                    #di4_last_change_datetime = :di4_last_change_datetime, \
-                    #di5_last_change_datetime = :di5_last_change_datetime, \
-                    #di6_last_change_datetime = :di6_last_change_datetime, \
-                    #di7_last_change_datetime = :di7_last_change_datetime, \
-                    #di8_last_change_datetime = :di8_last_change_datetime, \
-                    #do1_last_change_datetime = :do1_last_change_datetime, \
-                    #do2_last_change_datetime = :do2_last_change_datetime, \
-                    #device_healthy_state = :device_healthy_state",
-                "ExpressionAttributeNames": {
-                    "#signal_last_update_datetime": "signal_last_update_datetime",
-                    "#battery_near_last_update_datetime": "battery_near_last_update_datetime",
-                    "#device_abnormality_last_update_datetime": "device_abnormality_last_update_datetime",
-                    "#parameter_abnormality_last_update_datetime": "parameter_abnormality_last_update_datetime",
-                    "#fw_update_abnormality_last_update_datetime": "fw_update_abnormality_last_update_datetime",
-                    "#di1_last_update_datetime": "di1_last_update_datetime",
-                    "#di2_last_update_datetime": "di2_last_update_datetime",
-                    "#di3_last_update_datetime": "di3_last_update_datetime",
-                    "#di4_last_update_datetime": "di4_last_update_datetime",
-                    "#di5_last_update_datetime": "di5_last_update_datetime",
-                    "#di6_last_update_datetime": "di6_last_update_datetime",
-                    "#di7_last_update_datetime": "di7_last_update_datetime",
-                    "#di8_last_update_datetime": "di8_last_update_datetime",
-                    "#do1_last_update_datetime": "do1_last_update_datetime",
-                    "#do2_last_update_datetime": "do2_last_update_datetime",
-                    "#signal_state": "signal_state",
-                    "#battery_near_state": "battery_near_state",
-                    "#device_abnormality": "device_abnormality",
-                    "#parameter_abnormality": "parameter_abnormality",
-                    "#fw_update_abnormality": "fw_update_abnormality",
-                    "#di1_state": "di1_state",
-                    "#di2_state": "di2_state",
-                    "#di3_state": "di3_state",
-                    "#di4_state": "di4_state",
-                    "#di5_state": "di5_state",
-                    "#di6_state": "di6_state",
-                    "#di7_state": "di7_state",
-                    "#di8_state": "di8_state",
-                    "#do1_state": "do1_state",
-                    "#do2_state": "do2_state",
-                    "#signal_last_change_datetime": "signal_last_change_datetime",
-                    "#battery_near_last_change_datetime": "battery_near_last_change_datetime",
-                    "#device_abnormality_last_change_datetime": "device_abnormality_last_change_datetime",
-                    "#parameter_abnormality_last_change_datetime": "parameter_abnormality_last_change_datetime",
-                    "#fw_update_abnormality_last_change_datetime": "fw_update_abnormality_last_change_datetime",
-                    "#di1_last_change_datetime": "di1_last_change_datetime",
-                    "#di2_last_change_datetime": "di2_last_change_datetime",
-                    "#di3_last_change_datetime": "di3_last_change_datetime",
-                    "#di4_last_change_datetime": "di4_last_change_datetime",
-                    "#di5_last_change_datetime": "di5_last_change_datetime",
-                    "#di6_last_change_datetime": "di6_last_change_datetime",
-                    "#di7_last_change_datetime": "di7_last_change_datetime",
-                    "#di8_last_change_datetime": "di8_last_change_datetime",
-                    "#do1_last_change_datetime": "do1_last_change_datetime",
-                    "#do2_last_change_datetime": "do2_last_change_datetime",
-                    "#device_healthy_state": "device_healthy_state",
-                },
-                "ExpressionAttributeValues": {
-                    ":signal_last_update_datetime": current_state_info.get("signal_last_update_datetime"),
-                    ":battery_near_last_update_datetime": current_state_info.get("battery_near_last_update_datetime"),
-                    ":device_abnormality_last_update_datetime": current_state_info.get("device_abnormality_last_update_datetime"),
-                    ":parameter_abnormality_last_update_datetime": current_state_info.get("parameter_abnormality_last_update_datetime"),
-                    ":fw_update_abnormality_last_update_datetime": current_state_info.get("fw_update_abnormality_last_update_datetime"),
-                    ":di1_last_update_datetime": current_state_info.get("di1_last_update_datetime"),
-                    ":di2_last_update_datetime": current_state_info.get("di2_last_update_datetime"),
-                    ":di3_last_update_datetime": current_state_info.get("di3_last_update_datetime"),
-                    ":di4_last_update_datetime": current_state_info.get("di4_last_update_datetime"),
-                    ":di5_last_update_datetime": current_state_info.get("di5_last_update_datetime"),
-                    ":di6_last_update_datetime": current_state_info.get("di6_last_update_datetime"),
-                    ":di7_last_update_datetime": current_state_info.get("di7_last_update_datetime"),
-                    ":di8_last_update_datetime": current_state_info.get("di8_last_update_datetime"),
-                    ":do1_last_update_datetime": current_state_info.get("do1_last_update_datetime"),
-                    ":do2_last_update_datetime": current_state_info.get("do2_last_update_datetime"),
-                    ":signal_state": current_state_info.get("signal_state"),
-                    ":battery_near_state": current_state_info.get("battery_near_state"),
-                    ":device_abnormality": current_state_info.get("device_abnormality"),
-                    ":parameter_abnormality": current_state_info.get("parameter_abnormality"),
-                    ":fw_update_abnormality": current_state_info.get("fw_update_abnormality"),
-                    ":di1_state": current_state_info.get("di1_state"),
-                    ":di2_state": current_state_info.get("di2_state"),
-                    ":di3_state": current_state_info.get("di3_state"),
-                    ":di4_state": current_state_info.get("di4_state"),
-                    ":di5_state": current_state_info.get("di5_state"),
-                    ":di6_state": current_state_info.get("di6_state"),
-                    ":di7_state": current_state_info.get("di7_state"),
-                    ":di8_state": current_state_info.get("di8_state"),
-                    ":do1_state": current_state_info.get("do1_state"),
-                    ":do2_state": current_state_info.get("do2_state"),
-                    ":signal_last_change_datetime": current_state_info.get("signal_last_change_datetime"),
-                    ":battery_near_last_change_datetime": current_state_info.get("battery_near_last_change_datetime"),
-                    ":device_abnormality_last_change_datetime": current_state_info.get("device_abnormality_last_change_datetime"),
-                    ":parameter_abnormality_last_change_datetime": current_state_info.get("parameter_abnormality_last_change_datetime"),
-                    ":fw_update_abnormality_last_change_datetime": current_state_info.get("fw_update_abnormality_last_change_datetime"),
-                    ":di1_last_change_datetime": current_state_info.get("di1_last_change_datetime"),
-                    ":di2_last_change_datetime": current_state_info.get("di2_last_change_datetime"),
-                    ":di3_last_change_datetime": current_state_info.get("di3_last_change_datetime"),
-                    ":di4_last_change_datetime": current_state_info.get("di4_last_change_datetime"),
-                    ":di5_last_change_datetime": current_state_info.get("di5_last_change_datetime"),
-                    ":di6_last_change_datetime": current_state_info.get("di6_last_change_datetime"),
-                    ":di7_last_change_datetime": current_state_info.get("di7_last_change_datetime"),
-                    ":di8_last_change_datetime": current_state_info.get("di8_last_change_datetime"),
-                    ":do1_last_change_datetime": current_state_info.get("do1_last_change_datetime"),
-                    ":do2_last_change_datetime": current_state_info.get("do2_last_change_datetime"),
-                    ":device_healthy_state": current_state_info.get("device_healthy_state", 0),
-                },
-            }
-        elif (update_digit & 0b0010) == 0b0010:
-            option = {
-                "Key": {
-                    "device_id": current_state_info['device_id'],
-                },
-                "UpdateExpression": "set #signal_last_update_datetime = :signal_last_update_datetime, \
-                    #battery_near_last_update_datetime = :battery_near_last_update_datetime, \
-                    #device_abnormality_last_update_datetime = :device_abnormality_last_update_datetime, \
-                    #parameter_abnormality_last_update_datetime = :parameter_abnormality_last_update_datetime, \
-                    #fw_update_abnormality_last_update_datetime = :fw_update_abnormality_last_update_datetime, \
-                    #di1_last_update_datetime = :di1_last_update_datetime, \
-                    #di2_last_update_datetime = :di2_last_update_datetime, \
-                    #di3_last_update_datetime = :di3_last_update_datetime, \
-                    #di4_last_update_datetime = :di4_last_update_datetime, \
-                    #di5_last_update_datetime = :di5_last_update_datetime, \
-                    #di6_last_update_datetime = :di6_last_update_datetime, \
-                    #di7_last_update_datetime = :di7_last_update_datetime, \
-                    #di8_last_update_datetime = :di8_last_update_datetime, \
-                    #do1_last_update_datetime = :do1_last_update_datetime, \
-                    #do2_last_update_datetime = :do2_last_update_datetime, \
-                    #signal_state = :signal_state, \
-                    #battery_near_state = :battery_near_state, \
-                    #device_abnormality = :device_abnormality, \
-                    #parameter_abnormality = :parameter_abnormality, \
-                    #fw_update_abnormality = :fw_update_abnormality, \
-                    #di1_state = :di1_state, \
-                    #di2_state = :di2_state, \
-                    #di3_state = :di3_state, \
-                    #di4_state = :di4_state, \
-                    #di5_state = :di5_state, \
-                    #di6_state = :di6_state, \
-                    #di7_state = :di7_state, \
-                    #di8_state = :di8_state, \
-                    #do1_state = :do1_state, \
-                    #do2_state = :do2_state, \
-                    #signal_last_change_datetime = :signal_last_change_datetime, \
-                    #battery_near_last_change_datetime = :battery_near_last_change_datetime, \
-                    #device_abnormality_last_change_datetime = :device_abnormality_last_change_datetime, \
-                    #parameter_abnormality_last_change_datetime = :parameter_abnormality_last_change_datetime, \
-                    #fw_update_abnormality_last_change_datetime = :fw_update_abnormality_last_change_datetime, \
-                    #di1_last_change_datetime = :di1_last_change_datetime, \
-                    #di2_last_change_datetime = :di2_last_change_datetime, \
-                    #di3_last_change_datetime = :di3_last_change_datetime, \
-                    #di4_last_change_datetime = :di4_last_change_datetime, \
-                    #di5_last_change_datetime = :di5_last_change_datetime, \
-                    #di6_last_change_datetime = :di6_last_change_datetime, \
-                    #di7_last_change_datetime = :di7_last_change_datetime, \
-                    #di8_last_change_datetime = :di8_last_change_datetime, \
-                    #do1_last_change_datetime = :do1_last_change_datetime, \
-                    #do2_last_change_datetime = :do2_last_change_datetime, \
-                    #di1_healthy_state = :di1_healthy_state, \
-                    #di2_healthy_state = :di2_healthy_state, \
-                    #di3_healthy_state = :di3_healthy_state, \
-                    #di4_healthy_state = :di4_healthy_state, \
-                    #di5_healthy_state = :di5_healthy_state, \
-                    #di6_healthy_state = :di6_healthy_state, \
-                    #di7_healthy_state = :di7_healthy_state, \
-                    #di8_healthy_state = :di8_healthy_state",
-                "ExpressionAttributeNames": {
-                    "#signal_last_update_datetime": "signal_last_update_datetime",
-                    "#battery_near_last_update_datetime": "battery_near_last_update_datetime",
-                    "#device_abnormality_last_update_datetime": "device_abnormality_last_update_datetime",
-                    "#parameter_abnormality_last_update_datetime": "parameter_abnormality_last_update_datetime",
-                    "#fw_update_abnormality_last_update_datetime": "fw_update_abnormality_last_update_datetime",
-                    "#di1_last_update_datetime": "di1_last_update_datetime",
-                    "#di2_last_update_datetime": "di2_last_update_datetime",
-                    "#di3_last_update_datetime": "di3_last_update_datetime",
-                    "#di4_last_update_datetime": "di4_last_update_datetime",
-                    "#di5_last_update_datetime": "di5_last_update_datetime",
-                    "#di6_last_update_datetime": "di6_last_update_datetime",
-                    "#di7_last_update_datetime": "di7_last_update_datetime",
-                    "#di8_last_update_datetime": "di8_last_update_datetime",
-                    "#do1_last_update_datetime": "do1_last_update_datetime",
-                    "#do2_last_update_datetime": "do2_last_update_datetime",
-                    "#signal_state": "signal_state",
-                    "#battery_near_state": "battery_near_state",
-                    "#device_abnormality": "device_abnormality",
-                    "#parameter_abnormality": "parameter_abnormality",
-                    "#fw_update_abnormality": "fw_update_abnormality",
-                    "#di1_state": "di1_state",
-                    "#di2_state": "di2_state",
-                    "#di3_state": "di3_state",
-                    "#di4_state": "di4_state",
-                    "#di5_state": "di5_state",
-                    "#di6_state": "di6_state",
-                    "#di7_state": "di7_state",
-                    "#di8_state": "di8_state",
-                    "#do1_state": "do1_state",
-                    "#do2_state": "do2_state",
-                    "#signal_last_change_datetime": "signal_last_change_datetime",
-                    "#battery_near_last_change_datetime": "battery_near_last_change_datetime",
-                    "#device_abnormality_last_change_datetime": "device_abnormality_last_change_datetime",
-                    "#parameter_abnormality_last_change_datetime": "parameter_abnormality_last_change_datetime",
-                    "#fw_update_abnormality_last_change_datetime": "fw_update_abnormality_last_change_datetime",
-                    "#di1_last_change_datetime": "di1_last_change_datetime",
-                    "#di2_last_change_datetime": "di2_last_change_datetime",
-                    "#di3_last_change_datetime": "di3_last_change_datetime",
-                    "#di4_last_change_datetime": "di4_last_change_datetime",
-                    "#di5_last_change_datetime": "di5_last_change_datetime",
-                    "#di6_last_change_datetime": "di6_last_change_datetime",
-                    "#di7_last_change_datetime": "di7_last_change_datetime",
-                    "#di8_last_change_datetime": "di8_last_change_datetime",
-                    "#do1_last_change_datetime": "do1_last_change_datetime",
-                    "#do2_last_change_datetime": "do2_last_change_datetime",
-                    "#di1_healthy_state": "di1_healthy_state",
-                    "#di2_healthy_state": "di2_healthy_state",
-                    "#di3_healthy_state": "di3_healthy_state",
-                    "#di4_healthy_state": "di4_healthy_state",
-                    "#di5_healthy_state": "di5_healthy_state",
-                    "#di6_healthy_state": "di6_healthy_state",
-                    "#di7_healthy_state": "di7_healthy_state",
-                    "#di8_healthy_state": "di8_healthy_state",
-                },
-                "ExpressionAttributeValues": {
-                    ":signal_last_update_datetime": current_state_info.get("signal_last_update_datetime"),
-                    ":battery_near_last_update_datetime": current_state_info.get("battery_near_last_update_datetime"),
-                    ":device_abnormality_last_update_datetime": current_state_info.get("device_abnormality_last_update_datetime"),
-                    ":parameter_abnormality_last_update_datetime": current_state_info.get("parameter_abnormality_last_update_datetime"),
-                    ":fw_update_abnormality_last_update_datetime": current_state_info.get("fw_update_abnormality_last_update_datetime"),
-                    ":di1_last_update_datetime": current_state_info.get("di1_last_update_datetime"),
-                    ":di2_last_update_datetime": current_state_info.get("di2_last_update_datetime"),
-                    ":di3_last_update_datetime": current_state_info.get("di3_last_update_datetime"),
-                    ":di4_last_update_datetime": current_state_info.get("di4_last_update_datetime"),
-                    ":di5_last_update_datetime": current_state_info.get("di5_last_update_datetime"),
-                    ":di6_last_update_datetime": current_state_info.get("di6_last_update_datetime"),
-                    ":di7_last_update_datetime": current_state_info.get("di7_last_update_datetime"),
-                    ":di8_last_update_datetime": current_state_info.get("di8_last_update_datetime"),
-                    ":do1_last_update_datetime": current_state_info.get("do1_last_update_datetime"),
-                    ":do2_last_update_datetime": current_state_info.get("do2_last_update_datetime"),
-                    ":signal_state": current_state_info.get("signal_state"),
-                    ":battery_near_state": current_state_info.get("battery_near_state"),
-                    ":device_abnormality": current_state_info.get("device_abnormality"),
-                    ":parameter_abnormality": current_state_info.get("parameter_abnormality"),
-                    ":fw_update_abnormality": current_state_info.get("fw_update_abnormality"),
-                    ":di1_state": current_state_info.get("di1_state"),
-                    ":di2_state": current_state_info.get("di2_state"),
-                    ":di3_state": current_state_info.get("di3_state"),
-                    ":di4_state": current_state_info.get("di4_state"),
-                    ":di5_state": current_state_info.get("di5_state"),
-                    ":di6_state": current_state_info.get("di6_state"),
-                    ":di7_state": current_state_info.get("di7_state"),
-                    ":di8_state": current_state_info.get("di8_state"),
-                    ":do1_state": current_state_info.get("do1_state"),
-                    ":do2_state": current_state_info.get("do2_state"),
-                    ":signal_last_change_datetime": current_state_info.get("signal_last_change_datetime"),
-                    ":battery_near_last_change_datetime": current_state_info.get("battery_near_last_change_datetime"),
-                    ":device_abnormality_last_change_datetime": current_state_info.get("device_abnormality_last_change_datetime"),
-                    ":parameter_abnormality_last_change_datetime": current_state_info.get("parameter_abnormality_last_change_datetime"),
-                    ":fw_update_abnormality_last_change_datetime": current_state_info.get("fw_update_abnormality_last_change_datetime"),
-                    ":di1_last_change_datetime": current_state_info.get("di1_last_change_datetime"),
-                    ":di2_last_change_datetime": current_state_info.get("di2_last_change_datetime"),
-                    ":di3_last_change_datetime": current_state_info.get("di3_last_change_datetime"),
-                    ":di4_last_change_datetime": current_state_info.get("di4_last_change_datetime"),
-                    ":di5_last_change_datetime": current_state_info.get("di5_last_change_datetime"),
-                    ":di6_last_change_datetime": current_state_info.get("di6_last_change_datetime"),
-                    ":di7_last_change_datetime": current_state_info.get("di7_last_change_datetime"),
-                    ":di8_last_change_datetime": current_state_info.get("di8_last_change_datetime"),
-                    ":do1_last_change_datetime": current_state_info.get("do1_last_change_datetime"),
-                    ":do2_last_change_datetime": current_state_info.get("do2_last_change_datetime"),
-                    ":di1_healthy_state": current_state_info.get("di1_healthy_state", 0),
-                    ":di2_healthy_state": current_state_info.get("di2_healthy_state", 0),
-                    ":di3_healthy_state": current_state_info.get("di3_healthy_state", 0),
-                    ":di4_healthy_state": current_state_info.get("di4_healthy_state", 0),
-                    ":di5_healthy_state": current_state_info.get("di5_healthy_state", 0),
-                    ":di6_healthy_state": current_state_info.get("di6_healthy_state", 0),
-                    ":di7_healthy_state": current_state_info.get("di7_healthy_state", 0),
-                    ":di8_healthy_state": current_state_info.get("di8_healthy_state", 0),
-                },
-            }
+# 受信前の現状態（device_current_state）との差分のみ更新する
+# 読み込み後に他の電文で現状態が更新された場合に上書きしないよう、
+# 読み込んだ最終更新電文のイベント発生日時（last_event_datetime）と一致することを条件とする
+# 条件不一致の場合は現状態を再取得し、より新しい電文で更新済みでなければ差分を取り直して再更新する
+def update_current_state(current_state_info, device_current_state, device_info, event_datetime, state_table):
+    device_id = current_state_info["device_id"]
+    device_type = device_info["device_type"]
+    for retry in range(UPDATE_CURRENT_STATE_RETRY + 1):
+        read_event_datetime = (device_current_state or {}).get("last_event_datetime")
+        if read_event_datetime is not None and read_event_datetime > event_datetime:
+            logger.info(
+                f"より新しい電文で現状態更新済みのため更新なし device_id={device_id}, event_datetime={event_datetime}"
+            )
+            return
+
+        update_values = _currentStateDiff(current_state_info, device_current_state, device_type)
+        update_values["last_event_datetime"] = event_datetime
+        option = {
+            "Key": {
+                "device_id": device_id,
+            },
+            "UpdateExpression": "set " + ", ".join(f"#{key} = :{key}" for key in update_values),
+            "ExpressionAttributeNames": {f"#{key}": key for key in update_values},
+            "ExpressionAttributeValues": {f":{key}": value for key, value in update_values.items()},
+            "ReturnValues": "ALL_NEW",
+        }
+        if read_event_datetime is None:
+            option["ConditionExpression"] = "attribute_not_exists(#last_event_datetime)"
         else:
-            option = {
-                "Key": {
-                    "device_id": current_state_info['device_id'],
-                },
-                "UpdateExpression": "set #signal_last_update_datetime = :signal_last_update_datetime, \
-                    #battery_near_last_update_datetime = :battery_near_last_update_datetime, \
-                    #device_abnormality_last_update_datetime = :device_abnormality_last_update_datetime, \
-                    #parameter_abnormality_last_update_datetime = :parameter_abnormality_last_update_datetime, \
-                    #fw_update_abnormality_last_update_datetime = :fw_update_abnormality_last_update_datetime, \
-                    #di1_last_update_datetime = :di1_last_update_datetime, \
-                    #di2_last_update_datetime = :di2_last_update_datetime, \
-                    #di3_last_update_datetime = :di3_last_update_datetime, \
-                    #di4_last_update_datetime = :di4_last_update_datetime, \
-                    #di5_last_update_datetime = :di5_last_update_datetime, \
-                    #di6_last_update_datetime = :di6_last_update_datetime, \
-                    #di7_last_update_datetime = :di7_last_update_datetime, \
-                    #di8_last_update_datetime = :di8_last_update_datetime, \
-                    #do1_last_update_datetime = :do1_last_update_datetime, \
-                    #do2_last_update_datetime = :do2_last_update_datetime, \
-                    #signal_state = :signal_state, \
-                    #battery_near_state = :battery_near_state, \
-                    #device_abnormality = :device_abnormality, \
-                    #parameter_abnormality = :parameter_abnormality, \
-                    #fw_update_abnormality = :fw_update_abnormality, \
-                    #di1_state = :di1_state, \
-                    #di2_state = :di2_state, \
-                    #di3_state = :di3_state, \
-                    #di4_state = :di4_state, \
-                    #di5_state = :di5_state, \
-                    #di6_state = :di6_state, \
-                    #di7_state = :di7_state, \
-                    #di8_state = :di8_state, \
-                    #do1_state = :do1_state, \
-                    #do2_state = :do2_state, \
-                    #signal_last_change_datetime = :signal_last_change_datetime, \
-                    #battery_near_last_change_datetime = :battery_near_last_change_datetime, \
-                    #device_abnormality_last_change_datetime = :device_abnormality_last_change_datetime, \
-                    #parameter_abnormality_last_change_datetime = :parameter_abnormality_last_change_datetime, \
-                    #fw_update_abnormality_last_change_datetime = :fw_update_abnormality_last_change_datetime, \
-                    #di1_last_change_datetime = :di1_last_change_datetime, \
-                    #di2_last_change_datetime = :di2_last_change_datetime, \
-                    #di3_last_change_datetime = :di3_last_change_datetime, \
-                    #di4_last_change_datetime = :di4_last_change_datetime, \
-                    #di5_last_change_datetime = :di5_last_change_datetime, \
-                    #di6_last_change_datetime = :di6_last_change_datetime, \
-                    #di7_last_change_datetime = :di7_last_change_datetime, \
-                    #di8_last_change_datetime = :di8_last_change_datetime, \
-                    #do1_last_change_datetime = :do1_last_change_datetime, \
-                    #do2_last_change_datetime = :do2_last_change_datetime",
-                "ExpressionAttributeNames": {
-                    "#signal_last_update_datetime": "signal_last_update_datetime",
-                    "#battery_near_last_update_datetime": "battery_near_last_update_datetime",
-                    "#device_abnormality_last_update_datetime": "device_abnormality_last_update_datetime",
-                    "#parameter_abnormality_last_update_datetime": "parameter_abnormality_last_update_datetime",
-                    "#fw_update_abnormality_last_update_datetime": "fw_update_abnormality_last_update_datetime",
-                    "#di1_last_update_datetime": "di1_last_update_datetime",
-                    "#di2_last_update_datetime": "di2_last_update_datetime",
-                    "#di3_last_update_datetime": "di3_last_update_datetime",
-                    "#di4_last_update_datetime": "di4_last_update_datetime",
-                    "#di5_last_update_datetime": "di5_last_update_datetime",
-                    "#di6_last_update_datetime": "di6_last_update_datetime",
-                    "#di7_last_update_datetime": "di7_last_update_datetime",
-                    "#di8_last_update_datetime": "di8_last_update_datetime",
-                    "#do1_last_update_datetime": "do1_last_update_datetime",
-                    "#do2_last_update_datetime": "do2_last_update_datetime",
-                    "#signal_state": "signal_state",
-                    "#battery_near_state": "battery_near_state",
-                    "#device_abnormality": "device_abnormality",
-                    "#parameter_abnormality": "parameter_abnormality",
-                    "#fw_update_abnormality": "fw_update_abnormality",
-                    "#di1_state": "di1_state",
-                    "#di2_state": "di2_state",
-                    "#di3_state": "di3_state",
-                    "#di4_state": "di4_state",
-                    "#di5_state": "di5_state",
-                    "#di6_state": "di6_state",
-                    "#di7_state": "di7_state",
-                    "#di8_state": "di8_state",
-                    "#do1_state": "do1_state",
-                    "#do2_state": "do2_state",
-                    "#signal_last_change_datetime": "signal_last_change_datetime",
-                    "#battery_near_last_change_datetime": "battery_near_last_change_datetime",
-                    "#device_abnormality_last_change_datetime": "device_abnormality_last_change_datetime",
-                    "#parameter_abnormality_last_change_datetime": "parameter_abnormality_last_change_datetime",
-                    "#fw_update_abnormality_last_change_datetime": "fw_update_abnormality_last_change_datetime",
-                    "#di1_last_change_datetime": "di1_last_change_datetime",
-                    "#di2_last_change_datetime": "di2_last_change_datetime",
-                    "#di3_last_change_datetime": "di3_last_change_datetime",
-                    "#di4_last_change_datetime": "di4_last_change_datetime",
-                    "#di5_last_change_datetime": "di5_last_change_datetime",
-                    "#di6_last_change_datetime": "di6_last_change_datetime",
-                    "#di7_last_change_datetime": "di7_last_change_datetime",
-                    "#di8_last_change_datetime": "di8_last_change_datetime",
-                    "#do1_last_change_datetime": "do1_last_change_datetime",
-                    "#do2_last_change_datetime": "do2_last_change_datetime",
-                },
-                "ExpressionAttributeValues": {
-                    ":signal_last_update_datetime": current_state_info.get("signal_last_update_datetime"),
-                    ":battery_near_last_update_datetime": current_state_info.get("battery_near_last_update_datetime"),
-                    ":device_abnormality_last_update_datetime": current_state_info.get("device_abnormality_last_update_datetime"),
-                    ":parameter_abnormality_last_update_datetime": current_state_info.get("parameter_abnormality_last_update_datetime"),
-                    ":fw_update_abnormality_last_update_datetime": current_state_info.get("fw_update_abnormality_last_update_datetime"),
-                    ":di1_last_update_datetime": current_state_info.get("di1_last_update_datetime"),
-                    ":di2_last_update_datetime": current_state_info.get("di2_last_update_datetime"),
-                    ":di3_last_update_datetime": current_state_info.get("di3_last_update_datetime"),
-                    ":di4_last_update_datetime": current_state_info.get("di4_last_update_datetime"),
-                    ":di5_last_update_datetime": current_state_info.get("di5_last_update_datetime"),
-                    ":di6_last_update_datetime": current_state_info.get("di6_last_update_datetime"),
-                    ":di7_last_update_datetime": current_state_info.get("di7_last_update_datetime"),
-                    ":di8_last_update_datetime": current_state_info.get("di8_last_update_datetime"),
-                    ":do1_last_update_datetime": current_state_info.get("do1_last_update_datetime"),
-                    ":do2_last_update_datetime": current_state_info.get("do2_last_update_datetime"),
-                    ":signal_state": current_state_info.get("signal_state"),
-                    ":battery_near_state": current_state_info.get("battery_near_state"),
-                    ":device_abnormality": current_state_info.get("device_abnormality"),
-                    ":parameter_abnormality": current_state_info.get("parameter_abnormality"),
-                    ":fw_update_abnormality": current_state_info.get("fw_update_abnormality"),
-                    ":di1_state": current_state_info.get("di1_state"),
-                    ":di2_state": current_state_info.get("di2_state"),
-                    ":di3_state": current_state_info.get("di3_state"),
-                    ":di4_state": current_state_info.get("di4_state"),
-                    ":di5_state": current_state_info.get("di5_state"),
-                    ":di6_state": current_state_info.get("di6_state"),
-                    ":di7_state": current_state_info.get("di7_state"),
-                    ":di8_state": current_state_info.get("di8_state"),
-                    ":do1_state": current_state_info.get("do1_state"),
-                    ":do2_state": current_state_info.get("do2_state"),
-                    ":signal_last_change_datetime": current_state_info.get("signal_last_change_datetime"),
-                    ":battery_near_last_change_datetime": current_state_info.get("battery_near_last_change_datetime"),
-                    ":device_abnormality_last_change_datetime": current_state_info.get("device_abnormality_last_change_datetime"),
-                    ":parameter_abnormality_last_change_datetime": current_state_info.get("parameter_abnormality_last_change_datetime"),
-                    ":fw_update_abnormality_last_change_datetime": current_state_info.get("fw_update_abnormality_last_change_datetime"),
-                    ":di1_last_change_datetime": current_state_info.get("di1_last_change_datetime"),
-                    ":di2_last_change_datetime": current_state_info.get("di2_last_change_datetime"),
-                    ":di3_last_change_datetime": current_state_info.get("di3_last_change_datetime"),
-                    ":di4_last_change_datetime": current_state_info.get("di4_last_change_datetime"),
-                    ":di5_last_change_datetime": current_state_info.get("di5_last_change_datetime"),
-                    ":di6_last_change_datetime": current_state_info.get("di6_last_change_datetime"),
-                    ":di7_last_change_datetime": current_state_info.get("di7_last_change_datetime"),
-                    ":di8_last_change_datetime": current_state_info.get("di8_last_change_datetime"),
-                    ":do1_last_change_datetime": current_state_info.get("do1_last_change_datetime"),
-                    ":do2_last_change_datetime": current_state_info.get("do2_last_change_datetime"),
-                },
-            }
-    logger.debug(f"option={option}")
+            option["ConditionExpression"] = "#last_event_datetime = :read_last_event_datetime"
+            option["ExpressionAttributeValues"][":read_last_event_datetime"] = read_event_datetime
+        logger.debug(f"option={option}")
 
-    try:
-        state_table.update_item(**option)
-    except ClientError as e:
-        logger.debug(f"update_current_stateエラー e={e}")
+        try:
+            device_state = state_table.update_item(**option).get("Attributes", {})
+            break
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                # 呼び出し元で登録を取り消して再送させる
+                logger.error(f"update_current_stateエラー e={e}")
+                raise
+            logger.info(f"現状態競合のため再取得 device_id={device_id}, retry={retry}")
+            device_current_state = get_device_state(device_id, state_table, consistent_read=True)
+    else:
+        raise RuntimeError(f"現状態更新の競合が解消しないため更新中止 device_id={device_id}")
 
     # カスタムタイマーイベント
-    device_state = get_device_state(current_state_info['device_id'], state_table)
     if "custom_timer_event_list" in device_state:
-        custom_timer_event_list = device_state.get("custom_timer_event_list")
+        custom_timer_event_list = copy.deepcopy(device_state.get("custom_timer_event_list"))
         wk_custom_timer_event_list = current_state_info.get("custom_timer_event_list") or []
         for custom_timer_event in custom_timer_event_list:
             for wk_custom_timer_event in wk_custom_timer_event_list:
@@ -1021,6 +316,9 @@ def update_current_state(current_state_info, device_info, update_digit, state_ta
                             di_event["di_custom_event_state"] = wk_di_event.get("di_custom_event_state")
                             di_event["event_judge_datetime"] = wk_di_event.get("event_judge_datetime")
                             di_event["delay_flag"] = wk_di_event.get("delay_flag")
+        if custom_timer_event_list == device_state.get("custom_timer_event_list"):
+            # 変更なし
+            return
     else:
         custom_timer_event_list = current_state_info.get("custom_timer_event_list") or []
 
@@ -1041,7 +339,18 @@ def update_current_state(current_state_info, device_info, update_digit, state_ta
     try:
         state_table.update_item(**option)
     except ClientError as e:
-        logger.debug(f"update_current_stateエラー e={e}")
+        logger.error(f"update_current_stateエラー e={e}")
+        raise
+
+
+# 記録済みの制御結果が受信電文のものか判定
+# 後続の登録失敗で登録を取り消した応答電文の再送は、記録済みでも履歴一覧・イベント通知を作成する
+# （タイムアウト時の記録はイベント発生日時を持たないため一致しない）
+def is_recorded_control_res(remote_control_info, recv_data):
+    return (
+        remote_control_info.get("event_datetime") == recv_data["event_datetime"]
+        and remote_control_info.get("control_result") == recv_data["control_result"]
+    )
 
 
 # 接点出力制御応答データ更新
@@ -1055,7 +364,8 @@ def update_control_res(db_item, remote_control_table):
         req_datetime = cnt_state["req_datetime"]
         # 制御結果記録済みの場合は未更新
         if "control_result" in cnt_state:
-            return False
+            # 同じ応答電文の再送は記録済みとして後続処理を続ける
+            return is_recorded_control_res(cnt_state, db_item)
 
     logger.debug(f"req_datetime={req_datetime}")
     option = {
@@ -1094,6 +404,8 @@ def update_control_res(db_item, remote_control_table):
             ":do_state": db_item["do_state"],
             ":iccid": db_item["iccid"],
         },
+        # 取得後にタイムアウトで制御結果が記録された場合は更新しない
+        "ConditionExpression": "attribute_not_exists(#control_result)",
     }
     logger.debug(f"option={option}")
 
@@ -1101,7 +413,12 @@ def update_control_res(db_item, remote_control_table):
         remote_control_table.update_item(**option)
         return True
     except ClientError as e:
-        logger.debug(f"update_control_resエラー e={e}")
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            logger.debug(f"制御結果記録済み device_req_no={db_item['device_req_no']}")
+            return False
+        # 呼び出し元で登録を取り消して再送させる
+        logger.error(f"update_control_resエラー e={e}")
+        raise
 
 
 # 接点出力制御応答データ更新
@@ -1126,27 +443,137 @@ def update_control_res_link_di_result(
         logger.debug(f"update_control_res_link_di_resultエラー e={e}")
 
 
-# 履歴情報取得
-def get_history_count(simid, eventtime, hist_table):
-    res = hist_table.query(
-        IndexName="simid_index",
-        KeyConditionExpression=Key("simid").eq(simid)
-        & Key("event_datetime").eq(eventtime),
+# 冪等性キー（イベント発生日時#メッセージ種別、接点出力制御応答は#要求番号を付与）
+# 同一日時の状態通知と制御応答、別要求の制御応答を区別する
+def message_key(event_datetime, message_type, device_req_no=None):
+    key = f"{event_datetime}#{message_type}"
+    if device_req_no:
+        key = f"{key}#{device_req_no}"
+    return key
+
+
+# 受信済み電文判定（直近受信分）
+def is_recent_message(simid, key):
+    return recent_message_cache.get((simid, key)) is not None
+
+
+# 受信電文のICCID（接点出力制御応答はiccid項目に保持）
+def _simid(recv_data):
+    return recv_data.get("simid") or recv_data["iccid"]
+
+
+# 受信電文の冪等性キー
+def recv_message_key(recv_data):
+    return message_key(
+        recv_data["event_datetime"], recv_data["message_type"], recv_data.get("device_req_no")
     )
-    return res["Count"]
 
 
-# 通知履歴挿入
-def put_notice_hist(db_item, notification_hist_table):
-    item = json.loads(json.dumps(db_item), parse_float=decimal.Decimal)
-    try:
-        notification_hist_table.put_item(Item=item)
-    except ClientError as e:
-        logger.debug(f"put_notice_histエラー e={e}")
+###################################
+# 受信電文登録
+# 冪等性管理テーブルへの条件付き登録と履歴情報テーブルへの挿入を
+# 同一トランザクションで実行し、再送電文の多重処理を防止する
+# 接点出力制御応答（hist_flg=False）は冪等性キーのみ登録
+#
+# message_items : [(recv_data, hist_flg), ...]
+# 戻り値 : 登録結果リスト（True=登録、False=受信済み、None=登録エラー）
+###################################
+def claim_messages(message_items, idempotency_table, hist_table):
+    client = hist_table.meta.client
+    result = [False] * len(message_items)
+    # 1トランザクション最大100アイテム（1電文最大2アイテム）
+    for start in range(0, len(message_items), 50):
+        chunk = list(range(start, min(start + 50, len(message_items))))
+        while chunk:
+            transact_items = []
+            item_owner = []
+            for index in chunk:
+                recv_data, hist_flg = message_items[index]
+                transact_items.append(
+                    {
+                        "Put": {
+                            "TableName": idempotency_table.name,
+                            "Item": {
+                                "simid": _simid(recv_data),
+                                "message_key": recv_message_key(recv_data),
+                                "event_datetime": recv_data["event_datetime"],
+                                "recv_datetime": recv_data["recv_datetime"],
+                                "expire_datetime": (recv_data["event_datetime"] + RECV_PAST_TIME) // 1000,
+                            },
+                            "ConditionExpression": "attribute_not_exists(simid)",
+                        }
+                    }
+                )
+                item_owner.append(index)
+                if hist_flg:
+                    transact_items.append(
+                        {
+                            "Put": {
+                                "TableName": hist_table.name,
+                                "Item": convert.to_dynamo_item(recv_data),
+                            }
+                        }
+                    )
+                    item_owner.append(index)
+            try:
+                client.transact_write_items(TransactItems=transact_items)
+            except client.exceptions.TransactionCanceledException as e:
+                # 受信済み電文を除外して再実行
+                reasons = e.response.get("CancellationReasons", [])
+                duplicate_list = {
+                    item_owner[i]
+                    for i, reason in enumerate(reasons)
+                    if reason.get("Code") == "ConditionalCheckFailed"
+                }
+                if not duplicate_list:
+                    # 競合等（再送で再判定）
+                    logger.error(f"受信電文登録エラー e={e}")
+                    for index in chunk:
+                        result[index] = None
+                    break
+                for index in duplicate_list:
+                    recv_data = message_items[index][0]
+                    logger.debug(
+                        f"受信済み電文 simid={_simid(recv_data)}, message_key={recv_message_key(recv_data)}"
+                    )
+                    recent_message_cache.put((_simid(recv_data), recv_message_key(recv_data)), True)
+                chunk = [index for index in chunk if index not in duplicate_list]
+                continue
+            except ClientError as e:
+                logger.error(f"受信電文登録エラー e={e}")
+                for index in chunk:
+                    result[index] = None
+                break
+            for index in chunk:
+                recv_data = message_items[index][0]
+                result[index] = True
+                recent_message_cache.put((_simid(recv_data), recv_message_key(recv_data)), True)
+            chunk = []
+    return result
+
+
+###################################
+# 受信電文登録取消
+# 登録後の処理に失敗した電文を再送で処理できるよう、冪等性キーと履歴情報を削除する
+###################################
+def release_messages(message_items, idempotency_table, hist_table):
+    for recv_data, hist_flg in message_items:
+        recent_message_cache.invalidate((_simid(recv_data), recv_message_key(recv_data)))
+        try:
+            if hist_flg:
+                hist_table.delete_item(Key={"cnt_hist_id": recv_data["cnt_hist_id"]})
+            idempotency_table.delete_item(
+                Key={"simid": _simid(recv_data), "message_key": recv_message_key(recv_data)}
+            )
+        except ClientError as e:
+            logger.error(f"受信電文登録取消エラー simid={_simid(recv_data)}, e={e}")
 
 
 # グループ一覧取得
 def get_device_group_list(device_id, device_relation_table, group_table):
+    group_list = group_cache.get(device_id)
+    if group_list is not None:
+        return group_list
     group_id_list = db.get_device_relation_group_id_list(
         device_id, device_relation_table
     )
@@ -1162,19 +589,5 @@ def get_device_group_list(device_id, device_relation_table, group_table):
             )
     if group_list:
         group_list = sorted(group_list, key=lambda x: x["group_name"])
+    group_cache.put(device_id, group_list)
     return group_list
-
-
-def get_notice_mailaddress(user_id_list, user_table, account_table):
-    mailaddress_list = []
-    for item in user_id_list:
-        users_table_res = user_table.query(
-            KeyConditionExpression=Key("user_id").eq(item),
-        ).get("Items", [])
-        for items in users_table_res:
-            account_id = items["account_id"]
-            account_info = account_table.query(
-                KeyConditionExpression=Key("account_id").eq(account_id)
-            ).get("Items", [])
-            mailaddress_list.append(account_info[0]["email_address"])
-    return mailaddress_list
@@ -25,32 +25,184 @@ SIGNAL_MID = int(os.environ["SIGNAL_MID"])
 SIGNAL_LOW = int(os.environ["SIGNAL_LOW"])
 NO_SIGNAL = int(os.environ["NO_SIGNAL"])
 HIST_LIST_TTL = int(os.environ["HIST_LIST_TTL"])
+# 履歴IDの名前空間
+HIST_ID_NAMESPACE = uuid.UUID("6f1c2d8e-3b4a-5c6d-8e7f-90a1b2c3d4e5")
+
+###################################
+# イベント判定ルール（インポート時に生成）
+###################################
+# デバイス種別毎の端子数（接点入力, 接点出力）
+TERMINAL_COUNT = {"PJ1": (1, 0), "PJ2": (8, 2), "PJ3": (8, 2)}
+
+DI_STATE_KEYS = tuple(f"di{i}_state" for i in range(1, 9))
+DI_CHANGE_DATETIME_KEYS = tuple(f"di{i}_last_change_datetime" for i in range(1, 9))
+DO_STATE_KEYS = tuple(f"do{i}_state" for i in range(1, 3))
+DO_CHANGE_DATETIME_KEYS = tuple(f"do{i}_last_change_datetime" for i in range(1, 3))
+
+# デバイス状態ビット（チェックビット, イベント種別, 現状態キー）
+DEVICE_STATE_RULES = (
+    (0b00000001, "battery_near", "battery_near_state"),
+    (0b00000100, "device_abnormality", "device_abnormality"),
+    (0b01000000, "parameter_abnormality", "parameter_abnormality"),
+    (0b10000000, "fw_update_abnormality", "fw_update_abnormality"),
+)
+
+# 現状態更新（イベント種別 → 現状態キー, 最終変化日時キー, イベント情報キー）
+STATE_UPDATE_RULES = {
+    "battery_near": ("battery_near_state", "battery_near_last_change_datetime", "occurrence_flag"),
+    "device_abnormality": ("device_abnormality", "device_abnormality_last_change_datetime", "occurrence_flag"),
+    "parameter_abnormality": (
+        "parameter_abnormality",
+        "parameter_abnormality_last_change_datetime",
+        "occurrence_flag",
+    ),
+    "fw_update_abnormality": (
+        "fw_update_abnormality",
+        "fw_update_abnormality_last_change_datetime",
+        "occurrence_flag",
+    ),
+    "signal_state": ("signal_state", "signal_last_change_datetime", "signal_state"),
+}
+
+# 初回受信時の現状態
+INIT_STATE = {
+    "signal_state": 0,
+    "battery_near_state": 0,
+    "device_abnormality": 0,
+    "parameter_abnormality": 0,
+    "fw_update_abnormality": 0,
+}
+
+# 受信毎に更新する最終更新日時キー（デバイス種別毎）
+UPDATE_DATETIME_KEYS = {
+    device_type: (
+        "signal_last_update_datetime",
+        "battery_near_last_update_datetime",
+        "device_abnormality_last_update_datetime",
+        "parameter_abnormality_last_update_datetime",
+        "fw_update_abnormality_last_update_datetime",
+    )
+    + tuple(f"di{i}_last_update_datetime" for i in range(1, di_count + 1))
+    + tuple(f"do{i}_last_update_datetime" for i in range(1, do_count + 1))
+    for device_type, (di_count, do_count) in TERMINAL_COUNT.items()
+}
+
+
+# 接点状態（"08b"形式）を整数に変換、未設定の場合はNone
+def _parseBits(bits):
+    return int(bits, 2) if bits else None
+
+
+# 現状態と異なる端子をビットで返す（現状態が0/1以外の端子は変化ありとする）
+def _changedBits(state, device_current_state, state_keys):
+    current = 0
+    known = 0
+    for i, key in enumerate(state_keys):
+        value = device_current_state.get(key)
+        if value == 1:
+            current |= 1 << i
+            known |= 1 << i
+        elif value == 0:
+            known |= 1 << i
+    mask = (1 << len(state_keys)) - 1
+    if state is None:
+        return mask
+    return ((state ^ current) | ~known) & mask
+
+
+###################################
+# 電文単位のイベント判定コンテキスト
+# 1電文から複数の履歴が作成されるため、グループ一覧・端子設定・TTLを電文毎に1回だけ取得する
+###################################
+class JudgeContext:
+    def __init__(self, recv_data, device_info, device_relation_table, group_table):
+        self.recv_data = recv_data
+        self.device_info = device_info
+        self.device_relation_table = device_relation_table
+        self.group_table = group_table
+        self._group_list = None
+        self._expire_datetime = None
+
+        # 端子設定（端子番号 → 設定）
+        terminal_settings = (
+            device_info.get("device_data", {}).get("config", {}).get("terminal_settings", {})
+        )
+        self.di_settings = {}
+        for di_list in terminal_settings.get("di_list", []):
+            self.di_settings.setdefault(int(di_list.get("di_no")), di_list)
+        self.do_settings = {}
+        for do_list in terminal_settings.get("do_list", []):
+            self.do_settings.setdefault(int(do_list.get("do_no")), do_list)
+
+    # 接点入力設定取得（端子設定未登録の端子は既定の名称で履歴を作成する）
+    def diSetting(self, terminal_no):
+        di_list = self.di_settings.get(int(terminal_no))
+        if di_list is None:
+            logger.warning(f"接点入力設定なし device_id={self.device_info.get('device_id')}, di_no={terminal_no}")
+            di_list = {"di_no": int(terminal_no)}
+        return di_list
+
+    # 接点出力設定取得（端子設定未登録の端子は既定の名称で履歴を作成する）
+    def doSetting(self, terminal_no):
+        do_list = self.do_settings.get(int(terminal_no))
+        if do_list is None:
+            logger.warning(f"接点出力設定なし device_id={self.device_info.get('device_id')}, do_no={terminal_no}")
+            do_list = {"do_no": int(terminal_no)}
+        return do_list
 
-
-def createHistListData(recv_data, device_info, event_info, device_relation_table, group_table):
     # グループ情報取得
-    group_list = []
-    group_list = ddb.get_device_group_list(
-        device_info.get("device_id"), device_relation_table, group_table
+    def groupList(self):
+        if self._group_list is None:
+            self._group_list = ddb.get_device_group_list(
+                self.device_info.get("device_id"), self.device_relation_table, self.group_table
+            )
+            logger.debug(f"group_list={self._group_list}")
+        return self._group_list
+
+    # TTL有効期限
+    def expireDatetime(self):
+        if self._expire_datetime is None:
+            self._expire_datetime = int(
+                (
+                    datetime.fromtimestamp(self.recv_data.get("recv_datetime") / 1000)
+                    + relativedelta.relativedelta(years=HIST_LIST_TTL)
+                ).timestamp()
+            )
+        return self._expire_datetime
+
+
+# 履歴ID
+# 電文とイベントから一意に決まる値とし、再送時の再登録で履歴一覧が重複しないようにする
+def _histId(context, event_info):
+    key = "|".join(
+        str(value)
+        for value in (
+            context.device_info.get("device_id"),
+            context.recv_data.get("event_datetime"),
+            context.recv_data.get("message_type"),
+            event_info.get("event_type"),
+            event_info.get("terminal_no"),
+            event_info.get("do_no"),
+            event_info.get("device_req_no"),
+        )
     )
-    logger.debug(f"group_list={group_list}")
+    return str(uuid.uuid5(HIST_ID_NAMESPACE, key))
+
+
+def createHistListData(context, event_info):
+    recv_data = context.recv_data
+    device_info = context.device_info
 
     # 共通部
-    expire_datetime = int(
-        (
-            datetime.fromtimestamp(recv_data.get("recv_datetime") / 1000)
-            + relativedelta.relativedelta(years=HIST_LIST_TTL)
-        ).timestamp()
-    )
     hist_list_data = {
         "device_id": device_info.get("device_id"),
-        "hist_id": str(uuid.uuid4()),
+        "hist_id": _histId(context, event_info),
         "event_datetime": event_info.get("event_datetime"),
         "recv_datetime": recv_data.get("recv_datetime"),
-        "expire_datetime": expire_datetime,
+        "expire_datetime": context.expireDatetime(),
         "hist_data": {
             "device_name": device_info.get("device_data", {}).get("config", {}).get("device_name"),
-            "group_list": group_list,
+            "group_list": context.groupList(),
             "imei": device_info.get("imei"),
             "event_type": event_info.get("event_type"),
         },
@@ -62,19 +214,12 @@ def createHistListData(recv_data, device_info, event_info, device_relation_table
     # 接点入力部
     if event_info.get("event_type") == "di_change":
         terminal_no = event_info.get("terminal_no")
-        for di_list in (
-            device_info.get("device_data", {})
-            .get("config", {})
-            .get("terminal_settings", {})
-            .get("di_list", [])
-        ):
-            if int(di_list.get("di_no")) == int(terminal_no):
-                terminal_name = di_list.get("di_name", f"接点入力{terminal_no}")
-                if event_info.get("di_state") == 0:
-                    terminal_state_name = di_list.get("di_on_name", "クローズ")
-                else:
-                    terminal_state_name = di_list.get("di_off_name", "オープン")
-                break
+        di_list = context.diSetting(terminal_no)
+        terminal_name = di_list.get("di_name", f"接点入力{terminal_no}")
+        if event_info.get("di_state") == 0:
+            terminal_state_name = di_list.get("di_on_name", "クローズ")
+        else:
+            terminal_state_name = di_list.get("di_off_name", "オープン")
         hist_list_data["hist_data"]["terminal_no"] = terminal_no
         hist_list_data["hist_data"]["terminal_name"] = terminal_name
         hist_list_data["hist_data"]["terminal_state_name"] = terminal_state_name
@@ -82,19 +227,12 @@ def createHistListData(recv_data, device_info, event_info, device_relation_table
     # 接点出力部
     elif event_info.get("event_type") == "do_change":
         terminal_no = event_info.get("terminal_no")
-        for do_list in (
-            device_info.get("device_data", {})
-            .get("config", {})
-            .get("terminal_settings", {})
-            .get("do_list", [])
-        ):
-            if int(do_list.get("do_no")) == int(terminal_no):
-                terminal_name = do_list.get("do_name", f"接点出力{terminal_no}")
-                if event_info.get("do_state") == 0:
-                    terminal_state_name = "クローズ"
-                else:
-                    terminal_state_name = "オープン"
-                break
+        do_list = context.doSetting(terminal_no)
+        terminal_name = do_list.get("do_name", f"接点出力{terminal_no}")
+        if event_info.get("do_state") == 0:
+            terminal_state_name = "クローズ"
+        else:
+            terminal_state_name = "オープン"
         hist_list_data["hist_data"]["terminal_no"] = terminal_no
         hist_list_data["hist_data"]["terminal_name"] = terminal_name
         hist_list_data["hist_data"]["terminal_state_name"] = terminal_state_name
@@ -121,33 +259,19 @@ def createHistListData(recv_data, device_info, event_info, device_relation_table
         if "link_di_no" in event_info:
             link_di_no = event_info["link_di_no"]
             hist_list_data["hist_data"]["link_terminal_no"] = event_info.get("link_di_no")
-            for di_list in (
-                device_info.get("device_data", {})
-                .get("config", {})
-                .get("terminal_settings", {})
-                .get("di_list", [])
-            ):
-                if int(di_list.get("di_no")) == int(event_info.get("link_di_no")):
-                    di_terminal_name = di_list.get("di_name", f"接点入力{link_di_no}")
-                    if event_info.get("di_state") == 0:
-                        terminal_state_name = di_list.get("di_on_name", "クローズ")
-                    else:
-                        terminal_state_name = di_list.get("di_off_name", "オープン")
-                    break
+            di_list = context.diSetting(link_di_no)
+            di_terminal_name = di_list.get("di_name", f"接点入力{link_di_no}")
+            if event_info.get("di_state") == 0:
+                terminal_state_name = di_list.get("di_on_name", "クローズ")
+            else:
+                terminal_state_name = di_list.get("di_off_name", "オープン")
             hist_list_data["hist_data"]["link_terminal_name"] = di_terminal_name
             hist_list_data["hist_data"]["link_terminal_state_name"] = terminal_state_name
             hist_list_data["hist_data"]["control_trigger"] = event_info.get("control_trigger")
             hist_list_data["hist_data"]["terminal_no"] = int(event_info.get("do_no"))
-            for do_list in (
-                device_info.get("device_data", {})
-                .get("config", {})
-                .get("terminal_settings", {})
-                .get("do_list", [])
-            ):
-                if int(do_list.get("do_no")) == int(event_info.get("do_no")):
-                    do_no = do_list.get("do_no")
-                    do_terminal_name = do_list.get("do_name", f"接点出力{do_no}")
-                    break
+            do_list = context.doSetting(event_info.get("do_no"))
+            do_no = do_list.get("do_no")
+            do_terminal_name = do_list.get("do_name", f"接点出力{do_no}")
             hist_list_data["hist_data"]["terminal_name"] = do_terminal_name
             if event_info.get("event_type") == "manual_control":
                 hist_list_data["hist_data"]["control_exec_user_name"] = event_info.get(
@@ -196,16 +320,9 @@ def createHistListData(recv_data, device_info, event_info, device_relation_table
                 )
         else:
             hist_list_data["hist_data"]["control_trigger"] = event_info.get("control_trigger")
-            for do_list in (
-                device_info.get("device_data", {})
-                .get("config", {})
-                .get("terminal_settings", {})
-                .get("do_list", [])
-            ):
-                if int(do_list.get("do_no")) == int(event_info.get("do_no")):
-                    do_no = do_list.get("do_no")
-                    terminal_name = do_list.get("do_name", f"接点出力{do_no}")
-                    break
+            do_list = context.doSetting(event_info.get("do_no"))
+            do_no = do_list.get("do_no")
+            terminal_name = do_list.get("do_name", f"接点出力{do_no}")
             hist_list_data["hist_data"]["terminal_name"] = terminal_name
             hist_list_data["hist_data"]["terminal_no"] = int(event_info.get("do_no"))
             if event_info.get("event_type") == "manual_control":
@@ -260,21 +377,10 @@ def createHistListData(recv_data, device_info, event_info, device_relation_table
 
     elif event_info.get("event_type") == "di_unhealthy":
         terminal_no = event_info.get("terminal_no")
-        for di_list in (
-            device_info.get("device_data", {})
-            .get("config", {})
-            .get("terminal_settings", {})
-            .get("di_list", [])
-        ):
-            if int(di_list.get("di_no")) == int(terminal_no):
-                terminal_name = di_list.get("di_name", f"接点入力{terminal_no}")
-                if event_info.get("di_state") == 0:
-                    terminal_state_name = di_list.get("di_on_name", "クローズ")
-                else:
-                    terminal_state_name = di_list.get("di_off_name", "オープン")
-                di_healthy_period = di_list.get("di_healthy_period", 0)
-                di_healthy_type = di_list.get("di_healthy_type")
-                break
+        di_list = context.diSetting(terminal_no)
+        terminal_name = di_list.get("di_name", f"接点入力{terminal_no}")
+        di_healthy_period = di_list.get("di_healthy_period", 0)
+        di_healthy_type = di_list.get("di_healthy_type")
         hist_list_data["hist_data"]["terminal_no"] = terminal_no
         hist_list_data["hist_data"]["terminal_name"] = terminal_name
         hist_list_data["hist_data"]["di_healthy_type"] = di_healthy_type
@@ -285,25 +391,21 @@ def createHistListData(recv_data, device_info, event_info, device_relation_table
 
 
 def initCurrentStateInfo(recv_data, device_current_state, device_info, init_state_flg):
+    device_type = recv_data.get("device_type")
+    recv_datetime = recv_data.get("recv_datetime")
+    di_count, do_count = TERMINAL_COUNT[device_type]
+
     if init_state_flg == 1:
-        di_list = list(reversed(list(recv_data.get("di_state", []))))
-        do_list = list(reversed(list(recv_data.get("do_state", []))))
-
-        current_state_info = {
-            "device_id": device_info.get("device_id"),
-            "signal_last_update_datetime": recv_data.get("recv_datetime"),
-            "battery_near_last_update_datetime": recv_data.get("recv_datetime"),
-            "device_abnormality_last_update_datetime": recv_data.get("recv_datetime"),
-            "parameter_abnormality_last_update_datetime": recv_data.get("recv_datetime"),
-            "fw_update_abnormality_last_update_datetime": recv_data.get("recv_datetime"),
-            "di1_last_update_datetime": recv_data.get("recv_datetime"),
-            "signal_state": 0,
-            "battery_near_state": 0,
-            "device_abnormality": 0,
-            "parameter_abnormality": 0,
-            "fw_update_abnormality": 0,
-            "di1_state": int(di_list[0]) if di_list else None,
-        }
+        di_state = _parseBits(recv_data.get("di_state"))
+        do_state = _parseBits(recv_data.get("do_state"))
+
+        current_state_info = {"device_id": device_info.get("device_id")}
+        current_state_info.update(dict.fromkeys(UPDATE_DATETIME_KEYS[device_type], recv_datetime))
+        current_state_info.update(INIT_STATE)
+        for n, key in enumerate(DI_STATE_KEYS[:di_count]):
+            current_state_info[key] = (di_state >> n) & 1 if di_state is not None else None
+        for n, key in enumerate(DO_STATE_KEYS[:do_count]):
+            current_state_info[key] = (do_state >> n) & 1 if do_state is not None else None
 
         device_state_custom_timer_event_list = []
         for custom_event in device_info.get("device_data").get("config").get("custom_event_list", []):
@@ -324,101 +426,22 @@ def initCurrentStateInfo(recv_data, device_current_state, device_info, init_stat
                 device_state_custom_timer_event_list.append(custom_timer_event)
         current_state_info["custom_timer_event_list"] = device_state_custom_timer_event_list
 
-        if recv_data.get("device_type") in ["PJ2", "PJ3"]:
-            current_state_info["di2_state"] = int(di_list[1]) if di_list else None
-            current_state_info["di3_state"] = int(di_list[2]) if di_list else None
-            current_state_info["di4_state"] = int(di_list[3]) if di_list else None
-            current_state_info["di5_state"] = int(di_list[4]) if di_list else None
-            current_state_info["di6_state"] = int(di_list[5]) if di_list else None
-            current_state_info["di7_state"] = int(di_list[6]) if di_list else None
-            current_state_info["di8_state"] = int(di_list[7]) if di_list else None
-            current_state_info["do1_state"] = int(do_list[0]) if do_list else None
-            current_state_info["do2_state"] = int(do_list[1]) if do_list else None
-            current_state_info["di2_last_update_datetime"] = recv_data.get("recv_datetime")
-            current_state_info["di3_last_update_datetime"] = recv_data.get("recv_datetime")
-            current_state_info["di4_last_update_datetime"] = recv_data.get("recv_datetime")
-            current_state_info["di5_last_update_datetime"] = recv_data.get("recv_datetime")
-            current_state_info["di6_last_update_datetime"] = recv_data.get("recv_datetime")
-            current_state_info["di7_last_update_datetime"] = recv_data.get("recv_datetime")
-            current_state_info["di8_last_update_datetime"] = recv_data.get("recv_datetime")
-            current_state_info["do1_last_update_datetime"] = recv_data.get("recv_datetime")
-            current_state_info["do2_last_update_datetime"] = recv_data.get("recv_datetime")
-
-            """
-            if recv_data.get("device_type") == "PJ3":
-                current_state_info["ai1_state"] = recv_data.get("analogv1")
-                current_state_info["ai2_state"] = recv_data.get("analogv2")
-                current_state_info["ai1_last_update_datetime"] = recv_data.get("recv_datetime")
-                current_state_info["ai2_last_update_datetime"] = recv_data.get("recv_datetime")
-                current_state_info["ai1_threshold_last_update_datetime"] = recv_data.get("recv_datetime")
-                current_state_info["ai2_threshold_last_update_datetime"] = recv_data.get("recv_datetime")
-            """
-
     else:
         current_state_info = device_current_state.copy()
-        recv_datetime = recv_data.get("recv_datetime")
-        current_state_info["signal_last_update_datetime"] = recv_datetime
-        current_state_info["battery_near_last_update_datetime"] = recv_datetime
-        current_state_info["device_abnormality_last_update_datetime"] = recv_datetime
-        current_state_info["parameter_abnormality_last_update_datetime"] = recv_datetime
-        current_state_info["fw_update_abnormality_last_update_datetime"] = recv_datetime
-        current_state_info["di1_last_update_datetime"] = recv_datetime
-
-        if recv_data.get("device_type") in ["PJ2", "PJ3"]:
-            current_state_info["di2_last_update_datetime"] = recv_datetime
-            current_state_info["di3_last_update_datetime"] = recv_datetime
-            current_state_info["di4_last_update_datetime"] = recv_datetime
-            current_state_info["di5_last_update_datetime"] = recv_datetime
-            current_state_info["di6_last_update_datetime"] = recv_datetime
-            current_state_info["di7_last_update_datetime"] = recv_datetime
-            current_state_info["di8_last_update_datetime"] = recv_datetime
-            current_state_info["do1_last_update_datetime"] = recv_datetime
-            current_state_info["do2_last_update_datetime"] = recv_datetime
-
-            """
-            if recv_data.get("device_type") == "PJ3":
-                current_state_info["ai1_last_update_datetime"] = recv_datetime
-                current_state_info["ai2_last_update_datetime"] = recv_datetime
-                current_state_info["ai1_threshold_last_update_datetime"] = recv_datetime
-                current_state_info["ai2_threshold_last_update_datetime"] = recv_datetime
-            """
+        current_state_info.update(dict.fromkeys(UPDATE_DATETIME_KEYS[device_type], recv_datetime))
 
     return current_state_info
 
 
 def updateCurrentStateInfo(current_state_info, event_info, event_datetime, recv_data):
-    di_state = [
-        "di1_state",
-        "di2_state",
-        "di3_state",
-        "di4_state",
-        "di5_state",
-        "di6_state",
-        "di7_state",
-        "di8_state",
-    ]
-    di_change_datetime = [
-        "di1_last_change_datetime",
-        "di2_last_change_datetime",
-        "di3_last_change_datetime",
-        "di4_last_change_datetime",
-        "di5_last_change_datetime",
-        "di6_last_change_datetime",
-        "di7_last_change_datetime",
-        "di8_last_change_datetime",
-    ]
-    do_state = ["do1_state", "do2_state"]
-    do_change_datetime = ["do1_last_change_datetime", "do2_last_change_datetime"]
-
     # イベント判定結果をもとに現状態情報を更新
+    event_type = event_info.get("event_type")
+
     # 接点入力部
-    if event_info.get("event_type") == "di_change":
-        terminal_no = event_info.get("terminal_no")
-        list_num = int(terminal_no) - 1
-        state_key = di_state[list_num]
-        change_datetime_key = di_change_datetime[list_num]
-        current_state_info[state_key] = event_info.get("di_state")
-        current_state_info[change_datetime_key] = event_datetime
+    if event_type == "di_change":
+        list_num = int(event_info.get("terminal_no")) - 1
+        current_state_info[DI_STATE_KEYS[list_num]] = event_info.get("di_state")
+        current_state_info[DI_CHANGE_DATETIME_KEYS[list_num]] = event_datetime
 
         # カスタムタイマーイベント
         recv_datetime = recv_data.get("recv_datetime")
@@ -442,44 +465,23 @@ def updateCurrentStateInfo(current_state_info, event_info, event_datetime, recv_
                     break
 
     # 接点出力部
-    elif event_info.get("event_type") == "do_change":
+    elif event_type == "do_change":
         list_num = int(event_info.get("terminal_no")) - 1
-        state_key = do_state[list_num]
-        change_datetime_key = do_change_datetime[list_num]
-        current_state_info[state_key] = event_info.get("do_state")
-        current_state_info[change_datetime_key] = event_datetime
-
-    # デバイス状態（バッテリーニアエンド）
-    elif event_info.get("event_type") == "battery_near":
-        current_state_info["battery_near_state"] = event_info.get("occurrence_flag")
-        current_state_info["battery_near_last_change_datetime"] = event_datetime
-
-    # デバイス状態（機器異常）
-    elif event_info.get("event_type") == "device_abnormality":
-        current_state_info["device_abnormality"] = event_info.get("occurrence_flag")
-        current_state_info["device_abnormality_last_change_datetime"] = event_datetime
+        current_state_info[DO_STATE_KEYS[list_num]] = event_info.get("do_state")
+        current_state_info[DO_CHANGE_DATETIME_KEYS[list_num]] = event_datetime
 
-    # デバイス状態（パラメータ異常）
-    elif event_info.get("event_type") == "parameter_abnormality":
-        current_state_info["parameter_abnormality"] = event_info.get("occurrence_flag")
-        current_state_info["parameter_abnormality_last_change_datetime"] = event_datetime
-
-    # デバイス状態（FW更新異常）
-    elif event_info.get("event_type") == "fw_update_abnormality":
-        current_state_info["fw_update_abnormality"] = event_info.get("occurrence_flag")
-        current_state_info["fw_update_abnormality_last_change_datetime"] = event_datetime
-
-    # 電波状態
-    elif event_info.get("event_type") == "signal_state":
-        current_state_info["signal_state"] = event_info.get("signal_state")
-        current_state_info["signal_last_change_datetime"] = event_datetime
+    # デバイス状態・電波状態
+    elif event_type in STATE_UPDATE_RULES:
+        state_key, change_datetime_key, value_key = STATE_UPDATE_RULES[event_type]
+        current_state_info[state_key] = event_info.get(value_key)
+        current_state_info[change_datetime_key] = event_datetime
 
     # デバイスヘルシー
-    elif event_info.get("event_type") == "device_unhealthy":
+    elif event_type == "device_unhealthy":
         current_state_info["device_healthy_state"] = 0
 
     # 接点入力未変化
-    elif event_info.get("event_type") == "di_unhealthy":
+    elif event_type == "di_unhealthy":
         di_no = event_info["terminal_no"]
         current_di_healthy_state = f"di{di_no}_healthy_state"
         current_state_info[current_di_healthy_state] = 0
@@ -533,6 +535,9 @@ def eventJudge(
     hist_list = []
     event_datetime = recv_data.get("event_datetime")
 
+    # 電文単位のコンテキスト
+    context = JudgeContext(recv_data, device_info, device_relation_table, group_table)
+
     # 現状態設定
     init_state_flg = False
     if device_current_state is None or len(device_current_state) == 0:
@@ -544,25 +549,27 @@ def eventJudge(
 
     # 接点入力変化判定
     if recv_data.get("message_type") in ["0001", "0011", "0012"]:
-        event_info = {}
-        event_info["event_type"] = "di_change"
-        event_info["event_datetime"] = recv_data.get("event_datetime")
-        di_list = list(reversed(list(recv_data.get("di_state", []))))
-        if recv_data.get("message_type") == "0001":
-            di_trigger = recv_data.get("di_trigger")
-        di_range = 1 if recv_data.get("device_type") == "PJ1" else 8
-        for i in range(di_range):
-            event_info["terminal_no"] = i + 1
-            event_info["di_state"] = int(di_list[i]) if di_list else None
-            if recv_data.get("message_type") == "0001" and event_info["terminal_no"] == di_trigger:
-                hist_list_data = createHistListData(
-                    recv_data, device_info, event_info, device_relation_table, group_table
-                )
+        di_count = TERMINAL_COUNT[recv_data.get("device_type")][0]
+        di_state = _parseBits(recv_data.get("di_state"))
+        di_trigger = recv_data.get("di_trigger") if recv_data.get("message_type") == "0001" else None
+        if init_state_flg:
+            changed = (1 << di_count) - 1
+        else:
+            changed = _changedBits(di_state, device_current_state, DI_STATE_KEYS[:di_count])
+        for i in range(di_count):
+            terminal_no = i + 1
+            if terminal_no != di_trigger and not (changed >> i) & 1:
+                continue
+            event_info = {
+                "event_type": "di_change",
+                "event_datetime": recv_data.get("event_datetime"),
+                "terminal_no": terminal_no,
+                "di_state": (di_state >> i) & 1 if di_state is not None else None,
+            }
+            if terminal_no == di_trigger:
+                hist_list_data = createHistListData(context, event_info)
                 hist_list.append(hist_list_data)
-            if not init_state_flg:
-                terminal_key = "di" + str(i + 1) + "_state"
-                current_di = device_current_state.get(terminal_key)
-            if (init_state_flg) or (not init_state_flg and int(di_list[i]) != current_di):
+            if (changed >> i) & 1:
                 current_state_info = updateCurrentStateInfo(
                     current_state_info, event_info, event_datetime, recv_data
                 )
@@ -572,150 +579,70 @@ def eventJudge(
         "PJ2",
         "PJ3",
     ]:
-        event_info = {}
-        event_info["event_type"] = "do_change"
-        event_info["event_datetime"] = recv_data.get("event_datetime")
-        do_list = list(reversed(list(recv_data.get("do_state", []))))
+        do_count = TERMINAL_COUNT[recv_data.get("device_type")][1]
+        do_state = _parseBits(recv_data.get("do_state"))
         do_trigger = recv_data.get("do_trigger")
-        for i in range(2):
-            event_info["terminal_no"] = i + 1
-            event_info["do_state"] = int(do_list[i]) if do_list else None
-            if event_info["terminal_no"] == do_trigger:
-                hist_list_data = createHistListData(
-                    recv_data, device_info, event_info, device_relation_table, group_table
-                )
-                hist_list.append(hist_list_data)
-            if not init_state_flg:
-                terminal_key = "do" + str(i + 1) + "_state"
-                current_do = device_current_state.get(terminal_key)
-            if (init_state_flg) or (not init_state_flg and int(do_list[i]) != current_do):
-                current_state_info = updateCurrentStateInfo(
-                    current_state_info, event_info, event_datetime, recv_data
-                )
-
-    # バッテリーニアエンド判定
-    if recv_data.get("message_type") in ["0001", "0011", "0012"]:
-        check_digit = 0b00000001
-        event_info = {}
-        event_info["event_type"] = "battery_near"
-        event_info["event_datetime"] = recv_data.get("event_datetime")
-        if (recv_data.get("device_state") & check_digit) == check_digit:
-            battery_near_state = 1
-        else:
-            battery_near_state = 0
-        if not init_state_flg:
-            current_battery_near = device_current_state.get("battery_near_state")
-
-        if (init_state_flg) or (not init_state_flg and battery_near_state != current_battery_near):
-            event_info["occurrence_flag"] = battery_near_state
-            if not (init_state_flg == 1 and event_info["occurrence_flag"] == 0):
-                hist_list_data = createHistListData(
-                    recv_data, device_info, event_info, device_relation_table, group_table
-                )
-                hist_list.append(hist_list_data)
-                current_state_info = updateCurrentStateInfo(
-                    current_state_info, event_info, event_datetime, recv_data
-                )
-
-    # 機器異常判定
-    if recv_data.get("message_type") in ["0001", "0011", "0012"]:
-        check_digit = 0b00000100
-        event_info = {}
-        event_info["event_type"] = "device_abnormality"
-        event_info["event_datetime"] = recv_data.get("event_datetime")
-        if (recv_data.get("device_state") & check_digit) == check_digit:
-            device_abnormality_state = 1
-        else:
-            device_abnormality_state = 0
-        if not init_state_flg:
-            current_device_abnormality = device_current_state.get("device_abnormality")
-
-        if (init_state_flg) or (
-            not init_state_flg and device_abnormality_state != current_device_abnormality
-        ):
-            event_info["occurrence_flag"] = device_abnormality_state
-            if not (init_state_flg == 1 and event_info["occurrence_flag"] == 0):
-                hist_list_data = createHistListData(
-                    recv_data, device_info, event_info, device_relation_table, group_table
-                )
-                hist_list.append(hist_list_data)
-                current_state_info = updateCurrentStateInfo(
-                    current_state_info, event_info, event_datetime, recv_data
-                )
-
-    # パラメータ異常判定
-    if recv_data.get("message_type") in ["0001", "0011", "0012"]:
-        check_digit = 0b01000000
-        event_info = {}
-        event_info["event_type"] = "parameter_abnormality"
-        event_info["event_datetime"] = recv_data.get("event_datetime")
-        if (recv_data.get("device_state") & check_digit) == check_digit:
-            parameter_abnormality_state = 1
+        if init_state_flg:
+            changed = (1 << do_count) - 1
         else:
-            parameter_abnormality_state = 0
-        if not init_state_flg:
-            current_parameter_abnormality = device_current_state.get("parameter_abnormality")
-
-        if (init_state_flg) or (
-            not init_state_flg and parameter_abnormality_state != current_parameter_abnormality
-        ):
-            event_info["occurrence_flag"] = parameter_abnormality_state
-            if not (init_state_flg == 1 and event_info["occurrence_flag"] == 0):
-                hist_list_data = createHistListData(
-                    recv_data, device_info, event_info, device_relation_table, group_table
-                )
+            changed = _changedBits(do_state, device_current_state, DO_STATE_KEYS[:do_count])
+        for i in range(do_count):
+            terminal_no = i + 1
+            if terminal_no != do_trigger and not (changed >> i) & 1:
+                continue
+            event_info = {
+                "event_type": "do_change",
+                "event_datetime": recv_data.get("event_datetime"),
+                "terminal_no": terminal_no,
+                "do_state": (do_state >> i) & 1 if do_state is not None else None,
+            }
+            if terminal_no == do_trigger:
+                hist_list_data = createHistListData(context, event_info)
                 hist_list.append(hist_list_data)
+            if (changed >> i) & 1:
                 current_state_info = updateCurrentStateInfo(
                     current_state_info, event_info, event_datetime, recv_data
                 )
 
-    # FW更新異常判定
+    # デバイス状態判定（バッテリーニアエンド、機器異常、パラメータ異常、FW更新異常）
     if recv_data.get("message_type") in ["0001", "0011", "0012"]:
-        check_digit = 0b10000000
-        event_info = {}
-        event_info["event_type"] = "fw_update_abnormality"
-        event_info["event_datetime"] = recv_data.get("event_datetime")
-        if (recv_data.get("device_state") & check_digit) == check_digit:
-            fw_update_abnormality_state = 1
-        else:
-            fw_update_abnormality_state = 0
-        if not init_state_flg:
-            current_fw_update_abnormality = device_current_state.get("fw_update_abnormality")
-
-        if (init_state_flg) or (
-            not init_state_flg and fw_update_abnormality_state != current_fw_update_abnormality
-        ):
-            event_info["occurrence_flag"] = fw_update_abnormality_state
-            if not (init_state_flg == True and event_info["occurrence_flag"] == 0):
-                hist_list_data = createHistListData(
-                    recv_data, device_info, event_info, device_relation_table, group_table
-                )
-                hist_list.append(hist_list_data)
-                current_state_info = updateCurrentStateInfo(
-                    current_state_info, event_info, event_datetime, recv_data
-                )
+        device_state = recv_data.get("device_state")
+        for check_digit, event_type, state_key in DEVICE_STATE_RULES:
+            occurrence_flag = 1 if device_state & check_digit else 0
+            if init_state_flg:
+                # 初回受信時は発生のみ履歴を作成
+                if occurrence_flag == 0:
+                    continue
+            elif occurrence_flag == device_current_state.get(state_key):
+                continue
+            event_info = {
+                "event_type": event_type,
+                "event_datetime": recv_data.get("event_datetime"),
+                "occurrence_flag": occurrence_flag,
+            }
+            hist_list_data = createHistListData(context, event_info)
+            hist_list.append(hist_list_data)
+            current_state_info = updateCurrentStateInfo(
+                current_state_info, event_info, event_datetime, recv_data
+            )
 
     # 電源ON
     if recv_data.get("message_type") in ["0011"]:
         event_info = {}
         event_info["event_type"] = "power_on"
         event_info["event_datetime"] = recv_data.get("event_datetime")
-        hist_list_data = createHistListData(
-            recv_data, device_info, event_info, device_relation_table, group_table
-        )
+        hist_list_data = createHistListData(context, event_info)
         hist_list.append(hist_list_data)
-        current_state_info = updateCurrentStateInfo(current_state_info, event_info, event_datetime, recv_data)
 
     # 電波状態
     if recv_data.get("message_type") in ["0001", "0011", "0012"]:
         hist_signal_state = signalStateJedge(recv_data.get("rssi"), recv_data.get("sinr"))
-        event_info = {}
-        event_info["event_type"] = "signal_state"
-        event_info["event_datetime"] = recv_data.get("event_datetime")
-        event_info["signal_state"] = hist_signal_state
-        if (init_state_flg) or (
-            not init_state_flg and hist_signal_state != device_current_state.get("signal_state")
-        ):
+        if (init_state_flg) or hist_signal_state != device_current_state.get("signal_state"):
+            event_info = {
+                "event_type": "signal_state",
+                "event_datetime": recv_data.get("event_datetime"),
+                "signal_state": hist_signal_state,
+            }
             current_state_info = updateCurrentStateInfo(
                 current_state_info, event_info, event_datetime, recv_data
             )
@@ -729,7 +656,9 @@ def eventJudge(
         remote_control_info = ddb.get_remote_control_info(
             recv_data.get("device_req_no"), remote_control_table
         )
-        if "control_result" in remote_control_info:
+        if "control_result" in remote_control_info and not ddb.is_recorded_control_res(
+            remote_control_info, recv_data
+        ):
             logger.debug("制御結果記録済みの為、履歴一覧未記録")
             return hist_list, current_state_info
         logger.debug(f"remote_control_info={remote_control_info}")
@@ -795,9 +724,7 @@ def eventJudge(
                 "automation_trigger_event_detail_flag"
             )
 
-        hist_list_data = createHistListData(
-            recv_data, device_info, event_info, device_relation_table, group_table
-        )
+        hist_list_data = createHistListData(context, event_info)
         hist_list.append(hist_list_data)
 
     # 遠隔制御（状態変化通知）
@@ -826,8 +753,7 @@ def eventJudge(
                         "control_exec_user_email_address"
                     )
                 event_info["link_di_no"] = remote_control_info.get("link_di_no")
-                di_list = list(reversed(list(recv_data.get("di_state"))))
-                event_info["di_state"] = int(di_list[di_trigger - 1])
+                event_info["di_state"] = (_parseBits(recv_data.get("di_state")) >> (di_trigger - 1)) & 1
                 event_info["device_req_no"] = remote_control_info.get("device_req_no")
                 event_info["control_trigger"] = remote_control_info.get("control_trigger")
                 event_info["event_type"] = remote_control_info.get("control_trigger")
@@ -873,9 +799,7 @@ def eventJudge(
                     event_info["automation_trigger_event_detail_flag"] = remote_control_info.get(
                         "automation_trigger_event_detail_flag"
                     )
-                hist_list_data = createHistListData(
-                    recv_data, device_info, event_info, device_relation_table, group_table
-                )
+                hist_list_data = createHistListData(context, event_info)
                 hist_list.append(hist_list_data)
 
                 # 接点入力状態変化通知結果更新
@@ -899,9 +823,7 @@ def eventJudge(
         event_info["device_healthy_state"] = 0
         event_info["recv_datetime"] = recv_data.get("recv_datetime")
 
-        hist_list_data = createHistListData(
-            recv_data, device_info, event_info, device_relation_table, group_table
-        )
+        hist_list_data = createHistListData(context, event_info)
         hist_list.append(hist_list_data)
         current_state_info = updateCurrentStateInfo(
             current_state_info, event_info, event_datetime, recv_data
@@ -926,9 +848,7 @@ def eventJudge(
             event_info["di_healthy_state"] = 0
             event_info["recv_datetime"] = recv_data.get("recv_datetime")
 
-            hist_list_data = createHistListData(
-                recv_data, device_info, event_info, device_relation_table, group_table
-            )
+            hist_list_data = createHistListData(context, event_info)
             hist_list.append(hist_list_data)
             current_state_info = updateCurrentStateInfo(
                 current_state_info, event_info, event_datetime, recv_data
@@ -0,0 +1,105 @@
+import os
+import json
+import clients
+import ddb
+from aws_lambda_powertools import Logger
+
+logger = Logger()
+
+EVENT_NOTICE_SQS_QUEUE_NAME = os.environ["EVENT_NOTICE_SQS_QUEUE_NAME"]
+# SendMessageBatchの最大件数
+SEND_MESSAGE_BATCH_SIZE = 10
+# SQSメッセージの最大サイズ（SendMessageBatchは全件の合計）
+SQS_MESSAGE_MAX_SIZE = 256 * 1024
+
+# キュー取得結果（ウォームコンテナ内で再利用）
+_queue = None
+
+
+def _getQueue():
+    global _queue
+    if _queue is None:
+        sqs = clients.get_resource("sqs", endpoint_url=clients.ENDPOINT_URL)
+        _queue = sqs.get_queue_by_name(QueueName=EVENT_NOTICE_SQS_QUEUE_NAME)
+    return _queue
+
+
+# イベント通知処理で使用するデバイス情報（メール本文・通知設定・接点入力名・通知履歴の契約ID）
+def _noticeDeviceInfo(device_info):
+    device_data = device_info.get("device_data", {})
+    param = device_data.get("param", {})
+    config = device_data.get("config", {})
+    return {
+        "device_id": device_info.get("device_id"),
+        "imei": device_info.get("imei"),
+        "device_data": {
+            "param": {
+                "contract_id": param.get("contract_id"),
+                "device_code": param.get("device_code"),
+            },
+            "config": {
+                "notification_settings": config.get("notification_settings", []),
+                "notification_target_list": config.get("notification_target_list", []),
+                "terminal_settings": {
+                    "di_list": config.get("terminal_settings", {}).get("di_list", []),
+                },
+            },
+        },
+    }
+
+
+# SQSメッセージ本文（最大サイズを超える場合は履歴を分割する）
+def _messageBodies(hist_list, device_info):
+    body = json.dumps(
+        {
+            "event_trigger": "lambda-receivedata-2",
+            "device_info": device_info,
+            "hist_list": hist_list,
+        },
+        default=ddb.decimal_to_num,
+    )
+    if len(body.encode()) <= SQS_MESSAGE_MAX_SIZE:
+        return [body]
+    if len(hist_list) == 1:
+        raise Exception(f"イベント通知サイズ超過 hist_id={hist_list[0].get('hist_id')}")
+    half = len(hist_list) // 2
+    return _messageBodies(hist_list[:half], device_info) + _messageBodies(hist_list[half:], device_info)
+
+
+###################################
+# イベント通知（メール通知・連動制御）登録
+#
+# 受信処理では履歴一覧・現状態の登録までを行い、
+# メール通知・連動制御はイベント通知処理（event-notice）で非同期に実行する
+# notice_list : [(hist_list, device_info), ...]
+###################################
+def eventNotice(notice_list):
+    bodies = []
+    for hist_list, device_info in notice_list:
+        if not hist_list:
+            continue
+        bodies.extend(_messageBodies(hist_list, _noticeDeviceInfo(device_info)))
+    if not bodies:
+        return
+
+    # 件数・合計サイズの上限毎に送信
+    batches = [[]]
+    batch_size = 0
+    for body in bodies:
+        size = len(body.encode())
+        if len(batches[-1]) == SEND_MESSAGE_BATCH_SIZE or batch_size + size > SQS_MESSAGE_MAX_SIZE:
+            batches.append([])
+            batch_size = 0
+        batches[-1].append(body)
+        batch_size += size
+
+    queue = _getQueue()
+    for batch in batches:
+        entries = [
+            {"Id": str(i), "DelaySeconds": 0, "MessageBody": body} for i, body in enumerate(batch)
+        ]
+        res = queue.send_messages(Entries=entries)
+        if res.get("Failed"):
+            logger.error(f"イベント通知登録エラー failed={res['Failed']}")
+            raise Exception("イベント通知登録エラー")
+    logger.debug(f"イベント通知登録 件数={len(bodies)}")
@@ -1,21 +1,20 @@
 import os
 import base64
-import boto3
+import clients
 import ddb
 import json
-import ssm
+import parallel
 import time
 import traceback
 import validate
 from datetime import datetime
 from command_parser import commandParser
+from batch_ingest import batchIngest
 from aws_lambda_powertools import Logger
 from aws_xray_sdk.core import patch_all
 
 patch_all()
 
-dynamodb = boto3.resource("dynamodb", endpoint_url=os.environ.get("endpoint_url"))
-
 SSM_KEY_TABLE_NAME = os.environ["SSM_KEY_TABLE_NAME"]
 INITIAL_LAMBDA_NAME = os.environ["INITIAL_LAMBDA_NAME"]
 
@@ -28,22 +27,23 @@ def lambda_handler(event, context):
     try:
         # DynamoDB操作オブジェクト生成
         try:
-            iccid_table = dynamodb.Table(ssm.table_names["ICCID_TABLE"])
-            device_table = dynamodb.Table(ssm.table_names["DEVICE_TABLE"])
-            hist_table = dynamodb.Table(ssm.table_names["CNT_HIST_TABLE"])
-            hist_list_table = dynamodb.Table(ssm.table_names["HIST_LIST_TABLE"])
-            state_table = dynamodb.Table(ssm.table_names["STATE_TABLE"])
-            group_table = dynamodb.Table(ssm.table_names["GROUP_TABLE"])
-            notification_hist_table = dynamodb.Table(ssm.table_names["NOTIFICATION_HIST_TABLE"])
-            device_relation_table = dynamodb.Table(ssm.table_names["DEVICE_RELATION_TABLE"])
-            user_table = dynamodb.Table(ssm.table_names["USER_TABLE"])
-            account_table = dynamodb.Table(ssm.table_names["ACCOUNT_TABLE"])
-            remote_control_table = dynamodb.Table(ssm.table_names["REMOTE_CONTROL_TABLE"])
+            iccid_table = clients.get_table("ICCID_TABLE")
+            device_table = clients.get_table("DEVICE_TABLE")
+            hist_table = clients.get_table("CNT_HIST_TABLE")
+            hist_list_table = clients.get_table("HIST_LIST_TABLE")
+            state_table = clients.get_table("STATE_TABLE")
+            group_table = clients.get_table("GROUP_TABLE")
+            device_relation_table = clients.get_table("DEVICE_RELATION_TABLE")
+            remote_control_table = clients.get_table("REMOTE_CONTROL_TABLE")
+            idempotency_table = clients.get_table("RECV_IDEMPOTENCY_TABLE")
         except KeyError as e:
             logger.error("KeyError")
             logger.error(traceback.format_exc())
             return bytes([3])
 
+        # 処理段階毎の所要時間計測
+        timer = parallel.StageTimer()
+
         # サーバー受信日時を取得
         now = datetime.now()
         szRecvDatetime = int(time.mktime(now.timetuple()) * 1000) + int(now.microsecond / 1000)
@@ -54,7 +54,7 @@ def lambda_handler(event, context):
         logger.info(f"Payload={Payload.hex()}, szSimid={szSimid}, szRecvDatetime={szRecvDatetime}")
 
         # 入力データチェック
-        vali_result = validate.validate(Payload, szSimid, szRecvDatetime, hist_table)
+        vali_result, message = validate.validate(Payload, szSimid, szRecvDatetime)
         if vali_result != 0:
             if vali_result == 5:
                 return bytes([1])
@@ -64,34 +64,52 @@ def lambda_handler(event, context):
         # ICCID情報取得
         device_id = None
         device_info = None
+        device_current_state = None
         stray_flag = True
-        iccid_info = ddb.get_iccid_info(szSimid, iccid_table)
-        if iccid_info is None or len(iccid_info) == 0:
+        device_id = ddb.get_device_id_by_iccid(szSimid, iccid_table)
+        if device_id is None:
             logger.debug(f"未登録デバイス szSimid={szSimid}")
         else:
             stray_flag = False
-            device_id = iccid_info["device_id"]
-            device_info = ddb.get_device_info(device_id, device_table)
+            # 現状態取得（config_versionでデバイス情報キャッシュの有効性を判定）
+            # イベント判定で使用するグループ一覧も並列に取得してキャッシュしておく
+            with timer.stage("read"):
+                read_result = parallel.run_parallel(
+                    {
+                        "current_state": (ddb.get_device_state, device_id, state_table),
+                        "group_list": (
+                            ddb.get_device_group_list,
+                            device_id,
+                            device_relation_table,
+                            group_table,
+                        ),
+                    }
+                )
+            device_current_state = read_result["current_state"]
+            config_version = (device_current_state or {}).get("config_version", 0)
+            device_info = ddb.get_device_info_cached(device_id, device_table, config_version)
             if device_info is None or len(device_info) == 0:
+                ddb.invalidate_device_cache(device_id, szSimid)
                 return bytes([1])
+        logger.debug(f"cache_stats={ddb.get_cache_stats()}")
 
         # データ解析・登録
         try:
             res = commandParser(
                 szSimid,
                 szRecvDatetime,
-                Payload,
+                message,
                 device_info,
+                device_current_state,
                 stray_flag,
+                idempotency_table,
                 hist_table,
                 hist_list_table,
                 state_table,
                 group_table,
-                notification_hist_table,
                 device_relation_table,
-                user_table,
-                account_table,
                 remote_control_table,
+                timer,
             )
         except Exception as e:
             logger.debug(f"commandParserエラー e={e}")
@@ -107,11 +125,13 @@ def lambda_handler(event, context):
             Payload = json.dumps(input_event)
 
             # 呼び出し
-            boto3.client("lambda").invoke(
+            clients.get_client("lambda").invoke(
                 FunctionName=INITIAL_LAMBDA_NAME, InvocationType="Event", Payload=Payload
             )
             logger.debug("initialreceive呼び出し")
 
+        logger.info(f"stage_timings={timer.summary()}")
+        logger.debug(f"client_init_timings={clients.init_timings()}")
         logger.debug("lambda_handler正常終了")
         return res
 
@@ -119,3 +139,95 @@ def lambda_handler(event, context):
         logger.error(e)
         logger.error(traceback.format_exc())
         return bytes([3])
+
+
+def batch_handler(event, context):
+    logger.debug(f"batch_handler開始 件数={len(event.get('Records', []))}")
+
+    try:
+        # DynamoDB操作オブジェクト生成
+        try:
+            iccid_table = clients.get_table("ICCID_TABLE")
+            device_table = clients.get_table("DEVICE_TABLE")
+            hist_table = clients.get_table("CNT_HIST_TABLE")
+            hist_list_table = clients.get_table("HIST_LIST_TABLE")
+            state_table = clients.get_table("STATE_TABLE")
+            group_table = clients.get_table("GROUP_TABLE")
+            device_relation_table = clients.get_table("DEVICE_RELATION_TABLE")
+            remote_control_table = clients.get_table("REMOTE_CONTROL_TABLE")
+            idempotency_table = clients.get_table("RECV_IDEMPOTENCY_TABLE")
+        except KeyError as e:
+            logger.error("KeyError")
+            logger.error(traceback.format_exc())
+            raise
+
+        # 処理段階毎の所要時間計測
+        timer = parallel.StageTimer()
+
+        # 受信データ取り出し（SQS/Kinesis）
+        message_list = []
+        for record in event.get("Records", []):
+            if "kinesis" in record:
+                message_id = record["kinesis"]["sequenceNumber"]
+                recv_datetime = int(record["kinesis"]["approximateArrivalTimestamp"] * 1000)
+                body = base64.standard_b64decode(record["kinesis"]["data"])
+            else:
+                message_id = record["messageId"]
+                recv_datetime = int(record.get("attributes", {}).get("SentTimestamp", 0))
+                body = record["body"]
+            if not recv_datetime:
+                now = datetime.now()
+                recv_datetime = int(time.mktime(now.timetuple()) * 1000) + int(now.microsecond / 1000)
+            try:
+                body = json.loads(body)
+                message_list.append(
+                    {
+                        "message_id": message_id,
+                        "simid": body["simId"],
+                        "recv_datetime": recv_datetime,
+                        "payload": base64.standard_b64decode(body["payload"]),
+                    }
+                )
+            except (ValueError, KeyError, TypeError) as e:
+                # 形式不正のレコードは再送しても処理できないため破棄
+                logger.error(f"受信データ形式エラー message_id={message_id}, e={e}")
+
+        # データ解析・登録
+        failure_message_id_list, initial_receive_list = batchIngest(
+            message_list,
+            idempotency_table,
+            iccid_table,
+            device_table,
+            hist_table,
+            hist_list_table,
+            state_table,
+            group_table,
+            device_relation_table,
+            remote_control_table,
+            timer,
+        )
+
+        ##################
+        # 初期受信処理
+        ##################
+        for simid in initial_receive_list:
+            clients.get_client("lambda").invoke(
+                FunctionName=INITIAL_LAMBDA_NAME,
+                InvocationType="Event",
+                Payload=json.dumps({"iccid": simid}),
+            )
+            logger.debug(f"initialreceive呼び出し iccid={simid}")
+
+        logger.info(f"stage_timings={timer.summary()}")
+        logger.debug(f"client_init_timings={clients.init_timings()}")
+        logger.debug("batch_handler正常終了")
+        return {
+            "batchItemFailures": [
+                {"itemIdentifier": message_id} for message_id in failure_message_id_list
+            ]
+        }
+
+    except Exception as e:
+        logger.error(e)
+        logger.error(traceback.format_exc())
+        raise
@@ -0,0 +1,92 @@
+import struct
+from collections import namedtuple
+
+# デバイス種別
+DEVICE_TYPE_NAME = {0x0001: "PJ1", 0x0002: "PJ2", 0x0003: "PJ3"}
+
+# コマンド共通部（メッセージ長、デバイス種別、ファームウェアVersion、メッセージ種別）
+HEADER = struct.Struct(">HHHH")
+
+# メッセージ種別毎のレイアウト（コマンド共通部の後続）
+# Q:イベント発生日時 B:デバイス状態 b:RSSI/SINR(符号付) h:AI(符号付)
+_STATE_CHANGE = struct.Struct(">8xQBBBbbBBBBhhB")
+_CURRENT_STATE = struct.Struct(">8xQBBbbBBhh")
+_CONTROL_RES = struct.Struct(">8x4sQBBbbBB")
+LAYOUT = {
+    0x0001: _STATE_CHANGE,  # 状態変化通知
+    0x0011: _CURRENT_STATE,  # 現状態通知（電源ON）
+    0x0012: _CURRENT_STATE,  # 現状態通知
+    0x8002: _CONTROL_RES,  # 接点出力制御応答
+}
+
+DeviceMessage = namedtuple(
+    "DeviceMessage",
+    [
+        "length",
+        "device_type",
+        "fw_version",
+        "message_type",
+        "req_no",
+        "event_datetime",
+        "device_state",
+        "device_trigger",
+        "power_voltage",
+        "rssi",
+        "sinr",
+        "di_state",
+        "di_trigger",
+        "do_state",
+        "do_trigger",
+        "analogv1",
+        "analogv2",
+        "ad_trigger",
+        "control_result",
+    ],
+)
+
+
+# コマンド共通部解析
+# 戻り値 : (メッセージ長, デバイス種別, ファームウェアVersion, メッセージ種別)、長さ不足時はNone
+def decodeHeader(Payload):
+    if len(Payload) < HEADER.size:
+        return None
+    return HEADER.unpack_from(Payload)
+
+
+# 電文解析
+# 長さ不足、メッセージ種別不正の場合はValueError
+def decode(Payload, header=None):
+    if header is None:
+        header = decodeHeader(Payload)
+        if header is None:
+            raise ValueError("メッセージ長不足")
+    nlen, nDeviceType, nVer, nMsgType = header
+    layout = LAYOUT.get(nMsgType)
+    if layout is None:
+        raise ValueError(f"メッセージ種別不正 nMsgType={nMsgType}")
+    try:
+        values = layout.unpack_from(memoryview(Payload))
+    except struct.error as e:
+        raise ValueError("メッセージ長不足") from e
+
+    if nMsgType == 0x0001:
+        (
+            nEventTime, nState, nStatetrg, nVolt, nRssi, nSinr,
+            nDIState, nDItrg, nDOState, nDOtrg, nAI1, nAI2, nAItrg,
+        ) = values
+        return DeviceMessage(
+            nlen, nDeviceType, nVer, nMsgType, None, nEventTime, nState, nStatetrg, nVolt,
+            nRssi, nSinr, nDIState, nDItrg, nDOState, nDOtrg, nAI1, nAI2, nAItrg, None,
+        )
+    elif nMsgType == 0x8002:
+        bReqNo, nEventTime, nState, nVolt, nRssi, nSinr, nControlResult, nDOState = values
+        return DeviceMessage(
+            nlen, nDeviceType, nVer, nMsgType, bReqNo.hex(), nEventTime, nState, None, nVolt,
+            nRssi, nSinr, None, None, nDOState, None, None, None, None, nControlResult,
+        )
+    else:
+        nEventTime, nState, nVolt, nRssi, nSinr, nDIState, nDOState, nAI1, nAI2 = values
+        return DeviceMessage(
+            nlen, nDeviceType, nVer, nMsgType, None, nEventTime, nState, None, nVolt,
+            nRssi, nSinr, nDIState, None, nDOState, None, nAI1, nAI2, None, None,
+        )
@@ -1,5 +1,6 @@
 import os
 import ddb
+import message_decoder
 from aws_lambda_powertools import Logger
 
 logger = Logger()
@@ -8,54 +9,48 @@ RECV_PAST_TIME = int(os.environ["RECV_PAST_TIME"])
 RECV_FUTURE_TIME = int(os.environ["RECV_FUTURE_TIME"])
 
 
-def getByteArray(Payload, index, len):
-    start = index[0]
-    end = index[0] + len
-    index[0] += len
-    return Payload[start:end]
-
-
-def validate(Payload, Simid, RecvDatetime, hist_table):
+# 戻り値 : (チェック結果, 解析済み電文)
+def validate(Payload, Simid, RecvDatetime):
     logger.debug("validate開始")
-    index = [0]
-    nlen = int.from_bytes(getByteArray(Payload, index, 2), "big")
-    nDeviceType = int.from_bytes(getByteArray(Payload, index, 2), "big")
-    nVer = int.from_bytes(getByteArray(Payload, index, 2), "big")
-    nMsgType = int.from_bytes(getByteArray(Payload, index, 2), "big")
-    if nMsgType == 0x8002:
-        szReqNo = getByteArray(Payload, index, 4).hex()
-    else:
-        szReqNo = None
-    nEventTime = int.from_bytes(getByteArray(Payload, index, 8), "big")
+    header = message_decoder.decodeHeader(Payload)
 
     # メッセージ長
-    if (nlen != len(Payload)) or (len(Payload) < 8):
+    if (header is None) or (header[0] != len(Payload)):
         logger.debug("メッセージ長エラー")
-        return 1
+        return 1, None
+    nlen, nDeviceType, nVer, nMsgType = header
 
     # デバイス種別
     if nDeviceType not in [0x0001, 0x0002, 0x0003]:
         logger.debug("デバイス種別エラー")
-        return 2
+        return 2, None
 
     # メッセージ種別
     if nMsgType not in [0x0001, 0x0011, 0x0012, 0x8002]:
         logger.debug("メッセージ種別エラー")
-        return 3
+        return 3, None
+
+    # 電文解析（共通部は解析済みのものを使用）
+    try:
+        message = message_decoder.decode(Payload, header)
+    except ValueError:
+        logger.debug("メッセージ長エラー")
+        return 1, None
+    nEventTime = message.event_datetime
 
     # イベント発生日時
     if not ((RecvDatetime - RECV_PAST_TIME) <= nEventTime <= (RecvDatetime + RECV_FUTURE_TIME)):
         logger.debug(f"RecvDatetime={RecvDatetime}, nEventTime={nEventTime}")
         logger.debug("イベント発生日時エラー")
-        return 4
+        return 4, None
 
-    # 同一電文
-    count = ddb.get_history_count(Simid, nEventTime, hist_table)
-    # logger.debug(f'Simid={Simid}, nEventTime={nEventTime}, count={count}')
-    logger.debug(f"Simid={Simid}, nEventTime={nEventTime}, count={count}")
-    if count != 0:
+    # 同一電文（直近受信分のみ、確定判定は登録時の条件付き書き込みで実施）
+    device_req_no = f"{Simid}-{message.req_no}" if nMsgType == 0x8002 else None
+    key = ddb.message_key(nEventTime, format(nMsgType, "04x"), device_req_no)
+    if ddb.is_recent_message(Simid, key):
+        logger.debug(f"Simid={Simid}, key={key}")
         logger.debug("受信済みデータエラー")
-        return 5
+        return 5, None
 
     logger.debug("validate終了")
-    return 0
+    return 0, message
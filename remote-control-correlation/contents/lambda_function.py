@@ -0,0 +1,91 @@
+import time
+import traceback
+
+from aws_lambda_powertools import Logger
+from aws_xray_sdk.core import patch_all
+
+import control_correlation
+import control_timeout
+
+patch_all()
+
+logger = Logger()
+
+
+###################################
+# 接点出力制御の応答突合
+#
+# 接点出力制御応答テーブルのストリーム（NEW_AND_OLD_IMAGES）を受け取り、
+# 制御結果・紐づけ接点入力結果の登録を検知する
+# - 応答（タイムアウト以外）で確定した結果項目を記録し、予約済みのタイムアウト判定を取り消す
+# - 制御応答（タイムアウト以外）を受信した要求は、紐づけ接点入力の判定を期限で予約する
+# - 確定した要求は、要求からの所要時間をログ出力する
+# 処理に失敗したレコードは batchItemFailures（シーケンス番号）で再処理させる
+###################################
+def lambda_handler(event, context):
+    records = event.get("Records", [])
+    logger.debug(f"lambda_handler開始 件数={len(records)}")
+
+    for record in records:
+        if record.get("eventName") != "MODIFY":
+            continue
+        sequence_number = record["dynamodb"]["SequenceNumber"]
+        try:
+            correlate(*control_correlation.images(record))
+        except Exception as e:
+            logger.error(f"応答突合エラー sequence_number={sequence_number}, e={e}")
+            logger.error(traceback.format_exc())
+            # ストリームは失敗したレコード以降を順序どおりに再処理する
+            return {"batchItemFailures": [{"itemIdentifier": sequence_number}]}
+
+    logger.debug("lambda_handler正常終了")
+    return {"batchItemFailures": []}
+
+
+##################################
+# 応答突合
+# old : 変更前の接点出力制御応答
+# new : 変更後の接点出力制御応答
+##################################
+def correlate(old, new):
+    resolved = control_correlation.resolved(old, new)
+    if not resolved:
+        return
+
+    device_req_no = new["device_req_no"]
+    settled_keys = [
+        result_key
+        for result_key in resolved
+        if new[result_key] != control_correlation.RESULT_TIMEOUT
+    ]
+    if settled_keys and control_correlation.enabled():
+        # 応答で確定した段階のタイムアウト判定を取り消す
+        control_correlation.settle(device_req_no, settled_keys)
+
+    if (
+        control_correlation.RESULT_CONTROL in resolved
+        and new[control_correlation.RESULT_CONTROL] != control_correlation.RESULT_TIMEOUT
+        and new.get("link_di_no", 0) > 0
+        and new.get(control_correlation.RESULT_LINK_DI) is None
+        and control_correlation.enabled()
+    ):
+        # 紐づけ接点入力の判定予約
+        limit_datetime = control_timeout.limit_datetime(new, control_timeout.PHASE_LINK_DI)
+        control_timeout.schedule(
+            device_req_no,
+            control_timeout.PHASE_LINK_DI,
+            control_timeout.remaining_seconds(limit_datetime),
+        )
+
+    if control_correlation.is_settled(new):
+        logger.info(
+            {
+                "remote_control_settled": {
+                    "device_req_no": device_req_no,
+                    "control_trigger": new.get("control_trigger"),
+                    "control_result": new.get(control_correlation.RESULT_CONTROL),
+                    "link_di_result": new.get(control_correlation.RESULT_LINK_DI),
+                    "elapsed_ms": int(time.time() * 1000) - int(new["req_datetime"]),
+                }
+            }
+        )
@@ -14,6 +14,7 @@ import copy
 import auth
 import ssm
 import db
+import relation
 import ddb
 
 patch_all()
@@ -51,19 +52,19 @@ def lambda_handler(event, context, user_info):
 
         cotract_id = user_info["contract_id"]
 
+        contract_info = db.get_contract_info(cotract_id, contract_table)
+        logger.debug(f"contract_info: {contract_info}")
+        relation_graph = relation.get_relation_graph(contract_info, device_relation_table)
+
         ### 2. デバイスID取得（作業者・参照者の場合）
         device_id_list = list()
         if user_info["user_type"] in ("worker", "referrer"):
             logger.info("In case of worker/referee")
-            device_id_list = db.get_user_relation_device_id_list(
-                user_info["user_id"], device_relation_table
-            )
+            device_id_list = relation_graph.user_device_id_list(user_info["user_id"])
 
         ### 3. デバイスID取得（管理者・副管理者の場合）
         if user_info["user_type"] in ("admin", "sub_admin"):
             logger.info("In case of admin/sub_admin")
-            contract_info = db.get_contract_info(cotract_id, contract_table)
-            logger.debug(f"contract_info: {contract_info}")
             device_id_list = contract_info["contract_data"]["device_list"]
 
         logger.debug(f"device_id_list: {device_id_list}")
@@ -75,9 +76,7 @@ def lambda_handler(event, context, user_info):
             [],
         )  # デバイスID毎のグループID一覧、重複のないグループID一覧
         for device_id in device_id_list:
-            group_id_list = db.get_device_relation_group_id_list(
-                device_id, device_relation_table
-            )
+            group_id_list = relation_graph.device_group_id_list(device_id)
             device_group_relation.append({"device_id": device_id, "group_list": group_id_list})
             all_groups += group_id_list
         all_groups = set(all_groups)
@@ -85,13 +84,9 @@ def lambda_handler(event, context, user_info):
         logger.info(f"重複のないグループID一覧:{all_groups}")
 
         # グループ情報取得
-        group_info_list = []
-        for item in all_groups:
-            group_info = db.get_group_info(item, group_table)
-            if group_info:
-                group_info_list.append(group_info)
-            else:
-                logger.info(f"group information does not exist:{item}")
+        group_info_list = db.get_group_info_many(all_groups, group_table, db.GROUP_NAME_FIELDS)
+        for item in all_groups - {group_info["group_id"] for group_info in group_info_list}:
+            logger.info(f"group information does not exist:{item}")
         logger.info(f"グループ情報:{group_info_list}")
         if group_info_list:
             group_info_list = sorted(
@@ -141,6 +136,17 @@ def lambda_handler(event, context, user_info):
 
         ### 5. 遠隔制御一覧生成
         results = list()
+        # 現状態情報一括取得
+        state_info_list = db.get_device_state_many(
+            [
+                device_info["device_id"]
+                for device_info in device_info_list_filtered
+                if device_info and device_info.get("device_type") in ["PJ1", "PJ2", "PJ3"]
+            ],
+            device_state_table,
+        )
+        state_info_dict = {state_info["device_id"]: state_info for state_info in state_info_list}
+
         # デバイス情報取得
         for device_info in device_info_list_filtered:
             logger.debug({"device_info": device_info})
@@ -152,7 +158,7 @@ def lambda_handler(event, context, user_info):
 
             if device_info is not None and device_info.get("device_type") in ["PJ1", "PJ2", "PJ3"]:
                 # 現状態情報取得
-                state_info = db.get_device_state(device_info["device_id"], device_state_table)
+                state_info = state_info_dict.get(device_info["device_id"], {})
                 # 現状態情報がない場合は次のデバイスへ
                 if not state_info:
                     continue
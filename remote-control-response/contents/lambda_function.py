@@ -2,7 +2,6 @@ import json
 import os
 import traceback
 from decimal import Decimal
-import time
 
 from aws_lambda_powertools import Logger
 from aws_xray_sdk.core import patch_all
@@ -10,9 +9,9 @@ import boto3
 from botocore.exceptions import ClientError
 
 import auth
+import control_correlation
 import ssm
 import convert
-import ddb
 import validate
 
 patch_all()
@@ -67,17 +66,17 @@ def lambda_handler(event, context, user_info):
         remote_control = validate_result["remote_control"]
         req_datetime = remote_control["req_datetime"]
         limit_datetime = req_datetime + 10000  # 10秒
-        while (
-            not remote_control.get("control_result")
-            and time.time() <= limit_datetime / 1000
-        ):
-            time.sleep(1)
-            logger.info(time.time())
-            remote_control = ddb.get_remote_control_info(
-                remote_control["device_req_no"], remote_controls_table
+        control_result = remote_control.get("control_result")
+        if not control_result:
+            # 制御結果の登録まで待機
+            control_result = control_correlation.wait_result(
+                remote_control["device_req_no"],
+                control_correlation.RESULT_CONTROL,
+                limit_datetime,
+                remote_controls_table,
             )
 
-        control_result = "0" if remote_control.get("control_result") == "0" else "1"
+        control_result = "0" if control_result == "0" else "1"
         logger.info(f"result:{control_result}")
 
         if control_result == "0":
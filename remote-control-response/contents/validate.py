@@ -3,6 +3,7 @@ import json
 from aws_lambda_powertools import Logger
 
 import db
+import relation
 import ddb
 
 logger = Logger()
@@ -61,9 +62,9 @@ def validate(
 
     # 権限チェック（作業者）
     if not operation_auth_check(user):
-        user_device_list = db.get_user_relation_device_id_list(
-            user["user_id"], device_relation_table
-        )
+        user_device_list = relation.get_relation_graph(
+            contract, device_relation_table
+        ).user_device_id_list(user["user_id"])
         if device_id not in user_device_list:
             return {
                 "message": "権限が変更されたデバイスが選択されました。\n画面の更新を行います。\n\nエラーコード：003-0607"
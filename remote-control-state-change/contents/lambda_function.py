@@ -1,6 +1,5 @@
 import json
 import os
-import time
 import traceback
 
 from boto3.dynamodb.conditions import Key
@@ -10,7 +9,9 @@ from aws_xray_sdk.core import patch_all
 import boto3
 
 import auth
+import control_correlation
 import db
+import relation
 import ssm
 
 
@@ -121,9 +122,9 @@ def lambda_handler(event, context, user_info):
 
         # デバイス操作権限チェック（管理者, 副管理者でない場合）
         if user_info["user_type"] not in ["admin", "sub_admin"]:
-            allowed_device_id_list = db.get_user_relation_device_id_list(
-                user_id, device_relation_table
-            )
+            allowed_device_id_list = relation.get_relation_graph(
+                contract, device_relation_table
+            ).user_device_id_list(user_id)
             logger.info(f"allowed_device_id_list: {allowed_device_id_list}")
 
             if device_id not in allowed_device_id_list:
@@ -142,24 +143,16 @@ def lambda_handler(event, context, user_info):
         recv_datetime = remote_control["recv_datetime"]
         limit_datetime = recv_datetime + 20000  # 20秒
 
-        logger.info(int(time.time() * 1000))
-        while int(time.time() * 1000) <= limit_datetime:
-            remote_control = db.get_remote_control(device_req_no, remote_control_table)
-            if remote_control.get("link_di_result") is not None:
-                control_result = "0" if remote_control["link_di_result"] == "0" else "1"
-                return {
-                    "statusCode": 200,
-                    "headers": response_headers,
-                    "body": json.dumps(
-                        {
-                            "message": "",
-                            "device_req_no": device_req_no,
-                            "control_result": control_result,
-                        },
-                        ensure_ascii=False,
-                    ),
-                }
-            time.sleep(1)
+        link_di_result = remote_control.get("link_di_result")
+        if link_di_result is None:
+            # 紐づけ接点入力結果の登録まで待機
+            link_di_result = control_correlation.wait_result(
+                device_req_no,
+                control_correlation.RESULT_LINK_DI,
+                limit_datetime,
+                remote_control_table,
+            )
+        control_result = "0" if link_di_result == "0" else "1"
 
         return {
             "statusCode": 200,
@@ -168,7 +161,7 @@ def lambda_handler(event, context, user_info):
                 {
                     "message": "",
                     "device_req_no": device_req_no,
-                    "control_result": "1",
+                    "control_result": control_result,
                 },
                 ensure_ascii=False,
             ),
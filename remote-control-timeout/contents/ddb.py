@@ -1,7 +1,5 @@
 import os
-import json
 import uuid
-import decimal
 import time
 
 from aws_lambda_powertools import Logger
@@ -11,6 +9,7 @@ from decimal import Decimal
 from datetime import datetime
 from dateutil import relativedelta
 
+import convert
 import db
 
 logger = Logger()
@@ -18,6 +17,11 @@ logger = Logger()
 NOTIFICATION_HIST_TTL = int(os.environ["NOTIFICATION_HIST_TTL"])
 HIST_LIST_TTL = int(os.environ["HIST_LIST_TTL"])
 
+# タイムアウト履歴の履歴ID（端末要求番号・イベント種別から生成し、再判定でも同じ値とする）
+TIMEOUT_HIST_ID_NAMESPACE = uuid.UUID("7c1f3d2e-5b8a-4f06-9e2d-3a4b5c6d7e8f")
+# 通知済みのタイムアウト履歴のイベント種別（文字列セット）
+TIMEOUT_NOTIFIED = "timeout_notified"
+
 
 # 接点出力制御応答取得
 def get_remote_control_info(device_req_no, remote_controls_table):
@@ -49,7 +53,7 @@ def put_notification_hist(
         "expire_datetime": expire_datetime,
         "notification_user_list": notification_user_list,
     }
-    item = json.loads(json.dumps(notice_hist_item), parse_float=decimal.Decimal)
+    item = convert.to_dynamo_item(notice_hist_item)
     notification_hist_table.put_item(Item=item)
     return notification_hist_id
 
@@ -68,7 +72,13 @@ def get_cnt_hist(simid, event_datetime_from, event_datetime_to, cnt_hist_table):
     return cnt_hist["Items"]
 
 
+# タイムアウト履歴の履歴ID
+def timeout_hist_id(device_req_no, hist_type):
+    return str(uuid.uuid5(TIMEOUT_HIST_ID_NAMESPACE, f"{device_req_no}#{hist_type}"))
+
+
 # 履歴一覧テーブルにタイムアウトレコード作成
+# 判定の再配信で重複して作成しないよう、同じ履歴IDのレコードが存在する場合は作成しない
 def put_hist_list(
     remote_control,
     notification_hist_id,
@@ -116,7 +126,7 @@ def put_hist_list(
 
     hist_list_item = {
         "device_id": device.get("device_id"),
-        "hist_id": str(uuid.uuid4()),
+        "hist_id": timeout_hist_id(remote_control.get("device_req_no"), control_result),
         "event_datetime": limit_datetime,
         # "recv_datetime": "",  # TODO 仕様確認中
         "expire_datetime": expire_datetime,
@@ -186,31 +196,69 @@ def put_hist_list(
                         link_terminal_state_name = di_list.get("di_off_name", "オープン")
             hist_data["link_terminal_state_name"] = link_terminal_state_name
 
-    hist_list_table.put_item(Item=hist_list_item)
+    try:
+        hist_list_table.put_item(
+            Item=hist_list_item,
+            ConditionExpression="attribute_not_exists(hist_id)",
+        )
+    except hist_list_table.meta.client.exceptions.ConditionalCheckFailedException:
+        logger.info(f"タイムアウト履歴登録済みのため作成なし hist_id={hist_list_item['hist_id']}")
 
 
 # 接点出力制御結果更新
+# 制御結果が未登録の場合のみ更新する（応答受信・判定の重複実行で上書きしない）
+# 戻り値 : 更新した場合True
 def update_remote_control_result_timeout(
     device_req_no, req_datetime, link_di_no, remote_controls_table
 ):
     if link_di_no > 0:
-        remote_controls_table.update_item(
-            Key={"device_req_no": device_req_no, "req_datetime": req_datetime},
-            UpdateExpression="SET control_result = :control_result, link_di_result = :link_di_result",
-            ExpressionAttributeValues={":control_result": "9999", ":link_di_result": "9999"},
-        )
+        update_expression = "SET control_result = :control_result, link_di_result = :link_di_result"
+        expression_attribute_values = {":control_result": "9999", ":link_di_result": "9999"}
     else:
+        update_expression = "SET control_result = :control_result"
+        expression_attribute_values = {":control_result": "9999"}
+    try:
         remote_controls_table.update_item(
             Key={"device_req_no": device_req_no, "req_datetime": req_datetime},
-            UpdateExpression="SET control_result = :control_result",
-            ExpressionAttributeValues={":control_result": "9999"},
+            UpdateExpression=update_expression,
+            ConditionExpression="attribute_not_exists(control_result)",
+            ExpressionAttributeValues=expression_attribute_values,
         )
+    except remote_controls_table.meta.client.exceptions.ConditionalCheckFailedException:
+        logger.info(f"制御結果登録済みのため更新なし device_req_no={device_req_no}")
+        return False
+    return True
 
 
 # 接点入力状態変化通知結果更新
+# 接点入力状態変化通知結果が未登録の場合のみ更新する
+# 戻り値 : 更新した場合True
 def update_link_di_result_timeout(device_req_no, req_datetime, remote_controls_table):
+    try:
+        remote_controls_table.update_item(
+            Key={"device_req_no": device_req_no, "req_datetime": req_datetime},
+            UpdateExpression="SET link_di_result = :new_value",
+            ConditionExpression="attribute_not_exists(link_di_result)",
+            ExpressionAttributeValues={":new_value": "9999"},
+        )
+    except remote_controls_table.meta.client.exceptions.ConditionalCheckFailedException:
+        logger.info(f"接点入力状態変化通知結果登録済みのため更新なし device_req_no={device_req_no}")
+        return False
+    return True
+
+
+# タイムアウト通知済み有無
+# hist_type : 履歴のイベント種別（"timeout_response" / "timeout_status"）
+def is_timeout_notified(remote_control, hist_type):
+    return hist_type in remote_control.get(TIMEOUT_NOTIFIED, set())
+
+
+# タイムアウト通知済み登録
+# 通知・履歴登録の完了後に登録する（失敗して再配信された判定で通知をやり直せるようにする）
+def update_timeout_notified(device_req_no, req_datetime, hist_type, remote_controls_table):
     remote_controls_table.update_item(
         Key={"device_req_no": device_req_no, "req_datetime": req_datetime},
-        UpdateExpression="SET link_di_result = :new_value",
-        ExpressionAttributeValues={":new_value": "9999"},
+        UpdateExpression="ADD #notified :hist_type",
+        ExpressionAttributeNames={"#notified": TIMEOUT_NOTIFIED},
+        ExpressionAttributeValues={":hist_type": {hist_type}},
     )
@@ -9,21 +9,24 @@ import textwrap
 
 from aws_lambda_powertools import Logger
 from aws_xray_sdk.core import patch_all
-import boto3
 from botocore.exceptions import ClientError
 
 import auth
+import clients
+import control_correlation
+import control_timeout
 import ssm
 import db
 import convert
 import mail
+import parallel
 import ddb
 import validate
 
 patch_all()
 
 logger = Logger()
-dynamodb = boto3.resource("dynamodb", endpoint_url=os.environ.get("endpoint_url"))
+dynamodb = clients.dynamodb()
 
 SSM_KEY_TABLE_NAME = os.environ["SSM_KEY_TABLE_NAME"]
 
@@ -299,24 +302,38 @@ def send_mail(
     return notification_hist_id
 
 
+##################################
+# タイムアウト判定
+#
+# SQS（遅延メッセージ）: {"device_req_no", "phase"} を判定期限以降に受信し、まとめて判定する
+#   応答突合が有効な場合は、応答で確定済み（確定管理テーブルに記録済み）の段階の判定を取り消す
+#   応答済みかつ接点入力紐づけありの場合は、紐づけ接点入力の判定を予約する
+#   （応答突合が有効な場合は、応答受信時に remote-control-correlation で予約される）
+#   判定期限前に受信した場合は残り時間で再予約する
+#   判定に失敗したメッセージは batchItemFailures で再配信させる
+# 非同期呼び出し（従来）: {"body": "{\"device_req_no\": ...}"}
+#   予約キューが設定されている場合はSQSでの判定に切り替え、未設定の場合は判定期限まで待機する
+##################################
 def lambda_handler(event, context):
+    res_headers = {
+        "Content-Type": "application/json",
+        "Access-Control-Allow-Origin": "*",
+    }
     try:
-        res_headers = {
-            "Content-Type": "application/json",
-            "Access-Control-Allow-Origin": "*",
-        }
         # DynamoDB操作オブジェクト生成
         try:
-            account_table = dynamodb.Table(ssm.table_names["ACCOUNT_TABLE"])
-            user_table = dynamodb.Table(ssm.table_names["USER_TABLE"])
-            contract_table = dynamodb.Table(ssm.table_names["CONTRACT_TABLE"])
-            device_relation_table = dynamodb.Table(ssm.table_names["DEVICE_RELATION_TABLE"])
-            remote_controls_table = dynamodb.Table(ssm.table_names["REMOTE_CONTROL_TABLE"])
-            hist_list_table = dynamodb.Table(ssm.table_names["HIST_LIST_TABLE"])
-            device_table = dynamodb.Table(ssm.table_names["DEVICE_TABLE"])
-            group_table = dynamodb.Table(ssm.table_names["GROUP_TABLE"])
-            notification_hist_table = dynamodb.Table(ssm.table_names["NOTIFICATION_HIST_TABLE"])
-            device_state_table = dynamodb.Table(ssm.table_names["STATE_TABLE"])
+            tables = {
+                "account_table": dynamodb.Table(ssm.table_names["ACCOUNT_TABLE"]),
+                "user_table": dynamodb.Table(ssm.table_names["USER_TABLE"]),
+                "contract_table": dynamodb.Table(ssm.table_names["CONTRACT_TABLE"]),
+                "device_relation_table": dynamodb.Table(ssm.table_names["DEVICE_RELATION_TABLE"]),
+                "remote_controls_table": dynamodb.Table(ssm.table_names["REMOTE_CONTROL_TABLE"]),
+                "hist_list_table": dynamodb.Table(ssm.table_names["HIST_LIST_TABLE"]),
+                "device_table": dynamodb.Table(ssm.table_names["DEVICE_TABLE"]),
+                "group_table": dynamodb.Table(ssm.table_names["GROUP_TABLE"]),
+                "notification_hist_table": dynamodb.Table(ssm.table_names["NOTIFICATION_HIST_TABLE"]),
+                "device_state_table": dynamodb.Table(ssm.table_names["STATE_TABLE"]),
+            }
         except KeyError as e:
             body = {"code": "9999", "message": e}
             return {
@@ -325,12 +342,15 @@ def lambda_handler(event, context):
                 "body": json.dumps(body, ensure_ascii=False),
             }
 
+        if "Records" in event:
+            return _check_records(event["Records"], tables)
+
         # パラメータチェック
         validate_result = validate.validate(
             event,
-            contract_table,
-            device_relation_table,
-            remote_controls_table,
+            tables["contract_table"],
+            tables["device_relation_table"],
+            tables["remote_controls_table"],
         )
         if validate_result["code"] != "0000":
             return {
@@ -339,152 +359,247 @@ def lambda_handler(event, context):
                 "body": json.dumps(validate_result, ensure_ascii=False),
             }
 
-        remote_control = validate_result["remote_control"]
-
-        link_di_no = remote_control["link_di_no"]
-
-        req_datetime = remote_control["req_datetime"]
-        if remote_control.get("control_trigger") == "manual_control":
-            limit_datetime = req_datetime + 10000  # 10秒
-        else:
-            limit_datetime = req_datetime + 20000  # 20秒
-        if time.time() <= limit_datetime / 1000:
-            # タイムアウト時間まで待機
-            time.sleep(float(limit_datetime) / 1000 - time.time())
-
-        remote_control = ddb.get_remote_control_info(
-            remote_control["device_req_no"], remote_controls_table
+        message = check_timeout(
+            validate_result["remote_control"],
+            control_timeout.PHASE_RESPONSE,
+            tables,
+            wait=not control_timeout.enabled(),
         )
-        if not remote_control:
-            body = {"code": "9999", "message": "端末要求番号が存在しません。"}
+        if message:
+            body = {"code": "9999", "message": message}
             return {
                 "statusCode": 500,
                 "headers": res_headers,
                 "body": json.dumps(body, ensure_ascii=False),
             }
 
+    except Exception as e:
+        logger.info(e)
+        logger.info(traceback.format_exc())
+        res_body = {"code": "9999", "message": "予期しないエラーが発生しました。"}
+        raise Exception(json.dumps(res_body))
 
-        device = db.get_device_info_other_than_unavailable(remote_control.get("device_id"), device_table)
-        if not device:
-            body = {"code": "9999", "message": "デバイス情報が存在しません。"}
-            return {
-                "statusCode": 500,
-                "headers": res_headers,
-                "body": json.dumps(body, ensure_ascii=False),
-            }
 
-        if remote_control.get("control_result") is None:
-            # タイムアウト発生
-            notification_setting = [
-                setting
-                for setting in device.get("device_data", {})
-                .get("config", {})
-                .get("notification_settings", [])
-                if setting.get("event_trigger") == "do_change"
-                and setting.get("terminal_no") == remote_control["do_no"]
-            ]
-
-            notification_hist_id = None
-            if notification_setting:
-                change_state_mail = False
-                notification_hist_id = send_mail(
-                    notification_setting[0],
-                    device,
-                    remote_control,
-                    account_table,
-                    user_table,
-                    group_table,
-                    device_relation_table,
-                    notification_hist_table,
-                    change_state_mail,
-                    limit_datetime
-                )
+# SQSメッセージの一括判定
+def _check_records(records, tables):
+    # {メッセージID: (端末要求番号, 判定段階)}
+    checks = {}
+    for record in records:
+        try:
+            body = json.loads(record["body"])
+            checks[record["messageId"]] = (body["device_req_no"], body.get("phase"))
+        except (ValueError, KeyError, TypeError) as e:
+            # 形式不正のメッセージは再送しても処理できないため破棄
+            logger.error(f"タイムアウト判定メッセージ形式エラー message_id={record['messageId']}, e={e}")
+
+    settled = {}
+    if checks and control_correlation.enabled():
+        # 応答突合で確定済みの段階は接点出力制御応答を取得せずに取り消す（バッチ全体で一括取得）
+        try:
+            settled = control_correlation.settled_results(
+                [device_req_no for device_req_no, _ in checks.values()]
+            )
+        except Exception as e:
+            # 取得できない場合は接点出力制御応答から判定する
+            logger.warning(f"確定記録取得エラー e={e}")
+
+    def check_record(record):
+        if record["messageId"] not in checks:
+            return None
+        device_req_no, phase = checks[record["messageId"]]
+        if control_correlation.is_phase_settled(settled, device_req_no, phase):
+            logger.debug(f"応答確定済みのため判定取消 device_req_no={device_req_no}, phase={phase}")
+            return None
 
-            # 履歴レコード作成
-            ddb.put_hist_list(
-                remote_control,
-                notification_hist_id,
-                "timeout_response",
-                hist_list_table,
-                device_table,
-                group_table,
-                device_relation_table,
-                device_state_table,
-                limit_datetime
+        try:
+            remote_control = ddb.get_remote_control_info(
+                device_req_no, tables["remote_controls_table"]
             )
+            if not remote_control:
+                # 再配信しても判定できないため破棄
+                logger.error(f"端末要求番号が存在しません。 device_req_no={device_req_no}")
+                return None
+            message = check_timeout(remote_control, phase, tables, wait=False)
+            if message:
+                logger.error(f"{message} device_req_no={device_req_no}")
+            return None
+        except Exception as e:
+            logger.error(f"タイムアウト判定エラー message_id={record['messageId']}, e={e}")
+            logger.error(traceback.format_exc())
+            return record["messageId"]
+
+    failure_message_id_list = [
+        message_id for message_id in parallel.map_parallel(check_record, records) if message_id
+    ]
+    logger.debug(f"タイムアウト判定終了 件数={len(records)}, failure={len(failure_message_id_list)}")
+    return {
+        "batchItemFailures": [
+            {"itemIdentifier": message_id} for message_id in failure_message_id_list
+        ]
+    }
+
+
+##################################
+# 判定期限までの待機
+# wait=True : 期限まで待機し、接点出力制御応答を再取得する
+# wait=False : 期限前の場合は残り時間で判定を予約する
+# 戻り値 : (接点出力制御応答, 予約有無)
+##################################
+def _wait_limit(remote_control, phase, limit_datetime, remote_controls_table, wait):
+    remaining = control_timeout.remaining_seconds(limit_datetime)
+    if remaining <= 0:
+        return remote_control, False
+    if not wait:
+        control_timeout.schedule(remote_control["device_req_no"], phase, remaining)
+        return None, True
+    # タイムアウト時間まで待機
+    time.sleep(remaining)
+    return (
+        ddb.get_remote_control_info(remote_control["device_req_no"], remote_controls_table),
+        False,
+    )
+
 
+##################################
+# タイムアウト通知・履歴登録
+# hist_type : 履歴のイベント種別（"timeout_response" / "timeout_status"）
+# 戻り値 : エラーメッセージ（正常時はNone）
+# デバイス情報はタイムアウト発生時のみ取得する
+##################################
+def _notify_timeout(remote_control, hist_type, change_state_mail, limit_datetime, tables):
+    device = db.get_device_info_other_than_unavailable(
+        remote_control.get("device_id"), tables["device_table"]
+    )
+    if not device:
+        return "デバイス情報が存在しません。"
+
+    notification_setting = [
+        setting
+        for setting in device.get("device_data", {})
+        .get("config", {})
+        .get("notification_settings", [])
+        if setting.get("event_trigger") == "do_change"
+        and setting.get("terminal_no") == remote_control["do_no"]
+    ]
+
+    notification_hist_id = None
+    if notification_setting:
+        notification_hist_id = send_mail(
+            notification_setting[0],
+            device,
+            remote_control,
+            tables["account_table"],
+            tables["user_table"],
+            tables["group_table"],
+            tables["device_relation_table"],
+            tables["notification_hist_table"],
+            change_state_mail,
+            limit_datetime
+        )
+
+    # 履歴レコード作成
+    ddb.put_hist_list(
+        remote_control,
+        notification_hist_id,
+        hist_type,
+        tables["hist_list_table"],
+        tables["device_table"],
+        tables["group_table"],
+        tables["device_relation_table"],
+        tables["device_state_table"],
+        limit_datetime
+    )
+    return None
+
+
+##################################
+# タイムアウト通知（1回のみ）
+# 通知・履歴登録の完了後に通知済みを登録する
+# 通知済みの場合は通知しない（判定メッセージの再配信・重複配信）
+##################################
+def _notify_timeout_once(remote_control, hist_type, change_state_mail, limit_datetime, tables):
+    if ddb.is_timeout_notified(remote_control, hist_type):
+        return None
+    message = _notify_timeout(remote_control, hist_type, change_state_mail, limit_datetime, tables)
+    if message is None:
+        ddb.update_timeout_notified(
+            remote_control["device_req_no"],
+            remote_control["req_datetime"],
+            hist_type,
+            tables["remote_controls_table"],
+        )
+    return message
+
+
+##################################
+# 判定
+# remote_control : 接点出力制御応答
+# phase : 判定段階（control_timeout.PHASE_RESPONSE / PHASE_LINK_DI）
+# 戻り値 : エラーメッセージ（正常時はNone）
+##################################
+def check_timeout(remote_control, phase, tables, wait):
+    remote_controls_table = tables["remote_controls_table"]
+    link_di_no = remote_control["link_di_no"]
+
+    if phase == control_timeout.PHASE_RESPONSE:
+        limit_datetime = control_timeout.limit_datetime(remote_control, phase)
+        remote_control, scheduled = _wait_limit(
+            remote_control, phase, limit_datetime, remote_controls_table, wait
+        )
+        if scheduled:
+            return None
+        if not remote_control:
+            return "端末要求番号が存在しません。"
+
+        control_result = remote_control.get("control_result")
+        if control_result is None:
+            # タイムアウト発生
             # 接点衆力制御応答テーブルに制御結果（タイムアウト）を登録
-            ddb.update_remote_control_result_timeout(
+            # 判定メッセージは重複して配信されることがあるため、登録できた場合のみ通知する
+            if not ddb.update_remote_control_result_timeout(
                 remote_control.get("device_req_no"),
                 remote_control.get("req_datetime"),
                 link_di_no,
                 remote_controls_table,
+            ):
+                return None
+            control_result = control_correlation.RESULT_TIMEOUT
+        if control_result == control_correlation.RESULT_TIMEOUT:
+            # 通知前に失敗して再配信された場合は、登録済みのタイムアウトを通知する
+            return _notify_timeout_once(
+                remote_control, "timeout_response", False, limit_datetime, tables
             )
 
-            return
-
-        if link_di_no > 0:
-            # 接点入力紐づけ設定あり
-            recv_datetime = remote_control["recv_datetime"]
-            if remote_control.get("control_trigger") == "manual_control":
-                limit_datetime = recv_datetime + 20000  # 20秒
-            else:
-                limit_datetime = recv_datetime + 40000  # 40秒
-            if time.time() <= limit_datetime / 1000:
-                # タイムアウト時間まで待機
-                time.sleep(float(limit_datetime) / 1000 - time.time())
-
-            remote_control = ddb.get_remote_control_info(
-                remote_control["device_req_no"], remote_controls_table
-            )
-            if remote_control.get("link_di_result") != "0":
-                notification_setting = [
-                    setting
-                    for setting in device.get("device_data", {})
-                    .get("config", {})
-                    .get("notification_settings", [])
-                    if setting.get("event_trigger") == "do_change"
-                    and setting.get("terminal_no") == remote_control["do_no"]
-                ]
-
-                notification_hist_id = None
-                if notification_setting:
-                    change_state_mail = True
-                    notification_hist_id = send_mail(
-                        notification_setting[0],
-                        device,
-                        remote_control,
-                        account_table,
-                        user_table,
-                        group_table,
-                        device_relation_table,
-                        notification_hist_table,
-                        change_state_mail,
-                        limit_datetime
-                    )
-
-                # 履歴レコード作成
-                ddb.put_hist_list(
-                    remote_control,
-                    notification_hist_id,
-                    "timeout_status",
-                    hist_list_table,
-                    device_table,
-                    group_table,
-                    device_relation_table,
-                    device_state_table,
-                    limit_datetime
-                )
-
-                # 接点衆力制御応答テーブルに接点入力状態変化の結果（タイムアウト）を登録
-                ddb.update_link_di_result_timeout(
-                    remote_control.get("device_req_no"),
-                    remote_control.get("req_datetime"),
-                    remote_controls_table,
-                )
-
-    except Exception as e:
-        logger.info(e)
-        logger.info(traceback.format_exc())
-        res_body = {"code": "9999", "message": "予期しないエラーが発生しました。"}
-        raise Exception(json.dumps(res_body))
+        if not link_di_no > 0:
+            return None
+        if not wait and control_correlation.enabled():
+            # 紐づけ接点入力の判定は応答突合（remote-control-correlation）で予約済み
+            return None
+        phase = control_timeout.PHASE_LINK_DI
+
+    # 接点入力紐づけ設定あり
+    limit_datetime = control_timeout.limit_datetime(remote_control, phase)
+    remote_control, scheduled = _wait_limit(
+        remote_control, phase, limit_datetime, remote_controls_table, wait
+    )
+    if scheduled:
+        return None
+    if not remote_control:
+        return "端末要求番号が存在しません。"
+
+    link_di_result = remote_control.get("link_di_result")
+    if link_di_result is None:
+        # 接点衆力制御応答テーブルに接点入力状態変化の結果（タイムアウト）を登録
+        # 判定メッセージは重複して配信されることがあるため、登録できた場合のみ通知する
+        if not ddb.update_link_di_result_timeout(
+            remote_control.get("device_req_no"),
+            remote_control.get("req_datetime"),
+            remote_controls_table,
+        ):
+            return None
+        link_di_result = control_correlation.RESULT_TIMEOUT
+    if link_di_result == control_correlation.RESULT_TIMEOUT:
+        return _notify_timeout_once(
+            remote_control, "timeout_status", True, limit_datetime, tables
+        )
+    return None
@@ -1,6 +1,4 @@
 import os
-import decimal
-import json
 import time
 import uuid
 import db
@@ -18,20 +16,15 @@ logger = Logger()
 NOTIFICATION_HIST_TTL = int(os.environ["NOTIFICATION_HIST_TTL"])
 
 
-def get_req_no_count_info(sim_id, table):
-    response = table.get_item(Key={"simid": sim_id}).get("Item", {})
-    return response
-
-
 def get_remote_control_latest(device_id, do_no, table):
-    response = table.query(
+    remote_control_latest = db.query_first(
+        table,
         IndexName="device_id_req_datetime_index",
         KeyConditionExpression=Key("device_id").eq(device_id),
         FilterExpression=Attr("do_no").eq(do_no),
         ScanIndexForward=False,  # 降順
-        Limit=1,
-    ).get("Items", [])
-    return response
+    )
+    return [remote_control_latest] if remote_control_latest else []
 
 
 def check_control_status(device_id, do_no, delete_second, table):
@@ -41,7 +34,7 @@ def check_control_status(device_id, do_no, delete_second, table):
             "do_no": do_no,
             "del_datetime": int(time.time() + delete_second),
         }
-        put_item_fmt = json.loads(json.dumps(put_item), parse_float=decimal.Decimal)
+        put_item_fmt = convert.to_dynamo_item(put_item)
         table.put_item(
             Item=put_item_fmt,
             ConditionExpression="attribute_not_exists(device_id)",
@@ -63,19 +56,6 @@ def get_device_info_other_than_unavailable(pk, table):
     return db.insert_id_key_in_device_info_list(response)
 
 
-def increment_req_no_count_num(pk, table):
-    response = table.update_item(
-        Key={"simid": pk},
-        UpdateExpression="ADD #key :increment",
-        ExpressionAttributeNames={"#key": "num"},
-        ExpressionAttributeValues={":increment": decimal.Decimal(1)},
-        ReturnValues="UPDATED_NEW",
-    )
-    count = response.get("Attributes").get("num")
-    count = convert.decimal_default_proc(count)
-    return count
-
-
 # 通知履歴テーブル作成
 def put_notification_hist(
     contract_id, notification_user_list, notification_datetime, notification_hist_table
@@ -92,7 +72,7 @@ def put_notification_hist(
         "expire_datetime": expire_datetime,
         "notification_user_list": notification_user_list,
     }
-    item = json.loads(json.dumps(notice_hist_item), parse_float=decimal.Decimal)
+    item = convert.to_dynamo_item(notice_hist_item)
     notification_hist_table.put_item(Item=item)
 
     return notification_hist_id
@@ -10,15 +10,19 @@ from zoneinfo import ZoneInfo
 from dateutil import relativedelta
 
 import boto3
+from botocore.exceptions import ClientError
 from aws_lambda_powertools import Logger
 from aws_xray_sdk.core import patch_all
 
 # layer
 import auth
+import control_timeout
 import convert
 import db
+import relation
 import ddb
 import mail
+import req_no as req_no_counter
 import ssm
 import validate
 
@@ -28,7 +32,6 @@ logger = Logger()
 
 # 環境変数
 AWS_DEFAULT_REGION = os.environ["AWS_DEFAULT_REGION"]
-LAMBDA_TIMEOUT_CHECK = os.environ["LAMBDA_TIMEOUT_CHECK"]
 REMOTE_CONTROLS_TTL = int(os.environ["REMOTE_CONTROLS_TTL"])
 CNT_HIST_TTL = int(os.environ["CNT_HIST_TTL"])
 
@@ -45,7 +48,6 @@ dynamodb = boto3.resource(
     endpoint_url=os.environ.get("endpoint_url"),
 )
 iot = boto3.client("iot-data", region_name=AWS_DEFAULT_REGION)
-aws_lambda = boto3.client("lambda", region_name=AWS_DEFAULT_REGION)
 
 
 @auth.verify_login_user()
@@ -118,9 +120,9 @@ def lambda_handler(event, context, user_info):
         ### 3. デバイス捜査権限チェック（作業者の場合）
         # デバイス操作権限チェック
         if user_info["user_type"] == "worker":
-            device_id_list = db.get_user_relation_device_id_list(
-                user_info["user_id"], device_relation_table
-            )
+            device_id_list = relation.get_relation_graph(
+                contract_info, device_relation_table
+            ).user_device_id_list(user_info["user_id"])
             logger.info(f"device_id_list: {device_id_list}")
 
             if device_id not in device_id_list:
@@ -254,38 +256,22 @@ def lambda_handler(event, context, user_info):
 
         # 要求番号取得
         icc_id = device_info["device_data"]["param"]["iccid"]
-        req_no_count_info = ddb.get_req_no_count_info(icc_id, req_no_counter_table)
-        if req_no_count_info:
-            logger.info(f"req_no_count_info: {req_no_count_info}")
-
-            ### 6. 要求番号生成（アトミックカウンタをインクリメントし、端末要求番号を生成）
-            req_num = ddb.increment_req_no_count_num(icc_id, req_no_counter_table)
-
-        else:
-            ### 6. 要求番号生成（カウント0 のレコード作成し、カウント0 の端末要求番号を生成）
-            logger.info("req_no_count_info did not exist. Put req_no_count_info to table")
-            req_num = 0
-            write_items = [
-                {
-                    "Put": {
-                        "TableName": ssm.table_names["REQ_NO_COUNTER_TABLE"],
-                        "Item": {"simid": {"S": icc_id}, "num": {"N": str(req_num)}},
-                    }
-                }
-            ]
-            result = db.execute_transact_write_item(write_items)
-            if not result:
-                # 制御状況を削除
-                control_status_table.delete_item(
-                    Key={"device_id": device_id, "do_no": do_no},
-                )
-                res_body = {"message": "要求番号カウンタ情報への書き込みに失敗しました。"}
-                return {
-                    "statusCode": 500,
-                    "headers": res_headers,
-                    "body": json.dumps(res_body, ensure_ascii=False),
-                }
-        req_no = re.sub("^0x", "", format(req_num % 65535, "#010x"))
+        ### 6. 要求番号生成（1回のUpdateItemで採番、カウンタがない場合は0から開始）
+        try:
+            req_num = req_no_counter.next_count(icc_id, req_no_counter_table)
+        except ClientError as e:
+            logger.error(f"要求番号カウンタ更新エラー icc_id={icc_id}, e={e}")
+            # 制御状況を削除
+            control_status_table.delete_item(
+                Key={"device_id": device_id, "do_no": do_no},
+            )
+            res_body = {"message": "要求番号カウンタ情報への書き込みに失敗しました。"}
+            return {
+                "statusCode": 500,
+                "headers": res_headers,
+                "body": json.dumps(res_body, ensure_ascii=False),
+            }
+        req_no = req_no_counter.to_req_no(req_num)
 
         ### 7. 接点出力制御要求
         # 接点出力制御要求メッセージを生成
@@ -380,17 +366,8 @@ def lambda_handler(event, context, user_info):
                 "body": json.dumps(res_body, ensure_ascii=False),
             }
 
-        ### 8. タイムアウト判定Lambda呼び出し
-        payload = {
-            "headers": event["headers"],
-            "body": json.dumps({"device_req_no": device_req_no}),
-        }
-        lambda_invoke_result = aws_lambda.invoke(
-            FunctionName=LAMBDA_TIMEOUT_CHECK,
-            InvocationType="Event",
-            Payload=json.dumps(payload, ensure_ascii=False),
-        )
-        logger.info(f"lambda_invoke_result: {lambda_invoke_result}")
+        ### 8. タイムアウト判定予約
+        control_timeout.request_check(device_req_no, "manual_control", headers=event["headers"])
 
         # 制御状況を削除
         control_status_table.delete_item(
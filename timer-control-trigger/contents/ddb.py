@@ -1,8 +1,6 @@
-import boto3
 import decimal
 from aws_lambda_powertools import Logger
 
-dynamodb = boto3.resource("dynamodb")
 logger = Logger()
 
 
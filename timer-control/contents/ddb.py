@@ -1,6 +1,4 @@
 import os
-import decimal
-import json
 import time
 import uuid
 
@@ -30,32 +28,15 @@ def get_device_info_by_contract_id(contract_id, contract_table, device_table):
     return device_list
 
 
-def get_req_no_count_info(sim_id, table):
-    response = table.get_item(Key={"simid": sim_id}).get("Item", {})
-    return response
-
-
 def get_remote_control_latest(device_id, do_no, table):
-    response = table.query(
+    remote_control_latest = db.query_first(
+        table,
         IndexName="device_id_req_datetime_index",
         KeyConditionExpression=Key("device_id").eq(device_id),
         FilterExpression=Attr("do_no").eq(do_no),
         ScanIndexForward=False,  # 降順
-    ).get("Items", [])
-    return response
-
-
-def increment_req_no_count_num(pk, table):
-    response = table.update_item(
-        Key={"simid": pk},
-        UpdateExpression="ADD #key :increment",
-        ExpressionAttributeNames={"#key": "num"},
-        ExpressionAttributeValues={":increment": decimal.Decimal(1)},
-        ReturnValues="UPDATED_NEW",
     )
-    count = response.get("Attributes").get("num")
-    count = convert.decimal_default_proc(count)
-    return count
+    return [remote_control_latest] if remote_control_latest else []
 
 
 # 通知履歴テーブル作成
@@ -79,7 +60,7 @@ def put_notification_hist(
         "expire_datetime": expire_datetime,
         "notification_user_list": notification_user_list,
     }
-    item = json.loads(json.dumps(notice_hist_item), parse_float=decimal.Decimal)
+    item = convert.to_dynamo_item(notice_hist_item)
     notification_hist_table.put_item(Item=item)
 
     return notification_hist_id
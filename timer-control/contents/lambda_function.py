@@ -12,13 +12,16 @@ from dateutil import relativedelta
 from aws_lambda_powertools import Logger
 from aws_xray_sdk.core import patch_all
 import boto3
+from botocore.exceptions import ClientError
 
 # layer
 import ssm
+import control_timeout
 import db
 import convert
 import ddb
 import mail
+import req_no as req_no_counter
 
 patch_all()
 
@@ -27,7 +30,6 @@ logger = Logger()
 # 環境変数
 SSM_KEY_TABLE_NAME = os.environ["SSM_KEY_TABLE_NAME"]
 AWS_DEFAULT_REGION = os.environ["AWS_DEFAULT_REGION"]
-LAMBDA_TIMEOUT_CHECK = os.environ["LAMBDA_TIMEOUT_CHECK"]
 REMOTE_CONTROLS_TTL = int(os.environ["REMOTE_CONTROLS_TTL"])
 CNT_HIST_TTL = int(os.environ["CNT_HIST_TTL"])
 # 正常レスポンス内容
@@ -44,7 +46,6 @@ dynamodb = boto3.resource(
     "dynamodb", region_name=AWS_DEFAULT_REGION, endpoint_url=os.environ.get("endpoint_url")
 )
 iot = boto3.client("iot-data", region_name=AWS_DEFAULT_REGION)
-aws_lambda = boto3.client("lambda", region_name=AWS_DEFAULT_REGION)
 
 
 def lambda_handler(event, context):
@@ -293,14 +294,8 @@ def lambda_handler(event, context):
                         continue
                     logger.info(f"put_items: {put_items}")
 
-                    # タイムアウト判定Lambda呼び出し
-                    payload = {"body": json.dumps({"device_req_no": device_req_no})}
-                    lambda_invoke_result = aws_lambda.invoke(
-                        FunctionName=LAMBDA_TIMEOUT_CHECK,
-                        InvocationType="Event",
-                        Payload=json.dumps(payload, ensure_ascii=False),
-                    )
-                    logger.info(f"lambda_invoke_result: {lambda_invoke_result}")
+                    # タイムアウト判定予約
+                    control_timeout.request_check(device_req_no, control_trigger)
 
         logger.debug("lambda_handler正常終了")
         return 0
@@ -387,8 +382,8 @@ def __check_under_control(do_info, icc_id, device_id, req_no_counter_table, remo
                 処理続行する。
             2. 制御中の場合
                 履歴情報を登録して処理対象外としてスキップする。
-    2. 要求番号が設定されていない場合
-        要求番号テーブルへnum:0のレコードを作成する。
+    2. 制御中以外の場合
+        要求番号を採番する（要求番号カウンタがない場合は0から開始）。
     """
     result = None
     reason = ""
@@ -412,30 +407,15 @@ def __check_under_control(do_info, icc_id, device_id, req_no_counter_table, remo
             reason = remote_control_latest.get("control_trigger")
             return True, 1, reason
 
-    req_no_count_info = ddb.get_req_no_count_info(icc_id, req_no_counter_table)
-    if req_no_count_info:
-        # 要求番号生成（アトミックカウンタをインクリメントし、要求番号を取得）
-        req_num = ddb.increment_req_no_count_num(icc_id, req_no_counter_table)
-        result = do_info
-        result["req_num"] = int(req_num)
-
-    else:
-        logger.info("req_no_count_info did not exist. Put req_no_count_info to table")
-        req_num = 0
-        write_items = [
-            {
-                "Put": {
-                    "TableName": req_no_counter_table.name,
-                    "Item": {"simid": {"S": icc_id}, "num": {"N": str(req_num)}},
-                }
-            }
-        ]
-        result = db.execute_transact_write_item(write_items)
-        if not result:
-            res_body = {"message": "要求番号カウンタ情報への書き込みに失敗しました。"}
-            return False, res_body, reason
-        result = do_info
-        result["req_num"] = req_num
+    # 要求番号生成（1回のUpdateItemで採番、カウンタがない場合は0から開始）
+    try:
+        req_num = req_no_counter.next_count(icc_id, req_no_counter_table)
+    except ClientError as e:
+        logger.error(f"要求番号カウンタ更新エラー icc_id={icc_id}, e={e}")
+        res_body = {"message": "要求番号カウンタ情報への書き込みに失敗しました。"}
+        return False, res_body, reason
+    result = do_info
+    result["req_num"] = req_num
 
     return True, result, reason
 
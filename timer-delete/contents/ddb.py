@@ -1,12 +1,10 @@
 from aws_lambda_powertools import Logger
-import boto3
 from boto3.dynamodb.conditions import Key
 from boto3.dynamodb.conditions import Attr
 
 import db
 
 logger = Logger()
-dynamodb = boto3.resource("dynamodb")
 
 
 # タイマー設定削除
@@ -3,6 +3,7 @@ from aws_lambda_powertools import Logger
 
 # layer
 import db
+import relation
 
 logger = Logger()
 
@@ -82,9 +83,9 @@ def operation_auth_check(user_info, contract_info, device_id, tables):
         return False
     if user_type == "worker":
         # 3.1 ユーザに紐づくデバイスID取得
-        user_devices = db.get_user_relation_device_id_list(
-            user_id, tables["device_relation_table"]
-        )
+        user_devices = relation.get_relation_graph(
+            contract_info, tables["device_relation_table"]
+        ).user_device_id_list(user_id)
         if device_id not in set(user_devices):
             return False
     return True
@@ -4,14 +4,12 @@ import time
 from datetime import datetime
 
 from aws_lambda_powertools import Logger
-import boto3
 from boto3.dynamodb.conditions import Key
 from boto3.dynamodb.conditions import Attr
 
 import db
 
 logger = Logger()
-dynamodb = boto3.resource("dynamodb")
 
 
 class SettingLimitError(Exception):
@@ -1,13 +1,11 @@
-import json
-import boto3
 import decimal
+import convert
 import db
 from boto3.dynamodb.conditions import Key
 from boto3.dynamodb.conditions import Attr
 from botocore.exceptions import ClientError
 from aws_lambda_powertools import Logger
 
-dynamodb = boto3.resource("dynamodb")
 logger = Logger()
 
 
@@ -26,7 +24,7 @@ def get_device_info(pk, table):
 
 #現状態データ更新
 def put_db_item(db_item, table):
-    item = json.loads(json.dumps(db_item,default=decimal_to_num), parse_float=decimal.Decimal)
+    item = convert.to_dynamo_item(db_item)
     try:
         table.put_item(Item=item)
     except ClientError as e:
@@ -69,7 +67,7 @@ def get_device_state(device_id, device_state_table):
 
 # 通知履歴挿入
 def put_notice_hist(db_item, notification_hist_table):
-    item = json.loads(json.dumps(db_item), parse_float=decimal.Decimal)
+    item = convert.to_dynamo_item(db_item)
     try:
         notification_hist_table.put_item(Item=item)
     except ClientError as e:
@@ -1,5 +1,4 @@
 import os
-import boto3
 import uuid
 import time
 import ddb
@@ -12,8 +11,6 @@ from aws_xray_sdk.core import patch_all
 
 patch_all()
 
-dynamodb = boto3.resource("dynamodb", endpoint_url=os.environ.get("endpoint_url"))
-
 HIST_LIST_TTL = int(os.environ["HIST_LIST_TTL"])
 NOTIFICATION_HIST_TTL = int(os.environ["NOTIFICATION_HIST_TTL"])
 
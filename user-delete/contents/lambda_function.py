@@ -10,10 +10,12 @@ from aws_xray_sdk.core import patch_all
 
 import auth
 import db
+import relation
 import convert
 import ddb
 import ssm
 import validate
+import write_plan
 
 patch_all()
 
@@ -79,12 +81,15 @@ def lambda_handler(event, context, login_user, user_id):
                 "body": json.dumps({"message": "削除されたユーザーが選択されました。\n画面の更新を行います。\n\nエラーコード：006-0102"}, ensure_ascii=False),
             }
 
-        transact_items = []
+        # 関係データ・通知先を先に削除し、全て成功した場合のみ契約・ユーザーの削除を行う
+        # （失敗した場合は削除済みの関係データ・通知先を元に戻す）
+        plan = write_plan.WritePlan(key_names={device_relation_table.table_name: ("key1", "key2")})
+        user_delete_items = []
 
         # 契約情報から削除対象のユーザーを削除
         contract_user_list = contract.get("contract_data").get("user_list", [])
         contract_user_list.remove(user_id)
-        transact_items.append(
+        user_delete_items.append(
             {
                 "Update": {
                     "TableName": contract_table.table_name,
@@ -111,10 +116,12 @@ def lambda_handler(event, context, login_user, user_id):
             update = False
             notification_target_list = device.get("device_data").get("config").get("notification_target_list", [])
             if user_id in notification_target_list:
+                # 以降の書き込みが失敗した場合に元に戻す値
+                notification_target_list_old = list(notification_target_list)
                 notification_target_list.remove(user_id)
                 update = True
             if update:
-                transact_items.append(
+                plan.add(
                     {
                         "Update": {
                             "TableName": device_table.table_name,
@@ -134,7 +141,27 @@ def lambda_handler(event, context, login_user, user_id):
                                 {":notification_target_list": notification_target_list}
                             ),
                         }
-                    }
+                    },
+                    compensate={
+                        "Update": {
+                            "TableName": device_table.table_name,
+                            "Key": convert.dict_dynamo_format(
+                                {
+                                    "device_id": device["device_id"],
+                                    "identification_id": device["imei"],
+                                }
+                            ),
+                            "UpdateExpression": "SET #device_data.#config.#notification_target_list = :notification_target_list",
+                            "ExpressionAttributeNames": {
+                                "#device_data": "device_data",
+                                "#config": "config",
+                                "#notification_target_list": "notification_target_list",
+                            },
+                            "ExpressionAttributeValues": convert.dict_dynamo_format(
+                                {":notification_target_list": notification_target_list_old}
+                            ),
+                        }
+                    },
                 )
 
         # 削除対象のデバイス関係を取得して削除
@@ -142,8 +169,8 @@ def lambda_handler(event, context, login_user, user_id):
             f"u-{user_id}", device_relation_table, sk_prefix="d-"
         ) + db.get_device_relation(f"u-{user_id}", device_relation_table, sk_prefix="g-")
         logger.info({"device_relation_list": device_relation_list})
-        transact_items.extend(
-            [
+        for device_relation in device_relation_list:
+            plan.add(
                 {
                     "Delete": {
                         "TableName": device_relation_table.table_name,
@@ -154,15 +181,19 @@ def lambda_handler(event, context, login_user, user_id):
                             }
                         ),
                     }
-                }
-                for device_relation in device_relation_list
-            ]
-        )
+                },
+                compensate={
+                    "Put": {
+                        "TableName": device_relation_table.table_name,
+                        "Item": convert.dict_dynamo_format(device_relation),
+                    }
+                },
+            )
 
         # モノセコムユーザー管理テーブルに削除日時を設定
         del_datetime = int(time.time() * 1000)
         logger.info({"del_datetime": del_datetime})
-        transact_items.append(
+        user_delete_items.append(
             {
                 "Update": {
                     "TableName": user_table.table_name,
@@ -220,7 +251,7 @@ def lambda_handler(event, context, login_user, user_id):
                 }
         
             # アカウント管理テーブルに削除日時を設定
-            transact_items.append(
+            user_delete_items.append(
                 {
                     "Update": {
                         "TableName": account_table.table_name,
@@ -239,22 +270,21 @@ def lambda_handler(event, context, login_user, user_id):
             )
 
         # DB更新
-        if len(transact_items) > 100:
-            transact_items_list = [transact_items[i:i+100] for i in range(0, len(transact_items), 100)]
-        else:
-            transact_items_list = [transact_items]
-        logger.info("------------transact_items_list-----------")
-        logger.info(transact_items_list)
-        logger.info("------------------------------------------")
+        plan.then()
+        plan.add_atomic(user_delete_items)
+        result = plan.execute()
+        if not result.ok:
+            logger.error("ユーザー情報削除に失敗")
+            # 一部の更新が実行済みの場合があるためキャッシュは無効化する
+            relation.update_relation_version(login_user["contract_id"], contract_table)
+            return {
+                "statusCode": 500,
+                "headers": res_headers,
+                "body": json.dumps({"message": "ユーザー情報の削除に失敗しました。"}, ensure_ascii=False),
+            }
 
-        for transact_item in transact_items_list:
-            if not db.execute_transact_write_item(transact_item):
-                logger.error("ユーザー情報削除に失敗", exc_info=True)
-                return {
-                    "statusCode": 500,
-                    "headers": res_headers,
-                    "body": json.dumps({"message": "ユーザー情報の削除に失敗しました。"}, ensure_ascii=False),
-                }
+        # デバイス関係グラフのキャッシュ無効化
+        relation.update_relation_version(login_user["contract_id"], contract_table)
 
         return {"statusCode": 204, "headers": res_headers}
 
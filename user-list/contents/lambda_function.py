@@ -23,6 +23,15 @@ SSM_KEY_TABLE_NAME = os.environ["SSM_KEY_TABLE_NAME"]
 
 logger = Logger()
 
+# 一覧表示に必要な属性
+USER_LIST_USER_FIELDS = ["user_type", "account_id"]
+USER_LIST_ACCOUNT_FIELDS = [
+    "email_address",
+    "user_data.config.user_name",
+    "user_data.config.auth_status",
+    "user_data.config.auth_period",
+]
+
 
 @auth.verify_login_user()
 def lambda_handler(event, context, login_user):
@@ -66,12 +75,26 @@ def lambda_handler(event, context, login_user):
                         detect_condition = int(query_param_detect_condition)
 
             contract_info = db.get_contract_info(login_user["contract_id"], contract_table)
-            for user_id in contract_info.get("contract_data", {}).get("user_list", {}):
-                user = db.get_user_info_by_user_id(user_id, user_table)
-                if user.get("user_type") == "admin":
-                    continue
-
-                account = db.get_account_info_by_account_id(user.get("account_id"), account_table)
+            # ユーザー情報・アカウント情報一括取得
+            contract_user_list = [
+                user
+                for user in db.get_users_many(
+                    contract_info.get("contract_data", {}).get("user_list", []),
+                    user_table,
+                    USER_LIST_USER_FIELDS,
+                )
+                if user.get("user_type") != "admin"
+            ]
+            account_dict = {
+                account["account_id"]: account
+                for account in db.get_accounts_many(
+                    [user.get("account_id") for user in contract_user_list],
+                    account_table,
+                    USER_LIST_ACCOUNT_FIELDS,
+                )
+            }
+            for user in contract_user_list:
+                account = account_dict.get(user.get("account_id"), {})
                 account_config = account.get("user_data", {}).get("config", {})
 
                 auth_status = account_config.get("auth_status")
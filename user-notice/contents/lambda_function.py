@@ -8,6 +8,7 @@ from aws_xray_sdk.core import patch_all
 
 import auth
 import db
+import relation
 import mail
 import ssm
 import validate
@@ -86,7 +87,9 @@ def lambda_handler(event, context, login_user, user_id):
 
         # ユーザーのデバイスIDリストを取得
         if user["user_type"] in ["worker", "referrer"]:
-            device_id_list = db.get_user_relation_device_id_list(user_id, device_relation_table)
+            device_id_list = relation.get_relation_graph(
+                contract, device_relation_table
+            ).user_device_id_list(user_id)
         elif user["user_type"] == "sub_admin":
             device_id_list = contract.get("contract_data", {}).get("device_list", [])
         else:
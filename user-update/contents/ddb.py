@@ -8,6 +8,8 @@ from aws_lambda_powertools import Logger
 import cognito
 import convert
 import db
+import relation
+import write_plan
 
 logger = Logger()
 
@@ -24,8 +26,11 @@ def create_user_info(
     contract_table_name,
     device_relation_table_name,
 ):
-    # トランザクション書き込み用オブジェクト
-    transact_items = []
+    # 書き込み計画
+    # 関係データを先に登録し、全て成功した場合のみアカウント・ユーザー・契約を登録する
+    # （失敗した場合は登録済みの関係データを削除する）
+    plan = write_plan.WritePlan(key_names={device_relation_table_name: ("key1", "key2")})
+    user_create_items = []
 
     #################################################
     # アカウント管理テーブル、Cognito UserPool
@@ -64,7 +69,7 @@ def create_user_info(
                 "Item": account_item_fmt,
             }
         }
-        transact_items.append(put_group)
+        user_create_items.append(put_group)
     else:
         # すでにアカウントがあれば更新
         account_id = account["account_id"]
@@ -101,7 +106,7 @@ def create_user_info(
                     "ExpressionAttributeNames": account_expression_attribute_name,
                 }
             }
-            transact_items.append(update_account)
+            user_create_items.append(update_account)
 
     #################################################
     # モノセコムユーザ管理テーブル
@@ -121,7 +126,7 @@ def create_user_info(
             "Item": user_item_fmt,
         }
     }
-    transact_items.append(put_user)
+    user_create_items.append(put_user)
 
     #################################################
     # 契約管理テーブル
@@ -147,7 +152,7 @@ def create_user_info(
             "ExpressionAttributeNames": contract_expression_attribute_name,
         }
     }
-    transact_items.append(update_contract)
+    user_create_items.append(update_contract)
 
     #################################################
     # デバイス関係テーブル（グループ）
@@ -164,7 +169,10 @@ def create_user_info(
                 "Item": group_relation_item_fmt,
             }
         }
-        transact_items.append(put_group_relation)
+        plan.add(
+            put_group_relation,
+            compensate=_remove_relation(device_relation_table_name, group_relation_item_fmt),
+        )
 
     #################################################
     # デバイス関係テーブル（デバイス）
@@ -181,25 +189,29 @@ def create_user_info(
                 "Item": device_relation_item_fmt,
             }
         }
-        transact_items.append(put_device_relation)
+        plan.add(
+            put_device_relation,
+            compensate=_remove_relation(device_relation_table_name, device_relation_item_fmt),
+        )
 
     #################################################
     # DB書き込みトランザクション実行
     #################################################
-    if len(transact_items) > 100:
-        transact_items_list = [transact_items[i:i+100] for i in range(0, len(transact_items), 100)]
-    else:
-        transact_items_list = [transact_items]
-    logger.info("------------transact_items_list-----------")
-    logger.info(transact_items_list)
-    logger.info("------------------------------------------")
+    plan.then()
+    plan.add_atomic(user_create_items)
+    result = plan.execute()
 
-    for transact_item in transact_items_list:
-        transact_result = db.execute_transact_write_item(transact_item)
-        if not transact_result:
-            break
+    return result.ok, user_id
 
-    return transact_result, user_id
+
+# 登録したデバイス関係の削除用オブジェクト
+def _remove_relation(device_relation_table_name, relation_item_fmt):
+    return {
+        "Delete": {
+            "TableName": device_relation_table_name,
+            "Key": relation_item_fmt,
+        }
+    }
 
 
 def update_user_info(
@@ -430,7 +442,10 @@ def update_user_info(
     #################################################
     logger.info(user)
     if user["user_type"] in ["worker", "referrer"] and request_params["user_type"] in ["worker", "referrer"]:
-        device_id_list_old = db.get_user_relation_duplication_device_id_list(user_id, device_relation_table)
+        contract_info = db.get_contract_info(user.get("contract_id"), contract_table)
+        device_id_list_old = relation.get_relation_graph(
+            contract_info, device_relation_table
+        ).user_duplication_device_id_list(user_id)
         remove_device_id_list = convert.list_difference(remove_device_id_list, added_device_id_list)
         remove_device_id_set = set(remove_device_id_list)
         for device_id in remove_device_id_set:
@@ -11,6 +11,7 @@ import auth
 import ssm
 import convert
 import db
+import relation
 import mail
 import ddb
 import validate
@@ -109,6 +110,9 @@ def lambda_handler(event, context, user):
                 ),
             }
 
+        # デバイス関係グラフのキャッシュ無効化
+        relation.update_relation_version(user["contract_id"], contract_table)
+
         # レスポンス用データ取得
         user_id = result[1]
         registed_user = db.get_user_info_by_user_id(user_id, user_table)